@@ -15,15 +15,19 @@ if db_url:
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-if config.config_file_name is not None:
+# (sauf exécution depuis l'application : sa configuration des logs est conservée)
+if config.config_file_name is not None and 'connection' not in config.attributes:
     fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-from app.models import Base
-target_metadata = Base.metadata
+# (l'application fournit ses métadonnées, déjà chargées, via config.attributes)
+target_metadata = config.attributes.get('target_metadata')
+if target_metadata is None:
+    from app.models import Base
+    target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -62,6 +66,17 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # Connexion fournie par l'application (migrations au démarrage, voir demarrage.py)
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        context.configure(
+            connection=connection, target_metadata=target_metadata
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -0,0 +1,29 @@
+"""Ajout du hash du document signé
+
+Revision ID: a1c3e5f7b9d2
+Revises: f4a6b8c0d2e5
+Create Date: 2026-10-19 16:41:09.372154
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f7b9d2'
+down_revision: Union[str, Sequence[str], None] = 'f4a6b8c0d2e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Table 20_documents_a_signer : hash du fichier signé final (ETag des téléchargements)
+    inspector = sa.inspect(op.get_bind())
+    if 'hash_signed_file' not in {column['name'] for column in inspector.get_columns('20_documents_a_signer')}:
+        op.add_column('20_documents_a_signer', sa.Column('hash_signed_file', sa.String(64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('20_documents_a_signer', 'hash_signed_file')
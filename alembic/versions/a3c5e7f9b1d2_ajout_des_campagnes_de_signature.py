@@ -0,0 +1,61 @@
+"""Ajout des campagnes de signature
+
+Revision ID: a3c5e7f9b1d2
+Revises: e1a3c5b7d9f0
+Create Date: 2026-10-19 17:58:24.640183
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e7f9b1d2'
+down_revision: Union[str, Sequence[str], None] = 'e1a3c5b7d9f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Index de suivi des campagnes et de la file des invitations : (nom de l'index, table, colonnes)
+CAMPAGNE_INDEXES = [
+    ('ix_20_documents_campagne_status', '20_documents_a_signer', ['id_campagne', 'status']),
+    ('ix_23_invitations_envoi', '23_invitations', ['mail_envoye', 'status']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Création de la table '26_campagnes' si SQL Alchemy ne l'a pas déjà fait
+    inspector = sa.inspect(op.get_bind())
+    if '26_campagnes' not in inspector.get_table_names():
+        op.create_table(
+            '26_campagnes',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('nom', sa.String(255), nullable=False),
+            sa.Column('mode', sa.String(10), nullable=False),
+            sa.Column('id_user', sa.Integer(), sa.ForeignKey('99_users.id'), nullable=True),
+            sa.Column('url_racine', sa.String(255), nullable=False),
+            sa.Column('nb_documents', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('nb_signataires', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('cree_at', sa.DateTime(), server_default=sa.func.now()),
+        )
+
+    # Rattachement des documents à signer à leur campagne
+    if 'id_campagne' not in {column['name'] for column in inspector.get_columns('20_documents_a_signer')}:
+        op.add_column('20_documents_a_signer', sa.Column('id_campagne', sa.Integer(), nullable=True))
+        op.create_foreign_key('fk_20_documents_campagne', '20_documents_a_signer', '26_campagnes',
+                              ['id_campagne'], ['id'], ondelete='SET NULL')
+
+    # Index de suivi des campagnes et de la file des invitations
+    for name, table, columns in CAMPAGNE_INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Clé étrangère supprimée avant l'index qui la sert
+    op.drop_constraint('fk_20_documents_campagne', '20_documents_a_signer', type_='foreignkey')
+    for name, table, _ in CAMPAGNE_INDEXES:
+        op.drop_index(name, table_name=table)
+    op.drop_column('20_documents_a_signer', 'id_campagne')
+    op.drop_table('26_campagnes')
@@ -0,0 +1,30 @@
+"""Ajout de l'impression par référence
+
+Revision ID: a7c9e1f3b5d6
+Revises: f6b8d0e2a4c5
+Create Date: 2026-10-19 21:05:48.207614
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c9e1f3b5d6'
+down_revision: Union[str, Sequence[str], None] = 'f6b8d0e2a4c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Table 30_impressions : référence du fichier stocké imprimé sans copie (document, facture, document signé)
+    if 'reference' not in {column['name'] for column in inspector.get_columns('30_impressions')}:
+        op.add_column('30_impressions', sa.Column('reference', sa.String(50), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('30_impressions', 'reference')
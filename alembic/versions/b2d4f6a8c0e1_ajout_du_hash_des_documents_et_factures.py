@@ -0,0 +1,33 @@
+"""Ajout du hash des documents et factures
+
+Revision ID: b2d4f6a8c0e1
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-19 17:52:27.604318
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a8c0e1'
+down_revision: Union[str, Sequence[str], None] = 'a1c3e5f7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('11_documents', '13_factures')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables 11_documents et 13_factures : SHA-256 calculé au téléversement (ETag des téléchargements)
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        if 'hash_fichier' not in {column['name'] for column in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('hash_fichier', sa.String(64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.drop_column(table, 'hash_fichier')
@@ -0,0 +1,30 @@
+"""Bail des travaux d'impression
+
+Revision ID: b5d7f9a1c3e4
+Revises: a3c5e7f9b1d2
+Create Date: 2026-10-19 19:12:37.508261
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d7f9a1c3e4'
+down_revision: Union[str, Sequence[str], None] = 'a3c5e7f9b1d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Table 30_impressions : date de réservation d'un travail par un thread d'envoi (bail)
+    if 'reserve_at' not in {column['name'] for column in inspector.get_columns('30_impressions')}:
+        op.add_column('30_impressions', sa.Column('reserve_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('30_impressions', 'reserve_at')
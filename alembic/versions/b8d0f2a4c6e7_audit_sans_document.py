@@ -0,0 +1,32 @@
+"""Audit des actions sans document
+
+Revision ID: b8d0f2a4c6e7
+Revises: a7c9e1f3b5d6
+Create Date: 2026-10-19 21:38:26.619043
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d0f2a4c6e7'
+down_revision: Union[str, Sequence[str], None] = 'a7c9e1f3b5d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Table 24_audit_logs : actions sans document existant (dépôt refusé, document introuvable, liste)
+    colonnes = {column['name']: column for column in inspector.get_columns('24_audit_logs')}
+    if not colonnes['id_document']['nullable']:
+        op.alter_column('24_audit_logs', 'id_document', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM `24_audit_logs` WHERE id_document IS NULL")
+    op.alter_column('24_audit_logs', 'id_document', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,39 @@
+"""Ajout du magasin de fichiers adressé par contenu
+
+Revision ID: c3e5a7b9d1f2
+Revises: b2d4f6a8c0e1
+Create Date: 2026-10-19 18:36:14.218735
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e5a7b9d1f2'
+down_revision: Union[str, Sequence[str], None] = 'b2d4f6a8c0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Table 10_fichiers : fichiers stockés sous leur empreinte SHA-256 et compteur de références
+    # (les fichiers existants sont importés par `python stockage.py`)
+    inspector = sa.inspect(op.get_bind())
+    if '10_fichiers' not in inspector.get_table_names():
+        op.create_table(
+            '10_fichiers',
+            sa.Column('hash', sa.String(64), primary_key=True),
+            sa.Column('taille', sa.BigInteger(), nullable=False),
+            sa.Column('nb_references', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('used_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_10_fichiers_references_used', '10_fichiers', ['nb_references', 'used_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_10_fichiers_references_used', table_name='10_fichiers')
+    op.drop_table('10_fichiers')
@@ -0,0 +1,154 @@
+"""Partitionnement mensuel et codes compacts du journal d'audit
+
+Revision ID: c9e1a3b5d7f8
+Revises: b8d0f2a4c6e7
+Create Date: 2026-10-19 22:47:12.305518
+
+"""
+from datetime import date
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e1a3b5d7f8'
+down_revision: Union[str, Sequence[str], None] = 'b8d0f2a4c6e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = '24_audit_logs'
+
+# Nombre de mois à venir partitionnés dès la migration (ensuite : tâche maintenance_audit)
+PARTITIONS_AVANCE = 3
+
+# Index temporels : (nom de l'index, colonnes)
+AUDIT_INDEXES = [
+    ('ix_24_audit_document_timestamp', ['id_document', 'timestamp']),
+    ('ix_24_audit_user_timestamp', ['id_user', 'timestamp']),
+    ('ix_24_audit_action_timestamp', ['action', 'timestamp']),
+]
+
+# Conversion des détails en codes : (code, motif du texte existant, complément conservé)
+CONVERSIONS = [
+    (0, r'^success$', ''),
+    (1, r'^connexion échouée *\(?([^)]*)\)?$', r'\1'),
+    (2, r'^Erreur OTP - invitation non trouvée *\(?([^)]*)\)?$', r'\1'),
+    (3, r'^OTP envoyé avec succès$', ''),
+    (4, r'^Erreur lors de la création du code OTP$', ''),
+    (5, r'^Liste des documents affichée$', ''),
+    (6, r'^Document finalisé et envoyé par email$', ''),
+    (7, r'^Aucun document PDF téléchargé.*$', ''),
+    (8, r'^Fichier non trouvé pour le document (.*)$', r'\1'),
+    (9, r'^Tentative de téléchargement du document (.*) non trouvé$', r'document \1'),
+    (10, r'^Tentative de téléchargement d.un document non signé$', ''),
+    (11, r'^Erreur lors du téléchargement du fichier signé.*$', ''),
+    (12, r'^Impression du document signé *\(?([^)]*)\)?$', r'\1'),
+    (13, r'^Document expiré$', ''),
+    (14, r'^Invitation expirée$', ''),
+]
+
+# Libellés rétablis au retour arrière (code, libellé)
+LIBELLES = [
+    (0, 'success'), (1, 'connexion échouée'), (2, 'Erreur OTP - invitation non trouvée'),
+    (3, 'OTP envoyé avec succès'), (4, 'Erreur lors de la création du code OTP'),
+    (5, 'Liste des documents affichée'), (6, 'Document finalisé et envoyé par email'),
+    (7, 'Aucun document PDF téléchargé ou nom de fichier invalide.'), (8, 'Fichier non trouvé'),
+    (9, 'Tentative de téléchargement de document non trouvé'),
+    (10, "Tentative de téléchargement d'un document non signé"),
+    (11, 'Erreur lors du téléchargement du fichier signé par utilisateur autorisé.'),
+    (12, 'Impression du document signé'), (13, 'Document expiré'), (14, 'Invitation expirée'),
+]
+
+
+def _decaler_mois(mois: date, nombre: int) -> date:
+    """Premier jour du mois décalé de `nombre` mois."""
+    index = mois.year * 12 + mois.month - 1 + nombre
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _est_partitionnee(bind: sa.engine.Connection) -> bool:
+    """Indique si la table d'audit est déjà partitionnée."""
+    return bool(bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL"),
+        {'table': TABLE}).scalar())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    mariadb = bind.dialect.name in ('mysql', 'mariadb')
+
+    # Code d'événement et conversion des détails existants (le complément variable est conservé)
+    if 'code' not in {column['name'] for column in inspector.get_columns(TABLE)}:
+        op.add_column(TABLE, sa.Column('code', sa.SmallInteger(), nullable=False, server_default='0'))
+        if mariadb:
+            for code, motif, complement in CONVERSIONS:
+                bind.execute(sa.text(
+                    f"UPDATE `{TABLE}` SET code = :code, "
+                    f"details = NULLIF(REGEXP_REPLACE(details, :motif, :complement), '') "
+                    f"WHERE details REGEXP :motif"), {'code': code, 'motif': motif, 'complement': complement})
+    op.alter_column(TABLE, 'action', existing_type=sa.Integer(), type_=sa.SmallInteger(), existing_nullable=False)
+
+    # Clés étrangères non prises en charge sur une table partitionnée
+    for foreign_key in inspector.get_foreign_keys(TABLE):
+        if foreign_key.get('name'):
+            op.drop_constraint(foreign_key['name'], TABLE, type_='foreignkey')
+
+    # Date obligatoire (clé de partitionnement)
+    op.execute(f"UPDATE `{TABLE}` SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL")
+    op.alter_column(TABLE, 'timestamp', existing_type=sa.DateTime(), nullable=False)
+
+    # Index temporels
+    existants = {index['name'] for index in inspector.get_indexes(TABLE)}
+    for name, columns in AUDIT_INDEXES:
+        if name not in existants:
+            op.create_index(name, TABLE, columns)
+
+    if not mariadb or _est_partitionnee(bind):
+        return
+
+    # Clé primaire incluant la clé de partitionnement
+    if inspector.get_pk_constraint(TABLE)['constrained_columns'] != ['id', 'timestamp']:
+        op.execute(f"ALTER TABLE `{TABLE}` DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+
+    # Une partition par mois, du plus ancien événement aux mois à venir, puis pmax
+    plus_ancien = bind.execute(sa.text(f"SELECT MIN(timestamp) FROM `{TABLE}`")).scalar()
+    aujourd_hui = date.today()
+    mois = date((plus_ancien or aujourd_hui).year, (plus_ancien or aujourd_hui).month, 1)
+    dernier = _decaler_mois(date(aujourd_hui.year, aujourd_hui.month, 1), PARTITIONS_AVANCE)
+    partitions = []
+    while mois <= dernier:
+        suivant = _decaler_mois(mois, 1)
+        partitions.append(f"PARTITION p{mois:%Y%m} VALUES LESS THAN (TO_DAYS('{suivant:%Y-%m-%d}'))")
+        mois = suivant
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    op.execute(f"ALTER TABLE `{TABLE}` PARTITION BY RANGE (TO_DAYS(timestamp)) ({', '.join(partitions)})")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if _est_partitionnee(bind):
+        op.execute(f"ALTER TABLE `{TABLE}` REMOVE PARTITIONING")
+    op.execute(f"ALTER TABLE `{TABLE}` DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+
+    # Rétablissement des détails en texte libre
+    for code, texte in LIBELLES:
+        bind.execute(sa.text(
+            f"UPDATE `{TABLE}` SET details = IF(details IS NULL, :texte, CONCAT(:texte, ' (', details, ')')) "
+            f"WHERE code = :code"), {'code': code, 'texte': texte})
+    op.drop_column(TABLE, 'code')
+
+    for name, _ in AUDIT_INDEXES:
+        op.drop_index(name, table_name=TABLE)
+    op.alter_column(TABLE, 'timestamp', existing_type=sa.DateTime(), nullable=True)
+    op.alter_column(TABLE, 'action', existing_type=sa.SmallInteger(), type_=sa.Integer(), existing_nullable=False)
+
+    # Clés étrangères (les événements de documents supprimés depuis sont détachés)
+    op.execute(f"UPDATE `{TABLE}` SET id_document = NULL "
+               f"WHERE id_document NOT IN (SELECT id FROM `20_documents_a_signer`)")
+    op.execute(f"UPDATE `{TABLE}` SET id_user = NULL WHERE id_user NOT IN (SELECT id FROM `99_users`)")
+    op.create_foreign_key(None, TABLE, '20_documents_a_signer', ['id_document'], ['id'])
+    op.create_foreign_key(None, TABLE, '99_users', ['id_user'], ['id'])
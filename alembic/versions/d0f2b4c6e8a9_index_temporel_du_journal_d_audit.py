@@ -0,0 +1,30 @@
+"""Index temporel du journal d'audit
+
+Revision ID: d0f2b4c6e8a9
+Revises: c9e1a3b5d7f8
+Create Date: 2026-10-19 23:18:40.512094
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0f2b4c6e8a9'
+down_revision: Union[str, Sequence[str], None] = 'c9e1a3b5d7f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Consultation et exportation sans filtre d'égalité : tri et reprise sur (timestamp, id)
+    if 'ix_24_audit_timestamp' not in {index['name'] for index in inspector.get_indexes('24_audit_logs')}:
+        op.create_index('ix_24_audit_timestamp', '24_audit_logs', ['timestamp'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_24_audit_timestamp', table_name='24_audit_logs')
@@ -0,0 +1,47 @@
+"""Index FULLTEXT pour la recherche dans les contrats
+
+Revision ID: d3f1a8b2c4e6
+Revises: c8293d28c674
+Create Date: 2026-10-19 09:12:44.207351
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f1a8b2c4e6'
+down_revision: Union[str, Sequence[str], None] = 'c8293d28c674'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Index FULLTEXT : (nom de l'index, table, colonnes)
+FULLTEXT_INDEXES = [
+    ('ft_01_contrats', '01_contrats', ['intitule', 'entreprise', 'id_externe_contrat']),
+    ('ft_02_contacts', '02_contacts', ['nom', 'mail', 'ville']),
+    ('ft_11_documents', '11_documents', ['descriptif']),
+    ('ft_12_evenements', '12_evenements', ['descriptif']),
+    ('ft_13_factures', '13_factures', ['titre_facture']),
+]
+
+
+def _existing_indexes(table: str) -> set[str]:
+    """Retourne les noms des index déjà présents sur une table."""
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Les tables existent déjà : les index FULLTEXT déclarés dans les modèles
+    # ne sont créés par SQL Alchemy que pour les nouvelles tables
+    for name, table, columns in FULLTEXT_INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, mysql_prefix='FULLTEXT')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in FULLTEXT_INDEXES:
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
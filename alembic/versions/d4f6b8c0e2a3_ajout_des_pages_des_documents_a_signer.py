@@ -0,0 +1,45 @@
+"""Ajout des pages des documents à signer
+
+Revision ID: d4f6b8c0e2a3
+Revises: c3e5a7b9d1f2
+Create Date: 2026-10-19 19:24:51.903176
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6b8c0e2a3'
+down_revision: Union[str, Sequence[str], None] = 'c3e5a7b9d1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Table 20_documents_a_signer : nombre de pages relevé à l'analyse du PDF
+    if 'nb_pages' not in {column['name'] for column in inspector.get_columns('20_documents_a_signer')}:
+        op.add_column('20_documents_a_signer', sa.Column('nb_pages', sa.Integer(), nullable=True))
+
+    # Table 25_pages : dimensions (mediabox) et rotation de chaque page
+    if '25_pages' not in inspector.get_table_names():
+        op.create_table(
+            '25_pages',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('id_document', sa.Integer(),
+                      sa.ForeignKey('20_documents_a_signer.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('page_num', sa.Integer(), nullable=False),
+            sa.Column('largeur', sa.Numeric(10, 2), nullable=False),
+            sa.Column('hauteur', sa.Numeric(10, 2), nullable=False),
+            sa.Column('rotation', sa.Integer(), nullable=False),
+            sa.UniqueConstraint('id_document', 'page_num', name='uq_25_pages_document_page'),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('25_pages')
+    op.drop_column('20_documents_a_signer', 'nb_pages')
@@ -0,0 +1,46 @@
+"""Ajout de la table 14_depenses
+
+Revision ID: e1a3c5b7d9f0
+Revises: d0f2b4c6e8a9
+Create Date: 2026-10-19 16:42:08.317254
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a3c5b7d9f0'
+down_revision: Union[str, Sequence[str], None] = 'd0f2b4c6e8a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Création de la table '14_depenses' si SQL Alchemy ne l'a pas déjà fait
+    inspector = sa.inspect(op.get_bind())
+    if '14_depenses' not in inspector.get_table_names():
+        op.create_table(
+            '14_depenses',
+            sa.Column('id_contrat', sa.Integer(), sa.ForeignKey('01_contrats.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('annee', sa.SmallInteger(), primary_key=True, autoincrement=False),
+            sa.Column('mois', sa.SmallInteger(), primary_key=True, autoincrement=False),
+            sa.Column('montant', sa.Numeric(14, 2), nullable=False),
+            sa.Column('nb_factures', sa.Integer(), nullable=False),
+        )
+        op.create_index('ix_14_depenses_periode', '14_depenses', ['annee', 'mois'])
+
+    # Alimentation initiale depuis les factures existantes
+    op.execute("""
+        INSERT IGNORE INTO `14_depenses` (id_contrat, annee, mois, montant, nb_factures)
+        SELECT id_contrat, YEAR(date_facture), MONTH(date_facture), SUM(montant), COUNT(*)
+        FROM `13_factures`
+        GROUP BY id_contrat, YEAR(date_facture), MONTH(date_facture)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Suppression de la table '14_depenses'
+    op.drop_table('14_depenses')
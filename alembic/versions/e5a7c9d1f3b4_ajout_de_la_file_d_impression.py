@@ -0,0 +1,46 @@
+"""Ajout de la file d'impression
+
+Revision ID: e5a7c9d1f3b4
+Revises: d4f6b8c0e2a3
+Create Date: 2026-10-19 20:02:37.418265
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9d1f3b4'
+down_revision: Union[str, Sequence[str], None] = 'd4f6b8c0e2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Table 30_impressions : travaux de la file d'impression et identifiant CUPS
+    if '30_impressions' not in inspector.get_table_names():
+        op.create_table(
+            '30_impressions',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('id_user', sa.Integer(), sa.ForeignKey('99_users.id'), nullable=True),
+            sa.Column('titre', sa.String(255), nullable=False),
+            sa.Column('chemin_fichier', sa.String(500), nullable=False),
+            sa.Column('options', sa.Text(), nullable=False),
+            sa.Column('status', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('cups_job_id', sa.Integer(), nullable=True),
+            sa.Column('tentatives', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('erreur', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+            sa.Column('completed_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_30_impressions_status_created', '30_impressions', ['status', 'created_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_30_impressions_status_created', table_name='30_impressions')
+    op.drop_table('30_impressions')
@@ -0,0 +1,46 @@
+"""Ajout de la table 03_echeances
+
+Revision ID: e7b2c9d4f1a3
+Revises: d3f1a8b2c4e6
+Create Date: 2026-10-19 11:03:27.518204
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2c9d4f1a3'
+down_revision: Union[str, Sequence[str], None] = 'd3f1a8b2c4e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Création de la table '03_echeances' si SQL Alchemy ne l'a pas déjà fait
+    inspector = sa.inspect(op.get_bind())
+    if '03_echeances' not in inspector.get_table_names():
+        op.create_table(
+            '03_echeances',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('id_contrat', sa.Integer(), sa.ForeignKey('01_contrats.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('type_echeance', sa.String(20), nullable=False),
+            sa.Column('date_echeance', sa.Date(), nullable=False),
+            sa.UniqueConstraint('id_contrat', 'type_echeance', name='uq_03_echeances_contrat_type'),
+        )
+        op.create_index('ix_03_echeances_type_date', '03_echeances', ['type_echeance', 'date_echeance'])
+
+    # Alimentation initiale depuis les contrats existants
+    op.execute("""
+        INSERT IGNORE INTO `03_echeances` (id_contrat, type_echeance, date_echeance)
+        SELECT id, 'preavis', date_fin_preavis FROM `01_contrats` WHERE date_fin_preavis IS NOT NULL
+        UNION ALL
+        SELECT id, 'fin', date_fin FROM `01_contrats` WHERE date_fin IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Suppression de la table '03_echeances'
+    op.drop_table('03_echeances')
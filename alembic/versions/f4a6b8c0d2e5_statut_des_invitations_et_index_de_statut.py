@@ -0,0 +1,46 @@
+"""Statut des invitations et index de statut des signatures
+
+Revision ID: f4a6b8c0d2e5
+Revises: e7b2c9d4f1a3
+Create Date: 2026-10-19 14:26:51.093612
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a6b8c0d2e5'
+down_revision: Union[str, Sequence[str], None] = 'e7b2c9d4f1a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Index de statut : (nom de l'index, table, colonnes)
+STATUS_INDEXES = [
+    ('ix_20_documents_status_limite', '20_documents_a_signer', ['status', 'limite_signature']),
+    ('ix_21_points_user_status', '21_points', ['id_user', 'status']),
+    ('ix_21_points_document_status', '21_points', ['id_document', 'status']),
+    ('ix_23_invitations_status_expire', '23_invitations', ['status', 'expire_at']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Ajout du statut des invitations, initialisé depuis les dates existantes
+    if 'status' not in {column['name'] for column in inspector.get_columns('23_invitations')}:
+        op.add_column('23_invitations', sa.Column('status', sa.Integer(), nullable=False, server_default='0'))
+        op.execute("UPDATE `23_invitations` SET status = 1 WHERE signe_at IS NOT NULL")
+
+    # Index de statut
+    for name, table, columns in STATUS_INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in STATUS_INDEXES:
+        op.drop_index(name, table_name=table)
+    op.drop_column('23_invitations', 'status')
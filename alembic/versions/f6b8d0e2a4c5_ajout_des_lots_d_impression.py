@@ -0,0 +1,30 @@
+"""Ajout des lots d'impression
+
+Revision ID: f6b8d0e2a4c5
+Revises: e5a7c9d1f3b4
+Create Date: 2026-10-19 20:41:12.530917
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b8d0e2a4c5'
+down_revision: Union[str, Sequence[str], None] = 'e5a7c9d1f3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Table 30_impressions : fichiers sources, plages de pages et imposition des lots fusionnés
+    if 'lot' not in {column['name'] for column in inspector.get_columns('30_impressions')}:
+        op.add_column('30_impressions', sa.Column('lot', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('30_impressions', 'lot')
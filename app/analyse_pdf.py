@@ -0,0 +1,163 @@
+"""
+=============================================================
+Analyse des PDF à signer de l'Intranet API'Raudière
+=============================================================
+Module d'analyse des PDF au moment de leur téléversement.
+
+Le PDF est ouvert une seule fois, dans un processus de travail (pool `forkserver`
+ne préchargeant que ce module) : un fichier malformé ou volumineux n'occupe pas le
+processus du serveur et un plantage du lecteur PDF n'affecte que le processus de travail.
+Le nombre de pages et les dimensions (mediabox) de chaque page sont conservés dans la
+table `25_pages` ; les points de signature sont contrôlés sur ces dimensions dès le dépôt,
+et la génération du document signé les réutilise sans relire les pages.
+
+Exemple :
+    ```python
+    pages = analyser_pdf('/tmp/signature/contrat.pdf')
+    verifier_points(points, pages)
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from config import Config
+from logging import getLogger
+import multiprocessing
+
+logger = getLogger(__name__)
+
+# Échelle d'affichage du PDF dans le navigateur (pdfScale du JavaScript) : pixels → points PDF
+ECHELLE_AFFICHAGE = 1.5
+
+# Signature d'en-tête d'un fichier PDF
+EN_TETE_PDF = b'%PDF-'
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = Lock()
+
+
+class PdfInvalideError(ValueError):
+    """PDF illisible, chiffré ou sans page exploitable."""
+
+
+def _analyser(chemin: str) -> Dict[str, Any]:
+    """
+    Analyse un PDF (exécuté dans un processus de travail).
+    Les erreurs sont renvoyées sous forme de message pour rester sérialisables.
+    """
+    try:
+        from pypdf import PdfReader
+
+        reader = PdfReader(chemin, strict=False)
+        if reader.is_encrypted:
+            return {'erreur': 'PDF protégé par mot de passe'}
+
+        pages: List[Dict[str, Any]] = []
+        for page in reader.pages:
+            box = page.mediabox
+            largeur, hauteur = float(box.width), float(box.height)
+            if largeur <= 0 or hauteur <= 0:
+                return {'erreur': f'Dimensions invalides pour la page {len(pages) + 1}'}
+            pages.append({'largeur': round(largeur, 2),
+                          'hauteur': round(hauteur, 2),
+                          'rotation': int(page.rotation or 0) % 360})
+        if not pages:
+            return {'erreur': 'PDF sans page'}
+        return {'pages': pages}
+    except Exception as e:
+        return {'erreur': f'PDF illisible : {e}'}
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Crée le pool de processus d'analyse à la première utilisation."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            methode = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            contexte = multiprocessing.get_context(methode)
+            if methode == 'forkserver':
+                # Processus de travail issus d'un serveur n'ayant importé que ce module (pas l'application)
+                contexte.set_forkserver_preload([__name__])
+            _executor = ProcessPoolExecutor(max_workers=Config.PDF_ANALYSE_WORKERS, mp_context=contexte)
+        return _executor
+
+
+def _reinitialiser_executor() -> None:
+    """Abandonne le pool (processus bloqué ou arrêté) ; un nouveau pool sera créé au prochain appel."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def analyser_pdf(chemin: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Analyse un PDF dans un processus de travail et retourne les dimensions de ses pages.
+    Args:
+        chemin (str): Le chemin du fichier PDF.
+        timeout (Optional[float]): Le délai maximal d'analyse en secondes (défaut : PDF_ANALYSE_TIMEOUT).
+    Returns:
+        List[Dict[str, Any]]: Pour chaque page (dans l'ordre) : 'largeur', 'hauteur' (points PDF) et 'rotation'.
+    Raises:
+        PdfInvalideError: Si le fichier n'est pas un PDF lisible, est chiffré, n'a pas de page
+                          ou si l'analyse échoue ou dépasse le délai.
+    Exemples:
+        ```python
+        pages = analyser_pdf('/tmp/signature/contrat.pdf')
+        nb_pages = len(pages)
+        ```
+    """
+    # Contrôle immédiat de l'en-tête, sans solliciter le pool
+    with open(chemin, 'rb') as f:
+        if EN_TETE_PDF not in f.read(1024):
+            raise PdfInvalideError("Le fichier n'est pas un PDF.")
+
+    try:
+        resultat = _get_executor().submit(_analyser, chemin).result(timeout=timeout or Config.PDF_ANALYSE_TIMEOUT)
+    except FuturesTimeoutError:
+        _reinitialiser_executor()
+        raise PdfInvalideError("L'analyse du PDF a dépassé le délai autorisé.")
+    except BrokenProcessPool:
+        _reinitialiser_executor()
+        raise PdfInvalideError("L'analyse du PDF a échoué (processus interrompu).")
+
+    if 'erreur' in resultat:
+        raise PdfInvalideError(resultat['erreur'])
+    logger.info(f"PDF analysé : {chemin} ({len(resultat['pages'])} page(s))")
+    return resultat['pages']
+
+
+def dimensions_affichees(page: Dict[str, Any]) -> tuple[float, float]:
+    """
+    Retourne la largeur et la hauteur de la page telles qu'affichées (rotation appliquée), en points PDF.
+    """
+    largeur, hauteur = float(page['largeur']), float(page['hauteur'])
+    if int(page.get('rotation') or 0) % 180 == 90:
+        return hauteur, largeur
+    return largeur, hauteur
+
+
+def verifier_points(points: List[Dict[str, Any]], pages: List[Dict[str, Any]]) -> None:
+    """
+    Vérifie que chaque point de signature est sur une page existante et dans ses limites.
+    Les coordonnées des points sont en pixels d'affichage (échelle ECHELLE_AFFICHAGE).
+    Args:
+        points (List[Dict[str, Any]]): Les points ('x', 'y', 'page_num').
+        pages (List[Dict[str, Any]]): Les pages retournées par analyser_pdf (ou lues en base).
+    Raises:
+        ValueError: Si un point est sur une page inexistante ou hors de la page.
+    """
+    for index, point in enumerate(points, start=1):
+        page_num = int(point['page_num'])
+        if not 1 <= page_num <= len(pages):
+            raise ValueError(f"Point de signature {index} : la page {page_num} n'existe pas "
+                             f"(le document compte {len(pages)} page(s)).")
+        largeur, hauteur = dimensions_affichees(pages[page_num - 1])
+        x, y = float(point['x']) / ECHELLE_AFFICHAGE, float(point['y']) / ECHELLE_AFFICHAGE
+        if not (0 <= x <= largeur and 0 <= y <= hauteur):
+            raise ValueError(f"Point de signature {index} : position hors de la page {page_num}.")
@@ -19,15 +19,17 @@ Routes disponibles :
 - '/erpp' [GET] : Espace réservé pour les professeurs principaux
 - '/erp' [GET] : Espace réservé pour les professeurs
 - '/ei' [GET] : Espace impressions
-- '/print-doc' [POST] : Impression d'un document
+- '/print-doc' [POST] : Impression d'un document (mise en file d'impression)
+- '/print-jobs/<id>' [GET] : Statut d'un travail d'impression
 - '/ere' [GET] : Espace réservé pour les élèves
 - '/ajout-utilisateurs' [POST] : Ajout d'un utilisateur
 - '/suppr-utilisateurs' [POST] : Suppression d'un utilisateur
 - '/modif-utilisateurs' [POST] : Modification d'un utilisateur
-- '/rapport-contrats' [POST] : Rapport des contrats arrivant à échéance entre m-6 et m-3
+- '/rapport-contrats' [POST] : Rapport des contrats arrivant à échéance (fenêtres en mois, défaut m+4 à m+6)
+- '/sante' [GET] : État de santé du serveur et de ses workers (sans authentification)
 """
 # Imports liés à Flask et SQLAlchemy
-from flask import Flask, jsonify, render_template, Request, request, redirect, url_for, session, g
+from flask import Flask, jsonify, make_response, render_template, Request, request, redirect, url_for, session, g
 from flask.wrappers import Response
 from werkzeug import Response
 from sqlalchemy import create_engine
@@ -39,11 +41,21 @@ from habilitations import (validate_habilitation, ADMINISTRATEUR, GESTIONNAIRE,
                            PROFESSEURS, ELEVES, IMPRESSIONS)
 from bp_contracts import contracts_bp
 from bp_signature import signatures_bp
+from bp_audit import audit_bp
 from config import Config
-from models import Base, User, DocToSigne, Points, Signatures, Invitation
-from docs import print_document, delete_file
-from rapport_echeances import envoi_contrats_renego
+from models import User, DocToSigne, Points, Signatures, Invitation, PrintJob
+from impression import file_impression, construire_options, suivre_impressions
+from rapport_echeances import envoi_contrats_renego, parse_fenetre
 from utilities import get_jsoned_datas
+from expiration import expirer_signatures
+from stockage import nettoyer_fichiers
+from archivage_audit import maintenir_audit
+from prevision import tache_prevision
+from campagnes import envoyer_invitations
+from taches import planificateur
+from serveur import sante as etat_serveur
+from fragments import CacheFragments, version_json
+from assets import empreinte_static, est_empreinte, CACHE_IMMUABLE
 
 # Imports standards
 from typing import List, Dict, Any, cast, Optional, Tuple
@@ -69,10 +81,18 @@ peraudiere = Flask(__name__)
 # Enregistrement du blueprint pour les contrats
 peraudiere.register_blueprint(contracts_bp)
 peraudiere.register_blueprint(signatures_bp)
+peraudiere.register_blueprint(audit_bp)
 
 # Charger la configuration depuis config.py
 peraudiere.config.from_object(Config)
 
+# Cache des fragments stables des gabarits (grilles de modules, menus), voir fragments.py
+peraudiere.jinja_env.add_extension(CacheFragments)
+peraudiere.jinja_env.globals['version_json'] = version_json
+
+# Adresses des fichiers statiques à empreinte (voir assets.py)
+peraudiere.url_defaults(empreinte_static)
+
 # Construction de l'URL de la base de données
 db_user: str = cast(str, peraudiere.config["DB_USER"])
 db_password: str = cast(str, peraudiere.config["DB_PASSWORD"])
@@ -96,35 +116,44 @@ engine = create_engine(db_url,
                         connect_args={'connect_timeout': 10},
                         echo=False)
 
-# Créer les tables de la base de données (avec retry en cas d'erreur de connexion)
-def initialize_database(max_retries: int = 10, retry_delay: int = 2) -> bool | None:
+# Créer une session de base de données sans ouverture de celle-ci
+Session = sessionmaker(bind=engine)
+
+# Préparer la base de données (appelée au démarrage du serveur, voir run.py, et non à l'import)
+def initialize_database(max_retries: int = 10, retry_delay: int = 2,
+                        durees: Optional[Dict[str, float]] = None) -> str:
     """
     Fonction pour initialiser la base de données avec retry en cas d'erreur de connexion.
-    Sert aussi de healthcheck pour l'application.
+    Sert aussi de healthcheck pour l'application. Le schéma n'est créé ou migré que si sa
+    révision Alembic diffère de la révision head (voir demarrage.py).
     Args:
         max_retries (int): Le nombre maximum de tentatives de connexion.
         retry_delay (int): Le délai entre chaque tentative de connexion (en secondes).
+        durees (Optional[Dict[str, float]]): Les durées des phases, complétées (secondes).
     Returns:
-        bool | None: True si la connexion est réussie, None sinon.
-    """
-    import time
-    
-    # Tenter de créer les tables avec des retries
-    for attempt in range(max_retries):
-        try:
-            Base.metadata.create_all(engine)
-            return True
-        except Exception:
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                raise
-
-# Créer une session de base de données sans ouverture de celle-ci
-Session = sessionmaker(bind=engine)
-
-# Initialiser la base de données avec retry
-initialize_database()
+        str: L'état du schéma ('à jour', 'créé' ou 'migré').
+    """
+    from demarrage import attendre_base, preparer_schema, phase
+
+    durees = durees if durees is not None else {}
+    with phase('connexion à la base', durees):
+        attendre_base(engine, tentatives=max_retries, delai=retry_delay)
+    with phase('schéma', durees):
+        return preparer_schema(engine)
+
+# Enregistrement des tâches planifiées (démarrées par le serveur, voir run.py)
+planificateur.ajouter('expiration_signatures', expirer_signatures,
+                      intervalle=cast(int, peraudiere.config['EXPIRATION_INTERVAL']))
+planificateur.ajouter('nettoyage_fichiers', nettoyer_fichiers,
+                      intervalle=cast(int, peraudiere.config['NETTOYAGE_FICHIERS_INTERVAL']))
+planificateur.ajouter('suivi_impressions', suivre_impressions,
+                      intervalle=cast(int, peraudiere.config['PRINT_SUIVI_INTERVAL']))
+planificateur.ajouter('maintenance_audit', maintenir_audit,
+                      intervalle=cast(int, peraudiere.config['AUDIT_MAINTENANCE_INTERVAL']))
+planificateur.ajouter('prevision_depenses', tache_prevision,
+                      intervalle=cast(int, peraudiere.config['PREVISION_INTERVAL']))
+planificateur.ajouter('envoi_campagnes', lambda session: envoyer_invitations(session, application=peraudiere),
+                      intervalle=cast(int, peraudiere.config['CAMPAGNE_ENVOI_INTERVAL']))
 
 class UsersMethods:
     """
@@ -280,6 +309,8 @@ def before_request() -> Any:
             return None
         case 'logout':
             return None
+        case 'sante':
+            return None
         case _:
             if 'prenom' not in session or 'nom' not in session:
                 session.clear()
@@ -288,6 +319,21 @@ def before_request() -> Any:
                 preview_request = request.url if request.method == 'GET' else None
                 return redirect(url_for('login', error_message=error_message, preview_request=preview_request))
 
+@peraudiere.after_request
+def cache_fichiers_statiques(response: Response) -> Response:
+    """
+    Fonction exécutée après chaque requête.
+    Les fichiers statiques à empreinte (contenu immuable) sont mis en cache par le navigateur
+    pour un an, lorsqu'ils sont servis par l'application et non par nginx.
+    Args:
+        response (Response): La réponse.
+    Returns:
+        Response: La réponse, avec l'en-tête Cache-Control des fichiers à empreinte.
+    """
+    if request.endpoint == 'static' and est_empreinte((request.view_args or {}).get('filename', '')):
+        response.headers['Cache-Control'] = CACHE_IMMUABLE
+    return response
+
 @peraudiere.teardown_appcontext
 def teardown_request(exception: Optional[BaseException]) -> None:
     """
@@ -492,6 +538,9 @@ def ei(message: Optional[str] = None, success_message: Optional[str] = None,
     Returns:
         Response: La page de l'espace réservé aux impressions.
     """
+    message = request.args.get('message', message)
+    success_message = request.args.get('success_message', success_message)
+    error_message = request.args.get('error_message', error_message)
     return render_template('ei.html', message=message, success_message=success_message,
                            error_message=error_message)
 
@@ -522,34 +571,75 @@ def ea(message: Optional[str] = None, success_message: Optional[str] = None,
 def print_doc() -> Response:
     """
     Route pour l'impression d'un document.
-    Gère l'impression d'un document via SSH.
+    Met le document en file d'impression et répond immédiatement : l'envoi à CUPS est
+    réalisé en arrière-plan (voir impression.py). Plusieurs fichiers (PDF, images), des plages
+    de pages ou plusieurs pages par feuille donnent un lot fusionné en un seul travail.
     Args:
         None
     Returns:
         Response: Redirection vers la page de l'espace réservé aux
-                  impressions avec un message de succès.
+                  impressions avec la référence du travail d'impression.
     """
     try:
-        binary_document: Any = request.files['document']
-        document = str(binary_document.filename)
-        extension: str = str(splitext(document))[1]
-        docname = document.split('.')[0]
+        documents: List[Any] = [document for document in request.files.getlist('document') if document.filename]
         username = session['prenom'] + ' ' + session['nom']
         copies: str = str(request.form.get('copies'))
         sides: str = request.form.get('recto_verso', '')
         media: str = request.form.get('format', '')
         orientation: str = request.form.get('orientation', '')
         color: str = request.form.get('couleur', '')
+        pages_par_feuille = int(request.form.get('pages_par_feuille', 1) or 1)
+        # Plages de pages de chaque fichier, séparées par des points-virgules (ex. « 1-3;;2,4 »)
+        plages: List[Optional[str]] = [plage.strip() or None for plage in request.form.get('plages', '').split(';')]
+        plages += [None] * (len(documents) - len(plages))
+        options = construire_options(copies, sides, media, orientation, color)
+        titre = f'Intranet-{username}-Intranet'
+
+        if not documents:
+            return redirect(url_for('ei', error_message='Aucun document sélectionné'))
+
+        # Mise en file : un PDF seul tel quel, sinon un lot fusionné en un seul travail
+        if len(documents) == 1 and pages_par_feuille == 1 and not plages[0] \
+                and splitext(str(documents[0].filename))[1].lower() == '.pdf':
+            travail = file_impression.soumettre(g.db_session, documents[0], str(documents[0].filename),
+                                                id_user=session.get('id'), titre=titre, options=options)
+        else:
+            travail = file_impression.soumettre_lot(g.db_session, list(zip(documents, plages)),
+                                                    id_user=session.get('id'), titre=titre, options=options,
+                                                    pages_par_feuille=pages_par_feuille)
 
-        # Envoi du document à l'imprimante
-        print_document(binary_document,docname, extension, copies, username, sides, media, orientation, color)
+        return redirect(url_for('ei', success_message=f'Impression n°{travail.id} mise en file'))
+    except ValueError as e:
+        return redirect(url_for('ei', error_message=f'Impression impossible : {e}'))
+    except Exception as e:
+        logger.error(f"Erreur lors de la mise en file d'impression : {e}")
+        return redirect(url_for('ei', error_message='Erreur lors de l\'impression, veuillez réessayer'))
 
-        # Suppression du document sur le serveur
-        delete_file(docname, extension)
+@peraudiere.route('/print-jobs/<int:id_job>', methods=['GET'])
+@validate_habilitation(IMPRESSIONS)
+def print_job(id_job: int) -> Tuple[Response, int] | Response:
+    """
+    Route pour le statut d'un travail d'impression de l'utilisateur connecté.
+    Args:
+        id_job (int): L'identifiant du travail d'impression.
+    Returns:
+        Response: Le travail au format JSON (statut -1: erreur, 0: en attente, 1: envoyé, 2: terminé).
+    """
+    travail = g.db_session.get(PrintJob, id_job)
+    if travail is None or travail.id_user != session.get('id'):
+        return jsonify({'erreur': 'Travail d\'impression introuvable'}), 404
+    return jsonify(travail.to_dict())
 
-        return redirect(url_for('ei', success_message='Impression envoyée'))
-    except Exception:
-        return redirect(url_for('ei', error_message='Erreur lors de l\'impression, veuillez réessayer'))
+@peraudiere.route('/sante', methods=['GET'])
+def sante() -> Tuple[Response, int]:
+    """
+    Route de l'état de santé du serveur (supervision, sans authentification).
+    Returns:
+        Response: Le statut, le mode et l'état de chaque worker (pid, requêtes servies et en cours,
+                  âge du dernier battement de cœur) au format JSON ; code 503 si le serveur est dégradé.
+    """
+    etat = etat_serveur(delai_battement=cast(int, peraudiere.config['SERVEUR_DELAI_BATTEMENT']))
+    return jsonify(etat), 200 if etat['statut'] == 'ok' else 503
 
 @peraudiere.route('/ere')
 @validate_habilitation(ELEVES)
@@ -755,14 +845,25 @@ def rapport_contrats() -> Response:
     """
     Route pour l'envoi du rapport des contrats à renégocier.
     Gère l'envoi du rapport des contrats à renégocier par email.
-    Args:
-        None
+    Paramètres GET :
+        email (str): Destinataire(s), paramètre répétable ou liste séparée par des virgules.
+        fenetre (str): Fenêtre(s) en mois au format 'debut-fin' (défaut '4-6'), paramètre répétable.
     Returns:
-        Response: Un message JSON indiquant le résultat de l'opération.
+        Response: Un message JSON indiquant le résultat de l'opération (400 sans destinataire ou
+            avec une fenêtre invalide, 502 si aucun courriel n'a pu être envoyé).
     """
-    email: str = request.args.get('email', '')
+    emails: List[str] = [mail.strip() for valeur in request.args.getlist('email')
+                         for mail in valeur.split(',') if mail.strip()]
+    if not emails:
+        return make_response(jsonify("Aucun destinataire pour le rapport"), 400)
+    try:
+        fenetres = [parse_fenetre(valeur) for valeur in request.args.getlist('fenetre')]
+    except ValueError as e:
+        return make_response(jsonify(str(e)), 400)
     try:
-        envoi_contrats_renego(email)
-        return jsonify(f"Rapport envoye a {email}", 200)
+        envoyes = envoi_contrats_renego(emails, g.db_session, fenetres or None)
+        return make_response(jsonify(f"Rapport envoye a {envoyes} destinataire(s) : {', '.join(emails)}"), 200)
+    except RuntimeError as e:
+        return make_response(jsonify(f"Rapport non envoye a {', '.join(emails)} : {e}"), 502)
     except Exception as e:
-        return jsonify(f"Erreur lors de l envoi du rapport a {email} : {e}", 500)
+        return make_response(jsonify(f"Erreur lors de l envoi du rapport a {', '.join(emails)} : {e}"), 500)
@@ -0,0 +1,279 @@
+"""
+=============================================================
+Archivage du journal d'audit de l'Intranet API'Raudière
+=============================================================
+Module de maintenance de la table `24_audit_logs`, partitionnée par mois sous MariaDB
+(`PARTITION BY RANGE (TO_DAYS(timestamp))`, partitions `pAAAAMM` et `pmax`).
+
+La rétention est étagée :
+- les AUDIT_RETENTION_MOIS derniers mois restent en base (requêtes limitées aux
+  partitions utiles grâce au critère de date) ;
+- les mois plus anciens sont exportés en archives JSON Lines compressées
+  (`audit_AAAAMM.jsonl.gz`) puis leur partition est supprimée (`DROP PARTITION`,
+  instantané quel que soit le volume, sans `DELETE` ligne à ligne) ;
+- les archives sont supprimées après AUDIT_ARCHIVE_RETENTION_MOIS (0 : conservées).
+
+La tâche planifiée crée aussi à l'avance les partitions des mois à venir, en découpant
+la partition `pmax` (vide en fonctionnement normal, donc sans copie de données).
+Sur une base non partitionnée (SQLite des tests, base non migrée), seules l'exportation
+et la purge des archives sont disponibles.
+
+Exemple :
+    ```python
+    compteurs = maintenir_audit(session)
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple, Union
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from models import AuditLog
+from historique_audit import parcourir, serialiser
+from config import Config
+from logging import getLogger
+import gzip
+import json
+import os
+import re
+
+logger = getLogger(__name__)
+
+# Table partitionnée et partition de débordement
+TABLE_AUDIT = '24_audit_logs'
+PARTITION_MAX = 'pmax'
+
+# Nom des partitions mensuelles et des archives
+MOTIF_PARTITION = re.compile(r'^p(\d{4})(\d{2})$')
+MOTIF_ARCHIVE = re.compile(r'^audit_(\d{4})(\d{2})\.jsonl\.gz$')
+
+
+def debut_mois(jour: date) -> date:
+    """Retourne le premier jour du mois de la date donnée."""
+    return date(jour.year, jour.month, 1)
+
+
+def decaler_mois(mois: date, nombre: int) -> date:
+    """
+    Retourne le premier jour du mois décalé de `nombre` mois (négatif : mois précédents).
+    Exemples:
+        ```python
+        decaler_mois(date(2026, 11, 1), 3)    # date(2027, 2, 1)
+        ```
+    """
+    index = mois.year * 12 + mois.month - 1 + nombre
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def nom_partition(mois: date) -> str:
+    """Retourne le nom de la partition d'un mois (ex. 'p202610')."""
+    return f'p{mois:%Y%m}'
+
+
+def mois_partition(nom: str) -> Optional[date]:
+    """Retourne le mois d'une partition mensuelle, ou None (pmax, nom inconnu)."""
+    correspondance = MOTIF_PARTITION.match(nom)
+    return date(int(correspondance.group(1)), int(correspondance.group(2)), 1) if correspondance else None
+
+
+def get_dossier_archives() -> str:
+    """
+    Retourne le dossier des archives (AUDIT_ARCHIVE_PATH, sinon sous-dossier 'archives/audit' des documents).
+    """
+    return Config.AUDIT_ARCHIVE_PATH or os.path.join(Config.UPLOAD_FOLDER or '/uploads', 'archives', 'audit')
+
+
+def lister_partitions(session: Union[Session, Connection]) -> List[str]:
+    """
+    Retourne les partitions de la table d'audit dans l'ordre des bornes.
+    Args:
+        session (Union[Session, Connection]): La session ou la connexion à la base.
+    Returns:
+        List[str]: Les noms des partitions, vide si la base n'est pas MariaDB ou la table pas partitionnée.
+    """
+    dialecte = session.dialect if isinstance(session, Connection) else session.get_bind().dialect
+    if dialecte.name not in ('mysql', 'mariadb'):
+        return []
+    return list(session.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"), {'table': TABLE_AUDIT}).scalars())
+
+
+def _definition_partition(mois: date) -> str:
+    """Définition SQL de la partition d'un mois (bornée par le premier jour du mois suivant)."""
+    return f"PARTITION {nom_partition(mois)} VALUES LESS THAN (TO_DAYS('{decaler_mois(mois, 1):%Y-%m-%d}'))"
+
+
+def partitionner_table(connexion: Connection, maintenant: Optional[datetime] = None,
+                       avance: Optional[int] = None) -> bool:
+    """
+    Partitionne la table d'audit d'une base créée sans migration (création des tables au premier
+    démarrage) : clé primaire (id, timestamp) puis une partition par mois, du mois en cours aux
+    `avance` mois suivants, et `pmax`. La table d'une base neuve étant vide, l'opération est immédiate.
+    Args:
+        connexion (Connection): La connexion à la base.
+        maintenant (Optional[datetime]): La date de référence (défaut : maintenant).
+        avance (Optional[int]): Le nombre de mois créés à l'avance (défaut : AUDIT_PARTITIONS_AVANCE).
+    Returns:
+        bool: True si la table a été partitionnée, False si elle l'était déjà ou si la base n'est pas MariaDB.
+    """
+    if connexion.dialect.name not in ('mysql', 'mariadb') or lister_partitions(connexion):
+        return False
+    courant = debut_mois(maintenant or datetime.now())
+    avance = Config.AUDIT_PARTITIONS_AVANCE if avance is None else avance
+    definitions = ', '.join(_definition_partition(decaler_mois(courant, decalage)) for decalage in range(avance + 1))
+    connexion.execute(text(f"ALTER TABLE `{TABLE_AUDIT}` DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)"))
+    connexion.execute(text(
+        f"ALTER TABLE `{TABLE_AUDIT}` PARTITION BY RANGE (TO_DAYS(timestamp)) "
+        f"({definitions}, PARTITION {PARTITION_MAX} VALUES LESS THAN MAXVALUE)"))
+    logger.info(f"Table {TABLE_AUDIT} partitionnée par mois")
+    return True
+
+
+def creer_partitions(session: Session, maintenant: Optional[datetime] = None,
+                     avance: Optional[int] = None) -> List[str]:
+    """
+    Crée les partitions manquantes du mois en cours et des `avance` mois suivants, en une seule
+    réorganisation de la partition `pmax`.
+    Args:
+        session (Session): La session de base de données.
+        maintenant (Optional[datetime]): La date de référence (défaut : maintenant).
+        avance (Optional[int]): Le nombre de mois créés à l'avance (défaut : AUDIT_PARTITIONS_AVANCE).
+    Returns:
+        List[str]: Les noms des partitions créées.
+    """
+    partitions = lister_partitions(session)
+    if PARTITION_MAX not in partitions:
+        return []
+
+    # Seuls les mois postérieurs à la dernière partition mensuelle sont découpés dans pmax
+    mois_existants = [mois for mois in map(mois_partition, partitions) if mois]
+    dernier = max(mois_existants) if mois_existants else None
+    courant = debut_mois(maintenant or datetime.now())
+    avance = Config.AUDIT_PARTITIONS_AVANCE if avance is None else avance
+    a_creer = [mois for mois in (decaler_mois(courant, decalage) for decalage in range(avance + 1))
+               if dernier is None or mois > dernier]
+    if not a_creer:
+        return []
+
+    definitions = ', '.join(_definition_partition(mois) for mois in a_creer)
+    session.execute(text(
+        f"ALTER TABLE `{TABLE_AUDIT}` REORGANIZE PARTITION {PARTITION_MAX} INTO "
+        f"({definitions}, PARTITION {PARTITION_MAX} VALUES LESS THAN MAXVALUE)"))
+    noms = [nom_partition(mois) for mois in a_creer]
+    logger.info(f"Partitions d'audit créées : {noms}")
+    return noms
+
+
+def exporter_mois(session: Session, mois: date, dossier: Optional[str] = None) -> Tuple[str, int]:
+    """
+    Exporte les lignes d'audit d'un mois dans une archive JSON Lines compressée.
+    Les lignes sont lues par lots successifs (mémoire constante, voir historique_audit.parcourir)
+    et l'archive est écrite sous un nom temporaire puis renommée (jamais d'archive partielle).
+    Args:
+        session (Session): La session de base de données.
+        mois (date): Le premier jour du mois exporté.
+        dossier (Optional[str]): Le dossier des archives (défaut : configuration).
+    Returns:
+        Tuple[str, int]: Le chemin de l'archive et le nombre de lignes exportées.
+    Exemples:
+        ```python
+        chemin, nombre = exporter_mois(session, date(2025, 9, 1))
+        ```
+    """
+    dossier = dossier or get_dossier_archives()
+    os.makedirs(dossier, exist_ok=True)
+    chemin = os.path.join(dossier, f'audit_{mois:%Y%m}.jsonl.gz')
+    temporaire = chemin + '.part'
+
+    lignes = parcourir(session.connection(), {'debut': mois, 'fin': decaler_mois(mois, 1)})
+    nombre = 0
+    with gzip.open(temporaire, 'wt', encoding='utf-8') as archive:
+        for ligne in lignes:
+            archive.write(json.dumps(serialiser(ligne), ensure_ascii=False) + '\n')
+            nombre += 1
+    os.replace(temporaire, chemin)
+    return chemin, nombre
+
+
+def archiver_partitions(session: Session, maintenant: Optional[datetime] = None,
+                        retention: Optional[int] = None, dossier: Optional[str] = None) -> List[str]:
+    """
+    Exporte puis supprime les partitions des mois sortis de la rétention en base.
+    Une partition n'est supprimée que si toutes ses lignes figurent dans l'archive.
+    Args:
+        session (Session): La session de base de données.
+        maintenant (Optional[datetime]): La date de référence (défaut : maintenant).
+        retention (Optional[int]): Le nombre de mois conservés en base, mois en cours compris
+                                   (défaut : AUDIT_RETENTION_MOIS ; 0 : pas d'archivage).
+        dossier (Optional[str]): Le dossier des archives (défaut : configuration).
+    Returns:
+        List[str]: Les noms des partitions archivées et supprimées.
+    """
+    retention = Config.AUDIT_RETENTION_MOIS if retention is None else retention
+    if retention <= 0:
+        return []
+    limite = decaler_mois(debut_mois(maintenant or datetime.now()), 1 - retention)
+
+    archivees: List[str] = []
+    for nom in lister_partitions(session):
+        mois = mois_partition(nom)
+        if mois is None or mois >= limite:
+            continue
+        chemin, nombre = exporter_mois(session, mois, dossier)
+        attendu = session.execute(
+            select(func.count()).select_from(AuditLog)
+            .where(AuditLog.timestamp >= mois, AuditLog.timestamp < decaler_mois(mois, 1))).scalar_one()
+        if attendu != nombre:
+            logger.error(f"Archivage de {nom} interrompu : {nombre} ligne(s) exportée(s) sur {attendu}")
+            continue
+        session.execute(text(f"ALTER TABLE `{TABLE_AUDIT}` DROP PARTITION {nom}"))
+        logger.info(f"Partition d'audit {nom} archivée ({nombre} ligne(s) -> {chemin}) et supprimée")
+        archivees.append(nom)
+    return archivees
+
+
+def purger_archives(maintenant: Optional[datetime] = None, retention: Optional[int] = None,
+                    dossier: Optional[str] = None) -> int:
+    """
+    Supprime les archives des mois sortis de la rétention des archives.
+    Args:
+        maintenant (Optional[datetime]): La date de référence (défaut : maintenant).
+        retention (Optional[int]): Le nombre de mois conservés en archive, mois en cours compris
+                                   (défaut : AUDIT_ARCHIVE_RETENTION_MOIS ; 0 : sans limite).
+        dossier (Optional[str]): Le dossier des archives (défaut : configuration).
+    Returns:
+        int: Le nombre d'archives supprimées.
+    """
+    retention = Config.AUDIT_ARCHIVE_RETENTION_MOIS if retention is None else retention
+    dossier = dossier or get_dossier_archives()
+    if retention <= 0 or not os.path.isdir(dossier):
+        return 0
+    limite = decaler_mois(debut_mois(maintenant or datetime.now()), 1 - retention)
+
+    supprimees = 0
+    for nom in os.listdir(dossier):
+        correspondance = MOTIF_ARCHIVE.match(nom)
+        if correspondance and date(int(correspondance.group(1)), int(correspondance.group(2)), 1) < limite:
+            os.remove(os.path.join(dossier, nom))
+            supprimees += 1
+    if supprimees:
+        logger.info(f"Purge des archives d'audit : {supprimees} archive(s) supprimée(s)")
+    return supprimees
+
+
+def maintenir_audit(session: Session) -> Dict[str, int]:
+    """
+    Tâche planifiée : crée les partitions à venir, archive les mois anciens et purge les archives.
+    Args:
+        session (Session): La session de base de données (fournie par le planificateur).
+    Returns:
+        Dict[str, int]: Le nombre de partitions créées, de partitions archivées et d'archives purgées.
+    """
+    return {'creees': len(creer_partitions(session)),
+            'archivees': len(archiver_partitions(session)),
+            'purgees': purger_archives()}
@@ -0,0 +1,184 @@
+"""
+=============================================================
+Fichiers statiques de l'Intranet API'Raudière
+=============================================================
+Construction et résolution des fichiers statiques à empreinte.
+
+La construction (`python app/assets.py`, lancée à la construction de l'image Docker)
+copie chaque fichier de `static/` dans `static/dist/` sous un nom portant l'empreinte
+de son contenu (`css/style-general.css` -> `css/style-general.3f2a9c1b4d5e.css`), avec
+ses variantes précompressées gzip (`.gz`) et brotli (`.br`, si le module brotli est
+installé) pour les fichiers texte. Le manifeste `static/dist/manifest.json` associe
+chaque nom d'origine à son nom à empreinte.
+
+`url_for('static', filename=...)` produit alors l'adresse du fichier à empreinte (voir
+empreinte_static) : son contenu ne change jamais, il est servi directement par nginx
+avec un cache `immutable`. Sans manifeste (développement), les fichiers d'origine sont
+servis tels quels.
+
+Exemple :
+    ```console
+    python app/assets.py
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from logging import getLogger
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:     # pragma: no cover - module brotli absent : variantes gzip seulement
+    brotli = None
+
+logger = getLogger(__name__)
+
+# Dossier des fichiers statiques et sous-dossier des fichiers à empreinte
+DOSSIER_STATIC = os.path.join(os.path.dirname(__file__), 'static')
+DIST = 'dist'
+MANIFESTE = 'manifest.json'
+
+# Longueur de l'empreinte (caractères hexadécimaux du SHA-256)
+LONGUEUR_EMPREINTE = 12
+
+# Extensions précompressées (les images matricielles sont déjà compressées)
+EXTENSIONS_TEXTE = {'.css', '.js', '.svg', '.json', '.map', '.txt', '.html'}
+
+# Durée de cache des fichiers à empreinte (un an)
+CACHE_IMMUABLE = 'public, max-age=31536000, immutable'
+
+
+def nom_empreinte(chemin_relatif: str, contenu: bytes) -> str:
+    """
+    Retourne le nom à empreinte d'un fichier.
+    Args:
+        chemin_relatif (str): Le chemin du fichier dans `static/` ('css/style-general.css').
+        contenu (bytes): Le contenu du fichier.
+    Returns:
+        str: Le chemin à empreinte ('css/style-general.3f2a9c1b4d5e.css').
+    """
+    racine, extension = os.path.splitext(chemin_relatif)
+    return f'{racine}.{hashlib.sha256(contenu).hexdigest()[:LONGUEUR_EMPREINTE]}{extension}'
+
+
+def _ecrire(chemin: str, contenu: bytes) -> None:
+    """Écrit un fichier de façon atomique (fichier temporaire renommé)."""
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    temporaire = f'{chemin}.tmp'
+    with open(temporaire, 'wb') as fichier:
+        fichier.write(contenu)
+    os.replace(temporaire, chemin)
+
+
+def _variantes(chemin: str, contenu: bytes) -> int:
+    """
+    Écrit les variantes précompressées d'un fichier texte (seulement si elles sont plus petites).
+    Returns:
+        int: Le nombre de variantes écrites.
+    """
+    variantes = {'.gz': gzip.compress(contenu, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variantes['.br'] = brotli.compress(contenu, quality=11)
+    ecrites = 0
+    for suffixe, compresse in variantes.items():
+        if len(compresse) < len(contenu):
+            _ecrire(chemin + suffixe, compresse)
+            ecrites += 1
+    return ecrites
+
+
+def construire(source: str = DOSSIER_STATIC) -> Dict[str, str]:
+    """
+    Construit les fichiers à empreinte, leurs variantes précompressées et le manifeste.
+    Le dossier `dist/` est reconstruit entièrement.
+    Args:
+        source (str): Le dossier des fichiers statiques.
+    Returns:
+        Dict[str, str]: Le manifeste (nom d'origine -> nom à empreinte, relatifs à `source`).
+    Exemples:
+        ```python
+        construire()['js/signatures-sign.js']  # 'dist/js/signatures-sign.9b0e4c2a71d3.js'
+        ```
+    """
+    destination = os.path.join(source, DIST)
+    shutil.rmtree(destination, ignore_errors=True)
+    manifeste: Dict[str, str] = {}
+    compresses = 0
+    for dossier, sous_dossiers, fichiers in os.walk(source):
+        if os.path.abspath(dossier) == os.path.abspath(source) and DIST in sous_dossiers:
+            sous_dossiers.remove(DIST)
+        for nom in sorted(fichiers):
+            chemin = os.path.join(dossier, nom)
+            relatif = os.path.relpath(chemin, source).replace(os.sep, '/')
+            with open(chemin, 'rb') as fichier:
+                contenu = fichier.read()
+            cible = nom_empreinte(relatif, contenu)
+            _ecrire(os.path.join(destination, cible), contenu)
+            if os.path.splitext(nom)[1].lower() in EXTENSIONS_TEXTE:
+                compresses += _variantes(os.path.join(destination, cible), contenu)
+            manifeste[relatif] = f'{DIST}/{cible}'
+    _ecrire(os.path.join(destination, MANIFESTE),
+            json.dumps(manifeste, indent=2, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    logger.info(f"Fichiers statiques : {len(manifeste)} fichier(s) à empreinte, {compresses} variante(s) précompressée(s)")
+    return manifeste
+
+
+def charger_manifeste(source: str = DOSSIER_STATIC) -> Dict[str, str]:
+    """
+    Retourne le manifeste des fichiers à empreinte (vide s'il n'a pas été construit).
+    Le manifeste est mis en cache selon sa date de modification (reconstruction prise en compte).
+    """
+    chemin = os.path.join(source, DIST, MANIFESTE)
+    try:
+        return _lire_manifeste(chemin, os.path.getmtime(chemin))
+    except OSError:
+        return {}
+
+
+@lru_cache(maxsize=4)
+def _lire_manifeste(chemin: str, mtime: float) -> Dict[str, str]:
+    """
+    Lecture effective du manifeste, mise en cache par (chemin, date de modification).
+    """
+    with open(chemin, 'r', encoding='utf-8') as fichier:
+        return json.load(fichier)
+
+
+def empreinte_static(endpoint: str, valeurs: Dict[str, Any], source: Optional[str] = None) -> None:
+    """
+    Fonction `url_defaults` de l'application : remplace le nom d'un fichier statique par
+    son nom à empreinte dans les adresses produites par url_for.
+    Args:
+        endpoint (str): Le point d'entrée de l'adresse.
+        valeurs (Dict[str, Any]): Les paramètres de l'adresse (modifiés en place).
+        source (Optional[str]): Le dossier des fichiers statiques (défaut : `static/`).
+    """
+    if endpoint != 'static' or 'filename' not in valeurs:
+        return
+    cible = charger_manifeste(source or DOSSIER_STATIC).get(valeurs['filename'])
+    if cible is not None:
+        valeurs['filename'] = cible
+
+
+def est_empreinte(filename: str) -> bool:
+    """Indique si un fichier statique demandé est un fichier à empreinte (contenu immuable)."""
+    return filename.startswith(f'{DIST}/') and filename != f'{DIST}/{MANIFESTE}'
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+
+    parser = argparse.ArgumentParser(description="Construction des fichiers statiques à empreinte.")
+    parser.add_argument('--source', default=DOSSIER_STATIC, help="Dossier des fichiers statiques.")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    construire(arguments.source)
@@ -0,0 +1,293 @@
+"""
+=============================================================
+Journal d'audit de l'Intranet API'Raudière
+=============================================================
+Module d'écriture des événements d'audit (table `24_audit_logs`).
+
+Deux modes d'écriture :
+- `auditer(session, ...)` : événement lié à une modification métier. Il est conservé dans la
+  session et écrit (insertion multi-lignes) dans la même transaction que la modification, au
+  prochain commit ; il est abandonné si la transaction est annulée.
+- `journaliser(...)` : événement « au mieux » (consultation, tentative refusée, erreur). Il est
+  placé dans un tampon mémoire vidé par un thread d'écriture, par lots multi-lignes, sans commit
+  dans la requête.
+
+Un document inexistant n'est jamais référencé : `id_document` est alors vide et l'identifiant
+demandé figure dans les détails (la clé étrangère faisait échouer l'insertion).
+
+L'événement est stocké sous forme compacte : un code d'action et un code d'événement (petits
+entiers, libellés dans `LIBELLES_CODES`), les détails ne portant que le complément variable
+(identifiant demandé, numéro de travail d'impression...).
+
+Exemple :
+    ```python
+    auditer(g.db_session, ACTION_SIGNER, id_document=document.id)
+    g.db_session.commit()
+    journaliser(ACTION_CONSULTER, CODE_DOCUMENT_INTROUVABLE, details='document 12')
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from datetime import datetime
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+from typing import Any, Dict, List, Optional
+from flask import has_request_context, request, session as flask_session
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from models import AuditLog
+from logging import getLogger
+import atexit
+
+logger = getLogger(__name__)
+
+# Codes d'action (24_audit_logs.action)
+ACTION_ANNULER = -2
+ACTION_EXPIRER = -1
+ACTION_CREER = 0
+ACTION_CONSULTER = 1
+ACTION_SIGNER = 2
+ACTION_EXPEDIER = 3
+
+# Libellés des actions
+LIBELLES_ACTIONS = {
+    ACTION_ANNULER: 'annulation',
+    ACTION_EXPIRER: 'expiration',
+    ACTION_CREER: 'création',
+    ACTION_CONSULTER: 'consultation',
+    ACTION_SIGNER: 'signature',
+    ACTION_EXPEDIER: 'expédition',
+}
+
+# Codes d'événement (24_audit_logs.code)
+CODE_SUCCES = 0
+CODE_CONNEXION_ECHOUEE = 1
+CODE_INVITATION_INTROUVABLE = 2
+CODE_OTP_ENVOYE = 3
+CODE_OTP_ERREUR = 4
+CODE_LISTE_AFFICHEE = 5
+CODE_DOCUMENT_FINALISE = 6
+CODE_DEPOT_INVALIDE = 7
+CODE_FICHIER_INTROUVABLE = 8
+CODE_DOCUMENT_INTROUVABLE = 9
+CODE_DOCUMENT_NON_SIGNE = 10
+CODE_TELECHARGEMENT_ERREUR = 11
+CODE_IMPRESSION = 12
+CODE_DOCUMENT_EXPIRE = 13
+CODE_INVITATION_EXPIREE = 14
+
+# Libellés des codes d'événement (ne jamais renuméroter : les codes sont conservés en base et en archive)
+LIBELLES_CODES = {
+    CODE_SUCCES: 'success',
+    CODE_CONNEXION_ECHOUEE: 'connexion échouée',
+    CODE_INVITATION_INTROUVABLE: 'Erreur OTP - invitation non trouvée',
+    CODE_OTP_ENVOYE: 'OTP envoyé avec succès',
+    CODE_OTP_ERREUR: 'Erreur lors de la création du code OTP',
+    CODE_LISTE_AFFICHEE: 'Liste des documents affichée',
+    CODE_DOCUMENT_FINALISE: 'Document finalisé et envoyé par email',
+    CODE_DEPOT_INVALIDE: 'Aucun document PDF téléchargé ou nom de fichier invalide.',
+    CODE_FICHIER_INTROUVABLE: 'Fichier non trouvé',
+    CODE_DOCUMENT_INTROUVABLE: 'Tentative de téléchargement de document non trouvé',
+    CODE_DOCUMENT_NON_SIGNE: 'Tentative de téléchargement d\'un document non signé',
+    CODE_TELECHARGEMENT_ERREUR: 'Erreur lors du téléchargement du fichier signé par utilisateur autorisé.',
+    CODE_IMPRESSION: 'Impression du document signé',
+    CODE_DOCUMENT_EXPIRE: 'Document expiré',
+    CODE_INVITATION_EXPIREE: 'Invitation expirée',
+}
+
+# Clé des événements en attente dans Session.info
+CLE_EVENEMENTS = 'audit_en_attente'
+
+
+def libelle(code: int, details: Optional[str] = None) -> str:
+    """
+    Retourne le libellé lisible d'un événement (libellé du code suivi du complément éventuel).
+    Exemples:
+        ```python
+        libelle(CODE_DOCUMENT_INTROUVABLE, 'document 12')
+        ```
+        ```console
+        Tentative de téléchargement de document non trouvé (document 12)
+        ```
+    """
+    texte = LIBELLES_CODES.get(code, f'code {code}')
+    return f'{texte} ({details})' if details else texte
+
+
+def evenement(action: int, code: int = CODE_SUCCES, *, id_document: Optional[int] = None,
+              details: Optional[str] = None, id_user: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Construit un événement d'audit ; l'utilisateur, l'adresse IP et le User-Agent sont
+    repris de la requête en cours s'ils ne sont pas fournis.
+    Args:
+        action (int): Le code d'action (ACTION_*).
+        code (int): Le code d'événement (CODE_*, défaut : succès).
+        id_document (Optional[int]): L'identifiant d'un document existant, ou None.
+        details (Optional[str]): Le complément variable de l'événement.
+        id_user (Optional[int]): L'identifiant de l'utilisateur (défaut : utilisateur connecté).
+    Returns:
+        Dict[str, Any]: Les valeurs de la ligne d'audit.
+    """
+    ip_addresse = user_agent = None
+    if has_request_context():
+        id_user = id_user if id_user is not None else flask_session.get('id', None)
+        ip_addresse = request.remote_addr
+        user_agent = (request.user_agent.string or '')[:1024] or None
+    return {'id_document': id_document, 'id_user': id_user, 'action': action, 'code': code,
+            'details': details[:255] if details else None, 'ip_addresse': ip_addresse,
+            'user_agent': user_agent, 'timestamp': datetime.now()}
+
+
+def auditer(session: Session, action: int, code: int = CODE_SUCCES, *, id_document: Optional[int] = None,
+            details: Optional[str] = None, id_user: Optional[int] = None) -> None:
+    """
+    Enregistre un événement écrit avec la modification métier, au prochain commit de la session.
+    Args:
+        session (Session): La session de la requête (celle qui committe la modification).
+        action (int): Le code d'action (ACTION_*).
+        code (int): Le code d'événement (CODE_*, défaut : succès).
+        id_document (Optional[int]): L'identifiant du document concerné.
+        details (Optional[str]): Le complément variable de l'événement.
+        id_user (Optional[int]): L'identifiant de l'utilisateur (défaut : utilisateur connecté).
+    Exemples:
+        ```python
+        auditer(g.db_session, ACTION_CREER, id_document=document.id)
+        g.db_session.commit()
+        ```
+    """
+    # Transaction ouverte (sans connexion) pour que son annulation abandonne l'événement
+    if not session.in_transaction():
+        session.begin()
+    session.info.setdefault(CLE_EVENEMENTS, []).append(
+        evenement(action, code, id_document=id_document, details=details, id_user=id_user))
+
+
+def journaliser(action: int, code: int = CODE_SUCCES, *, id_document: Optional[int] = None,
+                details: Optional[str] = None, id_user: Optional[int] = None) -> None:
+    """
+    Enregistre un événement « au mieux », écrit en arrière-plan par lots (aucun commit dans la requête).
+    Args:
+        action (int): Le code d'action (ACTION_*).
+        code (int): Le code d'événement (CODE_*, défaut : succès).
+        id_document (Optional[int]): L'identifiant d'un document existant, ou None.
+        details (Optional[str]): Le complément variable de l'événement.
+        id_user (Optional[int]): L'identifiant de l'utilisateur (défaut : utilisateur connecté).
+    Exemples:
+        ```python
+        journaliser(ACTION_CONSULTER, CODE_DOCUMENT_INTROUVABLE, details='document 12')
+        ```
+    """
+    ecrivain_audit.ajouter(evenement(action, code, id_document=id_document, details=details, id_user=id_user))
+
+
+@event.listens_for(Session, 'before_commit')
+def _ecrire_evenements(session: Session) -> None:
+    """Écrit les événements en attente dans la transaction qui va être committée."""
+    evenements = session.info.pop(CLE_EVENEMENTS, None)
+    if evenements:
+        session.execute(insert(AuditLog), evenements)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _abandonner_evenements(session: Session, transaction: Any) -> None:
+    """Abandonne les événements d'une transaction annulée (sauf annulation d'un point de sauvegarde)."""
+    if not session.in_transaction():
+        session.info.pop(CLE_EVENEMENTS, None)
+
+
+class EcrivainAudit:
+    """
+    Écriture différée des événements « au mieux » : tampon mémoire borné et thread démon
+    qui insère les événements par lots multi-lignes, dans une transaction par lot.
+    Méthodes :
+        ajouter(evenement) -> None: Place un événement dans le tampon.
+        demarrer(session_factory) -> None: Démarre le thread d'écriture.
+        vider() -> int: Écrit immédiatement les événements du tampon.
+        arreter() -> None: Arrête le thread après écriture du tampon.
+    """
+    def __init__(self, taille_lot: int = 500, delai: float = 2.0, capacite: int = 10000) -> None:
+        self.taille_lot = taille_lot
+        self.delai = delai
+        self._tampon: 'Queue[Dict[str, Any]]' = Queue(maxsize=capacite)
+        self._engine: Optional[Engine] = None
+        self._arret = Event()
+        self._reveil = Event()
+        self._thread: Optional[Thread] = None
+
+    def ajouter(self, evenement: Dict[str, Any]) -> None:
+        """
+        Place un événement dans le tampon (abandonné, avec un avertissement, si le tampon est plein).
+        """
+        try:
+            self._tampon.put_nowait(evenement)
+        except Full:
+            logger.warning(f"Tampon d'audit plein : événement abandonné "
+                           f"({libelle(evenement['code'], evenement.get('details'))})")
+            return
+        if self._tampon.qsize() >= self.taille_lot:
+            self._reveil.set()
+
+    def demarrer(self, session_factory: 'sessionmaker[Session]') -> None:
+        """
+        Démarre le thread d'écriture (sans effet s'il tourne déjà).
+        Args:
+            session_factory (sessionmaker[Session]): La fabrique de sessions de l'application.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._engine = session_factory.kw['bind']
+        self._arret.clear()
+        self._thread = Thread(target=self._boucle, name='ecrivain-audit', daemon=True)
+        self._thread.start()
+        atexit.register(self.arreter)
+
+    def arreter(self) -> None:
+        """
+        Arrête le thread d'écriture puis écrit les événements restants.
+        """
+        self._arret.set()
+        self._reveil.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+        self.vider()
+
+    def vider(self) -> int:
+        """
+        Écrit les événements du tampon par lots de `taille_lot` lignes.
+        Returns:
+            int: Le nombre d'événements écrits.
+        """
+        if self._engine is None:
+            return 0
+        total = 0
+        while True:
+            lot: List[Dict[str, Any]] = []
+            try:
+                while len(lot) < self.taille_lot:
+                    lot.append(self._tampon.get_nowait())
+            except Empty:
+                pass
+            if not lot:
+                return total
+            try:
+                with self._engine.begin() as connexion:
+                    connexion.execute(insert(AuditLog), lot)
+                total += len(lot)
+            except Exception as e:
+                logger.error(f"Écriture de {len(lot)} événement(s) d'audit impossible : {e}")
+
+    def _boucle(self) -> None:
+        """
+        Boucle du thread : vide le tampon toutes les `delai` secondes ou dès qu'un lot est complet.
+        """
+        while not self._arret.is_set():
+            self._reveil.wait(self.delai)
+            self._reveil.clear()
+            self.vider()
+
+
+# Écrivain unique de l'application
+ecrivain_audit = EcrivainAudit()
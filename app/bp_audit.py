@@ -0,0 +1,79 @@
+"""
+==========================================================
+Routes du journal d'audit de l'Intranet API'Raudière
+==========================================================
+Fichier Blueprint de consultation et d'exportation du journal d'audit (`24_audit_logs`),
+réservé aux administrateurs.
+
+Auteur : Rémi Verschuur
+
+Routes disponibles (prefixe '/audit') :
+- '/evenements' : Historique filtré, paginé par clé, du plus récent au plus ancien (GET, JSON)
+- '/export.<csv|jsonl>' : Exportation en flux de l'historique filtré, dans l'ordre chronologique (GET)
+
+Filtres communs (paramètres GET) : id_document, id_user, action, code, debut et fin (dates ISO).
+"""
+
+from datetime import datetime
+from flask import Blueprint, Response, request, g, jsonify
+from flask.typing import ResponseReturnValue
+from typing import Any, Dict, Iterator
+from habilitations import validate_habilitation, ADMINISTRATEUR
+from historique_audit import lire_filtres, page_audit, parcourir, exporter_csv, exporter_jsonl, PAR_PAGE
+from logging import getLogger
+
+log = getLogger(__name__)
+
+audit_bp = Blueprint('audit_bp', __name__, url_prefix='/audit')
+
+# Type MIME des exportations
+TYPES_EXPORT = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+
+
+@audit_bp.route('/evenements', methods=['GET'])
+@validate_habilitation(ADMINISTRATEUR)
+def evenements_audit() -> ResponseReturnValue:
+    """
+    Route de consultation du journal d'audit.
+    Paramètres GET :
+        id_document, id_user, action, code (int): Filtres d'égalité.
+        debut, fin (str): Période au format ISO (fin exclue, sauf date seule incluse).
+        apres (str): Le curseur 'suivant' de la page précédente.
+        par_page (int): Le nombre d'événements par page (défaut 50, maximum 500).
+    Returns:
+        Response: Les événements et le curseur de la page suivante au format JSON.
+    """
+    try:
+        filtres = lire_filtres(request.args)
+        return jsonify(page_audit(g.db_session, filtres, apres=request.args.get('apres') or None,
+                                  par_page=request.args.get('par_page', PAR_PAGE, type=int)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@audit_bp.route('/export.<any(csv, jsonl):format_export>', methods=['GET'])
+@validate_habilitation(ADMINISTRATEUR)
+def export_audit(format_export: str) -> ResponseReturnValue:
+    """
+    Route d'exportation du journal d'audit, produite au fil de l'eau (mémoire constante).
+    Paramètres GET : les filtres de la consultation.
+    Returns:
+        Response: Le fichier CSV ou JSON Lines en téléchargement.
+    """
+    try:
+        filtres = lire_filtres(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    engine = g.db_session.get_bind()
+
+    def generer() -> Iterator[str]:
+        # Connexion dédiée, indépendante de la session de la requête (fermée avant la fin du flux)
+        with engine.connect() as connexion:
+            lignes = parcourir(connexion, filtres)
+            yield from (exporter_csv(lignes) if format_export == 'csv' else exporter_jsonl(lignes))
+
+    nom = f"audit_{datetime.now():%Y%m%d_%H%M%S}.{format_export}"
+    entetes: Dict[str, Any] = {'Content-Disposition': f'attachment; filename="{nom}"',
+                               'X-Accel-Buffering': 'no'}
+    log.info(f"Exportation du journal d'audit ({format_export}) : {filtres}")
+    return Response(generer(), content_type=TYPES_EXPORT[format_export], headers=entetes)
@@ -10,23 +10,39 @@ Date : 2025-09-11
 
 Routes disponibles (prefixe '/contrats') :
 - '/' : Accès à la liste des contrats (GET) et ajout d'un contrat (POST)
-- '/contrat-<int:id_contrat>' : Détail d'un contrat (GET) et modification d'un contrat (POST)
+- '/contrat-<int:id_contrat>' : Détail d'un contrat (GET, variante JSON avec '?format=json') et modification d'un contrat (POST)
 - '/contrat-<int:id_contrat>/evenement' : Création d'un évènement d'un contrat (POST)
 - '/contrat-<int:id_contrat>/document' : Création d'un document d'un contrat (POST)
 - '/contrat-<int:id_contrat>/evenement-<int:id_evenement>' : Modification d'un évènement d'un contrat (POST)
 - '/contrat-<int:id_contrat>/document-<int:id_document>' : Modification d'un document d'un contrat (POST)
 - '/contrat-<int:id_contrat>/download/<name>' : Téléchargement d'un document enregistré sur le serveur (GET)
+- '/contrat-<int:id_contrat>/imprimer/<document|facture>-<int:id_element>' : Impression d'un document ou d'une facture stocké (POST)
+- '/echeances' : Echéances des contrats sur une période, via la table d'index des échéances (GET, JSON)
+- '/recherche' : Recherche plein texte classée et paginée dans les contrats et leurs éléments (GET, JSON)
+- '/export.<csv|jsonl|xlsx>' : Exportation en flux des contrats filtrés, avec leurs éléments liés au choix (GET)
+- '/depenses' : Tableau des dépenses par contrat, entreprise, type ou sous-type, par mois ou par année (GET, variante JSON avec '?format=json')
+- '/previsions' : Prévision des dépenses par contrat, type et année, calculée par une tâche planifiée (GET, JSON)
+- '/import' : Import en masse de contrats, contacts, évènements et factures depuis un fichier CSV ou XLSX (POST, JSON)
 """
 
-from flask import Blueprint, render_template, request, g, redirect, url_for
+from flask import Blueprint, Response, render_template, request, g, redirect, url_for, jsonify, session
 from flask.typing import ResponseReturnValue
+from sqlalchemy.orm import Session, selectinload
 from utilities import (
     get_jsoned_datas, NOT_ALLOWED, JSON_MENUS, TYPINGS, ACCUEIL_CONTRAT, DETAIL_CONTRAT
     )
-from models import Contract, Contacts, Event, Document, Bill
-from typing import Any
-from habilitations import validate_habilitation, GESTIONNAIRE
+from models import Contract, Contacts, Event, Document, Bill, TYPE_ECHEANCE_PREAVIS, TYPE_ECHEANCE_FIN
+from typing import Any, Dict, Optional
+from habilitations import validate_habilitation, GESTIONNAIRE, IMPRESSIONS
+from impression import file_impression, construire_options
 from docs import download_file
+from recherche import rechercher
+from rapport_echeances import echeances_entre, ajouter_mois
+from import_contrats import lire_fichier, importer
+from export_contrats import lire_filtres, lire_details, criteres, exporter, TYPES_EXPORT
+from depenses import analyser, lire_parametres, AXES, PERIODES
+from prevision import derniere_prevision, version_donnees
+from datetime import date, datetime
 from logging import getLogger
 
 log = getLogger(__name__)
@@ -36,6 +52,26 @@ contracts_bp = Blueprint('contracts_bp', __name__, url_prefix='/contrats')
 # Constantes et variables globales
 
 
+def get_contract_details(session: Session, id_contrat: int) -> Optional[Contract]:
+    """
+    Récupère un contrat avec ses contacts, évènements, documents et factures.
+    Les quatre relations sont chargées par selectinload : une requête pour le contrat
+    puis une requête par relation, quel que soit le nombre d'éléments liés.
+    Args:
+        session (Session): La session de base de données.
+        id_contrat (int): L'identifiant du contrat.
+    Returns:
+        Optional[Contract]: Le contrat avec ses relations chargées, ou None s'il n'existe pas.
+    """
+    return (session.query(Contract)
+            .options(selectinload(Contract.contacts),
+                     selectinload(Contract.evenements),
+                     selectinload(Contract.documents),
+                     selectinload(Contract.factures))
+            .filter(Contract.id == id_contrat)
+            .first())
+
+
 @contracts_bp.route('/', methods=['GET', 'POST'])
 @validate_habilitation(GESTIONNAIRE)
 def contrats() -> ResponseReturnValue:
@@ -54,8 +90,8 @@ def contrats() -> ResponseReturnValue:
         success_message = request.args.get('success_message', None)
         error_message = request.args.get('error_message', None)
 
-        # Récupération de la liste des contrats
-        contracts = g.db_session.query(Contract).all()
+        # Récupération de la liste des contrats (filtres de type et sous-type, partagés avec l'exportation)
+        contracts = g.db_session.query(Contract).filter(*criteres(lire_filtres(request.args))).all()
 
         # Récupération des menus depuis le fichier JSON
         menus: str = get_jsoned_datas(file=JSON_MENUS,
@@ -112,23 +148,30 @@ def contrats_by_num(id_contrat: int) -> ResponseReturnValue:
         Response: La page de détail du contrat ou une redirection vers la page de gestion des
     """
     tab = request.args.get('tab', 'c')
-    # Récupération du contrat
-    contract = g.db_session.query(Contract).filter(Contract.id == id_contrat).first()
 
     # === Gestion de la méthode GET (affichage du détail du contrat) ===
     if request.method == 'GET':
+        # Récupération du contrat et de ses éléments liés (requête unique + selectinload)
+        contract = get_contract_details(g.db_session, id_contrat)
+
+        # Variante JSON du détail du contrat
+        if request.args.get('format') == 'json':
+            if contract is None:
+                return jsonify({'error': 'Contrat introuvable'}), 404
+            return jsonify(contract.to_dict(with_details=True))
+
         # Récupération des messages passés en paramètres GET
         message = request.args.get('message', None)
         success_message = request.args.get('success_message', None)
         error_message = request.args.get('error_message', None)
 
-        # Récupération du contrat, des évènements et des documents associés
-        events = list(g.db_session.query(Event).filter(Event.id_contrat == id_contrat))
-        documents = list(g.db_session.query(Document).filter(Document.id_contrat == id_contrat))
-        bills = list(g.db_session.query(Bill).filter(Bill.id_contrat == id_contrat))
-        contacts = list(g.db_session.query(Contacts).filter(Contacts.id_contrat == id_contrat))
+        # Récupération des éléments liés déjà chargés
+        events = list(contract.evenements) if contract else []
+        documents = list(contract.documents) if contract else []
+        bills = list(contract.factures) if contract else []
+        contacts = list(contract.contacts) if contract else []
 
-        # Récupération des filtres depuis le fichier JSON
+        # Récupération des filtres depuis le fichier JSON (mis en cache)
         document_typing = get_jsoned_datas(file=JSON_MENUS, level_one=TYPINGS, level_two='Documents', dumped=False)
         event_typing = get_jsoned_datas(file=JSON_MENUS, level_one=TYPINGS, level_two='Evènements', dumped=False)
 
@@ -140,6 +183,9 @@ def contrats_by_num(id_contrat: int) -> ResponseReturnValue:
 
     # === Gestion de la méthode POST (modification du contrat) ===
     elif request.method == 'POST' and request.form.get('_method') == 'PUT':
+        # Récupération du contrat
+        contract = g.db_session.query(Contract).filter(Contract.id == id_contrat).first()
+
         # Récupération des données du formulaire
         type_contrat = request.form.get(f'Type{id_contrat}', '')
         sous_type_contrat = request.form.get(f'SType{id_contrat}', '')
@@ -331,12 +377,12 @@ def add_contrats_bill(id_contrat: int) -> ResponseReturnValue:
             g.db_session.flush()  # Pour obtenir l'ID avant le commit
             bill.create_name(binary_file=binary_file)
 
+            # Enregistrement du fichier sur le serveur (hash conservé en base)
+            bill.upload(file_to_upload=binary_file)
+
             # Ajout et Fermeture de la session
             g.db_session.commit()
 
-            # Enregistrement du fichier sur le serveur
-            bill.upload(file_to_upload=binary_file)
-
             # Retour du formulaire
             message = f'Facture {bill.titre_facture} ajoutée avec succès'
             return redirect(url_for(DETAIL_CONTRAT, id_contrat=id_contrat, success_message=message, tab=tab))
@@ -578,6 +624,46 @@ def delete_contact_id(id_contact: int, id_contrat: int) -> ResponseReturnValue:
     else:
         return redirect(url_for(DETAIL_CONTRAT, id_contrat = id_contrat, error_message=NOT_ALLOWED, tab=tab))
 
+@contracts_bp.route('/contrat-<int:id_contrat>/imprimer/<any(document, facture):element>-<int:id_element>',
+                    methods=['POST'])
+@validate_habilitation(GESTIONNAIRE)
+@validate_habilitation(IMPRESSIONS)
+def print_stored_file(id_contrat: int, element: str, id_element: int) -> ResponseReturnValue:
+    """
+    Route pour l'impression d'un document ou d'une facture d'un contrat.
+    Le fichier est envoyé à la file d'impression depuis son emplacement de stockage,
+    sans téléchargement ni nouveau téléversement.
+    Args:
+        id_contrat (int): Le numéro du contrat.
+        element (str): 'document' ou 'facture'.
+        id_element (int): Le numéro du document ou de la facture.
+    Returns:
+        Response: Redirection vers la page de détail du contrat avec la référence du travail d'impression.
+    """
+    tab = 'd' if element == 'document' else 'f'
+    modele = Document if element == 'document' else Bill
+    try:
+        # Récupération de l'élément du contrat et de son fichier
+        stocke = g.db_session.query(modele).filter(modele.id == id_element, modele.id_contrat == id_contrat).first()
+        chemin = stocke.file_path() if stocke else None
+        if chemin is None:
+            message = f'Aucun fichier à imprimer pour {element} {id_element}'
+            return redirect(url_for(DETAIL_CONTRAT, id_contrat=id_contrat, error_message=message, tab=tab))
+
+        # Mise en file d'impression par référence
+        options = construire_options(copies=request.form.get('copies', '1'),
+                                     sides=request.form.get('recto_verso', 'two-sided-long-edge'))
+        travail = file_impression.soumettre_reference(
+            g.db_session, chemin, reference=f'{element}:{id_element}', id_user=session.get('id'),
+            titre=f"Intranet-{session.get('prenom', '')} {session.get('nom', '')}-{stocke.str_lien}",
+            options=options)
+
+        message = f'Impression n°{travail.id} de {stocke.str_lien} mise en file'
+        return redirect(url_for(DETAIL_CONTRAT, id_contrat=id_contrat, success_message=message, tab=tab))
+    except Exception as e:
+        message = f'Erreur lors de l\'impression de {element} {id_element} : {e}'
+        return redirect(url_for(DETAIL_CONTRAT, id_contrat=id_contrat, error_message=message, tab=tab))
+
 @contracts_bp.route('/download/<name>', methods=['GET'])
 @validate_habilitation(GESTIONNAIRE)
 def download_document(name: str) -> Any:
@@ -586,3 +672,152 @@ def download_document(name: str) -> Any:
     Gère le téléchargement d'un document depuis le serveur.
     """
     return download_file(file_name_with_ext=name)
+
+@contracts_bp.route('/recherche', methods=['GET'])
+@validate_habilitation(GESTIONNAIRE)
+def recherche_contrats() -> ResponseReturnValue:
+    """
+    Route de recherche plein texte dans les contrats, contacts, évènements, documents et factures.
+    Paramètres GET :
+        q (str): Les mots recherchés.
+        page (int): Le numéro de page (défaut 1).
+        par_page (int): Le nombre de résultats par page (défaut 20, maximum 100).
+    Returns:
+        Response: Les résultats classés par pertinence au format JSON.
+    """
+    saisie = request.args.get('q', '')
+    page = request.args.get('page', 1, type=int)
+    par_page = request.args.get('par_page', 20, type=int)
+    try:
+        return jsonify(rechercher(g.db_session, saisie, page=page, par_page=par_page))
+    except Exception as e:
+        log.error(f'Erreur lors de la recherche "{saisie}" : {e}')
+        return jsonify({'error': 'Erreur lors de la recherche'}), 500
+
+@contracts_bp.route('/echeances', methods=['GET'])
+@validate_habilitation(GESTIONNAIRE)
+def echeances_contrats() -> ResponseReturnValue:
+    """
+    Route des échéances de contrats sur une période.
+    Paramètres GET :
+        debut (str): Date de début au format YYYY-MM-DD (défaut : aujourd'hui).
+        fin (str): Date de fin au format YYYY-MM-DD (défaut : dans 6 mois).
+        type (str): Type d'échéance, 'preavis' ou 'fin' (défaut 'preavis').
+    Returns:
+        Response: Les échéances triées par date au format JSON.
+    """
+    try:
+        debut = date.fromisoformat(request.args['debut']) if request.args.get('debut') else date.today()
+        fin = date.fromisoformat(request.args['fin']) if request.args.get('fin') else ajouter_mois(debut, 6)
+    except ValueError:
+        return jsonify({'error': 'Dates invalides, format attendu : YYYY-MM-DD'}), 400
+    type_echeance = request.args.get('type', TYPE_ECHEANCE_PREAVIS)
+    if type_echeance not in (TYPE_ECHEANCE_PREAVIS, TYPE_ECHEANCE_FIN):
+        return jsonify({'error': f"Type d'échéance invalide, valeurs possibles : "
+                                 f"{TYPE_ECHEANCE_PREAVIS}, {TYPE_ECHEANCE_FIN}"}), 400
+
+    echeances = echeances_entre(g.db_session, debut, fin, type_echeance)
+    return jsonify([{'date_echeance': date_echeance.isoformat(), 'type_echeance': type_echeance,
+                     'contrat': contract.to_dict()} for date_echeance, contract in echeances])
+
+@contracts_bp.route('/import', methods=['POST'])
+@validate_habilitation(GESTIONNAIRE)
+def import_contrats() -> ResponseReturnValue:
+    """
+    Route d'import en masse de contrats, contacts, évènements et factures (fichier CSV ou XLSX).
+    Paramètres du formulaire :
+        fichier (file): Le fichier à importer.
+        nature (str): La nature des données d'un fichier CSV ('contrats', 'contacts', 'evenements', 'factures').
+        partiel (str): '1' pour importer les lignes valides malgré les erreurs.
+        simulation (str): '1' pour valider le fichier sans rien écrire.
+    Returns:
+        Response: Le rapport d'import au format JSON (422 si le fichier est refusé).
+    """
+    fichier = request.files.get('fichier')
+    if fichier is None or not fichier.filename:
+        return jsonify({'error': 'Aucun fichier transmis'}), 400
+    try:
+        donnees = lire_fichier(fichier.stream, fichier.filename, request.form.get('nature') or None)
+        rapport = importer(g.db_session, donnees, partiel=request.form.get('partiel') == '1',
+                           simulation=request.form.get('simulation') == '1')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.error(f'Erreur lors de l\'import du fichier {fichier.filename} : {e}')
+        return jsonify({'error': 'Erreur lors de l\'import'}), 500
+    refuse = bool(rapport['erreurs']) and not rapport['importe'] and not request.form.get('simulation') == '1'
+    return jsonify(rapport), 422 if refuse else 200
+
+@contracts_bp.route('/export.<any(csv, jsonl, xlsx):format_export>', methods=['GET'])
+@validate_habilitation(GESTIONNAIRE)
+def export_contrats(format_export: str) -> ResponseReturnValue:
+    """
+    Route d'exportation des contrats, produite au fil de l'eau (mémoire constante).
+    Paramètres GET :
+        TypeFiltre, STypeFiltre (str): Les filtres de la liste des contrats.
+        details (str): Les éléments liés à joindre, séparés par des virgules ('contacts', 'evenements', 'factures').
+    Returns:
+        Response: Le fichier CSV, JSON Lines ou XLSX en téléchargement.
+    """
+    try:
+        filtres = lire_filtres(request.args)
+        details = lire_details(request.args.get('details', ''), format_export)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    engine = g.db_session.get_bind()
+
+    nom = f"contrats_{datetime.now():%Y%m%d_%H%M%S}.{format_export}"
+    entetes: Dict[str, Any] = {'Content-Disposition': f'attachment; filename="{nom}"',
+                               'X-Accel-Buffering': 'no'}
+    log.info(f"Exportation des contrats ({format_export}) : {filtres}, détails {details}")
+    return Response(exporter(engine, format_export, filtres, details), content_type=TYPES_EXPORT[format_export],
+                    headers=entetes)
+
+@contracts_bp.route('/depenses', methods=['GET'])
+@validate_habilitation(GESTIONNAIRE)
+def depenses_contrats() -> ResponseReturnValue:
+    """
+    Route du tableau des dépenses, servi depuis la table de cumuls mensuels des factures.
+    Paramètres GET :
+        axe (str): 'contrat', 'entreprise', 'type' (défaut) ou 'sous_type'.
+        periode (str): 'mois' (défaut) ou 'annee'.
+        debut, fin (str): Premier et dernier mois inclus (AAAA ou AAAA-MM).
+        TypeFiltre, STypeFiltre (str): Les filtres de la liste des contrats.
+        format (str): 'json' pour la variante JSON.
+    Returns:
+        Response: La page du tableau des dépenses, ou les dépenses au format JSON.
+    """
+    try:
+        parametres = lire_parametres(request.args)
+    except ValueError as e:
+        if request.args.get('format') == 'json':
+            return jsonify({'error': str(e)}), 400
+        return redirect(url_for('contracts_bp.depenses_contrats', error_message=str(e)))
+    analyse = analyser(g.db_session, **parametres)
+    if request.args.get('format') == 'json':
+        return jsonify(analyse)
+
+    menus: Dict[str, Any] = get_jsoned_datas(file=JSON_MENUS, level_one=TYPINGS, level_two='Contrats')
+    return render_template('depenses.html', analyse=analyse, axes=list(AXES), periodes=PERIODES,
+                           parametres=request.args, menus=menus,
+                           error_message=request.args.get('error_message', None))
+
+@contracts_bp.route('/previsions', methods=['GET'])
+@validate_habilitation(GESTIONNAIRE)
+def previsions_contrats() -> ResponseReturnValue:
+    """
+    Route de la prévision des dépenses, calculée en arrière-plan par la tâche 'prevision_depenses'.
+    Paramètres GET :
+        contrats (str): '0' pour omettre le détail par contrat.
+    Returns:
+        Response: La dernière prévision au format JSON, avec l'indicateur 'a_jour' (version
+                  des données inchangée depuis le calcul), ou 503 si aucune n'a encore été calculée.
+    """
+    prevision = derniere_prevision()
+    if prevision is None:
+        return jsonify({'error': 'Prévision des dépenses en cours de calcul'}), 503
+    version = version_donnees(g.db_session, date.today().replace(day=1), prevision['horizon'])
+    reponse = {**prevision, 'a_jour': version == prevision['version']}
+    if request.args.get('contrats') == '0':
+        reponse.pop('contrats', None)
+    return jsonify(reponse)
@@ -8,20 +8,32 @@ Routes:
 - /signature/creer-depuis-modele : Permet de créer un document à signer depuis un modèle.
 - /signature/charger-pdf : Permet de charger un document PDF à signer.
 - /download/<filename> : Permet de télécharger un document PDF précédemment chargé.
+- /signature/imprimer/<doc_id>/<hash_document> : Imprime un document signé depuis son emplacement de stockage.
+- /signature/campagnes : Crée une campagne de signature (POST) ou liste les campagnes et leur avancement (GET, JSON).
+- /signature/campagnes/<id_campagne> : Avancement d'une campagne de signature (JSON).
 
 Chaque route gère les méthodes GET et POST pour afficher les formulaires et traiter les soumissions.
 """
 # Imports Flask/Werkzeug
 from flask import (
-    Blueprint, render_template, request, g, send_from_directory,
-    session, url_for, redirect, jsonify, send_file
+    Blueprint, render_template, request, g,
+    session, url_for, redirect, jsonify
 )
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 from werkzeug.datastructures import FileStorage
 # Imports locaux
-from models import User, DocToSigne, Points, Invitation, AuditLog
-from signatures import SignatureDoer, SignatureMaker, SecureDocumentAccess, SignedDocumentCreator, send_otp_email
+from models import User, DocToSigne, Points, Invitation, Campagne
+from docs import send_stored_file, store_upload, get_upload_limit, UploadTooLargeError
+from analyse_pdf import analyser_pdf, PdfInvalideError
+from impression import file_impression, construire_options
+from audit import (auditer, journaliser, ACTION_CREER, ACTION_CONSULTER, ACTION_SIGNER, ACTION_EXPEDIER,
+                   CODE_CONNEXION_ECHOUEE, CODE_INVITATION_INTROUVABLE, CODE_OTP_ENVOYE, CODE_OTP_ERREUR,
+                   CODE_LISTE_AFFICHEE, CODE_DOCUMENT_FINALISE, CODE_DEPOT_INVALIDE, CODE_FICHIER_INTROUVABLE,
+                   CODE_DOCUMENT_INTROUVABLE, CODE_DOCUMENT_NON_SIGNE, CODE_TELECHARGEMENT_ERREUR, CODE_IMPRESSION)
+from habilitations import validate_habilitation, IMPRESSIONS, ADMINISTRATEUR, GESTIONNAIRE
+from signatures import SignatureDoer, SignatureMaker, SecureDocumentAccess, send_otp_email
+from campagnes import choisir_signataires, creer_campagne, avancement
 # Imports standards
 from typing import Any, Dict, List
 from pathlib import Path
@@ -49,19 +61,12 @@ def signature_make() -> Any:
             document = SignatureMaker(request) \
                             .post_request() \
                             .get_signature_points() \
+                            .validate_points() \
                             .create_document() \
                             .create_points() \
                             .fix_documents() \
                             .send_invitation()
-            audit_log = AuditLog(
-                id_user=session.get('id', None),
-                ip_addresse=request.remote_addr,
-                user_agent=request.user_agent.string,
-                id_document=document.doc_to_signe.id,
-                action=0,
-                details='success'
-            )
-            g.db_session.add(audit_log)
+            auditer(g.db_session, ACTION_CREER, id_document=document.doc_to_signe.id)
             g.db_session.commit()
         except (IOError, FileNotFoundError, ValueError) as e:
             message = f"Erreur lors du traitement du document : {str(e)}"
@@ -94,15 +99,8 @@ def signature_do(doc_id: int, hash_document: str) -> Any:
                         .post_request(id_document=doc_id, hash_document=hash_document) \
                         .get_signature_points() \
                         .handle_signature_submission()
-            audit_log = AuditLog(
-                id_user=doer.signatory_id,
-                ip_addresse=request.remote_addr,
-                user_agent=request.user_agent.string,
-                id_document=doer.document.id,
-                action=2,
-                details='success'
-            )
-            g.db_session.add(audit_log)
+            auditer(g.db_session, ACTION_SIGNER, id_document=doer.document.id,
+                    id_user=doer.signatory_id)
             g.db_session.commit()
 
             # Vérifier si tous les signataires ont signé
@@ -133,16 +131,8 @@ def signature_do(doc_id: int, hash_document: str) -> Any:
         doer = SignatureDoer(request) \
                     .get_request(id_document=doc_id, hash_document=hash_document) \
                     .get_signature_points()
-        audit_log = AuditLog(
-            id_user=doer.signatory_id,
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=doer.document.id,
-            action=1,
-            details='success'
-        )
-        g.db_session.add(audit_log)
-        g.db_session.commit()
+        journaliser(ACTION_CONSULTER, id_document=doer.document.id,
+                    id_user=doer.signatory_id)
         # Sérialiser les points de signature en JSON pour éviter les erreurs de parsing JavaScript
         import json
         from datetime import datetime
@@ -165,16 +155,7 @@ def signature_do(doc_id: int, hash_document: str) -> Any:
                                token=doer.token, curent_user_name=doer.signatory_name,
                                echeance=doer.invitation.expire_at)
     except ValueError:
-        audit_log = AuditLog(
-            id_user=session.get('id', None),
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=doc_id,
-            action=1,
-            details='connexion échouée'
-        )
-        g.db_session.add(audit_log)
-        g.db_session.commit()
+        journaliser(ACTION_CONSULTER, CODE_CONNEXION_ECHOUEE, details=f'document {doc_id}')
         return render_template(ADMINISTRATION, error_message=BAD_INVITATION)
 
 @signatures_bp.route('/<int:id_document>/otp/<hash_document>', methods=['POST'])
@@ -195,16 +176,7 @@ def signature_request_otp(id_document: int, hash_document: str) -> Any:
                         .filter_by(id=id_document, hash_fichier=hash_document) \
                         .first()
     if not invitation or not document:
-        audit_log = AuditLog(
-            id_user=session.get('id', None),
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=id_document,
-            action=2,
-            details='Erreur OTP - invitation non trouvée'
-        )
-        g.db_session.add(audit_log)
-        g.db_session.commit()
+        journaliser(ACTION_SIGNER, CODE_INVITATION_INTROUVABLE, details=f'document {id_document}')
         return jsonify(success=False, message=BAD_INVITATION), 400
     invitation.code_otp = str(random.randint(10000, 999999)).zfill(6)
     body_mail = render_template(
@@ -214,28 +186,11 @@ def signature_request_otp(id_document: int, hash_document: str) -> Any:
     )
     try:
         send_otp_email(to=user.mail, template=body_mail)
-        audit_log = AuditLog(
-            id_user=session.get('id', None),
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=id_document,
-            action=2,
-            details='OTP envoyé avec succès'
-        )
-        g.db_session.add(audit_log)
+        auditer(g.db_session, ACTION_SIGNER, CODE_OTP_ENVOYE, id_document=id_document)
         g.db_session.commit()
         return jsonify(success=True)
     except Exception as e:
-        audit_log = AuditLog(
-            id_user=session.get('id', None),
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=id_document,
-            action=2,
-            details='Erreur lors de la création du code OTP'
-        )
-        g.db_session.add(audit_log)
-        g.db_session.commit()
+        journaliser(ACTION_SIGNER, CODE_OTP_ERREUR, id_document=id_document)
         logging.error(f"Erreur lors de la création du code OTP : {e}")
         return jsonify(success=False, message=INTERNAL_SERVER_ERROR), 500
 
@@ -268,22 +223,12 @@ def signature_do_list() -> Any:
     for doc in documents if doc.status == 0
     ]
     documents_archived = [doc for doc in documents if doc.status != 0]
-    try:
-        audit_log = AuditLog(
-            id_user=session.get('id', None),
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=documents[0].id if documents else None,
-            action=1,
-            details='Liste des documents affichée'
-        )
-        g.db_session.add(audit_log)
-        g.db_session.commit()
-    except Exception:
-        pass
+    journaliser(ACTION_CONSULTER, CODE_LISTE_AFFICHEE)
     return render_template(ADMINISTRATION, context='signature_list', tab='a',
                            documents_to_signe=documents_to_signe,
-                           documents_archived=documents_archived)
+                           documents_archived=documents_archived,
+                           success_message=request.args.get('success_message'),
+                           error_message=request.args.get('error_message'))
 
 @signatures_bp.route('/creer/<int:id_document>/<hash_document>', methods=['POST'])
 def create_final_signed_document(id_document: int, hash_document: str) -> Any:
@@ -299,6 +244,8 @@ def create_final_signed_document(id_document: int, hash_document: str) -> Any:
             return jsonify(success=False, message="Session utilisateur invalide."), 401
         
         # Créer et exécuter le processus de création du document signé
+        # (import tardif : pile PDF et cryptographie chargée à la première finalisation)
+        from signature_pdf import SignedDocumentCreator
         creator = SignedDocumentCreator(
             id_document=id_document
         )
@@ -313,15 +260,8 @@ def create_final_signed_document(id_document: int, hash_document: str) -> Any:
                .send_signed_document_by_email()
         
         # Sauvegarder les modifications en base et logger l'action
-        audit_log = AuditLog(
-            id_user=current_user_id,
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=id_document,
-            action=3,
-            details='Document finalisé et envoyé par email'
-        )
-        g.db_session.add(audit_log)
+        auditer(g.db_session, ACTION_EXPEDIER, CODE_DOCUMENT_FINALISE, id_document=id_document,
+                id_user=current_user_id)
         g.db_session.commit()
         
         # Retourner une réponse de succès
@@ -370,16 +310,7 @@ def upload_document() -> Any:
         pdf_document: FileStorage | None = request.files.get('pdf', None)
         filename = getattr(pdf_document, "filename", None)
         if not pdf_document or not filename:
-            audit_log = AuditLog(
-                id_user=session.get('id', None),
-                ip_addresse=request.remote_addr,
-                user_agent=request.user_agent.string,
-                id_document=None,
-                action=0,
-                details='Aucun document PDF téléchargé ou nom de fichier invalide.'
-            )
-            g.db_session.add(audit_log)
-            g.db_session.commit()
+            journaliser(ACTION_CREER, CODE_DEPOT_INVALIDE)
             return render_template(ADMINISTRATION, error_message="Aucun document PDF téléchargé ou nom de fichier invalide.")
         elif filename.lower().endswith('.pdf'):
             # Nettoyer les fichiers expirés avant de créer un nouveau
@@ -394,13 +325,25 @@ def upload_document() -> Any:
             # Vérifier que le dossier existe
             Path(folder_path).mkdir(parents=True, exist_ok=True)
 
-            # Sauvegarder le fichier PDF
+            # Sauvegarder le fichier PDF (par blocs, hash calculé au fil de l'écriture)
             file_path = f"{folder_path}/{filename}"
-            pdf_document.save(file_path)
+            try:
+                file_hash, file_size = store_upload(pdf_document, file_path,
+                                                    max_size=get_upload_limit('signature'))
+            except UploadTooLargeError as e:
+                return render_template(ADMINISTRATION, error_message=str(e))
+
+            # Analyser le PDF une seule fois (processus de travail) : rejet immédiat d'un fichier malformé
+            try:
+                pages = analyser_pdf(file_path)
+            except PdfInvalideError as e:
+                Path(file_path).unlink(missing_ok=True)
+                return render_template(ADMINISTRATION, error_message=f"PDF refusé : {e}")
             
             # Générer le hash d'accès et créer le fichier temporaire
             document_hash = SecureDocumentAccess.generate_document_hash(filename)
-            SecureDocumentAccess.create_temp_access_file(filename, document_hash)
+            SecureDocumentAccess.create_temp_access_file(filename, document_hash, file_hash=file_hash,
+                                                         file_size=file_size, pages=pages)
             users = g.db_session.query(User).order_by(User.nom).all()
             users = [user.to_dict(with_mdp=False) for user in users]
             return render_template(ADMINISTRATION, context='signature_make',
@@ -426,7 +369,10 @@ def download_pdf(filename: str):
             return "Accès non autorisé à ce document", 403
         
         folder_path = SecureDocumentAccess.TEMP_DIR
-        return send_from_directory(folder_path, filename)
+        temp_file_path = Path(folder_path) / Path(filename).name
+        if not temp_file_path.is_file():
+            return "Fichier non trouvé", 404
+        return send_stored_file(str(temp_file_path), download_name=temp_file_path.name, as_attachment=False)
     
     # Vérifier l'accès via les points de signature (documents définitifs)
     else:
@@ -452,23 +398,13 @@ def download_pdf(filename: str):
         real_file_path = Path(document.chemin_fichier)
         
         if not real_file_path.exists():
-            audit_log = AuditLog(
-                id_user=id_user,
-                ip_addresse=request.remote_addr,
-                user_agent=request.user_agent.string,
-                id_document=document.id,
-                action=1,
-                details=f'Fichier non trouvé pour le document {filename}'
-            )
-            g.db_session.add(audit_log)
-            g.db_session.commit()
+            journaliser(ACTION_CONSULTER, CODE_FICHIER_INTROUVABLE, id_document=document.id,
+                        details=filename, id_user=id_user)
             return "Fichier non trouvé", 404
         
-        # Servir le fichier depuis son emplacement réel
-        folder_path = str(real_file_path.parent)
-        filename_real = real_file_path.name
-        
-        return send_from_directory(folder_path, filename_real)
+        # Servir le fichier depuis son emplacement réel (nginx en mode X-Accel-Redirect)
+        return send_stored_file(str(real_file_path), download_name=real_file_path.name,
+                                etag=document.hash_signed_file or document.hash_fichier, as_attachment=False)
 
 @signatures_bp.route('/download-signed/<int:doc_id>/<hash_document>')
 def download_signed_doc(doc_id: int, hash_document: str):
@@ -478,46 +414,99 @@ def download_signed_doc(doc_id: int, hash_document: str):
     """
     document = g.db_session.query(DocToSigne).filter_by(id=doc_id, hash_fichier=hash_document).first()
     if not document:
-        audit_log = AuditLog(
-            id_user=session.get('id', None),
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=doc_id,
-            action=1,
-            details='Tentative de téléchargement de document non trouvé'
-        )
-        g.db_session.add(audit_log)
-        g.db_session.commit()
+        journaliser(ACTION_CONSULTER, CODE_DOCUMENT_INTROUVABLE, details=f'document {doc_id}')
         return "Document non trouvé", 404
 
     # Vérifier si le document a été signé
     if document.status != 1:
-        audit_log = AuditLog(
-            id_user=session.get('id', None),
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=doc_id,
-            action=1,
-            details='Tentative de téléchargement d\'un document non signé'
-        )
-        g.db_session.add(audit_log)
-        g.db_session.commit()
+        journaliser(ACTION_CONSULTER, CODE_DOCUMENT_NON_SIGNE, id_document=doc_id)
         return "Document non signé", 403
 
     # Télécharger le fichier du document
     file_downloaded = document.download()
     if not file_downloaded:
-        audit_log = AuditLog(
-            id_user=session.get('id', None),
-            ip_addresse=request.remote_addr,
-            user_agent=request.user_agent.string,
-            id_document=doc_id,
-            action=1,
-            details='Erreur lors du téléchargement du fichier signé par utilisateur autorisé.'
-        )
-        g.db_session.add(audit_log)
-        g.db_session.commit()
+        journaliser(ACTION_CONSULTER, CODE_TELECHARGEMENT_ERREUR, id_document=doc_id)
         return "Erreur lors du téléchargement du fichier.", 501
 
-    # Envoyer le fichier en réponse
-    return send_file(file_downloaded, as_attachment=True, download_name=document.doc_nom)
+    # Envoyer le fichier en réponse (streaming depuis le disque, Range et ETag)
+    return file_downloaded
+
+@signatures_bp.route('/imprimer/<int:doc_id>/<hash_document>', methods=['POST'])
+@validate_habilitation(IMPRESSIONS)
+def print_signed_doc(doc_id: int, hash_document: str):
+    """
+    Envoie le document final signé à la file d'impression, depuis son emplacement de stockage
+    (pas de téléchargement ni de copie). Réservé au déposant et aux signataires du document.
+    """
+    document = g.db_session.query(DocToSigne).filter_by(id=doc_id, hash_fichier=hash_document).first()
+    id_user = session.get('id', None)
+    autorise = document is not None and (document.id_user == id_user
+                                         or any(point.id_user == id_user for point in document.points))
+    if not autorise or document.status != 1 or not document.chemin_fichier:
+        return redirect(url_for('signature.signature_do_list', error_message='Document signé non trouvé'))
+
+    try:
+        travail = file_impression.soumettre_reference(
+            g.db_session, document.chemin_fichier, reference=f'signature:{document.id}', id_user=id_user,
+            titre=f"Intranet-{session.get('prenom', '')} {session.get('nom', '')}-{document.doc_nom}",
+            options=construire_options(sides='two-sided-long-edge'))
+        journaliser(ACTION_CONSULTER, CODE_IMPRESSION, id_document=doc_id,
+                    details=f'travail n°{travail.id}', id_user=id_user)
+        return redirect(url_for('signature.signature_do_list',
+                                success_message=f'Impression n°{travail.id} mise en file'))
+    except Exception as e:
+        logging.error(f"Erreur lors de l'impression du document signé {doc_id} : {e}")
+        return redirect(url_for('signature.signature_do_list', error_message='Erreur lors de l\'impression'))
+
+@signatures_bp.route('/campagnes', methods=['GET', 'POST'])
+@validate_habilitation([ADMINISTRATEUR, GESTIONNAIRE])
+def signature_campaigns() -> Any:
+    """
+    Campagnes de signature : un PDF téléversé et une disposition de points envoyés à une liste de signataires.
+    Méthodes supportées : GET, POST.
+    GET : Liste les campagnes de l'utilisateur connecté et leur avancement (JSON).
+    POST : Crée une campagne depuis le formulaire de dépôt, complété de 'campagne_mode' ('individuel'
+           ou 'partage'), des identifiants 'signataires' et des niveaux 'habilitations' choisis.
+           Les invitations sont envoyées par lots en arrière-plan (tâche 'envoi_campagnes').
+    """
+    id_user = session.get('id', None)
+    if request.method == 'GET':
+        campagnes = g.db_session.query(Campagne).filter_by(id_user=id_user) \
+                        .order_by(Campagne.cree_at.desc()).all()
+        return jsonify(campagnes=avancement(g.db_session, campagnes))
+
+    try:
+        maker = SignatureMaker(request) \
+                    .post_request() \
+                    .get_signature_points() \
+                    .validate_points()
+        signataires = choisir_signataires(g.db_session, ids=request.form.getlist('signataires', type=int),
+                                          habilitations=request.form.getlist('habilitations'))
+        campagne = creer_campagne(
+            g.db_session, nom=maker.new_name, mode=request.form.get('campagne_mode', ''),
+            chemin_modele=str(Path(SecureDocumentAccess.TEMP_DIR) / Path(maker.old_name).name),
+            empreinte=SecureDocumentAccess.get_temp_file_hash(maker.old_name), pages=maker.pages,
+            points=maker.points, signataires=signataires,
+            metadonnees={'doc_type': maker.type, 'doc_sous_type': maker.subtype,
+                         'priorite': int(maker.priority) if maker.priority and maker.priority.isdigit() else 0,
+                         'echeance': maker.signing_deadline,
+                         'duree_archivage': int(maker.validity) if maker.validity and maker.validity.isdigit() else 3660,
+                         'description': maker.description},
+            id_user=id_user, url_racine=request.url_root)
+        g.db_session.commit()
+    except (IOError, FileNotFoundError, ValueError) as e:
+        g.db_session.rollback()
+        return jsonify(success=False, message=f"Erreur lors de la création de la campagne : {e}"), 400
+    return jsonify(success=True, campagne=avancement(g.db_session, [campagne])[0]), 201
+
+@signatures_bp.route('/campagnes/<int:id_campagne>', methods=['GET'])
+@validate_habilitation([ADMINISTRATEUR, GESTIONNAIRE])
+def signature_campaign_progress(id_campagne: int) -> Any:
+    """
+    Avancement d'une campagne de signature de l'utilisateur connecté (JSON).
+    Méthode supportée : GET.
+    """
+    campagne = g.db_session.query(Campagne).filter_by(id=id_campagne, id_user=session.get('id', None)).first()
+    if campagne is None:
+        return jsonify(success=False, message='Campagne non trouvée.'), 404
+    return jsonify(avancement(g.db_session, [campagne])[0])
@@ -0,0 +1,366 @@
+"""
+=============================================================
+Campagnes de signature de l'Intranet API'Raudière
+=============================================================
+Module d'envoi d'un même PDF, avec une même disposition de points de signature,
+à une liste de signataires (utilisateurs choisis un par un ou par habilitation).
+
+Deux modes :
+- individuel : un document par signataire, qui reçoit tous les points de la disposition ;
+- partagé : un seul document, chaque point étant attribué à son signataire.
+
+Le fichier est placé une seule fois dans le magasin ; chaque document reçoit sa copie
+de travail (lien physique). Les documents, pages, points et invitations sont écrits par
+insertions multiples dans la transaction de la requête. Les invitations sont mises en
+file (`mail_envoye` à faux) et envoyées par lots, sur une connexion SMTP par lot, par la
+tâche planifiée `envoi_campagnes`. L'avancement d'une campagne est agrégé depuis les
+statuts de ses documents et de ses invitations.
+
+Exemple :
+    ```python
+    campagne = creer_campagne(session, nom='Autorisation.pdf', mode=MODE_INDIVIDUEL, ...)
+    session.commit()
+    envoyer_invitations(session, application=peraudiere)
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+import hashlib, hmac, smtplib
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from flask import Flask, render_template
+from sqlalchemy import String, case, cast, func, or_, select, update
+from sqlalchemy.orm import Session, aliased
+from config import Config
+from models import Blob, Campagne, DocToSigne, Invitation, Page, Points, User
+from stockage import importer_fichier, lier_copie_de_travail
+from audit import auditer, ACTION_CREER
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Modes de campagne
+MODE_INDIVIDUEL = 'individuel'
+MODE_PARTAGE = 'partage'
+MODES = (MODE_INDIVIDUEL, MODE_PARTAGE)
+
+# Nombre de lignes par insertion multiple
+TAILLE_LOT = 500
+
+# Nombre d'essais d'envoi d'une invitation avant abandon
+TENTATIVES_MAIL = 3
+
+SUJET_INVITATION = 'La Péraudière | Vous êtes invité à signer un document'
+
+
+def choisir_signataires(session: Session, ids: Iterable[int] = (), habilitations: Iterable[str] = ()) -> List[int]:
+    """
+    Retourne les utilisateurs actifs (non verrouillés, non échus) choisis par identifiant ou par habilitation.
+    Args:
+        session (Session): La session de base de données.
+        ids (Iterable[int]): Les identifiants d'utilisateurs.
+        habilitations (Iterable[str]): Les niveaux d'habilitation (voir habilitations.py), ex. ['4'].
+    Returns:
+        List[int]: Les identifiants des signataires, triés par nom et prénom.
+    Exemples:
+        ```python
+        choisir_signataires(session, habilitations=[PROFESSEURS])
+        ```
+    """
+    ids = {int(id_user) for id_user in ids}
+    habilitations = [str(habilitation) for habilitation in habilitations if str(habilitation).isdigit()]
+    criteres = [User.id.in_(ids)] if ids else []
+    criteres += [cast(User.habilitation, String).contains(habilitation) for habilitation in habilitations]
+    if not criteres:
+        return []
+    requete = (select(User.id)
+               .where(or_(*criteres),
+                      or_(User.locked.is_(None), User.locked.is_(False)),
+                      or_(User.fin.is_(None), User.fin >= date.today()))
+               .order_by(User.nom, User.prenom))
+    return list(session.execute(requete).scalars())
+
+
+def repartir(mode: str, points: Sequence[Dict[str, Any]],
+             signataires: Sequence[int]) -> List[Tuple[Optional[int], List[Dict[str, Any]]]]:
+    """
+    Répartit la disposition des points entre les documents de la campagne.
+    En mode individuel, chaque signataire reçoit un document portant tous les points (leur
+    signataire éventuel est ignoré) ; en mode partagé, le document unique garde les points
+    tels qu'attribués : chaque point doit revenir à un signataire retenu (actif et choisi,
+    voir choisir_signataires) et chaque signataire retenu doit avoir au moins un point.
+    Args:
+        mode (str): 'individuel' ou 'partage'.
+        points (Sequence[Dict[str, Any]]): Les points ('x', 'y', 'page_num', 'user_id').
+        signataires (Sequence[int]): Les identifiants des signataires retenus.
+    Returns:
+        List[Tuple[Optional[int], List[Dict[str, Any]]]]: Pour chaque document, son signataire
+            (None pour le document partagé) et ses points.
+    Raises:
+        ValueError: Si le mode est inconnu, la disposition ou la liste des signataires vide,
+            un point attribué à un utilisateur non retenu ou un signataire sans point.
+    Exemples:
+        ```python
+        repartir(MODE_INDIVIDUEL, [{'x': 50, 'y': 80, 'page_num': 1}], [3, 4])
+        # [(3, [{'x': 50, 'y': 80, 'page_num': 1, 'user_id': 3}]), (4, [... 'user_id': 4}])]
+        ```
+    """
+    if mode not in MODES:
+        raise ValueError(f"Mode de campagne inconnu : {mode} (possibles : {', '.join(MODES)})")
+    if not points:
+        raise ValueError("La campagne ne comporte aucun point de signature.")
+    if not signataires:
+        raise ValueError("La campagne ne comporte aucun signataire.")
+
+    if mode == MODE_INDIVIDUEL:
+        return [(signataire, [{**point, 'user_id': signataire} for point in points])
+                for signataire in dict.fromkeys(signataires)]
+
+    # Mode partagé : les points viennent du formulaire, leur signataire doit avoir été retenu
+    retenus = set(signataires)
+    inconnus = [point.get('user_id') for point in points if point.get('user_id') not in retenus]
+    if inconnus:
+        raise ValueError("Points attribués à des utilisateurs non retenus comme signataires : "
+                         f"{', '.join(map(str, dict.fromkeys(inconnus)))}")
+    attribues = {point['user_id'] for point in points}
+    sans_point = [signataire for signataire in dict.fromkeys(signataires) if signataire not in attribues]
+    if sans_point:
+        raise ValueError(f"Signataires sans point de signature : {', '.join(map(str, sans_point))}")
+    return [(None, list(points))]
+
+
+def _jeton(id_document: int, empreinte: str, id_user: int, instant: datetime) -> str:
+    """Jeton du lien d'invitation (même construction que l'invitation d'un document déposé)."""
+    return hmac.new(Config.SECRET_KEY.encode(), f"{id_document}-{empreinte}-{id_user}-{instant.isoformat()}".encode(),
+                    hashlib.sha256).hexdigest()
+
+
+def _inserer(session: Session, table: Any, lignes: List[Dict[str, Any]], taille_lot: int) -> None:
+    """Insère des lignes par lots d'insertions multiples, dans la transaction de la session."""
+    for debut in range(0, len(lignes), taille_lot):
+        session.execute(table.insert(), lignes[debut:debut + taille_lot])
+
+
+def creer_campagne(session: Session, *, nom: str, mode: str, chemin_modele: str, empreinte: Optional[str],
+                   pages: Sequence[Dict[str, Any]], points: Sequence[Dict[str, Any]], signataires: Sequence[int],
+                   metadonnees: Dict[str, Any], id_user: Optional[int], url_racine: str,
+                   dossier: Optional[str] = None, taille_lot: int = TAILLE_LOT) -> Campagne:
+    """
+    Crée une campagne : documents, pages, points et invitations (en file d'envoi) par insertions multiples.
+    Le commit est laissé à l'appelant.
+    Args:
+        session (Session): La session de base de données.
+        nom (str): Le nom des documents (et de leur copie de travail).
+        mode (str): 'individuel' ou 'partage'.
+        chemin_modele (str): Le chemin du PDF téléversé (déplacé dans le magasin).
+        empreinte (Optional[str]): L'empreinte SHA-256 du PDF si elle est connue.
+        pages (Sequence[Dict[str, Any]]): Les dimensions des pages (voir analyse_pdf.analyser_pdf).
+        points (Sequence[Dict[str, Any]]): La disposition des points (voir repartir).
+        signataires (Sequence[int]): Les identifiants des signataires (voir choisir_signataires).
+        metadonnees (Dict[str, Any]): 'doc_type', 'doc_sous_type', 'priorite', 'echeance' (jours),
+                                      'duree_archivage' et 'description' des documents.
+        id_user (Optional[int]): L'identifiant du créateur.
+        url_racine (str): La racine des liens de signature ('https://intranet.exemple.fr').
+        dossier (Optional[str]): Le dossier des copies de travail (défaut : dossier des signatures).
+        taille_lot (int): Nombre de lignes par insertion multiple.
+    Returns:
+        Campagne: La campagne créée.
+    Raises:
+        ValueError: Si la répartition des points est impossible (voir repartir).
+    """
+    repartition = repartir(mode, points, signataires)
+    echeance = int(metadonnees.get('echeance') or 3)
+    campagne = Campagne(nom=nom, mode=mode, id_user=id_user, url_racine=url_racine.rstrip('/'),
+                        nb_documents=len(repartition),
+                        nb_signataires=len({point['user_id'] for _, lot in repartition for point in lot}))
+    session.add(campagne)
+    session.flush()
+
+    # Fichier placé une seule fois dans le magasin, une copie de travail (lien) par document
+    empreinte, _ = importer_fichier(session, chemin_modele, empreinte=empreinte)
+    racine = Path(dossier or Config.SIGNATURE_PATH or '/tmp') / 'campagnes' / str(campagne.id)
+    chemins = [lier_copie_de_travail(empreinte, str(racine / str(signataire or 'commun') / Path(nom).name))
+               for signataire, _ in repartition]
+
+    _inserer(session, DocToSigne.__table__, [
+        {'doc_nom': nom, 'doc_type': metadonnees.get('doc_type'), 'doc_sous_type': metadonnees.get('doc_sous_type'),
+         'priorite': metadonnees.get('priorite', 0), 'echeance': echeance,
+         'duree_archivage': metadonnees.get('duree_archivage', 3660), 'description': metadonnees.get('description'),
+         'chemin_fichier': chemin, 'hash_fichier': empreinte, 'nb_pages': len(pages) or None, 'id_user': id_user,
+         'status': 0, 'id_campagne': campagne.id}
+        for chemin in chemins], taille_lot)
+    # Insertions multiples sans évènement de mapper : une référence au fichier par document
+    session.execute(update(Blob).where(Blob.hash == empreinte)
+                    .values(nb_references=Blob.nb_references + len(chemins)))
+
+    # Identifiants relus par copie de travail (unique par document de la campagne)
+    ids = dict(session.execute(select(DocToSigne.chemin_fichier, DocToSigne.id)
+                               .where(DocToSigne.id_campagne == campagne.id)).tuples().all())
+    maintenant = datetime.now()
+    expire_at = maintenant + timedelta(days=echeance)
+    lignes_pages: List[Dict[str, Any]] = []
+    lignes_points: List[Dict[str, Any]] = []
+    lignes_invitations: List[Dict[str, Any]] = []
+    for chemin, (_, lot) in zip(chemins, repartition):
+        id_document = ids[chemin]
+        lignes_pages += [{'id_document': id_document, 'page_num': page_num, 'largeur': page['largeur'],
+                          'hauteur': page['hauteur'], 'rotation': page.get('rotation', 0)}
+                         for page_num, page in enumerate(pages, start=1)]
+        lignes_points += [{'id_document': id_document, 'id_user': point['user_id'], 'page_num': point['page_num'],
+                           'x': point['x'], 'y': point['y'], 'status': 0} for point in lot]
+        lignes_invitations += [{'id_document': id_document, 'id_user': signataire,
+                                'token': _jeton(id_document, empreinte, signataire, maintenant),
+                                'expire_at': expire_at, 'envoye_at': None, 'status': 0,
+                                'mail_envoye': False, 'mail_compte': 0}
+                               for signataire in dict.fromkeys(point['user_id'] for point in lot)]
+        auditer(session, ACTION_CREER, id_document=id_document, details=f'campagne {campagne.id}', id_user=id_user)
+    _inserer(session, Page.__table__, lignes_pages, taille_lot)
+    _inserer(session, Points.__table__, lignes_points, taille_lot)
+    _inserer(session, Invitation.__table__, lignes_invitations, taille_lot)
+
+    logger.info(f"Campagne {campagne.id} créée : {len(chemins)} documents, {len(lignes_invitations)} invitations")
+    return campagne
+
+
+def expedier(messages: Iterable[Tuple[int, str, str]], sujet: str = SUJET_INVITATION) -> Tuple[List[int], List[int]]:
+    """
+    Envoie des courriels HTML sur une connexion SMTP unique.
+    Une connexion impossible n'est imputée à aucun message (ils seront repris au lot suivant).
+    Args:
+        messages (Iterable[Tuple[int, str, str]]): (identifiant, destinataire, corps HTML).
+        sujet (str): Le sujet des courriels.
+    Returns:
+        Tuple[List[int], List[int]]: Les identifiants des messages envoyés et ceux en échec.
+    """
+    envoyes: List[int] = []
+    echecs: List[int] = []
+    try:
+        with smtplib.SMTP(Config.EMAIL_SMTP, Config.EMAIL_PORT) as server:
+            server.starttls()
+            server.login(Config.EMAIL_USER, Config.EMAIL_PASSWORD)
+            for identifiant, destinataire, corps in messages:
+                msg = MIMEMultipart()
+                msg['From'] = Config.EMAIL_USER
+                msg['To'] = destinataire
+                msg['Subject'] = sujet
+                msg.attach(MIMEText(corps, 'html'))
+                try:
+                    server.send_message(msg)
+                    envoyes.append(identifiant)
+                except smtplib.SMTPException as e:
+                    echecs.append(identifiant)
+                    logger.error(f"Erreur lors de l'envoi de l'e-mail à {destinataire} : {e}")
+    except (OSError, smtplib.SMTPException) as e:
+        logger.error(f"Connexion SMTP impossible : {e}")
+    return envoyes, echecs
+
+
+def envoyer_invitations(session: Session, lot: Optional[int] = None,
+                        application: Optional[Flask] = None) -> Dict[str, int]:
+    """
+    Envoie un lot d'invitations de campagne en file (tâche planifiée `envoi_campagnes`).
+    Les invitations sont lues en une requête avec leur document, leur signataire et le
+    créateur de la campagne, les courriels rendus puis envoyés sur une connexion SMTP,
+    et les statuts d'envoi mis à jour en masse. Le commit est laissé à l'appelant.
+    Args:
+        session (Session): La session de base de données.
+        lot (Optional[int]): Le nombre maximal d'invitations envoyées (défaut : configuration).
+        application (Optional[Flask]): L'application, pour le rendu hors requête (thread planificateur).
+    Returns:
+        Dict[str, int]: Le nombre d'invitations envoyées et en échec.
+    """
+    createur = aliased(User)
+    requete = (select(Invitation.id, Invitation.token, Invitation.expire_at, DocToSigne.id.label('id_document'),
+                      DocToSigne.doc_nom, DocToSigne.doc_type, DocToSigne.hash_fichier, User.prenom, User.nom,
+                      User.mail, Campagne.url_racine, createur.prenom.label('prenom_createur'),
+                      createur.nom.label('nom_createur'))
+               .join(DocToSigne, DocToSigne.id == Invitation.id_document)
+               .join(Campagne, Campagne.id == DocToSigne.id_campagne)
+               .join(User, User.id == Invitation.id_user)
+               .outerjoin(createur, createur.id == Campagne.id_user)
+               .where(Invitation.mail_envoye.is_(False), Invitation.status == 0,
+                      Invitation.mail_compte < TENTATIVES_MAIL)
+               .order_by(Invitation.id)
+               .limit(lot or Config.CAMPAGNE_ENVOI_LOT))
+    invitations = session.execute(requete).mappings().all()
+    if not invitations:
+        return {'envoyes': 0, 'echecs': 0}
+
+    # Rendu des courriels (contexte d'application hors requête)
+    with application.app_context() if application else nullcontext():
+        messages = [(invitation['id'], invitation['mail'], render_template(
+            'signatures/signature_mail.html',
+            nom_expediteur=f"{invitation['prenom_createur'] or ''} {invitation['nom_createur'] or ''}".strip(),
+            nom_signataire=f"{invitation['prenom']} {invitation['nom']}".strip(),
+            doc_titre=invitation['doc_nom'],
+            doc_type=invitation['doc_type'],
+            date_limite=invitation['expire_at'].strftime('%d/%m/%Y %H:%M'),
+            lien_signature=(f"{invitation['url_racine']}/signature/signer/{invitation['id_document']}/"
+                            f"{invitation['hash_fichier']}?token={invitation['token']}")))
+            for invitation in invitations]
+
+    envoyes, echecs = expedier(messages)
+    if envoyes:
+        session.execute(update(Invitation).where(Invitation.id.in_(envoyes))
+                        .values(mail_envoye=True, mail_compte=Invitation.mail_compte + 1, envoye_at=datetime.now()))
+    if echecs:
+        session.execute(update(Invitation).where(Invitation.id.in_(echecs))
+                        .values(mail_compte=Invitation.mail_compte + 1))
+    logger.info(f"Invitations de campagne : {len(envoyes)} envoyées, {len(echecs)} en échec")
+    return {'envoyes': len(envoyes), 'echecs': len(echecs)}
+
+
+def avancement(session: Session, campagnes: Sequence[Campagne]) -> List[Dict[str, Any]]:
+    """
+    Retourne l'avancement de campagnes, agrégé en deux requêtes (documents, invitations).
+    Args:
+        session (Session): La session de base de données.
+        campagnes (Sequence[Campagne]): Les campagnes.
+    Returns:
+        List[Dict[str, Any]]: Pour chaque campagne, ses documents par statut, ses invitations
+            (en file, envoyées, abandonnées, signées, expirées) et le pourcentage de signataires ayant signé.
+    Exemples:
+        ```python
+        avancement(session, [campagne])[0]['invitations']
+        # {'en_file': 120, 'envoyees': 180, 'abandonnees': 0, 'signees': 42, 'expirees': 0}
+        ```
+    """
+    ids = [campagne.id for campagne in campagnes]
+    documents: Dict[int, Dict[str, int]] = {id_campagne: {'en_attente': 0, 'signes': 0, 'expires': 0, 'annules': 0}
+                                            for id_campagne in ids}
+    invitations: Dict[int, Dict[str, int]] = {id_campagne: {'en_file': 0, 'envoyees': 0, 'abandonnees': 0,
+                                                            'signees': 0, 'expirees': 0} for id_campagne in ids}
+    if ids:
+        statuts_documents = {0: 'en_attente', 1: 'signes', -1: 'expires', -2: 'annules'}
+        for id_campagne, status, nombre in session.execute(
+                select(DocToSigne.id_campagne, DocToSigne.status, func.count())
+                .where(DocToSigne.id_campagne.in_(ids))
+                .group_by(DocToSigne.id_campagne, DocToSigne.status)):
+            if status in statuts_documents:
+                documents[id_campagne][statuts_documents[status]] += nombre
+
+        envoi = case((Invitation.mail_envoye.is_(True), 'envoyees'),
+                     (Invitation.mail_compte >= TENTATIVES_MAIL, 'abandonnees'), else_='en_file')
+        for id_campagne, status, etat, nombre in session.execute(
+                select(DocToSigne.id_campagne, Invitation.status, envoi, func.count())
+                .join(DocToSigne, DocToSigne.id == Invitation.id_document)
+                .where(DocToSigne.id_campagne.in_(ids))
+                .group_by(DocToSigne.id_campagne, Invitation.status, envoi)):
+            invitations[id_campagne][etat] += nombre
+            if status == 1:
+                invitations[id_campagne]['signees'] += nombre
+            elif status == -1:
+                invitations[id_campagne]['expirees'] += nombre
+
+    return [{'id': campagne.id, 'nom': campagne.nom, 'mode': campagne.mode,
+             'cree_at': campagne.cree_at.isoformat() if campagne.cree_at else None,
+             'nb_documents': campagne.nb_documents, 'nb_signataires': campagne.nb_signataires,
+             'documents': documents[campagne.id], 'invitations': invitations[campagne.id],
+             'progression': round(100 * invitations[campagne.id]['signees'] / campagne.nb_signataires, 1)
+             if campagne.nb_signataires else 0.0}
+            for campagne in campagnes]
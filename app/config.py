@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from typing import TypedDict
+from typing import TypedDict, Dict
 from datetime import timedelta
 
 # Création du chemin absolu du répertoire racine du projet
@@ -20,6 +20,14 @@ class Config:
     # Gestion SSH
     UPLOAD_FOLDER: str = os.getenv('FILES_DOCKER_PATH', '')
     UPLOAD_EXTENSIONS = ['.jpg', '.png', '.gif', '.jpeg', '.tif', '.tiff', '.pdf']
+    # Tailles maximales des fichiers téléversés par type (en octets)
+    UPLOAD_LIMITS: Dict[str, int] = {
+        'document': int(os.getenv('UPLOAD_MAX_DOCUMENT', 20 * 1024 * 1024)),
+        'facture': int(os.getenv('UPLOAD_MAX_FACTURE', 10 * 1024 * 1024)),
+        'signature': int(os.getenv('UPLOAD_MAX_SIGNATURE', 20 * 1024 * 1024)),
+    }
+    # Taille maximale d'une requête (aligné sur client_max_body_size de nginx)
+    MAX_CONTENT_LENGTH: int = int(os.getenv('MAX_CONTENT_LENGTH', 20 * 1024 * 1024))
     SSH_PORT: int = int(os.getenv('SSH_PORT', 22))
     SSH_HOST: str = os.getenv('SSH_HOST', 'localhost')
     SSH_USER: str = os.getenv('SSH_USER', 'user')
@@ -27,12 +35,51 @@ class Config:
     # Gestion impression
     PRINTER_NAME: str = os.getenv('PRINTER_NAME', '')
     PRINT_PATH: str = os.getenv('PRINT_DOCKER_PATH', '')
+    # File d'impression (serveur CUPS : défaut passerelle du conteneur)
+    CUPS_SERVER: str = os.getenv('CUPS_SERVER', '')
+    PRINT_WORKERS: int = int(os.getenv('PRINT_WORKERS', 2))
+    PRINT_TENTATIVES: int = int(os.getenv('PRINT_TENTATIVES', 3))
+    PRINT_SUIVI_INTERVAL: int = int(os.getenv('PRINT_SUIVI_INTERVAL', 60))
+    # Magasin de fichiers adressé par contenu (défaut : sous-dossier 'blobs' de UPLOAD_FOLDER)
+    BLOB_PATH: str = os.getenv('BLOB_DOCKER_PATH', '')
+    NETTOYAGE_FICHIERS_INTERVAL: int = int(os.getenv('NETTOYAGE_FICHIERS_INTERVAL', 3600))
+    # Gestion des fichiers de signature
+    SIGNATURE_PATH: str = os.getenv('SIGNATURE_DOCKER_PATH', '')
+    # Analyse des PDF à signer au téléversement (processus de travail)
+    PDF_ANALYSE_WORKERS: int = int(os.getenv('PDF_ANALYSE_WORKERS', 2))
+    PDF_ANALYSE_TIMEOUT: int = int(os.getenv('PDF_ANALYSE_TIMEOUT', 30))
+    # Envoi des fichiers : 'flask' (par l'application) ou 'nginx' (X-Accel-Redirect)
+    FILE_DELIVERY_MODE: str = os.getenv('FILE_DELIVERY_MODE', 'flask')
     # Gestion mail
     EMAIL_USER: str = os.getenv('EMAIL_USER', '')
     EMAIL_PASSWORD: str = os.getenv('EMAIL_PASSWORD', '')
     EMAIL_SMTP: str = os.getenv('EMAIL_SMTP', '')
     EMAIL_PORT: int = int(os.getenv('EMAIL_PORT', 587))
     API_MAIL_TOKEN: str = os.getenv('API_MAIL_TOKEN', '')
+    # Gestion des tâches planifiées
+    EXPIRATION_INTERVAL: int = int(os.getenv('EXPIRATION_INTERVAL', 300))
+    # Journal d'audit partitionné : mois conservés en base, archives (0 : sans limite) et partitions d'avance
+    AUDIT_RETENTION_MOIS: int = int(os.getenv('AUDIT_RETENTION_MOIS', 12))
+    AUDIT_ARCHIVE_PATH: str = os.getenv('AUDIT_ARCHIVE_DOCKER_PATH', '')
+    AUDIT_ARCHIVE_RETENTION_MOIS: int = int(os.getenv('AUDIT_ARCHIVE_RETENTION_MOIS', 0))
+    AUDIT_PARTITIONS_AVANCE: int = int(os.getenv('AUDIT_PARTITIONS_AVANCE', 3))
+    AUDIT_MAINTENANCE_INTERVAL: int = int(os.getenv('AUDIT_MAINTENANCE_INTERVAL', 86400))
+    # Prévision des dépenses : vérification de la version des données, horizon (mois) et dossier du résultat
+    PREVISION_INTERVAL: int = int(os.getenv('PREVISION_INTERVAL', 900))
+    PREVISION_HORIZON_MOIS: int = int(os.getenv('PREVISION_HORIZON_MOIS', 24))
+    PREVISION_PATH: str = os.getenv('PREVISION_DOCKER_PATH', '')
+    # Campagnes de signature : intervalle et taille des lots d'envoi des invitations
+    CAMPAGNE_ENVOI_INTERVAL: int = int(os.getenv('CAMPAGNE_ENVOI_INTERVAL', 60))
+    CAMPAGNE_ENVOI_LOT: int = int(os.getenv('CAMPAGNE_ENVOI_LOT', 200))
+    # Serveur : workers pré-forkés (0 : processus unique), threads par worker, écoute ('partage' ou 'ports'),
+    # recyclage après un nombre de requêtes (0 : jamais) et délais d'arrêt et de battement de cœur (secondes)
+    SERVEUR_WORKERS: int = int(os.getenv('SERVEUR_WORKERS', 0))
+    SERVEUR_THREADS: int = int(os.getenv('SERVEUR_THREADS', 4))
+    SERVEUR_ECOUTE: str = os.getenv('SERVEUR_ECOUTE', 'partage')
+    SERVEUR_MAX_REQUETES: int = int(os.getenv('SERVEUR_MAX_REQUETES', 0))
+    SERVEUR_MAX_REQUETES_ALEA: int = int(os.getenv('SERVEUR_MAX_REQUETES_ALEA', 0))
+    SERVEUR_DELAI_ARRET: int = int(os.getenv('SERVEUR_DELAI_ARRET', 30))
+    SERVEUR_DELAI_BATTEMENT: int = int(os.getenv('SERVEUR_DELAI_BATTEMENT', 60))
 
 class ConfigDict(TypedDict, total=False):
     SECRET_KEY: str
@@ -41,13 +88,43 @@ class ConfigDict(TypedDict, total=False):
     DB_HOST: str
     DB_NAME: str
     UPLOAD_FOLDER: str
+    UPLOAD_LIMITS: Dict[str, int]
+    MAX_CONTENT_LENGTH: int
     SSH_PORT: int
     SSH_HOST: str
     SSH_USER: str
     SSH_PASSWORD: str
     PRINTER_NAME: str
     PRINT_PATH: str
+    CUPS_SERVER: str
+    PRINT_WORKERS: int
+    PRINT_TENTATIVES: int
+    PRINT_SUIVI_INTERVAL: int
+    SIGNATURE_PATH: str
+    BLOB_PATH: str
+    NETTOYAGE_FICHIERS_INTERVAL: int
+    PDF_ANALYSE_WORKERS: int
+    PDF_ANALYSE_TIMEOUT: int
+    FILE_DELIVERY_MODE: str
     EMAIL_USER: str
     EMAIL_PASSWORD: str
     EMAIL_SMTP: str
     EMAIL_PORT: int
+    EXPIRATION_INTERVAL: int
+    AUDIT_RETENTION_MOIS: int
+    AUDIT_ARCHIVE_PATH: str
+    AUDIT_ARCHIVE_RETENTION_MOIS: int
+    AUDIT_PARTITIONS_AVANCE: int
+    AUDIT_MAINTENANCE_INTERVAL: int
+    PREVISION_INTERVAL: int
+    PREVISION_HORIZON_MOIS: int
+    PREVISION_PATH: str
+    CAMPAGNE_ENVOI_INTERVAL: int
+    CAMPAGNE_ENVOI_LOT: int
+    SERVEUR_WORKERS: int
+    SERVEUR_THREADS: int
+    SERVEUR_ECOUTE: str
+    SERVEUR_MAX_REQUETES: int
+    SERVEUR_MAX_REQUETES_ALEA: int
+    SERVEUR_DELAI_ARRET: int
+    SERVEUR_DELAI_BATTEMENT: int
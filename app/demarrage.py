@@ -0,0 +1,166 @@
+"""
+=============================================================
+Démarrage de l'Intranet API'Raudière
+=============================================================
+Module de préparation de la base de données au démarrage du serveur (run.py).
+
+Les migrations sont appliquées dans le processus, par l'API Python d'Alembic, sur une
+connexion de l'application : la révision enregistrée en base (`alembic_version`) est
+comparée une seule fois à la révision `head` des scripts, et rien n'est fait si elles
+sont identiques (ni `create_all`, ni relecture du schéma). Une base vide est créée depuis
+les modèles puis marquée à la révision `head` ; sinon, seules les migrations manquantes
+sont appliquées. Un verrou nommé MariaDB évite que deux processus migrent en même temps.
+
+La durée de chaque phase du démarrage est journalisée.
+
+Exemple :
+    ```python
+    durees: Dict[str, float] = {}
+    with phase('schéma', durees):
+        preparer_schema(engine)
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from contextlib import contextmanager
+from time import perf_counter, sleep
+from typing import Dict, Iterator, Set
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from models import Base
+from archivage_audit import partitionner_table
+from logging import getLogger
+import os
+
+logger = getLogger(__name__)
+
+# Fichier de configuration d'Alembic (racine du projet)
+CHEMIN_ALEMBIC_INI = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'alembic.ini'))
+
+# Verrou nommé des migrations et délai d'attente (secondes)
+VERROU_MIGRATIONS = 'intranet_migrations'
+DELAI_VERROU = 300
+
+# États retournés par preparer_schema
+SCHEMA_A_JOUR = 'à jour'
+SCHEMA_CREE = 'créé'
+SCHEMA_MIGRE = 'migré'
+
+
+@contextmanager
+def phase(nom: str, durees: Dict[str, float]) -> Iterator[None]:
+    """
+    Mesure et journalise la durée d'une phase du démarrage.
+    Args:
+        nom (str): Le nom de la phase.
+        durees (Dict[str, float]): Les durées des phases (secondes), complétées à la fin de la phase.
+    """
+    debut = perf_counter()
+    try:
+        yield
+    finally:
+        durees[nom] = perf_counter() - debut
+        logger.info(f"Démarrage - {nom} : {durees[nom]:.3f} s")
+
+
+def attendre_base(engine: Engine, tentatives: int = 10, delai: float = 2) -> None:
+    """
+    Attend que la base de données accepte les connexions.
+    Args:
+        engine (Engine): Le moteur de l'application.
+        tentatives (int): Le nombre maximal de tentatives de connexion.
+        delai (float): Le délai entre deux tentatives (secondes).
+    Raises:
+        Exception: L'erreur de la dernière tentative.
+    """
+    for tentative in range(1, tentatives + 1):
+        try:
+            with engine.connect() as connexion:
+                connexion.execute(text("SELECT 1"))
+            return
+        except Exception as e:
+            if tentative == tentatives:
+                raise
+            logger.warning(f"Base de données indisponible (tentative {tentative}/{tentatives}) : {e}")
+            sleep(delai)
+
+
+def get_config_alembic() -> AlembicConfig:
+    """
+    Retourne la configuration d'Alembic de l'application (métadonnées des modèles déjà chargées).
+    """
+    config = AlembicConfig(CHEMIN_ALEMBIC_INI)
+    config.attributes['target_metadata'] = Base.metadata
+    return config
+
+
+def revisions_cibles(config: AlembicConfig) -> Set[str]:
+    """Retourne les révisions `head` des scripts de migration."""
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def revisions_courantes(connexion: Connection) -> Set[str]:
+    """Retourne les révisions enregistrées dans la base (vide si la base n'est pas versionnée)."""
+    return set(MigrationContext.configure(connexion).get_current_heads())
+
+
+def _verrouiller(connexion: Connection) -> bool:
+    """Prend le verrou nommé des migrations (MariaDB uniquement ; sans effet sinon)."""
+    if connexion.dialect.name not in ('mysql', 'mariadb'):
+        return False
+    if not connexion.execute(text("SELECT GET_LOCK(:nom, :delai)"),
+                             {'nom': VERROU_MIGRATIONS, 'delai': DELAI_VERROU}).scalar():
+        raise RuntimeError("Verrou des migrations non obtenu : migration en cours dans un autre processus ?")
+    return True
+
+
+def preparer_schema(engine: Engine) -> str:
+    """
+    Met le schéma de la base à la révision `head`.
+    Args:
+        engine (Engine): Le moteur de l'application.
+    Returns:
+        str: SCHEMA_A_JOUR (aucune opération), SCHEMA_CREE (base vide créée depuis les modèles)
+             ou SCHEMA_MIGRE (migrations manquantes appliquées).
+    """
+    config = get_config_alembic()
+    cibles = revisions_cibles(config)
+
+    with engine.connect() as connexion:
+        if revisions_courantes(connexion) == cibles:
+            logger.info(f"Schéma à jour (révision {', '.join(sorted(cibles))})")
+            return SCHEMA_A_JOUR
+
+        verrou = _verrouiller(connexion)
+        try:
+            # Nouvelle lecture sous verrou : un autre processus a pu migrer entre-temps
+            courantes = revisions_courantes(connexion)
+            connexion.commit()
+            if courantes == cibles:
+                return SCHEMA_A_JOUR
+
+            config.attributes['connection'] = connexion
+            tables = set(inspect(connexion).get_table_names())
+            if not courantes and not tables & set(Base.metadata.tables):
+                # Base vide : création depuis les modèles, puis révision head
+                Base.metadata.create_all(connexion)
+                partitionner_table(connexion)
+                command.stamp(config, 'head')
+                connexion.commit()
+                logger.info(f"Base créée à la révision {', '.join(sorted(cibles))}")
+                return SCHEMA_CREE
+
+            logger.info(f"Migration du schéma : {', '.join(sorted(courantes)) or 'aucune révision'} "
+                        f"-> {', '.join(sorted(cibles))}")
+            command.upgrade(config, 'head')
+            connexion.commit()
+            return SCHEMA_MIGRE
+        finally:
+            if verrou:
+                connexion.execute(text("SELECT RELEASE_LOCK(:nom)"), {'nom': VERROU_MIGRATIONS})
+                connexion.commit()
@@ -0,0 +1,181 @@
+"""
+=============================================================
+Tableau des dépenses de l'Intranet API'Raudière
+=============================================================
+Module d'analyse des dépenses (factures) par contrat, entreprise, type ou sous-type
+de contrat, par mois ou par année.
+
+Les montants sont lus dans la table de cumuls `14_depenses` (une ligne par contrat et
+par mois, maintenue à chaque écriture d'une facture) jointe aux contrats : le coût
+d'une analyse dépend du nombre de contrats et de mois, pas du nombre de factures.
+Les filtres de contrats sont ceux de la liste des contrats (voir export_contrats).
+
+Exemple :
+    ```python
+    analyse = analyser(session, axe='type', periode='annee', debut=(2025, 1))
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Mapping, Optional, Tuple
+from sqlalchemy import and_, extract, func, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+from models import Bill, Contract, Depense
+from export_contrats import lire_filtres, criteres
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Axes d'analyse : colonnes de contrat regroupées
+AXES: Dict[str, Tuple[Any, ...]] = {
+    'contrat': (Contract.id, Contract.intitule, Contract.entreprise),
+    'entreprise': (Contract.entreprise,),
+    'type': (Contract.type_contrat,),
+    'sous_type': (Contract.type_contrat, Contract.sous_type_contrat),
+}
+
+# Périodes d'analyse
+PERIODE_MOIS = 'mois'
+PERIODE_ANNEE = 'annee'
+PERIODES = (PERIODE_MOIS, PERIODE_ANNEE)
+
+
+def _lire_mois(texte: str, nom: str) -> Tuple[int, int]:
+    """
+    Convertit une année ('2026') ou un mois ('2026-03') en (année, mois).
+    Raises:
+        ValueError: Si le texte est invalide.
+    """
+    annee, _, mois = texte.partition('-')
+    if not annee.isdigit() or (mois and not mois.isdigit()) or not 1 <= int(mois or 1) <= 12:
+        raise ValueError(f"Période '{nom}' invalide : {texte} (AAAA ou AAAA-MM)")
+    return int(annee), int(mois or (1 if nom == 'debut' else 12))
+
+
+def lire_parametres(parametres: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Lit les paramètres d'une analyse depuis des paramètres de requête.
+    Args:
+        parametres (Mapping[str, str]): 'axe', 'periode', 'debut' et 'fin' (AAAA ou AAAA-MM, inclus)
+                                        et les filtres de la liste des contrats.
+    Returns:
+        Dict[str, Any]: Les arguments de analyser.
+    Raises:
+        ValueError: Si un paramètre est invalide.
+    """
+    axe = parametres.get('axe') or 'type'
+    periode = parametres.get('periode') or PERIODE_MOIS
+    if axe not in AXES:
+        raise ValueError(f"Axe inconnu : {axe} (possibles : {', '.join(AXES)})")
+    if periode not in PERIODES:
+        raise ValueError(f"Période inconnue : {periode} (possibles : {', '.join(PERIODES)})")
+    arguments: Dict[str, Any] = {'axe': axe, 'periode': periode, 'filtres': lire_filtres(parametres)}
+    for nom in ('debut', 'fin'):
+        valeur = (parametres.get(nom) or '').strip()
+        arguments[nom] = _lire_mois(valeur, nom) if valeur else None
+    return arguments
+
+
+def _a_partir(mois: Tuple[int, int], fin: bool = False) -> ColumnElement[bool]:
+    """Critère de période sur (année, mois), développé pour rester exploitable par l'index (annee, mois)."""
+    annee, numero = mois
+    if fin:
+        return or_(Depense.annee < annee, and_(Depense.annee == annee, Depense.mois <= numero))
+    return or_(Depense.annee > annee, and_(Depense.annee == annee, Depense.mois >= numero))
+
+
+def _libelle(axe: str, ligne: Mapping[str, Any]) -> str:
+    """Retourne le libellé d'une ligne d'analyse selon son axe."""
+    if axe == 'contrat':
+        return f"{ligne['intitule']} ({ligne['entreprise']})"
+    if axe == 'sous_type':
+        return f"{ligne['type_contrat']} / {ligne['sous_type_contrat']}"
+    return str(ligne[AXES[axe][0].key])
+
+
+def analyser(session: Session, axe: str = 'type', periode: str = PERIODE_MOIS,
+             debut: Optional[Tuple[int, int]] = None, fin: Optional[Tuple[int, int]] = None,
+             filtres: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Retourne les dépenses regroupées par axe et par période, depuis la table de cumuls.
+    Args:
+        session (Session): La session de base de données.
+        axe (str): 'contrat', 'entreprise', 'type' ou 'sous_type'.
+        periode (str): 'mois' ou 'annee'.
+        debut (Optional[Tuple[int, int]]): Le premier mois inclus (année, mois).
+        fin (Optional[Tuple[int, int]]): Le dernier mois inclus (année, mois).
+        filtres (Optional[Dict[str, str]]): Les filtres de contrats (voir export_contrats.lire_filtres).
+    Returns:
+        Dict[str, Any]: Les périodes ('2026-03' ou '2026'), une ligne par valeur de l'axe
+            (libellé, montant par période, total) triées par total décroissant, et le total général.
+    Exemples:
+        ```python
+        analyser(session, axe='entreprise', periode='annee')['lignes'][0]
+        # {'libelle': 'EDF', 'montants': {'2025': 1200.0, '2026': 300.0}, 'nb_factures': 14, 'total': 1500.0}
+        ```
+    """
+    colonnes = AXES[axe]
+    temps = (Depense.annee, Depense.mois) if periode == PERIODE_MOIS else (Depense.annee,)
+    conditions = criteres(filtres or {})
+    if debut:
+        conditions.append(_a_partir(debut))
+    if fin:
+        conditions.append(_a_partir(fin, fin=True))
+    requete = (select(*colonnes, *temps, func.sum(Depense.montant).label('montant'),
+                      func.sum(Depense.nb_factures).label('nb_factures'))
+               .join(Contract, Contract.id == Depense.id_contrat)
+               .where(*conditions)
+               .group_by(*colonnes, *temps))
+
+    periodes: set = set()
+    lignes: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for ligne in session.execute(requete).mappings():
+        cle_periode = f"{ligne['annee']}-{ligne['mois']:02d}" if periode == PERIODE_MOIS else str(ligne['annee'])
+        periodes.add(cle_periode)
+        cle = tuple(ligne[colonne.key] for colonne in colonnes)
+        entree = lignes.setdefault(cle, {'libelle': _libelle(axe, ligne), 'montants': {}, 'nb_factures': 0,
+                                         'total': Decimal(0)})
+        entree['montants'][cle_periode] = float(ligne['montant'] or 0)
+        entree['nb_factures'] += int(ligne['nb_factures'] or 0)
+        entree['total'] += Decimal(ligne['montant'] or 0)
+
+    resultat = sorted(lignes.values(), key=lambda entree: (-entree['total'], entree['libelle']))
+    total = sum((entree['total'] for entree in resultat), Decimal(0))
+    for entree in resultat:
+        entree['total'] = float(entree['total'])
+    return {'axe': axe, 'periode': periode, 'periodes': sorted(periodes), 'lignes': resultat, 'total': float(total)}
+
+
+def reconstruire_depenses(session: Session) -> int:
+    """
+    Reconstruit entièrement la table de cumuls depuis 13_factures (réparation, contrôle).
+    Args:
+        session (Session): La session de base de données (validée par la fonction).
+    Returns:
+        int: Le nombre de cumuls mensuels écrits.
+    """
+    table = Depense.__table__
+    annee, mois = extract('year', Bill.date_facture), extract('month', Bill.date_facture)
+    session.execute(table.delete())
+    session.execute(table.insert().from_select(
+        ['id_contrat', 'annee', 'mois', 'montant', 'nb_factures'],
+        select(Bill.id_contrat, annee, mois, func.sum(Bill.montant), func.count(Bill.id))
+        .group_by(Bill.id_contrat, annee, mois)))
+    nombre = session.execute(select(func.count()).select_from(table)).scalar_one()
+    session.commit()
+    logger.info(f"Cumuls des dépenses reconstruits : {nombre} mois de contrat")
+    return nombre
+
+
+if __name__ == '__main__':
+    import argparse
+    from application import peraudiere, Session as SessionFactory
+
+    parser = argparse.ArgumentParser(description="Reconstruction des cumuls mensuels des factures (14_depenses).")
+    parser.parse_args()
+
+    with peraudiere.app_context(), SessionFactory() as db_session:
+        print(reconstruire_depenses(db_session))
@@ -1,12 +1,12 @@
-from flask import jsonify, send_file
+from flask import jsonify, send_file, Response, current_app, request, has_request_context
 from werkzeug.utils import secure_filename
-import os, io
+import os, io, hashlib, tempfile
 from os.path import splitext
 from config import ConfigDict
-from typing import cast
-from impression import print_file
+from typing import cast, Optional, Tuple
 from logging import getLogger
 from werkzeug.datastructures import FileStorage
+from urllib.parse import quote
 
 logger = getLogger(__name__)
 
@@ -19,9 +19,6 @@ def get_config() -> ConfigDict:
 def _get_folder() -> str:
     return get_config().get("UPLOAD_FOLDER", '/uploads')
 
-def _get_print_folder() -> str:
-    return get_config().get("PRINT_PATH", '/prints')
-
 # Validation des chemins (appelée lors du premier accès)
 _folder_initialized = False
 
@@ -34,8 +31,117 @@ def _ensure_folder_exists():
             os.makedirs(folder)
         _folder_initialized = True
 
+# Taille des blocs lus lors de l'enregistrement d'un fichier téléversé
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Marge tolérée pour l'enveloppe multipart et les autres champs du formulaire
+MULTIPART_MARGIN = 64 * 1024
+
+# Droits des fichiers enregistrés : lisibles par nginx (X-Accel-Redirect), mkstemp créant en 0600
+MODE_FICHIER = 0o644
+
+class UploadTooLargeError(ValueError):
+    """Fichier téléversé dépassant la taille autorisée pour son type."""
+
+def get_upload_limit(kind: str) -> Optional[int]:
+    """
+    Retourne la taille maximale (en octets) autorisée pour un type de fichier.
+    Args:
+        kind (str): Le type de fichier ('document', 'facture' ou 'signature').
+    Returns:
+        Optional[int]: La taille maximale, ou None si aucune limite n'est définie.
+    """
+    return current_app.config.get('UPLOAD_LIMITS', {}).get(kind)
+
+def stream_to_temp(file_to_upload: FileStorage, directory: str, *,
+                   max_size: Optional[int] = None) -> Tuple[str, str, int]:
+    """
+    Écrit un fichier téléversé par blocs dans un fichier temporaire d'un dossier.
+    Le SHA-256 et la taille sont calculés au fil de l'écriture. La limite de taille est
+    contrôlée dès la réception (longueur annoncée de la requête) puis au fil de la lecture.
+    Le fichier temporaire est supprimé en cas d'erreur.
+    Args:
+        file_to_upload (FileStorage): Le fichier téléversé.
+        directory (str): Le dossier du fichier temporaire (même système de fichiers que la destination).
+        max_size (Optional[int]): La taille maximale autorisée en octets.
+    Returns:
+        Tuple[str, str, int]: Le chemin du fichier temporaire, le SHA-256 (hexadécimal) et la taille.
+    Raises:
+        UploadTooLargeError: Si le fichier dépasse la taille maximale.
+    """
+    # Rejet immédiat si la requête annoncée est déjà trop volumineuse
+    if max_size is not None and has_request_context():
+        declared = request.content_length
+        if declared is not None and declared > max_size + MULTIPART_MARGIN:
+            raise UploadTooLargeError(f'Fichier trop volumineux (maximum {max_size // (1024 * 1024)} Mo)')
+
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    # Écriture par blocs dans un fichier temporaire
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            os.fchmod(f.fileno(), MODE_FICHIER)
+            while True:
+                chunk = file_to_upload.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLargeError(f'Fichier trop volumineux (maximum {max_size // (1024 * 1024)} Mo)')
+                digest.update(chunk)
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+def store_upload(file_to_upload: FileStorage, file_path: str, *,
+                 max_size: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Enregistre un fichier téléversé par blocs, sans le charger en mémoire.
+    Le SHA-256 et la taille sont calculés au fil de l'écriture dans un fichier temporaire
+    du dossier de destination, renommé atomiquement une fois complet : le fichier final
+    n'est jamais visible partiellement écrit et aucune étape ultérieure n'a besoin de le relire.
+    Args:
+        file_to_upload (FileStorage): Le fichier téléversé.
+        file_path (str): Le chemin complet du fichier de destination.
+        max_size (Optional[int]): La taille maximale autorisée en octets.
+    Returns:
+        Tuple[str, int]: Le SHA-256 (hexadécimal) et la taille du fichier.
+    Raises:
+        UploadTooLargeError: Si le fichier dépasse la taille maximale.
+    Exemples:
+        ```python
+        sha256, taille = store_upload(binary_file, '/uploads/contrat.pdf', max_size=20 * 1024 * 1024)
+        ```
+    """
+    temp_path, sha256, size = stream_to_temp(file_to_upload, os.path.dirname(file_path) or '.',
+                                             max_size=max_size)
+    try:
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    logger.info(f"Fichier enregistré : {file_path} ({size} octets)")
+    return sha256, size
+
 # Téléchargement du fichier vers le serveur
-def upload_file(file_to_upload: FileStorage, *, file_name: str):
+def upload_file(file_to_upload: FileStorage, *, file_name: str, kind: str = 'document') -> Tuple[str, int]:
+    """
+    Enregistre un fichier téléversé dans le dossier des documents.
+    Args:
+        file_to_upload (FileStorage): Le fichier téléversé.
+        file_name (str): Le nom du fichier (l'extension est reprise du fichier téléversé).
+        kind (str): Le type de fichier, pour la limite de taille ('document' ou 'facture').
+    Returns:
+        Tuple[str, int]: Le SHA-256 et la taille du fichier enregistré.
+    """
     _ensure_folder_exists()  # S'assurer que le dossier existe
     
     # Création du chemin du fichier sur le serveur
@@ -46,40 +152,62 @@ def upload_file(file_to_upload: FileStorage, *, file_name: str):
     file_name = secure_filename(splitext(file_name)[0]) + extension
     file_path = os.path.join(_get_folder(), file_name)
     
-    # Enregistrement du fichier sur le serveur
-    with open(file_path, 'wb') as f:
-        f.write(file_to_upload.read())
+    # Enregistrement du fichier sur le serveur (par blocs, renommage atomique)
+    return store_upload(file_to_upload, file_path, max_size=get_upload_limit(kind))
     
 # Transfert de deux fichiers (exchange files)
-def exchange_files(old_file_name: str, new_file: FileStorage, new_file_name: str):
+def exchange_files(old_file_name: str, new_file: FileStorage, new_file_name: str,
+                   kind: str = 'document') -> Optional[Tuple[str, int]]:
     """
     Fonction pour échanger un fichier existant sur le serveur avec un nouveau fichier.
-    Supprime l'ancien fichier et enregistre le nouveau fichier avec un nom potentiellement différent.
-    1. Supprime l'ancien fichier.
-    2. Enregistre le nouveau fichier avec le nouveau nom.
-    3. Gère les erreurs et retourne un booléen.
+    Enregistre le nouveau fichier avec un nom potentiellement différent puis supprime l'ancien.
+    1. Enregistre le nouveau fichier (par blocs, renommage atomique).
+    2. Supprime l'ancien fichier s'il porte un autre nom.
+    3. Retourne le SHA-256 et la taille du nouveau fichier, ou None en cas d'erreur.
+    En cas d'échec de l'enregistrement, l'ancien fichier est conservé intact.
+    Raises:
+        UploadTooLargeError: Si le nouveau fichier dépasse la taille maximale.
     """
     _ensure_folder_exists()  # S'assurer que le dossier existe
     
     try:
-        # Suppression de l'ancien fichier
-        old_file_path = os.path.join(_get_folder(), secure_filename(old_file_name))
-        if os.path.exists(old_file_path):
-            os.remove(old_file_path)
-
         # Création du chemin du nouveau fichier sur le serveur
         new_file_path = os.path.join(_get_folder(), secure_filename(new_file_name))
         
         # Enregistrement du nouveau fichier sur le serveur
-        with open(new_file_path, 'wb') as f:
-            f.write(new_file.read())
+        stored = store_upload(new_file, new_file_path, max_size=get_upload_limit(kind))
 
-        return True
+        # Suppression de l'ancien fichier
+        old_file_path = os.path.join(_get_folder(), secure_filename(old_file_name))
+        if old_file_path != new_file_path and os.path.exists(old_file_path):
+            os.remove(old_file_path)
+
+        return stored
     
+    except UploadTooLargeError:
+        raise
     except Exception:
-        return False
+        return None
 
  
+# Suppression d'un fichier stocké par nom (ancien stockage, avant le magasin par empreinte)
+def remove_file(file_name: str) -> bool:
+    """
+    Supprime un fichier du dossier des documents s'il existe.
+    Args:
+        file_name (str): Le nom du fichier avec son extension.
+    Returns:
+        bool: True si le fichier a été supprimé, False sinon.
+    """
+    try:
+        file_path = os.path.join(_get_folder(), secure_filename(file_name))
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+            return True
+        return False
+    except OSError:
+        return False
+
 # Fonction pour changer seulement le nom d'un fichier (rename file)
 def rename_file(old_file_name: str, new_file_name: str):
     _ensure_folder_exists()  # S'assurer que le dossier existe
@@ -99,23 +227,85 @@ def rename_file(old_file_name: str, new_file_name: str):
     except Exception:
         return False
     
+# Emplacements internes nginx associés aux dossiers de stockage (voir nginx/nginx.conf)
+ACCEL_LOCATIONS = {
+    'UPLOAD_FOLDER': '/_fichiers/documents/',
+    'SIGNATURE_PATH': '/_fichiers/signatures/',
+}
+
+def _get_accel_uri(file_path: str) -> Optional[str]:
+    """
+    Retourne l'URI interne nginx d'un fichier, ou None s'il n'est dans aucun dossier publié.
+    Le chemin réel est contrôlé pour empêcher toute sortie du dossier (liens, '..').
+    """
+    real_path = os.path.realpath(file_path)
+    roots = [(os.path.realpath(current_app.config[config_key]), location)
+             for config_key, location in ACCEL_LOCATIONS.items() if current_app.config.get(config_key)]
+
+    # Le dossier le plus spécifique l'emporte (dossier de signatures imbriqué dans celui des documents)
+    for real_root, location in sorted(roots, key=lambda root: len(root[0]), reverse=True):
+        if os.path.commonpath([real_root, real_path]) == real_root and real_path != real_root:
+            relative = os.path.relpath(real_path, real_root).replace(os.sep, '/')
+            return location + quote(relative)
+    return None
+
+# Envoi d'un fichier stocké sur le disque (streaming, Range, ETag)
+def send_stored_file(file_path: str, *, download_name: str, etag: Optional[str] = None,
+                     as_attachment: bool = True, mimetype: Optional[str] = None) -> Response:
+    """
+    Envoie un fichier stocké sur le disque sans le charger en mémoire.
+    En mode 'nginx' (FILE_DELIVERY_MODE), la réponse ne contient qu'un en-tête
+    `X-Accel-Redirect` : nginx envoie lui-même le fichier (sendfile, Range, ETag).
+    Sinon (mode 'flask', développement), le fichier est lu par blocs, les requêtes `Range`
+    reçoivent une réponse `206` et une requête `If-None-Match` correspondant à l'ETag
+    reçoit une réponse `304`.
+    Les fichiers situés hors des dossiers publiés par nginx sont toujours envoyés par l'application.
+    Args:
+        file_path (str): Le chemin complet du fichier.
+        download_name (str): Le nom proposé au client.
+        etag (Optional[str]): L'ETag à utiliser (hash stocké en base), sinon calculé depuis le fichier.
+        as_attachment (bool): Envoi en pièce jointe (True) ou en affichage (False).
+        mimetype (Optional[str]): Le type MIME, déduit du nom si absent.
+    Returns:
+        Response: La réponse Flask.
+    Raises:
+        FileNotFoundError: Si le fichier n'existe pas.
+    """
+    if current_app.config.get('FILE_DELIVERY_MODE') == 'nginx':
+        accel_uri = _get_accel_uri(file_path)
+        if accel_uri:
+            if not os.path.isfile(file_path):
+                raise FileNotFoundError(file_path)
+            # Réponse vide : nginx conserve les en-têtes de présentation (type, nom du fichier, cache)
+            presentation = send_file(io.BytesIO(), as_attachment=as_attachment, download_name=download_name,
+                                     mimetype=mimetype, conditional=False, etag=False)
+            response = Response(b'', headers={'Content-Type': presentation.headers['Content-Type'],
+                                              'Content-Disposition': presentation.headers['Content-Disposition'],
+                                              'X-Accel-Redirect': accel_uri})
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+    response = send_file(file_path, as_attachment=as_attachment, download_name=download_name,
+                         mimetype=mimetype, conditional=True, etag=etag or True, max_age=0)
+    response.cache_control.private = True
+    return response
+
+# Chemin d'un fichier stocké (magasin par empreinte ou, avant migration, dossier des documents)
+def stored_file_path(file_name_with_ext: str, file_path: Optional[str] = None) -> str:
+    return file_path or os.path.join(_get_folder(), secure_filename(file_name_with_ext))
+
 # Téléchargement du fichier depuis le serveur
-def download_file(file_name_with_ext: str):
+def download_file(file_name_with_ext: str, etag: Optional[str] = None, file_path: Optional[str] = None):
     _ensure_folder_exists()  # S'assurer que le dossier existe
     
     try:
-        # Création du chemin du fichier sur le serveur
-        remote_file_path = os.path.join(_get_folder(), secure_filename(file_name_with_ext))
-
-        # Transfert du fichier depuis le serveur
-        with open(remote_file_path, 'rb') as f:
-            file_data = f.read()
+        # Création du chemin du fichier sur le serveur (sauf chemin fourni, fichier du magasin par empreinte)
+        file_name = secure_filename(file_name_with_ext)
+        remote_file_path = stored_file_path(file_name, file_path)
 
-        # Création d'un objet pour envoyer le fichier au client
-        file_stream = io.BytesIO(file_data)
-        file_stream.seek(0)
-
-        return send_file(file_stream, as_attachment=True, download_name=secure_filename(file_name_with_ext))
+        # Envoi du fichier par blocs depuis le disque
+        return send_stored_file(remote_file_path, download_name=file_name, etag=etag)
     
     except FileNotFoundError:
         return jsonify({'erreur': f'Erreur de fichier introuvable : {file_name_with_ext}'}), 404
@@ -140,29 +330,3 @@ def delete_file(file_name: str, extension: str):
 
     except Exception as e:
         return jsonify({'erreur': f'Erreur inconnue : {e}'})
-
-# Impression du fichier vers le serveur d'impression
-def print_document(file: io.BytesIO, file_name: str, extension: str, copies: str, username: str, sides: str, media: str, orientation: str, color: str):
-    
-    try:
-        # Création du chemin du fichier sur le serveur
-        file_name = secure_filename(file_name) + '.' + extension
-        file_path = os.path.join(_get_print_folder(), file_name)
-        logger.info(f"Preparing to print file: {file_path}")
-        
-        # Transfert du fichier vers le serveur
-        with open(file_path, 'wb') as f:
-            f.write(file.read())
-            logger.info(f"File {file_path} written to print directory")
-        
-        # Impression du fichier
-        print_file(file_path, username, 'Intranet' , copies, sides, media, orientation, color)
-        logger.info(f"Print command sent for file: {file_path}")
-        os.remove(file_path)
-        logger.info(f"File {file_path} removed from print directory after printing")
-        
-        return jsonify({'message': 'Document imprimé avec succès'})
-    
-    except Exception as e:
-        return jsonify({'erreur': f'Erreur lors de l\'impression : {e}'})
-    
\ No newline at end of file
@@ -12,5 +12,12 @@ if [ -n "$DB_URL" ]; then
   sed -i "s|^sqlalchemy.url =.*|sqlalchemy.url = $DB_URL|" /app/alembic.ini
 fi
 
+# Publication des fichiers statiques pour nginx (volume partagé)
+if [ -n "$STATIC_DOCKER_PATH" ]; then
+  mkdir -p "$STATIC_DOCKER_PATH"
+  cp -a /app/app/static/. "$STATIC_DOCKER_PATH"/
+  echo "🎨 Fichiers statiques publiés dans $STATIC_DOCKER_PATH"
+fi
+
 echo "🚀 Lancement de l'application Flask (run.py)..."
 exec python app/run.py
@@ -0,0 +1,90 @@
+"""
+=============================================================
+Expiration des signatures de l'Intranet API'Raudière
+=============================================================
+Module de passage au statut « expiré » (-1) des documents à signer, des points de
+signature et des invitations dont l'échéance est dépassée.
+
+Le traitement est ensembliste : quelques `INSERT ... SELECT` pour l'audit puis des
+`UPDATE` en masse, sans charger aucune ligne en mémoire. Les écrans de liste peuvent
+ainsi filtrer sur le seul statut (indexé) au lieu de comparer les dates d'échéance.
+
+Auteur : Rémi Verschuur
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import insert, select, update, literal, and_, or_
+from sqlalchemy.orm import Session
+from models import DocToSigne, Points, Invitation, AuditLog
+from audit import ACTION_EXPIRER, CODE_DOCUMENT_EXPIRE, CODE_INVITATION_EXPIREE
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Statuts communs aux documents, points et invitations
+STATUS_EXPIRE = -1
+STATUS_EN_ATTENTE = 0
+
+
+def expirer_signatures(session: Session, maintenant: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Passe en statut expiré les documents, points et invitations dont l'échéance est dépassée.
+    Les lignes d'audit sont écrites en masse avant les mises à jour, sur le même critère,
+    dans la même transaction. Le commit est laissé à l'appelant.
+    Args:
+        session (Session): La session de base de données.
+        maintenant (Optional[datetime]): La date de référence (défaut : maintenant).
+    Returns:
+        Dict[str, int]: Le nombre de documents, points et invitations expirés.
+    Exemples:
+        ```python
+        compteurs = expirer_signatures(session)
+        session.commit()
+        ```
+    """
+    maintenant = maintenant or datetime.now()
+
+    # Critères d'expiration
+    document_expire = and_(DocToSigne.status == STATUS_EN_ATTENTE,
+                           DocToSigne.limite_signature < maintenant)
+    documents_expires = select(DocToSigne.id).where(DocToSigne.status == STATUS_EXPIRE)
+    invitation_expiree = and_(Invitation.status == STATUS_EN_ATTENTE,
+                              or_(Invitation.expire_at < maintenant,
+                                  Invitation.id_document.in_(documents_expires)))
+
+    # Audit des documents arrivés à échéance (avant leur mise à jour)
+    session.execute(insert(AuditLog).from_select(
+        ['id_document', 'id_user', 'action', 'code', 'timestamp'],
+        select(DocToSigne.id, DocToSigne.id_user, literal(ACTION_EXPIRER),
+               literal(CODE_DOCUMENT_EXPIRE), literal(maintenant))
+        .where(document_expire)))
+
+    # Documents
+    nb_documents = session.execute(
+        update(DocToSigne).where(document_expire).values(status=STATUS_EXPIRE),
+        execution_options={'synchronize_session': False}).rowcount
+
+    # Points encore en attente des documents expirés
+    nb_points = session.execute(
+        update(Points)
+        .where(Points.status == STATUS_EN_ATTENTE, Points.id_document.in_(documents_expires))
+        .values(status=STATUS_EXPIRE),
+        execution_options={'synchronize_session': False}).rowcount
+
+    # Audit des invitations expirées (avant leur mise à jour)
+    session.execute(insert(AuditLog).from_select(
+        ['id_document', 'id_user', 'action', 'code', 'timestamp'],
+        select(Invitation.id_document, Invitation.id_user, literal(ACTION_EXPIRER),
+               literal(CODE_INVITATION_EXPIREE), literal(maintenant))
+        .where(invitation_expiree)))
+
+    # Invitations échues ou rattachées à un document expiré
+    nb_invitations = session.execute(
+        update(Invitation).where(invitation_expiree).values(status=STATUS_EXPIRE),
+        execution_options={'synchronize_session': False}).rowcount
+
+    compteurs = {'documents': nb_documents, 'points': nb_points, 'invitations': nb_invitations}
+    if any(compteurs.values()):
+        logger.info(f"Expiration des signatures : {compteurs}")
+    return compteurs
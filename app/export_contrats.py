@@ -0,0 +1,248 @@
+"""
+=============================================================
+Exportation des contrats de l'Intranet API'Raudière
+=============================================================
+Exportation du portefeuille de contrats en CSV, JSON Lines ou XLSX, avec au choix
+leurs contacts, évènements et factures.
+
+Les filtres sont ceux de la liste des contrats (type et sous-type). Les contrats sont
+lus par lots successifs sur la clé primaire (`id > dernier id lu`), les éléments liés
+d'un lot par une requête par nature (`id_contrat IN (...)`). Chaque lot est lu dans
+une transaction courte sur une connexion rendue au pool aussitôt : un client lent ne
+retient ni transaction ni connexion, et la mémoire utilisée ne dépend pas du nombre de
+contrats exportés (le pilote mysqlconnector n'offre pas de curseur côté serveur et met
+en mémoire tout le résultat d'une requête).
+
+Formats :
+- CSV : une ligne par contrat ; avec un détail (un seul), une ligne par élément lié,
+  précédée des colonnes de son contrat ;
+- JSON Lines : un objet par contrat, les éléments liés en listes ;
+- XLSX : une feuille par nature, aux colonnes du fichier d'import (voir import_contrats),
+  écrite en mode flux dans un fichier temporaire puis envoyée par blocs.
+
+Exemple :
+    ```python
+    filtres = lire_filtres({'TypeFiltre': 'Services'})
+    for bloc in exporter(engine, 'jsonl', filtres, details=('contacts',)):
+        ...
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Mapping, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.elements import ColumnElement
+from models import Contract
+from import_contrats import NATURES, NATURE_CONTRATS, REFERENCE
+from logging import getLogger
+import csv
+import io
+import json
+import tempfile
+
+logger = getLogger(__name__)
+
+# Nombre de contrats lus par lot
+LOT_EXPORT = 500
+
+# Taille des blocs envoyés pour un fichier XLSX
+BLOC_FICHIER = 64 * 1024
+
+# Type MIME des exportations
+TYPES_EXPORT = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8',
+                'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+
+# Filtres de la liste des contrats (paramètre du formulaire -> colonne)
+FILTRES = {'TypeFiltre': 'type_contrat', 'STypeFiltre': 'sous_type_contrat'}
+
+# Natures des éléments liés exportables
+DETAILS = tuple(nature for nature in NATURES if nature != NATURE_CONTRATS)
+
+# Noms des feuilles XLSX (relus par import_contrats.lire_fichier)
+FEUILLES = {'contrats': 'Contrats', 'contacts': 'Contacts', 'evenements': 'Evènements', 'factures': 'Factures'}
+
+
+def lire_filtres(parametres: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Lit les filtres de la liste des contrats depuis des paramètres de requête.
+    Args:
+        parametres (Mapping[str, str]): Les paramètres ('TypeFiltre', 'STypeFiltre').
+    Returns:
+        Dict[str, str]: Les filtres renseignés (colonne -> valeur).
+    """
+    return {colonne: parametres[nom].strip() for nom, colonne in FILTRES.items() if (parametres.get(nom) or '').strip()}
+
+
+def criteres(filtres: Dict[str, str]) -> List[ColumnElement[bool]]:
+    """Traduit les filtres en critères SQL sur les contrats."""
+    return [getattr(Contract, colonne) == valeur for colonne, valeur in filtres.items()]
+
+
+def lire_details(texte: str, format_export: str) -> Tuple[str, ...]:
+    """
+    Lit la liste des éléments liés demandés ('contacts,factures').
+    Raises:
+        ValueError: Nature inconnue, ou plusieurs natures pour un export CSV.
+    """
+    details = tuple(nature for nature in DETAILS if nature in {valeur.strip() for valeur in texte.split(',')})
+    inconnues = {valeur.strip() for valeur in texte.split(',') if valeur.strip()} - set(details)
+    if inconnues:
+        raise ValueError(f"Détail inconnu : {', '.join(sorted(inconnues))} (possibles : {', '.join(DETAILS)})")
+    if format_export == 'csv' and len(details) > 1:
+        raise ValueError("Un seul détail par export CSV (XLSX ou JSON Lines pour plusieurs)")
+    return details
+
+
+def colonnes(nature: str) -> List[str]:
+    """Retourne les colonnes exportées d'une nature (identifiants puis colonnes du fichier d'import)."""
+    if nature == NATURE_CONTRATS:
+        return ['id', *NATURES[nature][1]]
+    return ['id', REFERENCE, *NATURES[nature][1]]
+
+
+def _valeur(valeur: Any) -> Any:
+    """Convertit une valeur de colonne en valeur exportable (dates ISO, montants décimaux en nombre)."""
+    if isinstance(valeur, date):
+        return valeur.isoformat()
+    if isinstance(valeur, Decimal):
+        return float(valeur)
+    return valeur
+
+
+def parcourir(engine: Engine, filtres: Dict[str, str], details: Sequence[str] = (),
+              lot: int = LOT_EXPORT) -> Iterator[Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]]:
+    """
+    Parcourt les contrats filtrés par identifiant croissant, avec leurs éléments liés.
+    Chaque lot est lu sur une connexion et dans une transaction propres, libérées avant
+    que ses lignes ne soient produites.
+    Args:
+        engine (Engine): Le moteur de base de données.
+        filtres (Dict[str, str]): Les filtres (voir lire_filtres).
+        details (Sequence[str]): Les natures des éléments liés à joindre.
+        lot (int): Le nombre de contrats lus par lot.
+    Returns:
+        Iterator[Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]]: Chaque contrat et ses éléments par nature.
+    """
+    table = Contract.__table__
+    dernier = 0
+    while True:
+        with engine.connect() as connexion:
+            contrats = [dict(ligne) for ligne in connexion.execute(
+                select(table).where(*criteres(filtres), table.c.id > dernier).order_by(table.c.id).limit(lot)
+            ).mappings()]
+            identifiants = [contrat['id'] for contrat in contrats]
+            lies: Dict[str, Dict[int, List[Dict[str, Any]]]] = {nature: {} for nature in details}
+            for nature in details if identifiants else ():
+                table_liee = NATURES[nature][0].__table__
+                for ligne in connexion.execute(select(table_liee).where(table_liee.c.id_contrat.in_(identifiants))
+                                               .order_by(table_liee.c.id_contrat, table_liee.c.id)).mappings():
+                    lies[nature].setdefault(ligne['id_contrat'], []).append(dict(ligne))
+        for contrat in contrats:
+            yield contrat, {nature: lies[nature].get(contrat['id'], []) for nature in details}
+        if len(contrats) < lot:
+            return
+        dernier = identifiants[-1]
+
+
+def _ligne(nature: str, valeurs: Dict[str, Any], contrat: Dict[str, Any]) -> List[Any]:
+    """Retourne les valeurs d'une ligne exportée, dans l'ordre des colonnes de sa nature."""
+    valeurs = {**valeurs, REFERENCE: contrat[REFERENCE]}
+    return [_valeur(valeurs.get(colonne)) for colonne in colonnes(nature)]
+
+
+def exporter_csv(lignes: Iterator[Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]],
+                 details: Sequence[str] = (), lot: int = LOT_EXPORT) -> Iterator[str]:
+    """
+    Produit l'exportation CSV (séparateur ';'), par blocs de `lot` contrats.
+    Avec un détail, chaque ligne est un élément lié précédé des colonnes de son contrat ;
+    un contrat sans élément lié figure sur une ligne aux colonnes du détail vides (jointure externe).
+    """
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon, delimiter=';')
+    detail = details[0] if details else None
+    entete = colonnes(NATURE_CONTRATS)
+    if detail:
+        entete = ['id_contrat', *entete[1:], *(colonne for colonne in colonnes(detail) if colonne != REFERENCE)]
+    ecrivain.writerow(entete)
+    for numero, (contrat, lies) in enumerate(lignes, start=1):
+        valeurs_contrat = _ligne(NATURE_CONTRATS, contrat, contrat)
+        if detail is None:
+            ecrivain.writerow(valeurs_contrat)
+        elif not lies.get(detail):
+            ecrivain.writerow(valeurs_contrat + [None] * (len(entete) - len(valeurs_contrat)))
+        for element in lies.get(detail, []) if detail else ():
+            ecrivain.writerow(valeurs_contrat + [_valeur(element.get(colonne)) for colonne in colonnes(detail)
+                                                 if colonne != REFERENCE])
+        if numero % lot == 0:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    yield tampon.getvalue()
+
+
+def exporter_jsonl(lignes: Iterator[Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]],
+                   lot: int = LOT_EXPORT) -> Iterator[str]:
+    """
+    Produit l'exportation JSON Lines (un objet par contrat, éléments liés en listes), par blocs de `lot` contrats.
+    """
+    bloc: List[str] = []
+    for contrat, lies in lignes:
+        objet = {colonne: _valeur(valeur) for colonne, valeur in contrat.items()}
+        for nature, elements in lies.items():
+            objet[nature] = [{colonne: _valeur(valeur) for colonne, valeur in element.items()} for element in elements]
+        bloc.append(json.dumps(objet, ensure_ascii=False))
+        if len(bloc) == lot:
+            yield '\n'.join(bloc) + '\n'
+            bloc = []
+    if bloc:
+        yield '\n'.join(bloc) + '\n'
+
+
+def exporter_xlsx(lignes: Iterator[Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]],
+                  details: Sequence[str] = ()) -> Iterator[bytes]:
+    """
+    Produit l'exportation XLSX (une feuille par nature). Le classeur est écrit en mode flux
+    (openpyxl, lignes écrites sur disque au fil de l'eau) dans un fichier temporaire,
+    puis envoyé par blocs une fois complet (format zip).
+    """
+    from openpyxl import Workbook
+
+    classeur = Workbook(write_only=True)
+    feuilles = {nature: classeur.create_sheet(FEUILLES[nature]) for nature in (NATURE_CONTRATS, *details)}
+    for nature, feuille in feuilles.items():
+        feuille.append(colonnes(nature))
+    for contrat, lies in lignes:
+        feuilles[NATURE_CONTRATS].append(_ligne(NATURE_CONTRATS, contrat, contrat))
+        for nature, elements in lies.items():
+            for element in elements:
+                feuilles[nature].append(_ligne(nature, element, contrat))
+    with tempfile.TemporaryFile() as fichier:
+        classeur.save(fichier)
+        fichier.seek(0)
+        while bloc := fichier.read(BLOC_FICHIER):
+            yield bloc
+
+
+def exporter(engine: Engine, format_export: str, filtres: Dict[str, str], details: Sequence[str] = (),
+             lot: int = LOT_EXPORT) -> Iterator[Any]:
+    """
+    Produit l'exportation des contrats filtrés dans le format demandé.
+    Args:
+        engine (Engine): Le moteur de base de données.
+        format_export (str): 'csv', 'jsonl' ou 'xlsx'.
+        filtres (Dict[str, str]): Les filtres (voir lire_filtres).
+        details (Sequence[str]): Les natures des éléments liés à joindre (voir lire_details).
+        lot (int): Le nombre de contrats lus par lot.
+    Returns:
+        Iterator[Any]: Les blocs du fichier (texte, ou octets pour XLSX).
+    """
+    lignes = parcourir(engine, filtres, details, lot)
+    if format_export == 'csv':
+        return exporter_csv(lignes, details, lot)
+    if format_export == 'jsonl':
+        return exporter_jsonl(lignes, lot)
+    return exporter_xlsx(lignes, details)
@@ -0,0 +1,115 @@
+"""
+=============================================================
+Cache de fragments de l'Intranet API'Raudière
+=============================================================
+Extension Jinja de mise en cache des parties stables des pages (grilles de modules,
+menus), rendues une fois puis réutilisées tant que leur clé ne change pas.
+
+La clé d'un fragment comprend son nom, le gabarit qui le contient et la date de
+modification de ce gabarit, ainsi que les valeurs données dans la balise (ensemble
+d'habilitations, contexte, version d'un fichier JSON). Un fragment est donc rendu à
+nouveau dès que son gabarit ou ses fichiers JSON changent sur le disque. Les parties
+variables (messages) restent hors des balises et sont rendues à chaque requête.
+
+Le cache, borné, est propre à chaque processus.
+
+Exemple :
+    ```jinja
+    {% cache 'modules', version_json('modules.json'), habilitation_levels %}
+        {% for section in sections %}...{% endfor %}
+    {% endcache %}
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.parser import Parser
+from markupsafe import Markup
+from logging import getLogger
+import os
+
+logger = getLogger(__name__)
+
+# Nombre maximal de fragments conservés par processus
+CAPACITE = 256
+
+# Dossier des fichiers JSON de l'application (voir utilities.get_jsoned_datas)
+DOSSIER_JSON = os.path.join(os.path.dirname(__file__), 'json')
+
+
+def version_json(fichier: str) -> float:
+    """
+    Retourne la version (date de modification) d'un fichier du dossier 'json', à placer
+    dans la clé des fragments construits depuis ce fichier.
+    Args:
+        fichier (str): Le nom du fichier JSON.
+    Returns:
+        float: La date de modification du fichier.
+    """
+    return os.path.getmtime(os.path.join(DOSSIER_JSON, fichier))
+
+
+def _version_gabarit(chemin: Optional[str]) -> float:
+    """Retourne la date de modification d'un gabarit (0 s'il n'est pas lu depuis un fichier)."""
+    try:
+        return os.path.getmtime(chemin) if chemin else 0.0
+    except OSError:
+        return 0.0
+
+
+def _figer(valeur: Any) -> Hashable:
+    """Convertit une valeur de clé en valeur hachable (listes, ensembles et dictionnaires compris)."""
+    if isinstance(valeur, (list, tuple)):
+        return tuple(_figer(element) for element in valeur)
+    if isinstance(valeur, (set, frozenset)):
+        return tuple(sorted(_figer(element) for element in valeur))
+    if isinstance(valeur, dict):
+        return tuple(sorted((cle, _figer(element)) for cle, element in valeur.items()))
+    return valeur
+
+
+class CacheFragments(Extension):
+    """
+    Extension Jinja : balise `{% cache nom, cle... %}...{% endcache %}`.
+    Attributs de l'environnement :
+        cache_fragments (OrderedDict): Les fragments rendus, du moins au plus récemment utilisé.
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment: Any) -> None:
+        super().__init__(environment)
+        self._verrou = Lock()
+        environment.extend(cache_fragments=OrderedDict(), cache_fragments_capacite=CAPACITE)
+
+    def parse(self, parser: Parser) -> nodes.Node:
+        """Lit la balise : nom du fragment puis valeurs de clé, séparés par des virgules."""
+        lineno = next(parser.stream).lineno
+        cles: List[nodes.Expr] = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            cles.append(parser.parse_expression())
+        corps = parser.parse_statements(('name:endcache',), drop_needle=True)
+        appel = self.call_method('_rendre', [nodes.Const(parser.name), nodes.Const(parser.filename),
+                                             nodes.List(cles)])
+        return nodes.CallBlock(appel, [], [], corps).set_lineno(lineno)
+
+    def _rendre(self, gabarit: Optional[str], chemin: Optional[str], cles: List[Any],
+                caller: Callable[[], str]) -> Markup:
+        """Retourne le fragment en cache, ou le rend et le met en cache."""
+        cle: Tuple[Hashable, ...] = (gabarit, _version_gabarit(chemin), *(_figer(valeur) for valeur in cles))
+        cache: 'OrderedDict[Tuple[Hashable, ...], Markup]' = self.environment.cache_fragments  # type: ignore
+        with self._verrou:
+            fragment = cache.get(cle)
+            if fragment is not None:
+                cache.move_to_end(cle)
+                return fragment
+        fragment = Markup(caller())
+        with self._verrou:
+            cache[cle] = fragment
+            while len(cache) > self.environment.cache_fragments_capacite:  # type: ignore
+                cache.popitem(last=False)
+        return fragment
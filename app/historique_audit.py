@@ -0,0 +1,242 @@
+"""
+=============================================================
+Consultation du journal d'audit de l'Intranet API'Raudière
+=============================================================
+Module de consultation et d'exportation de l'historique `24_audit_logs`.
+
+Les filtres (document, utilisateur, action, code, période) correspondent aux index
+(colonne filtrée, `timestamp`) de la table, et la période limite les partitions lues.
+La pagination se fait par clé (`timestamp`, `id`) : chaque page reprend après la
+dernière ligne de la précédente (curseur opaque), à coût constant quelle que soit sa
+profondeur, sans `OFFSET` ni comptage.
+
+L'exportation (CSV ou JSON Lines) est produite par des générateurs : les lignes sont
+lues par lots successifs sur la même clé, dans une seule transaction (instantané
+cohérent), et écrites au fil de l'eau. La mémoire utilisée ne dépend pas du nombre de
+lignes exportées, le pilote mysqlconnector mettant en mémoire tout le résultat d'une
+requête (pas de curseur côté serveur).
+
+Exemple :
+    ```python
+    filtres = lire_filtres({'id_document': '12', 'debut': '2026-01-01'})
+    page = page_audit(g.db_session, filtres)
+    suite = page_audit(g.db_session, filtres, apres=page['suivant'])
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+from sqlalchemy import and_, or_, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+from models import AuditLog
+from audit import LIBELLES_ACTIONS, libelle
+from logging import getLogger
+import csv
+import io
+import json
+
+logger = getLogger(__name__)
+
+# Taille des pages de consultation
+PAR_PAGE = 50
+MAX_PAR_PAGE = 500
+
+# Nombre de lignes lues par requête lors d'une exportation
+LOT_EXPORT = 1000
+
+# Colonnes exportées, dans l'ordre
+COLONNES_EXPORT = ['id', 'timestamp', 'action', 'action_libelle', 'code', 'libelle', 'details',
+                   'id_document', 'id_user', 'ip_addresse', 'user_agent']
+
+# Filtres entiers acceptés
+FILTRES_ENTIERS = ('id_document', 'id_user', 'action', 'code')
+
+# Séparateur du curseur de pagination (date ISO puis identifiant)
+SEPARATEUR_CURSEUR = '_'
+
+
+def _lire_date(texte: str, fin: bool = False) -> datetime:
+    """
+    Convertit une date ISO (jour ou date et heure). Une date de fin sans heure couvre tout le jour.
+    """
+    valeur = datetime.fromisoformat(texte)
+    if fin and len(texte) == 10:
+        valeur += timedelta(days=1)
+    return valeur
+
+
+def lire_filtres(parametres: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Lit les filtres de consultation depuis des paramètres de requête.
+    Args:
+        parametres (Mapping[str, str]): Les paramètres ('id_document', 'id_user', 'action', 'code',
+                                        'debut' et 'fin' au format ISO, 'fin' exclue sauf date seule).
+    Returns:
+        Dict[str, Any]: Les filtres renseignés, convertis.
+    Raises:
+        ValueError: Si un filtre est invalide.
+    Exemples:
+        ```python
+        lire_filtres({'id_user': '3', 'debut': '2026-01-01', 'fin': '2026-03-31'})
+        ```
+    """
+    filtres: Dict[str, Any] = {}
+    for nom in FILTRES_ENTIERS:
+        valeur = (parametres.get(nom) or '').strip()
+        if valeur:
+            if not valeur.lstrip('-').isdigit():
+                raise ValueError(f"Filtre '{nom}' invalide : {valeur}")
+            filtres[nom] = int(valeur)
+    if 'action' in filtres and filtres['action'] not in LIBELLES_ACTIONS:
+        raise ValueError(f"Action inconnue : {filtres['action']}")
+    for nom in ('debut', 'fin'):
+        valeur = (parametres.get(nom) or '').strip()
+        if valeur:
+            try:
+                filtres[nom] = _lire_date(valeur, fin=nom == 'fin')
+            except ValueError:
+                raise ValueError(f"Date '{nom}' invalide : {valeur}")
+    return filtres
+
+
+def criteres(filtres: Dict[str, Any]) -> List[ColumnElement[bool]]:
+    """
+    Traduit les filtres en critères SQL (égalités sur les colonnes indexées et période).
+    """
+    conditions: List[ColumnElement[bool]] = [getattr(AuditLog, nom) == filtres[nom]
+                                             for nom in FILTRES_ENTIERS if nom in filtres]
+    if 'debut' in filtres:
+        conditions.append(AuditLog.timestamp >= filtres['debut'])
+    if 'fin' in filtres:
+        conditions.append(AuditLog.timestamp < filtres['fin'])
+    return conditions
+
+
+def encoder_curseur(timestamp: datetime, id_ligne: int) -> str:
+    """Encode la position d'une ligne en curseur de pagination."""
+    return f'{timestamp.isoformat()}{SEPARATEUR_CURSEUR}{id_ligne}'
+
+
+def decoder_curseur(curseur: str) -> Tuple[datetime, int]:
+    """
+    Décode un curseur de pagination.
+    Raises:
+        ValueError: Si le curseur est invalide.
+    """
+    horodatage, _, id_ligne = curseur.rpartition(SEPARATEUR_CURSEUR)
+    if not horodatage or not id_ligne.isdigit():
+        raise ValueError(f"Curseur invalide : {curseur}")
+    return datetime.fromisoformat(horodatage), int(id_ligne)
+
+
+def _apres(position: Tuple[datetime, int], croissant: bool) -> ColumnElement[bool]:
+    """
+    Critère de reprise après une position (`timestamp`, `id`), développé pour rester
+    exploitable par les index (colonne filtrée, `timestamp`) et la clé primaire.
+    """
+    horodatage, id_ligne = position
+    if croissant:
+        return or_(AuditLog.timestamp > horodatage, and_(AuditLog.timestamp == horodatage, AuditLog.id > id_ligne))
+    return or_(AuditLog.timestamp < horodatage, and_(AuditLog.timestamp == horodatage, AuditLog.id < id_ligne))
+
+
+def _requete(filtres: Dict[str, Any], position: Optional[Tuple[datetime, int]], croissant: bool, limite: int) -> Any:
+    """Construit la requête d'une page ou d'un lot, triée sur (`timestamp`, `id`)."""
+    table = AuditLog.__table__
+    conditions = criteres(filtres)
+    if position is not None:
+        conditions.append(_apres(position, croissant))
+    ordre = (table.c.timestamp.asc(), table.c.id.asc()) if croissant \
+        else (table.c.timestamp.desc(), table.c.id.desc())
+    return select(table).where(*conditions).order_by(*ordre).limit(limite)
+
+
+def serialiser(ligne: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Convertit une ligne d'audit en dictionnaire exportable (date ISO, libellés de l'action et du code).
+    """
+    valeurs = dict(ligne)
+    valeurs['timestamp'] = valeurs['timestamp'].isoformat() if valeurs['timestamp'] else None
+    valeurs['action_libelle'] = LIBELLES_ACTIONS.get(valeurs['action'], 'inconnu')
+    valeurs['libelle'] = libelle(valeurs['code'], valeurs['details'])
+    return valeurs
+
+
+def page_audit(session: Session, filtres: Dict[str, Any], apres: Optional[str] = None,
+               par_page: int = PAR_PAGE) -> Dict[str, Any]:
+    """
+    Retourne une page d'événements, du plus récent au plus ancien.
+    Une ligne supplémentaire est demandée pour savoir s'il existe une page suivante.
+    Args:
+        session (Session): La session de base de données.
+        filtres (Dict[str, Any]): Les filtres (voir lire_filtres).
+        apres (Optional[str]): Le curseur retourné par la page précédente.
+        par_page (int): Le nombre d'événements par page (MAX_PAR_PAGE au maximum).
+    Returns:
+        Dict[str, Any]: Les événements, le nombre par page et le curseur de la page suivante (ou None).
+    Raises:
+        ValueError: Si le curseur est invalide.
+    """
+    par_page = min(max(par_page, 1), MAX_PAR_PAGE)
+    position = decoder_curseur(apres) if apres else None
+    lignes = session.execute(_requete(filtres, position, False, par_page + 1)).mappings().all()
+    evenements = [serialiser(ligne) for ligne in lignes[:par_page]]
+    suivant = None
+    if len(lignes) > par_page:
+        derniere = lignes[par_page - 1]
+        suivant = encoder_curseur(derniere['timestamp'], derniere['id'])
+    return {'evenements': evenements, 'par_page': par_page, 'suivant': suivant}
+
+
+def parcourir(connexion: Connection, filtres: Dict[str, Any], lot: int = LOT_EXPORT) -> Iterator[Mapping[str, Any]]:
+    """
+    Parcourt les événements filtrés dans l'ordre chronologique, par lots de `lot` lignes
+    (une requête indexée par lot, reprise après la dernière ligne lue).
+    Args:
+        connexion (Connection): La connexion (une transaction pour tout le parcours).
+        filtres (Dict[str, Any]): Les filtres (voir lire_filtres).
+        lot (int): Le nombre de lignes lues par requête.
+    Returns:
+        Iterator[Mapping[str, Any]]: Les lignes d'audit.
+    """
+    position: Optional[Tuple[datetime, int]] = None
+    while True:
+        lignes = connexion.execute(_requete(filtres, position, True, lot)).mappings().all()
+        yield from lignes
+        if len(lignes) < lot:
+            return
+        position = (lignes[-1]['timestamp'], lignes[-1]['id'])
+
+
+def exporter_csv(lignes: Iterator[Mapping[str, Any]], lot: int = LOT_EXPORT) -> Iterator[str]:
+    """
+    Produit l'exportation CSV (en-tête puis une ligne par événement), par blocs de `lot` lignes.
+    """
+    tampon = io.StringIO()
+    ecrivain = csv.DictWriter(tampon, fieldnames=COLONNES_EXPORT, extrasaction='ignore')
+    ecrivain.writeheader()
+    for numero, ligne in enumerate(lignes, start=1):
+        ecrivain.writerow(serialiser(ligne))
+        if numero % lot == 0:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    yield tampon.getvalue()
+
+
+def exporter_jsonl(lignes: Iterator[Mapping[str, Any]], lot: int = LOT_EXPORT) -> Iterator[str]:
+    """
+    Produit l'exportation JSON Lines (un objet par ligne), par blocs de `lot` lignes.
+    """
+    bloc: List[str] = []
+    for ligne in lignes:
+        bloc.append(json.dumps(serialiser(ligne), ensure_ascii=False))
+        if len(bloc) == lot:
+            yield '\n'.join(bloc) + '\n'
+            bloc = []
+    if bloc:
+        yield '\n'.join(bloc) + '\n'
@@ -0,0 +1,365 @@
+"""
+=============================================================
+Import en masse des contrats de l'Intranet API'Raudière
+=============================================================
+Import de contrats, contacts, évènements et factures depuis des fichiers CSV ou XLSX.
+
+Chaque nature de données a ses colonnes, nommées comme les attributs des modèles
+(`type_contrat`, `date_fin_preavis`, `montant`...). Les contacts, évènements et factures
+désignent leur contrat par la colonne `id_externe_contrat` (numéro de contrat), qu'il soit
+déjà en base ou importé dans le même fichier. Un fichier XLSX peut contenir une feuille
+par nature (« Contrats », « Contacts », « Evènements », « Factures ») ; un fichier CSV
+contient une seule nature (séparateur `;` ou `,`, dates `AAAA-MM-JJ` ou `JJ/MM/AAAA`).
+
+La validation est faite colonne par colonne sur l'ensemble du fichier (pandas) :
+champs obligatoires, longueurs, dates, montants, couples type / sous-type du fichier
+`menus.json` et numéros de contrat. Elle produit un rapport d'erreurs par ligne.
+L'écriture se fait dans une seule transaction, par lots d'insertions multiples
+(`executemany`) ; les échéances des contrats importés (table 03_echeances) et les cumuls
+mensuels des factures (table 14_depenses), maintenus d'ordinaire par les évènements de
+mapper, sont écrits de la même façon.
+
+Par défaut l'import est refusé en entier dès qu'une ligne est en erreur ; en mode partiel,
+les lignes valides sont importées et les autres sont rapportées.
+
+Exemple :
+    ```console
+    python app/import_contrats.py contrats.xlsx
+    python app/import_contrats.py contacts.csv --nature contacts --simulation
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from typing import Any, Dict, IO, List, Optional, Tuple, TYPE_CHECKING
+from sqlalchemy import Date, Numeric, String, Table, select
+from sqlalchemy.orm import Session
+from models import (Contract, Contacts, Event, Bill, Echeance, TYPE_ECHEANCE_PREAVIS, TYPE_ECHEANCE_FIN,
+                    cumuler_depenses)
+from utilities import get_jsoned_datas, JSON_MENUS, TYPINGS
+from logging import getLogger
+import io
+import os
+import unicodedata
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = getLogger(__name__)
+
+# Natures de données importables
+NATURE_CONTRATS = 'contrats'
+NATURE_CONTACTS = 'contacts'
+NATURE_EVENEMENTS = 'evenements'
+NATURE_FACTURES = 'factures'
+
+# Modèle et colonnes importées de chaque nature (dans l'ordre d'import : contrats d'abord)
+NATURES: Dict[str, Tuple[Any, Tuple[str, ...]]] = {
+    NATURE_CONTRATS: (Contract, ('type_contrat', 'sous_type_contrat', 'entreprise', 'id_externe_contrat',
+                                 'intitule', 'date_debut', 'date_fin_preavis', 'date_fin')),
+    NATURE_CONTACTS: (Contacts, ('nom', 'fonction', 'mail', 'tel_fixe', 'tel_portable',
+                                 'adresse', 'code_postal', 'ville')),
+    NATURE_EVENEMENTS: (Event, ('type_evenement', 'sous_type_evenement', 'date_evenement', 'descriptif')),
+    NATURE_FACTURES: (Bill, ('date_facture', 'titre_facture', 'montant')),
+}
+
+# Colonnes de typage contrôlées contre menus.json (clé du menu, type, sous-type)
+TYPAGES: Dict[str, Tuple[str, str, str]] = {
+    NATURE_CONTRATS: ('Contrats', 'type_contrat', 'sous_type_contrat'),
+    NATURE_EVENEMENTS: ('Evènements', 'type_evenement', 'sous_type_evenement'),
+}
+
+# Colonne de rattachement au contrat (numéro de contrat externe)
+REFERENCE = 'id_externe_contrat'
+
+# Nombre de lignes par insertion multiple
+TAILLE_LOT = 1000
+
+# Formats de date acceptés, dans l'ordre d'essai
+FORMATS_DATE = ('ISO8601', '%d/%m/%Y')
+
+# Numéro de la première ligne de données dans le fichier (ligne 1 : en-têtes)
+PREMIERE_LIGNE = 2
+
+
+def _normaliser(nom: Any) -> str:
+    """Normalise un nom de colonne ou de feuille : minuscules, sans accents ni espaces ('Date début' -> 'date_debut')."""
+    texte = unicodedata.normalize('NFKD', str(nom)).encode('ascii', 'ignore').decode('ascii')
+    return '_'.join(texte.strip().lower().replace('-', ' ').split())
+
+
+def _erreur(nature: str, ligne: Optional[int], colonne: Optional[str], message: str) -> Dict[str, Any]:
+    """Construit une entrée du rapport d'erreurs."""
+    return {'nature': nature, 'ligne': ligne, 'colonne': colonne, 'message': message}
+
+
+def _erreurs_masque(nature: str, frame: 'pd.DataFrame', masque: 'pd.Series', colonne: Optional[str],
+                    message: str) -> List[Dict[str, Any]]:
+    """Retourne une erreur par ligne sélectionnée par le masque."""
+    return [_erreur(nature, int(ligne), colonne, message) for ligne in frame.loc[masque, '_ligne']]
+
+
+def lire_fichier(flux: IO[bytes], nom_fichier: str, nature: Optional[str] = None) -> Dict[str, 'pd.DataFrame']:
+    """
+    Lit un fichier CSV ou XLSX et retourne ses données par nature.
+    Toutes les cellules sont lues comme du texte ; la conversion est faite à la validation.
+    Args:
+        flux (IO[bytes]): Le contenu du fichier.
+        nom_fichier (str): Le nom du fichier (l'extension détermine le format).
+        nature (Optional[str]): La nature des données d'un fichier CSV (ou d'un classeur à une feuille).
+    Returns:
+        Dict[str, pd.DataFrame]: Les données lues, par nature.
+    Raises:
+        ValueError: Format de fichier, nature ou feuille inconnus.
+    """
+    import pandas as pd
+
+    extension = os.path.splitext(nom_fichier)[1].lower()
+    if extension == '.csv':
+        if nature not in NATURES:
+            raise ValueError(f"Nature des données du fichier CSV à préciser parmi : {', '.join(NATURES)}")
+        contenu = flux.read()
+        entete = contenu.split(b'\n', 1)[0]
+        separateur = ';' if entete.count(b';') >= entete.count(b',') else ','
+        return {nature: pd.read_csv(io.BytesIO(contenu), sep=separateur, dtype=str, keep_default_na=False,
+                                    encoding='utf-8-sig')}
+    if extension in ('.xlsx', '.xlsm'):
+        feuilles: Dict[str, pd.DataFrame] = pd.read_excel(flux, sheet_name=None, dtype=str, keep_default_na=False)
+        if len(feuilles) == 1 and nature in NATURES:
+            return {nature: next(iter(feuilles.values()))}
+        donnees: Dict[str, pd.DataFrame] = {}
+        for nom_feuille, frame in feuilles.items():
+            nature_feuille = _normaliser(nom_feuille)
+            if nature_feuille not in NATURES:
+                raise ValueError(f"Feuille inconnue : {nom_feuille} (attendues : {', '.join(NATURES)})")
+            donnees[nature_feuille] = frame
+        return donnees
+    raise ValueError(f"Format de fichier non pris en charge : {extension or nom_fichier} (CSV ou XLSX)")
+
+
+def _couples_types(cle_menu: str) -> List[Tuple[str, str]]:
+    """Retourne les couples (type, sous-type) valides d'un menu de menus.json (valeurs vides exclues)."""
+    menu: Dict[str, List[str]] = get_jsoned_datas(file=JSON_MENUS, level_one=TYPINGS, level_two=cle_menu)
+    return [(type_, sous_type) for type_, sous_types in menu.items() for sous_type in sous_types
+            if type_ and sous_type]
+
+
+def _convertir_dates(serie: 'pd.Series') -> 'pd.Series':
+    """Convertit une colonne de textes en dates, en essayant chaque format accepté (NaT si aucun ne convient)."""
+    import pandas as pd
+
+    dates = pd.Series(pd.NaT, index=serie.index, dtype='datetime64[ns]')
+    for format_date in FORMATS_DATE:
+        restantes = dates.isna() & (serie != '')
+        if not restantes.any():
+            break
+        dates[restantes] = pd.to_datetime(serie[restantes], format=format_date, errors='coerce')
+    return dates
+
+
+def valider(nature: str, frame: 'pd.DataFrame') -> Tuple['pd.DataFrame', List[Dict[str, Any]]]:
+    """
+    Valide et convertit les données d'une nature, colonne par colonne.
+    Les contrôles (obligation, longueur, date, montant, type / sous-type) sont déduits des
+    colonnes du modèle et de menus.json. Le rattachement aux contrats est contrôlé à l'import.
+    Args:
+        nature (str): La nature des données (voir NATURES).
+        frame (pd.DataFrame): Les données lues (textes).
+    Returns:
+        Tuple[pd.DataFrame, List[Dict[str, Any]]]: Les données converties, avec les colonnes
+            `_ligne` (numéro de ligne dans le fichier) et `_valide`, et les erreurs par ligne.
+    Exemples:
+        ```python
+        donnees, erreurs = valider('factures', lire_fichier(flux, 'factures.csv', 'factures')['factures'])
+        ```
+    """
+    import pandas as pd
+
+    modele, colonnes = NATURES[nature]
+    table: Table = modele.__table__
+    attendues = colonnes if nature == NATURE_CONTRATS else (REFERENCE, *colonnes)
+
+    frame = frame.rename(columns=_normaliser)
+    manquantes = [colonne for colonne in attendues
+                  if colonne not in frame.columns and (colonne == REFERENCE or not table.c[colonne].nullable)]
+    if manquantes:
+        return frame.iloc[0:0], [_erreur(nature, None, colonne, "Colonne obligatoire absente") for colonne in manquantes]
+
+    donnees = pd.DataFrame({'_ligne': pd.RangeIndex(PREMIERE_LIGNE, PREMIERE_LIGNE + len(frame))},
+                           index=frame.index)
+    erreurs: List[Dict[str, Any]] = []
+    for colonne in attendues:
+        texte = (frame[colonne].fillna('').astype(str).str.strip() if colonne in frame.columns
+                 else pd.Series('', index=frame.index))
+        type_colonne = table.c[colonne].type if colonne in table.c else Contract.__table__.c[REFERENCE].type
+        obligatoire = colonne == REFERENCE or not table.c[colonne].nullable
+        vides = texte == ''
+        if obligatoire:
+            erreurs += _erreurs_masque(nature, donnees, vides, colonne, "Valeur obligatoire")
+
+        if isinstance(type_colonne, Date):
+            valeurs = _convertir_dates(texte)
+            erreurs += _erreurs_masque(nature, donnees, valeurs.isna() & ~vides, colonne,
+                                       "Date invalide (AAAA-MM-JJ ou JJ/MM/AAAA)")
+            donnees[colonne] = valeurs.dt.date.astype(object).where(valeurs.notna(), None)
+        elif isinstance(type_colonne, Numeric):
+            valeurs = pd.to_numeric(texte.str.replace(' ', '', regex=False).str.replace(',', '.', regex=False),
+                                    errors='coerce').round(type_colonne.scale or 0)
+            limite = 10 ** ((type_colonne.precision or 10) - (type_colonne.scale or 0))
+            erreurs += _erreurs_masque(nature, donnees, (valeurs.isna() | (valeurs.abs() >= limite)) & ~vides,
+                                       colonne, "Montant invalide")
+            donnees[colonne] = valeurs.astype(object).where(valeurs.notna(), None)
+        else:
+            longueur = getattr(type_colonne, 'length', None)
+            if isinstance(type_colonne, String) and longueur:
+                erreurs += _erreurs_masque(nature, donnees, texte.str.len() > longueur, colonne,
+                                           f"Valeur trop longue ({longueur} caractères au plus)")
+            donnees[colonne] = texte.where(~vides, None)
+
+    if nature in TYPAGES:
+        cle_menu, colonne_type, colonne_sous_type = TYPAGES[nature]
+        couples = pd.MultiIndex.from_arrays([donnees[colonne_type].fillna(''), donnees[colonne_sous_type].fillna('')])
+        inconnus = ~couples.isin(_couples_types(cle_menu)) & donnees[colonne_type].notna()
+        erreurs += _erreurs_masque(nature, donnees, pd.Series(inconnus, index=donnees.index), colonne_sous_type,
+                                   f"Couple type / sous-type absent du menu « {cle_menu} »")
+
+    if nature == NATURE_CONTRATS:
+        doublons = donnees[REFERENCE].notna() & donnees[REFERENCE].duplicated(keep=False)
+        erreurs += _erreurs_masque(nature, donnees, doublons, REFERENCE, "Numéro de contrat en double dans le fichier")
+
+    lignes_en_erreur = {erreur['ligne'] for erreur in erreurs}
+    donnees['_valide'] = ~donnees['_ligne'].isin(lignes_en_erreur)
+    return donnees, erreurs
+
+
+def _contrats_existants(session: Session, numeros: List[str]) -> Dict[str, List[int]]:
+    """Retourne les identifiants des contrats en base pour chaque numéro de contrat externe (par lots)."""
+    trouves: Dict[str, List[int]] = {}
+    for debut in range(0, len(numeros), TAILLE_LOT):
+        lot = numeros[debut:debut + TAILLE_LOT]
+        for id_contrat, numero in session.execute(select(Contract.id, Contract.id_externe_contrat)
+                                                  .where(Contract.id_externe_contrat.in_(lot))):
+            trouves.setdefault(numero, []).append(id_contrat)
+    return trouves
+
+
+def _lignes(frame: 'pd.DataFrame', colonnes: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """Retourne les lignes à insérer (dictionnaires) pour les colonnes données."""
+    return frame[list(colonnes)].to_dict('records')
+
+
+def _inserer(session: Session, table: Table, lignes: List[Dict[str, Any]], taille_lot: int) -> None:
+    """Insère des lignes par lots d'insertions multiples, dans la transaction de la session."""
+    for debut in range(0, len(lignes), taille_lot):
+        session.execute(table.insert(), lignes[debut:debut + taille_lot])
+
+
+def importer(session: Session, donnees: Dict[str, 'pd.DataFrame'], partiel: bool = False,
+             simulation: bool = False, taille_lot: int = TAILLE_LOT) -> Dict[str, Any]:
+    """
+    Valide puis importe des données lues par lire_fichier, dans une seule transaction.
+    Args:
+        session (Session): La session de base de données (validée ou annulée par la fonction).
+        donnees (Dict[str, pd.DataFrame]): Les données par nature.
+        partiel (bool): Importer les lignes valides même si d'autres sont en erreur.
+        simulation (bool): Valider seulement, sans rien écrire.
+        taille_lot (int): Nombre de lignes par insertion multiple.
+    Returns:
+        Dict[str, Any]: Le rapport : lignes lues et importées par nature, erreurs par ligne,
+            et `importe` (True si des données ont été écrites).
+    Exemples:
+        ```python
+        rapport = importer(session, lire_fichier(flux, 'contrats.xlsx'))
+        rapport['importees']  # {'contrats': 120, 'contacts': 240, ...}
+        ```
+    """
+    rapport: Dict[str, Any] = {'lignes': {}, 'importees': {}, 'erreurs': [], 'importe': False}
+    validees: Dict[str, 'pd.DataFrame'] = {}
+    for nature in NATURES:
+        if nature in donnees:
+            validees[nature], erreurs = valider(nature, donnees[nature])
+            rapport['lignes'][nature] = len(donnees[nature])
+            rapport['erreurs'] += erreurs
+
+    # Rattachement aux contrats : numéros importés ici ou déjà en base (un seul contrat par numéro)
+    numeros = sorted({numero for frame in validees.values() if REFERENCE in frame.columns
+                      for numero in frame[REFERENCE].dropna()})
+    existants = _contrats_existants(session, numeros)
+    importes = set()
+    if NATURE_CONTRATS in validees:
+        contrats = validees[NATURE_CONTRATS]
+        deja = contrats[REFERENCE].isin(list(existants)) & contrats['_valide']
+        rapport['erreurs'] += _erreurs_masque(NATURE_CONTRATS, contrats, deja, REFERENCE, "Contrat déjà existant")
+        contrats.loc[deja, '_valide'] = False
+        importes = set(contrats.loc[contrats['_valide'], REFERENCE])
+    for nature, frame in validees.items():
+        if nature == NATURE_CONTRATS:
+            continue
+        references = frame[REFERENCE]
+        ambigus = references.isin([numero for numero, ids in existants.items() if len(ids) > 1])
+        inconnus = frame['_valide'] & references.notna() & ~references.isin(list(existants) + list(importes))
+        rapport['erreurs'] += _erreurs_masque(nature, frame, frame['_valide'] & ambigus, REFERENCE,
+                                              "Numéro de contrat porté par plusieurs contrats")
+        rapport['erreurs'] += _erreurs_masque(nature, frame, inconnus, REFERENCE, "Contrat inconnu")
+        frame.loc[ambigus | inconnus, '_valide'] = False
+
+    rapport['erreurs'].sort(key=lambda erreur: (list(NATURES).index(erreur['nature']), erreur['ligne'] or 0))
+    rapport['importees'] = {nature: int(frame['_valide'].sum()) for nature, frame in validees.items()}
+    if simulation or (rapport['erreurs'] and not partiel) or not any(rapport['importees'].values()):
+        if rapport['erreurs'] and not partiel:
+            rapport['importees'] = {nature: 0 for nature in validees}
+        return rapport
+
+    try:
+        identifiants = {numero: ids[0] for numero, ids in existants.items()}
+        if NATURE_CONTRATS in validees:
+            contrats = validees[NATURE_CONTRATS]
+            contrats = contrats[contrats['_valide']]
+            _inserer(session, Contract.__table__, _lignes(contrats, NATURES[NATURE_CONTRATS][1]), taille_lot)
+            # Identifiants attribués (numéros uniques, vérifiés ci-dessus) puis échéances du contrat
+            nouveaux = _contrats_existants(session, list(contrats[REFERENCE]))
+            identifiants.update({numero: ids[0] for numero, ids in nouveaux.items()})
+            echeances = [{'id_contrat': identifiants[numero], 'type_echeance': type_echeance, 'date_echeance': jour}
+                         for type_echeance, colonne in ((TYPE_ECHEANCE_PREAVIS, 'date_fin_preavis'),
+                                                        (TYPE_ECHEANCE_FIN, 'date_fin'))
+                         for numero, jour in zip(contrats[REFERENCE], contrats[colonne]) if jour is not None]
+            _inserer(session, Echeance.__table__, echeances, taille_lot)
+        for nature, frame in validees.items():
+            if nature == NATURE_CONTRATS:
+                continue
+            frame = frame[frame['_valide']].assign(id_contrat=lambda f: f[REFERENCE].map(identifiants))
+            _inserer(session, NATURES[nature][0].__table__, _lignes(frame, ('id_contrat', *NATURES[nature][1])),
+                     taille_lot)
+            if nature == NATURE_FACTURES:
+                # Cumuls mensuels des factures (table 14_depenses, également hors évènements de mapper)
+                cumuler_depenses(session.connection(), ((id_contrat, jour, montant, 1) for id_contrat, jour, montant
+                                                        in zip(frame['id_contrat'], frame['date_facture'],
+                                                               frame['montant'])))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    rapport['importe'] = True
+    logger.info(f"Import : {rapport['importees']} ligne(s) importée(s), {len(rapport['erreurs'])} erreur(s)")
+    return rapport
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    from application import peraudiere, Session as SessionFactory
+
+    parser = argparse.ArgumentParser(description="Import en masse de contrats, contacts, évènements et factures.")
+    parser.add_argument('fichier', help="Fichier CSV ou XLSX à importer.")
+    parser.add_argument('--nature', choices=list(NATURES), help="Nature des données d'un fichier CSV.")
+    parser.add_argument('--partiel', action='store_true', help="Importer les lignes valides malgré les erreurs.")
+    parser.add_argument('--simulation', action='store_true', help="Valider le fichier sans rien écrire.")
+    parser.add_argument('--lot', type=int, default=TAILLE_LOT, help="Nombre de lignes par insertion multiple.")
+    arguments = parser.parse_args()
+
+    with open(arguments.fichier, 'rb') as fichier_import:
+        donnees_import = lire_fichier(fichier_import, arguments.fichier, arguments.nature)
+    with peraudiere.app_context(), SessionFactory() as db_session:
+        rapport_import = importer(db_session, donnees_import, partiel=arguments.partiel,
+                                  simulation=arguments.simulation, taille_lot=arguments.lot)
+    print(json.dumps(rapport_import, indent=2, ensure_ascii=False))
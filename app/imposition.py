@@ -0,0 +1,214 @@
+"""
+=============================================================
+Fusion et imposition des impressions de l'Intranet API'Raudière
+=============================================================
+Module de préparation des impressions par lot : plusieurs PDF et images sont réunis
+côté serveur en un seul PDF, envoyé à l'imprimante en un seul travail CUPS.
+
+Les images (PNG, JPEG) sont converties en pages PDF (reportlab), des plages de pages
+peuvent être retenues pour chaque fichier et plusieurs pages peuvent être imposées
+sur une même feuille (2 ou 4 pages par feuille). Sans orientation demandée, 2 pages sont
+placées côte à côte sur une feuille paysage (réduction d'environ 71 %) et 4 pages sur une
+feuille portrait ; une feuille portrait en 2 pages empile les pages (réduction de 50 %).
+
+pypdf et le canevas reportlab ne sont importés qu'à la première fusion (dans le thread
+d'envoi de la file d'impression) : l'import de la file par l'application reste léger.
+
+Exemple :
+    ```python
+    nb_feuilles = fusionner([('/prints/a.pdf', '1-3'), ('/prints/b.png', None)],
+                            '/prints/lot.pdf', pages_par_feuille=2)
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from io import BytesIO
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+from reportlab.lib.pagesizes import A3, A4, A5, LEGAL, LETTER, landscape, portrait
+from logging import getLogger
+import os
+
+if TYPE_CHECKING:
+    from pypdf import PageObject
+
+logger = getLogger(__name__)
+
+# Formats de feuille (points PDF, portrait)
+FORMATS = {'A3': A3, 'A4': A4, 'A5': A5, 'LETTER': LETTER, 'LEGAL': LEGAL}
+
+# Grille d'imposition (colonnes, lignes) sur une feuille portrait
+GRILLES = {1: (1, 1), 2: (1, 2), 4: (2, 2)}
+
+# Orientation des feuilles imposées sans choix de l'utilisateur ('4' : paysage, pages côte à côte)
+ORIENTATIONS_PAR_DEFAUT = {1: '3', 2: '4', 4: '3'}
+
+# Extensions acceptées dans un lot
+EXTENSIONS_IMAGES = {'.png', '.jpg', '.jpeg'}
+EXTENSIONS_LOT = EXTENSIONS_IMAGES | {'.pdf'}
+
+
+def analyser_plages(texte: Optional[str], nb_pages: Optional[int] = None) -> Optional[List[int]]:
+    """
+    Convertit une saisie de plages de pages (ex. '1-3,5') en indices de pages (base 0).
+    Args:
+        texte (Optional[str]): Les plages saisies ; vide pour toutes les pages.
+        nb_pages (Optional[int]): Le nombre de pages du fichier (contrôle des bornes si fourni).
+    Returns:
+        Optional[List[int]]: Les indices des pages dans l'ordre saisi, ou None pour toutes les pages.
+    Raises:
+        ValueError: Si la saisie est invalide ou désigne une page inexistante.
+    Exemples:
+        ```python
+        analyser_plages('1-3,5')    # [0, 1, 2, 4]
+        ```
+    """
+    if not texte or not texte.strip():
+        return None
+    indices: List[int] = []
+    for morceau in texte.replace(' ', '').split(','):
+        debut, _, fin = morceau.partition('-')
+        if not debut.isdigit() or (fin and not fin.isdigit()):
+            raise ValueError(f"Plage de pages invalide : '{morceau}'")
+        premiere, derniere = int(debut), int(fin or debut)
+        if premiere < 1 or derniere < premiere:
+            raise ValueError(f"Plage de pages invalide : '{morceau}'")
+        if nb_pages is not None and derniere > nb_pages:
+            raise ValueError(f"Plage '{morceau}' hors du document ({nb_pages} page(s))")
+        indices.extend(range(premiere - 1, derniere))
+    return indices
+
+
+def taille_feuille(media: str = 'A4', orientation: str = '3') -> Tuple[float, float]:
+    """
+    Retourne la largeur et la hauteur de la feuille en points PDF ('4' : paysage).
+    """
+    taille = FORMATS.get((media or 'A4').upper(), A4)
+    return landscape(taille) if orientation == '4' else portrait(taille)
+
+
+def _image_en_pages(chemin: str, media: str) -> List['PageObject']:
+    """
+    Convertit une image en une page PDF du format demandé (orientée selon l'image, image centrée).
+    """
+    from pypdf import PdfReader
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen.canvas import Canvas
+
+    image = ImageReader(chemin)
+    largeur_image, hauteur_image = image.getSize()
+    taille = FORMATS.get((media or 'A4').upper(), A4)
+    largeur, hauteur = landscape(taille) if largeur_image > hauteur_image else portrait(taille)
+
+    tampon = BytesIO()
+    canvas = Canvas(tampon, pagesize=(largeur, hauteur))
+    canvas.drawImage(image, 0, 0, width=largeur, height=hauteur, preserveAspectRatio=True, anchor='c')
+    canvas.showPage()
+    canvas.save()
+    tampon.seek(0)
+    return list(PdfReader(tampon).pages)
+
+
+def _pages(chemin: str, plages: Optional[str], media: str) -> List['PageObject']:
+    """
+    Retourne les pages retenues d'un fichier du lot (PDF ou image).
+    """
+    from pypdf import PdfReader
+
+    if os.path.splitext(chemin)[1].lower() in EXTENSIONS_IMAGES:
+        pages = _image_en_pages(chemin, media)
+    else:
+        reader = PdfReader(chemin, strict=False)
+        if reader.is_encrypted:
+            raise ValueError(f"PDF protégé par mot de passe : {os.path.basename(chemin)}")
+        pages = list(reader.pages)
+    indices = analyser_plages(plages, len(pages))
+    return pages if indices is None else [pages[indice] for indice in indices]
+
+
+def _imposer(pages: Sequence['PageObject'], pages_par_feuille: int,
+             feuille: Tuple[float, float]) -> List['PageObject']:
+    """
+    Place les pages par groupes de `pages_par_feuille` sur des feuilles de la taille donnée
+    (chaque page est réduite proportionnellement et centrée dans sa case).
+    """
+    from pypdf import PageObject, Transformation
+
+    largeur, hauteur = feuille
+    colonnes, lignes = GRILLES[pages_par_feuille]
+    if largeur > hauteur:
+        colonnes, lignes = lignes, colonnes
+    largeur_case, hauteur_case = largeur / colonnes, hauteur / lignes
+
+    feuilles: List['PageObject'] = []
+    for debut in range(0, len(pages), pages_par_feuille):
+        feuille_pdf = PageObject.create_blank_page(width=largeur, height=hauteur)
+        for position, page in enumerate(pages[debut:debut + pages_par_feuille]):
+            # Rotation de la page appliquée au contenu pour travailler sur sa taille affichée
+            page.transfer_rotation_to_content()
+            boite = page.mediabox
+            echelle = min(largeur_case / float(boite.width), hauteur_case / float(boite.height))
+            colonne, ligne = position % colonnes, position // colonnes
+            x = colonne * largeur_case + (largeur_case - float(boite.width) * echelle) / 2
+            y = hauteur - (ligne + 1) * hauteur_case + (hauteur_case - float(boite.height) * echelle) / 2
+            feuille_pdf.merge_transformed_page(
+                page, Transformation()
+                .translate(-float(boite.left), -float(boite.bottom))
+                .scale(echelle, echelle)
+                .translate(x, y))
+        feuilles.append(feuille_pdf)
+    return feuilles
+
+
+def fusionner(fichiers: Sequence[Tuple[str, Optional[str]]], destination: str, *,
+              pages_par_feuille: int = 1, media: str = 'A4', orientation: Optional[str] = None) -> int:
+    """
+    Réunit les fichiers d'un lot (PDF et images) en un seul PDF, avec imposition éventuelle.
+    Args:
+        fichiers (Sequence[Tuple[str, Optional[str]]]): Les chemins des fichiers et leurs plages de pages, dans l'ordre.
+        destination (str): Le chemin du PDF produit.
+        pages_par_feuille (int): Le nombre de pages par feuille (1, 2 ou 4).
+        media (str): Le format des feuilles imposées (A4, A3, ...).
+        orientation (Optional[str]): '3' (portrait) ou '4' (paysage) pour les feuilles imposées
+            (défaut : ORIENTATIONS_PAR_DEFAUT, paysage pour 2 pages par feuille).
+    Returns:
+        int: Le nombre de pages du PDF produit.
+    Raises:
+        ValueError: Si un fichier est illisible, une plage invalide ou le lot vide.
+    Exemples:
+        ```python
+        nb_pages = fusionner([('/prints/a.pdf', None), ('/prints/photo.jpg', None)], '/prints/lot.pdf')
+        ```
+    """
+    from pypdf import PdfWriter
+
+    if pages_par_feuille not in GRILLES:
+        raise ValueError(f"Nombre de pages par feuille non pris en charge : {pages_par_feuille}")
+
+    pages: List['PageObject'] = []
+    for chemin, plages in fichiers:
+        try:
+            pages.extend(_pages(chemin, plages, media))
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Fichier illisible : {os.path.basename(chemin)} ({e})")
+    if not pages:
+        raise ValueError("Aucune page à imprimer")
+
+    if pages_par_feuille > 1:
+        orientation = orientation or ORIENTATIONS_PAR_DEFAUT[pages_par_feuille]
+        pages = _imposer(pages, pages_par_feuille, taille_feuille(media, orientation))
+
+    writer = PdfWriter()
+    for page in pages:
+        writer.add_page(page)
+    writer.compress_identical_objects()
+
+    # Écriture atomique du PDF produit
+    temporaire = destination + '.part'
+    with open(temporaire, 'wb') as f:
+        writer.write(f)
+    os.replace(temporaire, destination)
+    logger.info(f"Lot d'impression fusionné : {len(fichiers)} fichier(s), {len(pages)} page(s) -> {destination}")
+    return len(pages)
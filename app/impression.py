@@ -1,11 +1,87 @@
-import subprocess # Pour exécuter la commande lp
-import os
-from config import ConfigDict
-from typing import cast
+"""
+=============================================================
+Impressions de l'Intranet API'Raudière
+=============================================================
+Module de file d'impression vers le serveur CUPS de l'hôte Docker.
+
+La route d'impression ne fait plus qu'écrire le fichier dans PRINT_PATH et enregistrer
+un travail (table `30_impressions`) : l'envoi est réalisé par des threads de travail
+qui soumettent le fichier en IPP via une connexion pycups conservée par thread (repli
+sur la commande `lp` si pycups n'est pas installé). L'identifiant CUPS du travail est
+conservé et son état est suivi par la tâche planifiée `suivi_impressions`.
+Un travail est réservé par son passage au statut « en cours » avec une date de réservation
+(bail) : un autre processus ne le reprend qu'après expiration du bail. Les travaux en attente
+ne sont remis en file au démarrage, et les baux expirés repris, que par le worker n°0.
+Plusieurs fichiers peuvent être imprimés en un seul travail (lot fusionné, voir imposition.py)
+et les fichiers déjà stockés (documents, factures, documents signés) sont imprimés par référence.
+
+Le serveur CUPS (passerelle par défaut du conteneur) n'est déterminé qu'une fois.
+
+Exemple :
+    ```python
+    travail = file_impression.soumettre(g.db_session, fichier, 'rapport.pdf',
+                                        id_user=1, titre='Intranet-Jean Dupont',
+                                        options=construire_options(copies='2'))
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from datetime import datetime, timedelta
+from functools import lru_cache
+from queue import Queue, Empty
+from threading import Thread, Timer, Event, local
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, cast
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+from config import Config, ConfigDict
+from docs import stream_to_temp
+from imposition import EXTENSIONS_LOT, GRILLES, analyser_plages, fusionner
+from models import PrintJob
 from logging import getLogger
+import json
+import os
+import re
+import socket
+import struct
+import subprocess
+import uuid
+
+try:
+    import cups
+except ImportError:     # pragma: no cover - pycups absent : repli sur la commande lp
+    cups = None
 
 logger = getLogger(__name__)
 
+# Statuts des travaux d'impression
+STATUS_ERREUR = -1
+STATUS_EN_ATTENTE = 0
+STATUS_ENVOYE = 1
+STATUS_TERMINE = 2
+STATUS_EN_COURS = 3
+
+# États IPP des travaux (RFC 8011, job-state)
+IPP_JOB_TERMINE = 9
+IPP_JOB_ANNULE = 7
+IPP_JOB_ABANDONNE = 8
+
+# Passerelle Docker par défaut (bridge)
+CUPS_SERVER_DEFAUT = '172.17.0.1'
+
+# Délai avant une nouvelle tentative d'envoi, en secondes
+DELAI_NOUVELLE_TENTATIVE = 30
+
+# Durée du bail d'un travail réservé, en secondes (au-delà, le processus est considéré comme arrêté)
+DUREE_BAIL = 600
+
+Envoyeur = Callable[[str, str, Dict[str, str]], Optional[int]]
+
+_local = local()
+
+
 def get_config() -> ConfigDict:
     """Import tardif pour éviter l'import circulaire"""
     from application import peraudiere
@@ -14,110 +90,539 @@ def get_config() -> ConfigDict:
 def get_watched_dir() -> str:
     return get_config().get("PRINT_PATH", '/prints')
 
-def get_cups_server() -> str:
-    """Retourne l'IP du serveur CUPS sur l'hôte Docker"""
+def _passerelle_par_defaut(table_routes: str = '/proc/net/route') -> Optional[str]:
+    """
+    Lit la passerelle par défaut dans la table de routage du noyau (sans sous-processus).
+    """
     try:
-        # Récupérer l'IP de la passerelle Docker (hôte)
-        result = subprocess.run(['ip', 'route', 'show', 'default'], 
-                              capture_output=True, text=True)
-        if result.returncode == 0:
-            # Extraire l'IP de la passerelle de la sortie
-            gateway_ip = result.stdout.split()[2]
-            logger.info(f"CUPS server IP detected: {gateway_ip}")
-            return gateway_ip
-        else:
-            # Fallback vers l'IP Docker bridge standard
-            logger.warning("Could not determine gateway IP, using default")
-            return '172.17.0.1'
-    except Exception as e:
-        logger.error(f"Error determining gateway IP: {e}, using fallback")
-        return '172.17.0.1'
+        with open(table_routes) as f:
+            for ligne in f.readlines()[1:]:
+                champs = ligne.split()
+                # Destination 00000000 et drapeau RTF_GATEWAY (0x2)
+                if len(champs) > 3 and champs[1] == '00000000' and int(champs[3], 16) & 2:
+                    return socket.inet_ntoa(struct.pack('<L', int(champs[2], 16)))
+    except (OSError, ValueError):
+        pass
+    return None
+
+@lru_cache(maxsize=1)
+def get_cups_server() -> str:
+    """
+    Retourne l'adresse du serveur CUPS (déterminée une seule fois par processus) :
+    CUPS_SERVER si défini, sinon la passerelle par défaut du conteneur (hôte Docker).
+    """
+    serveur = Config.CUPS_SERVER or os.getenv('CUPS_SERVER', '')
+    if serveur:
+        return serveur
+    passerelle = _passerelle_par_defaut()
+    if passerelle:
+        logger.info(f"CUPS server IP detected: {passerelle}")
+        return passerelle
+    logger.warning("Could not determine gateway IP, using default")
+    return CUPS_SERVER_DEFAUT
 
 def get_printer_name() -> str:
     return get_config().get("PRINTER_NAME", 'Imprimerie_Sharp')
 
-def print_file(file_path: str, user_name: str = 'Default', site_name: str = 'Default',
-               copies: str = '1', sides: str = 'one-sided', media: str = 'A4',
-               orientation: str = '3', color: str = 'monochrome') -> None:
+def construire_options(copies: str = '1', sides: str = 'one-sided', media: str = 'A4',
+                       orientation: str = '3', color: str = 'monochrome') -> Dict[str, str]:
+    """
+    Construit les options CUPS d'un travail à partir des champs du formulaire d'impression.
+    Args:
+        copies (str): Le nombre de copies.
+        sides (str): 'one-sided', 'two-sided-long-edge' ou 'two-sided-short-edge'.
+        media (str): Le format de page (A4, A3, A5, LETTER, LEGAL).
+        orientation (str): '3' (portrait) ou '4' (paysage), valeurs IPP orientation-requested ;
+            vide : orientation automatique (pilote, ou imposition d'un lot).
+        color (str): 'monochrome' ou 'color'.
+    Returns:
+        Dict[str, str]: Les options, au format attendu par pycups et lp (-o nom=valeur).
+    Exemples:
+        ```python
+        options = construire_options(copies='2', sides='two-sided-long-edge')
+        ```
+    """
+    # Format de page (utiliser PageSize au lieu de media)
+    media = (media or 'A4').upper()
+    options = {
+        'copies': str(copies or '1') if str(copies or '1').isdigit() else '1',
+        'PageSize': media if media in ['A4', 'A3', 'A5', 'LETTER', 'LEGAL'] else 'A4',
+    }
+
+    # Gestion du recto/verso
+    duplex_mapping = {
+        'one-sided': 'None',
+        'two-sided-long-edge': 'DuplexNoTumble',
+        'two-sided-short-edge': 'DuplexTumble'
+    }
+    options['Duplex'] = duplex_mapping.get(sides, 'None')
+
+    # Orientation (si supportée par le pilote)
+    if orientation in ('3', '4'):
+        options['orientation-requested'] = orientation
+
+    # Couleur (peut ne pas fonctionner avec tous les pilotes génériques)
+    if color == 'monochrome':
+        options['ColorModel'] = 'Gray'
+    elif color == 'color':
+        options['ColorModel'] = 'RGB'
+
+    # Options supplémentaires pour améliorer la qualité
+    options['fit-to-page'] = 'true'
+    options['number-up'] = '1'
+    return options
+
+def _get_connexion() -> Any:
+    """
+    Retourne la connexion pycups du thread courant (créée à la première utilisation).
+    Une connexion pycups n'est pas partageable entre threads.
+    """
+    connexion = getattr(_local, 'connexion', None)
+    if connexion is None:
+        connexion = cups.Connection(host=get_cups_server())
+        _local.connexion = connexion
+    return connexion
+
+def _oublier_connexion() -> None:
+    """Abandonne la connexion du thread courant (recréée au prochain envoi)."""
+    _local.connexion = None
+
+def envoyer_cups(chemin: str, titre: str, options: Dict[str, str]) -> Optional[int]:
     """
-    Imprimer un fichier via la commande lp en utilisant CUPS sur l'hôte Docker
+    Soumet un fichier en IPP via pycups.
+    Args:
+        chemin (str): Le chemin du fichier à imprimer.
+        titre (str): Le titre du travail.
+        options (Dict[str, str]): Les options CUPS.
+    Returns:
+        Optional[int]: L'identifiant CUPS du travail.
     """
     try:
-        # Configuration du serveur CUPS
-        cups_server = get_cups_server()
-        printer_name = get_printer_name()
-        
-        # Préparation de la commande lp avec options
-        cmd = ['lp', '-d', printer_name]
-        
-        # Ajouter les options d'impression supportées
-        cmd.extend(['-n', copies])  # Nombre de copies
-        
-        # Format de page (utiliser PageSize au lieu de media)
-        if media.upper() in ['A4', 'A3', 'A5', 'LETTER', 'LEGAL']:
-            cmd.extend(['-o', f'PageSize={media.upper()}'])
-        else:
-            cmd.extend(['-o', 'PageSize=A4'])  # Par défaut A4
-        
-        # Gestion du recto/verso
-        duplex_mapping = {
-            'one-sided': 'None',
-            'two-sided-long-edge': 'DuplexNoTumble', 
-            'two-sided-short-edge': 'DuplexTumble'
-        }
-        duplex_value = duplex_mapping.get(sides, 'None')
-        cmd.extend(['-o', f'Duplex={duplex_value}'])
-        
-        # Orientation (si supportée par le pilote)
-        if orientation == '4':  # Paysage
-            cmd.extend(['-o', 'landscape'])
-        elif orientation == '3':  # Portrait (par défaut)
-            cmd.extend(['-o', 'portrait'])
-        
-        # Pour les options de couleur non supportées par les pilotes génériques,
-        # on peut essayer d'utiliser des options PostScript/PCL directes
-        if color == 'monochrome':
-            # Option pour forcer le noir et blanc (peut ne pas fonctionner avec tous les pilotes)
-            cmd.extend(['-o', 'ColorModel=Gray'])
-        elif color == 'color':
-            cmd.extend(['-o', 'ColorModel=RGB'])
-        
-        # Titre du travail
-        cmd.extend(['-t', f'Intranet-{user_name}-{site_name}'])
-        
-        # Options supplémentaires pour améliorer la qualité
-        cmd.extend(['-o', 'fit-to-page'])  # Ajuster à la page
-        cmd.extend(['-o', 'number-up=1'])  # Une page par feuille
-        
-        # Ajouter le fichier à imprimer
-        cmd.append(file_path)
-        
-        # Configuration de l'environnement pour pointer vers le serveur CUPS de l'hôte
-        env = os.environ.copy()
-        env['CUPS_SERVER'] = cups_server
-        
-        logger.info(f"Printing file {file_path} to printer {printer_name} via CUPS server {cups_server}")
-        logger.info(f"Command: {' '.join(cmd)}")
-        
-        # Exécuter la commande d'impression
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0:
-            # Extraire l'ID du travail d'impression de la sortie
-            output = result.stdout.strip()
-            logger.info(f"Print job submitted successfully: {output}")
-            print(f"✅ Impression envoyée avec succès: {output}")
+        return int(_get_connexion().printFile(get_printer_name(), chemin, titre, options))
+    except (cups.IPPError, cups.HTTPError, RuntimeError):
+        _oublier_connexion()
+        raise
+
+def envoyer_lp(chemin: str, titre: str, options: Dict[str, str]) -> Optional[int]:
+    """
+    Soumet un fichier via la commande lp (repli lorsque pycups n'est pas installé).
+    Args:
+        chemin (str): Le chemin du fichier à imprimer.
+        titre (str): Le titre du travail.
+        options (Dict[str, str]): Les options CUPS.
+    Returns:
+        Optional[int]: L'identifiant CUPS du travail lu dans la sortie de lp, si trouvé.
+    """
+    cmd = ['lp', '-d', get_printer_name(), '-t', titre]
+    for nom, valeur in options.items():
+        cmd.extend(['-o', f'{nom}={valeur}'])
+    cmd.append(chemin)
+
+    # Configuration de l'environnement pour pointer vers le serveur CUPS de l'hôte
+    env = os.environ.copy()
+    env['CUPS_SERVER'] = get_cups_server()
+    result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=30)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "Erreur inconnue")
+
+    # Sortie attendue : « request id is Imprimante-123 (1 file(s)) »
+    trouve = re.search(r'request id is \S+-(\d+)', result.stdout)
+    return int(trouve.group(1)) if trouve else None
+
+def etat_travail(cups_job_id: int) -> Optional[int]:
+    """
+    Retourne l'état IPP (job-state) d'un travail CUPS, ou None s'il ne peut être lu.
+    """
+    if cups is None:
+        return None
+    try:
+        attributs = _get_connexion().getJobAttributes(cups_job_id, requested_attributes=['job-state'])
+        return int(attributs['job-state'])
+    except (cups.IPPError, cups.HTTPError, RuntimeError, KeyError) as e:
+        _oublier_connexion()
+        logger.warning(f"État du travail CUPS {cups_job_id} illisible : {e}")
+        return None
+
+class FileImpression:
+    """
+    File d'impression : les travaux enregistrés en base sont envoyés à CUPS par des threads démons.
+    Méthodes :
+        soumettre(session, file, nom_fichier, ...) -> PrintJob: Enregistre un travail et le met en file.
+        soumettre_lot(session, fichiers, ...) -> PrintJob: Enregistre un lot fusionné en un seul travail.
+        soumettre_reference(session, chemin, ...) -> PrintJob: Enregistre l'impression d'un fichier déjà stocké.
+        demarrer(session_factory, reprendre) -> None: Démarre les threads (et reprend les travaux en attente).
+        reprendre(session, delai) -> int: Remet en file les travaux en attente et ceux dont le bail a expiré.
+        arreter() -> None: Arrête les threads de travail.
+        traiter(id_job) -> None: Envoie un travail à CUPS (exécuté par les threads).
+    """
+    def __init__(self, envoyeur: Optional[Envoyeur] = None, nb_workers: Optional[int] = None,
+                 dossier: Optional[str] = None) -> None:
+        self.envoyeur: Envoyeur = envoyeur or (envoyer_cups if cups is not None else envoyer_lp)
+        self.nb_workers = nb_workers or Config.PRINT_WORKERS
+        self.dossier = dossier
+        self._file: 'Queue[Optional[int]]' = Queue()
+        self._session_factory: Optional[sessionmaker[Session]] = None
+        self._arret = Event()
+        self._threads: List[Thread] = []
+
+    def soumettre(self, session: Session, file: FileStorage, nom_fichier: str, *,
+                  id_user: Optional[int], titre: str, options: Dict[str, str]) -> PrintJob:
+        """
+        Écrit le fichier dans le dossier d'impression, enregistre le travail puis le met en file.
+        Le travail est committé avant sa mise en file pour être visible des threads de travail.
+        Args:
+            session (Session): La session de base de données.
+            file (FileStorage): Le fichier à imprimer.
+            nom_fichier (str): Le nom d'origine du fichier (pour l'extension).
+            id_user (Optional[int]): L'identifiant de l'utilisateur demandeur.
+            titre (str): Le titre du travail CUPS.
+            options (Dict[str, str]): Les options CUPS (voir construire_options).
+        Returns:
+            PrintJob: Le travail enregistré (statut en attente).
+        Exemples:
+            ```python
+            travail = file_impression.soumettre(g.db_session, fichier, 'cours.pdf', id_user=1,
+                                                titre='Intranet-Jean Dupont', options={})
+            ```
+        """
+        dossier = self.dossier or get_watched_dir()
+        chemin = self._ecrire(file, nom_fichier, dossier)
+        return self._enregistrer(session, [chemin], id_user=id_user, titre=titre[:255],
+                                 chemin_fichier=chemin, options=json.dumps(options))
+
+    def soumettre_lot(self, session: Session, fichiers: Sequence[Tuple[FileStorage, Optional[str]]], *,
+                      id_user: Optional[int], titre: str, options: Dict[str, str],
+                      pages_par_feuille: int = 1) -> PrintJob:
+        """
+        Enregistre un lot de fichiers (PDF et images) imprimé en un seul travail CUPS.
+        Les fichiers sont fusionnés (plages de pages, imposition) par le thread de travail,
+        juste avant l'envoi (voir imposition.fusionner).
+        Args:
+            session (Session): La session de base de données.
+            fichiers (Sequence[Tuple[FileStorage, Optional[str]]]): Les fichiers et leurs plages de pages ('1-3,5'), dans l'ordre.
+            id_user (Optional[int]): L'identifiant de l'utilisateur demandeur.
+            titre (str): Le titre du travail CUPS.
+            options (Dict[str, str]): Les options CUPS (voir construire_options).
+            pages_par_feuille (int): Le nombre de pages imposées par feuille (1, 2 ou 4).
+        Returns:
+            PrintJob: Le travail enregistré (statut en attente).
+        Raises:
+            ValueError: Si un fichier n'est ni un PDF ni une image, ou si une plage est invalide.
+        Exemples:
+            ```python
+            travail = file_impression.soumettre_lot(g.db_session, [(cours, '1-4'), (schema, None)],
+                                                    id_user=1, titre='Intranet-Jean Dupont', options={},
+                                                    pages_par_feuille=2)
+            ```
+        """
+        # Contrôles préalables (avant toute écriture)
+        if not fichiers:
+            raise ValueError("Aucun fichier à imprimer")
+        if pages_par_feuille not in GRILLES:
+            raise ValueError(f"Nombre de pages par feuille non pris en charge : {pages_par_feuille}")
+        for file, plages in fichiers:
+            extension = os.path.splitext(secure_filename(str(file.filename)))[1].lower()
+            if extension not in EXTENSIONS_LOT:
+                raise ValueError(f"Type de fichier non pris en charge : {file.filename}")
+            analyser_plages(plages)
+
+        dossier = self.dossier or get_watched_dir()
+        sources: List[str] = []
+        try:
+            for file, _ in fichiers:
+                sources.append(self._ecrire(file, str(file.filename), dossier))
+        except Exception:
+            for chemin in sources:
+                self._supprimer_fichier(chemin)
+            raise
+
+        # Les feuilles imposées sont déjà orientées : pas de rotation par le pilote
+        # (sans orientation demandée, celle de l'imposition : paysage pour 2 pages par feuille)
+        options = dict(options)
+        orientation = options.get('orientation-requested')
+        if pages_par_feuille > 1:
+            options.pop('orientation-requested', None)
+        lot = {'fichiers': [[chemin, plages] for chemin, (_, plages) in zip(sources, fichiers)],
+               'pages_par_feuille': pages_par_feuille,
+               'media': options.get('PageSize', 'A4'),
+               'orientation': orientation}
+        return self._enregistrer(session, sources, id_user=id_user, titre=titre[:255],
+                                 chemin_fichier=os.path.join(dossier, f'{uuid.uuid4().hex}.pdf'),
+                                 options=json.dumps(options), lot=json.dumps(lot))
+
+    def soumettre_reference(self, session: Session, chemin: str, *, reference: str,
+                            id_user: Optional[int], titre: str, options: Dict[str, str]) -> PrintJob:
+        """
+        Enregistre l'impression d'un fichier déjà stocké (document, facture, document signé).
+        Le fichier est envoyé depuis son emplacement : ni copie dans PRINT_PATH, ni suppression après envoi.
+        Args:
+            session (Session): La session de base de données.
+            chemin (str): Le chemin du fichier stocké.
+            reference (str): La référence du fichier ('document:<id>', 'facture:<id>', 'signature:<id>').
+            id_user (Optional[int]): L'identifiant de l'utilisateur demandeur.
+            titre (str): Le titre du travail CUPS.
+            options (Dict[str, str]): Les options CUPS (voir construire_options).
+        Returns:
+            PrintJob: Le travail enregistré (statut en attente).
+        Raises:
+            FileNotFoundError: Si le fichier n'existe pas.
+        Exemples:
+            ```python
+            travail = file_impression.soumettre_reference(g.db_session, document.file_path(),
+                                                          reference=f'document:{document.id}', id_user=1,
+                                                          titre='Intranet-Jean Dupont', options={})
+            ```
+        """
+        if not os.path.isfile(chemin):
+            raise FileNotFoundError(f"Fichier introuvable : {reference}")
+        return self._enregistrer(session, [], id_user=id_user, titre=titre[:255], chemin_fichier=chemin,
+                                 options=json.dumps(options), reference=reference)
+
+    @staticmethod
+    def _ecrire(file: FileStorage, nom_fichier: str, dossier: str) -> str:
+        """
+        Écrit un fichier à imprimer dans le dossier d'impression sous un nom unique
+        (deux utilisateurs peuvent imprimer un fichier de même nom).
+        """
+        os.makedirs(dossier, exist_ok=True)
+        _, extension = os.path.splitext(secure_filename(nom_fichier))
+        chemin = os.path.join(dossier, f'{uuid.uuid4().hex}{extension.lower()}')
+        temp_path, _, _ = stream_to_temp(file, dossier, max_size=Config.UPLOAD_LIMITS.get('document'))
+        os.replace(temp_path, chemin)
+        return chemin
+
+    def _enregistrer(self, session: Session, fichiers: List[str], **colonnes: Any) -> PrintJob:
+        """
+        Enregistre et committe un travail en attente puis le met en file
+        (les fichiers écrits sont supprimés si l'enregistrement échoue).
+        """
+        try:
+            travail = PrintJob(status=STATUS_EN_ATTENTE, tentatives=0, created_at=datetime.now(), **colonnes)
+            session.add(travail)
+            session.commit()
+        except Exception:
+            session.rollback()
+            for chemin in fichiers:
+                self._supprimer_fichier(chemin)
+            raise
+
+        self._file.put(travail.id)
+        logger.info(f"Travail d'impression {travail.id} mis en file : {travail.chemin_fichier}")
+        return travail
+
+    def demarrer(self, session_factory: 'sessionmaker[Session]', reprendre: bool = True) -> None:
+        """
+        Démarre les threads de travail (sans effet s'ils tournent déjà) et remet en file
+        les travaux restés en attente (arrêt du serveur avant leur envoi).
+        Args:
+            session_factory (sessionmaker[Session]): La fabrique de sessions de l'application.
+            reprendre (bool): Reprendre les travaux en attente (un seul processus : le worker n°0).
+        """
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._session_factory = session_factory
+        self._arret.clear()
+
+        # Reprise des travaux en attente (les relances programmées du processus arrêté sont perdues)
+        repris = 0
+        if reprendre:
+            with session_factory() as session:
+                repris = self.reprendre(session, delai=0)
+
+        self._threads = [Thread(target=self._boucle, name=f'impression-{numero}', daemon=True)
+                         for numero in range(self.nb_workers)]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"File d'impression démarrée : {self.nb_workers} thread(s), {repris} travail(aux) repris")
+
+    @staticmethod
+    def _disponible(maintenant: datetime, delai: float = DUREE_BAIL) -> Any:
+        """
+        Critère des travaux à (re)prendre : en attente depuis plus de `delai` secondes (demande
+        ou remise en attente), ou réservés par un processus dont le bail a expiré.
+        """
+        return or_(and_(PrintJob.status == STATUS_EN_ATTENTE,
+                        func.coalesce(PrintJob.reserve_at, PrintJob.created_at) <= maintenant - timedelta(seconds=delai)),
+                   and_(PrintJob.status == STATUS_EN_COURS,
+                        PrintJob.reserve_at < maintenant - timedelta(seconds=DUREE_BAIL)))
+
+    def reprendre(self, session: Session, delai: float = DUREE_BAIL) -> int:
+        """
+        Remet en file les travaux en attente depuis plus de `delai` secondes et ceux dont le bail
+        a expiré (appelée au démarrage du worker n°0, puis par la tâche `suivi_impressions`).
+        Un travail remis en file par plusieurs processus n'est envoyé qu'une fois (voir traiter).
+        Args:
+            session (Session): La session de base de données.
+            delai (float): L'ancienneté minimale d'un travail en attente, en secondes.
+        Returns:
+            int: Le nombre de travaux remis en file.
+        """
+        ids = session.execute(select(PrintJob.id).where(self._disponible(datetime.now(), delai))
+                              .order_by(PrintJob.created_at)).scalars().all()
+        for id_job in ids:
+            self._file.put(id_job)
+        return len(ids)
+
+    def est_demarree(self) -> bool:
+        """Indique si les threads de travail de ce processus tournent."""
+        return any(thread.is_alive() for thread in self._threads)
+
+    def arreter(self) -> None:
+        """
+        Arrête les threads de travail après le travail en cours.
+        """
+        self._arret.set()
+        for _ in self._threads:
+            self._file.put(None)
+        for thread in self._threads:
+            thread.join(timeout=30)
+        self._threads = []
+
+    def _boucle(self) -> None:
+        """
+        Boucle d'un thread de travail : traite les travaux de la file jusqu'à l'arrêt.
+        """
+        while not self._arret.is_set():
+            try:
+                id_job = self._file.get(timeout=1)
+            except Empty:
+                continue
+            if id_job is None:
+                break
+            try:
+                self.traiter(id_job)
+            except Exception as e:
+                logger.error(f"Erreur lors du traitement du travail d'impression {id_job} : {e}")
+
+    def traiter(self, id_job: int) -> None:
+        """
+        Envoie un travail à CUPS et enregistre son identifiant CUPS.
+        Le travail est réservé par une mise à jour conditionnelle qui le passe au statut « en cours »
+        avec la date de réservation (bail) : un travail remis en file par un autre processus n'est
+        pas envoyé deux fois, et n'est repris qu'après expiration du bail (processus arrêté).
+        En cas d'échec, le travail est remis en attente jusqu'à PRINT_TENTATIVES tentatives.
+        Args:
+            id_job (int): L'identifiant du travail.
+        """
+        if self._session_factory is None:
+            raise RuntimeError("File d'impression non démarrée : aucune fabrique de session.")
+
+        with self._session_factory() as session:
+            # Réservation du travail
+            maintenant = datetime.now()
+            reserve = session.execute(
+                update(PrintJob)
+                .where(PrintJob.id == id_job,
+                       or_(PrintJob.status == STATUS_EN_ATTENTE,
+                           and_(PrintJob.status == STATUS_EN_COURS,
+                                PrintJob.reserve_at < maintenant - timedelta(seconds=DUREE_BAIL))))
+                .values(status=STATUS_EN_COURS, reserve_at=maintenant, tentatives=PrintJob.tentatives + 1),
+                execution_options={'synchronize_session': False}).rowcount
+            session.commit()
+            if not reserve:
+                return
+
+            travail = session.get(PrintJob, id_job)
+            if travail is None:
+                return
+            tentative = travail.tentatives
+            try:
+                # Lot : fusion des fichiers (une seule fois, le PDF produit est conservé jusqu'à l'envoi)
+                if travail.lot and not os.path.exists(travail.chemin_fichier):
+                    lot = json.loads(travail.lot)
+                    fusionner([(chemin, plages) for chemin, plages in lot['fichiers']], travail.chemin_fichier,
+                              pages_par_feuille=lot['pages_par_feuille'], media=lot['media'],
+                              orientation=lot['orientation'])
+                # Fichier stocké supprimé depuis la demande (document remplacé ou supprimé)
+                if travail.reference and not os.path.isfile(travail.chemin_fichier):
+                    raise FileNotFoundError(f"Fichier introuvable : {travail.reference}")
+                cups_job_id = self.envoyeur(travail.chemin_fichier, travail.titre, json.loads(travail.options))
+            except Exception as e:
+                logger.error(f"Envoi du travail d'impression {id_job} impossible "
+                             f"(tentative {tentative}) : {e}")
+                travail.erreur = str(e)[:1000]
+                # Un lot illisible ou un fichier disparu ne peut pas réussir à la tentative suivante
+                if tentative >= Config.PRINT_TENTATIVES or isinstance(e, (ValueError, FileNotFoundError)):
+                    travail.status = STATUS_ERREUR
+                    travail.completed_at = datetime.now()
+                    self._supprimer_fichiers(travail)
+                else:
+                    # Bail rendu : le travail attend sa relance (reprise par le worker n°0 si elle est perdue)
+                    travail.status = STATUS_EN_ATTENTE
+                    travail.reserve_at = datetime.now()
+                    relance = Timer(DELAI_NOUVELLE_TENTATIVE, self._file.put, args=(id_job,))
+                    relance.daemon = True
+                    relance.start()
+                session.commit()
+                return
+
+            travail.status = STATUS_ENVOYE
+            travail.cups_job_id = cups_job_id
+            travail.erreur = None
+            travail.sent_at = datetime.now()
+            session.commit()
+            logger.info(f"Travail d'impression {id_job} envoyé (CUPS {cups_job_id})")
+
+            # Le fichier est transmis au serveur CUPS : la copie locale n'est plus utile
+            self._supprimer_fichiers(travail)
+
+    @classmethod
+    def _supprimer_fichiers(cls, travail: PrintJob) -> None:
+        """Supprime le fichier d'un travail et, pour un lot, ses fichiers sources (jamais un fichier stocké)."""
+        if travail.reference:
+            return
+        cls._supprimer_fichier(travail.chemin_fichier)
+        if travail.lot:
+            for chemin, _ in json.loads(travail.lot)['fichiers']:
+                cls._supprimer_fichier(chemin)
+
+    @staticmethod
+    def _supprimer_fichier(chemin: str) -> None:
+        """Supprime le fichier d'un travail (déjà supprimé : sans effet)."""
+        try:
+            os.remove(chemin)
+        except FileNotFoundError:
+            pass
+
+
+def suivre_impressions(session: Session) -> Dict[str, int]:
+    """
+    Met à jour le statut des travaux envoyés à partir de leur état CUPS
+    (tâche planifiée : terminé → 2, annulé ou abandonné → -1) et remet en file les travaux
+    dont le bail a expiré (voir FileImpression.reprendre).
+    Args:
+        session (Session): La session de base de données (commit laissé à l'appelant).
+    Returns:
+        Dict[str, int]: Le nombre de travaux terminés, en erreur et repris.
+    """
+    compteurs = {'termines': 0, 'erreurs': 0, 'repris': 0}
+
+    # Travaux dont l'envoi a été interrompu (bail expiré) ou jamais pris en charge
+    if file_impression.est_demarree():
+        compteurs['repris'] = file_impression.reprendre(session)
+    if cups is None:
+        return compteurs
+
+    envoyes = session.execute(
+        select(PrintJob).where(PrintJob.status == STATUS_ENVOYE, PrintJob.cups_job_id.is_not(None))
+    ).scalars().all()
+    for travail in envoyes:
+        etat = etat_travail(cast(int, travail.cups_job_id))
+        if etat == IPP_JOB_TERMINE:
+            travail.status = STATUS_TERMINE
+            compteurs['termines'] += 1
+        elif etat in (IPP_JOB_ANNULE, IPP_JOB_ABANDONNE):
+            travail.status = STATUS_ERREUR
+            travail.erreur = 'Travail annulé' if etat == IPP_JOB_ANNULE else 'Travail abandonné par CUPS'
+            compteurs['erreurs'] += 1
         else:
-            error_msg = result.stderr.strip() if result.stderr else "Erreur inconnue"
-            logger.error(f"Print command failed: {error_msg}")
-            raise Exception(f"Erreur d'impression: {error_msg}")
-            
-    except subprocess.TimeoutExpired:
-        logger.error("Print command timed out")
-        raise Exception("Timeout lors de l'impression")
-    except FileNotFoundError:
-        logger.error("lp command not found - cups-client not installed?")
-        raise Exception("Commande lp non trouvée. Installer cups-client.")
-    except Exception as e:
-        logger.error(f"Print error: {e}")
-        raise Exception(f"Erreur lors de l'impression: {e}")
+            continue
+        travail.completed_at = datetime.now()
+
+    if any(compteurs.values()):
+        logger.info(f"Suivi des impressions : {compteurs}")
+    return compteurs
+
+
+# File d'impression unique de l'application
+file_impression = FileImpression()
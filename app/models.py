@@ -1,12 +1,15 @@
-from sqlalchemy import Integer, String, Date, Boolean, ForeignKey, Numeric, DateTime, Text, Computed
+from sqlalchemy import (BigInteger, Integer, SmallInteger, String, Date, Boolean, ForeignKey, Numeric, DateTime, Text,
+                        Computed, Index, UniqueConstraint, bindparam, event, inspect)
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import mapped_column, relationship
+from sqlalchemy.orm import Mapper, mapped_column, relationship, object_session
 from sqlalchemy.sql import func
-from flask import g
+from flask import g, Response
 from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
-from typing import Optional, Dict, Any, List
-from datetime import datetime
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+from datetime import datetime, date
+from decimal import Decimal
 from os.path import splitext
 import io
 
@@ -16,6 +19,8 @@ PK_DOC_TO_SIGNE = '20_documents_a_signer.id'
 PK_USER = '99_users.id'
 PK_POINTS = '23_points.id'
 CASCADE = "all, delete-orphan"
+TYPE_ECHEANCE_PREAVIS = 'preavis'
+TYPE_ECHEANCE_FIN = 'fin'
 
 class User(Base):
     """
@@ -125,12 +130,20 @@ class Contract(Base):
         date_fin (date): Date de fin de validité du contrat (optionnelle).
     Relations :
         contacts (List[Contacts]): Liste des contacts associés au contrat.
+        evenements (List[Event]): Liste des évènements associés au contrat.
+        factures (List[Bill]): Liste des factures associées au contrat.
+        documents (List[Document]): Liste des documents associés au contrat.
     Méthodes :
         __repr__() -> str:
             Retourne une représentation textuelle de l'objet Contract.
+        to_dict(with_details: bool = False) -> Dict[str, Any]:
+            Retourne un dictionnaire représentant le contrat (et ses éléments liés si demandé).
     """
     
     __tablename__ = '01_contrats'
+    __table_args__ = (
+        Index('ft_01_contrats', 'intitule', 'entreprise', 'id_externe_contrat', mysql_prefix='FULLTEXT'),
+    )
 
     # Données principales
     id = mapped_column(Integer, primary_key=True)
@@ -167,6 +180,187 @@ class Contract(Base):
             f"intitule='{self.intitule}', date_debut={self.date_debut}, date_fin_preavis={self.date_fin_preavis}, "
             f"date_fin={self.date_fin})>")
 
+    def to_dict(self, with_details: bool = False) -> Dict[str, Any]:
+        """
+        Retourne un dictionnaire représentant le contrat.
+        Si with_details est True, inclut les contacts, évènements, documents et factures.
+        Les relations doivent alors avoir été chargées (selectinload) pour éviter
+        une requête par relation.
+        Arguments :
+            with_details (bool): Indique si les éléments liés doivent être inclus. Defaults to False.
+        Returns :
+            Dict[str, Any]: Dictionnaire des attributs du contrat.
+        Exemple d'utilisation :
+            ```python
+            contract_dict = contract.to_dict(with_details=True)
+            ```
+        """
+        contract_dict: Dict[str, Any] = {
+            "id": self.id,
+            "type_contrat": self.type_contrat,
+            "sous_type_contrat": self.sous_type_contrat,
+            "entreprise": self.entreprise,
+            "id_externe_contrat": self.id_externe_contrat,
+            "intitule": self.intitule,
+            "date_debut": self.date_debut.isoformat() if self.date_debut else None,
+            "date_fin_preavis": self.date_fin_preavis.isoformat() if self.date_fin_preavis else None,
+            "date_fin": self.date_fin.isoformat() if self.date_fin else None
+        }
+        if with_details:
+            contract_dict["contacts"] = [contact.to_dict() for contact in self.contacts]
+            contract_dict["evenements"] = [event.to_dict() for event in self.evenements]
+            contract_dict["documents"] = [document.to_dict() for document in self.documents]
+            contract_dict["factures"] = [bill.to_dict() for bill in self.factures]
+        return contract_dict
+
+class Echeance(Base):
+    """
+    Représente une échéance (fin de préavis ou fin) d'un contrat.
+    Table d'index maintenue automatiquement à chaque création, modification ou suppression
+    d'un contrat (voir les évènements de mapper ci-dessous) : les rapports et tableaux de bord
+    interrogent des fenêtres de dates via l'index (type_echeance, date_echeance).
+    Attributs :
+        id (int): Identifiant unique de l'échéance.
+        id_contrat (int): Identifiant du contrat associé.
+        type_echeance (str): Type d'échéance ('preavis' ou 'fin').
+        date_echeance (date): Date de l'échéance.
+    Relations :
+        contrat (Contract): Contrat associé à l'échéance.
+    """
+    __tablename__ = '03_echeances'
+    __table_args__ = (
+        UniqueConstraint('id_contrat', 'type_echeance', name='uq_03_echeances_contrat_type'),
+        Index('ix_03_echeances_type_date', 'type_echeance', 'date_echeance'),
+    )
+
+    # Données principales
+    id = mapped_column(Integer, primary_key=True)
+    id_contrat = mapped_column(Integer, ForeignKey(PK_CONTRACT, ondelete='CASCADE'), nullable=False)
+    type_echeance = mapped_column(String(20), nullable=False)
+    date_echeance = mapped_column(Date, nullable=False)
+
+    # Relations
+    contrat = relationship("Contract", viewonly=True)
+
+    def __repr__(self) -> str:
+        """
+        Représentation textuelle de l'objet Echeance.
+        Exemple :
+            ```console
+            <Echeance(id=1, id_contrat=1, type_echeance='preavis', date_echeance=2025-06-30)>
+            ```
+        """
+        return (f"<Echeance(id={self.id}, id_contrat={self.id_contrat}, type_echeance='{self.type_echeance}', "
+            f"date_echeance={self.date_echeance})>")
+
+def _as_date(value: Any) -> Optional[date]:
+    """
+    Convertit une valeur de date (objet date ou chaîne 'YYYY-MM-DD' issue d'un formulaire) en date.
+    Retourne None pour une valeur vide.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+def _synchroniser_echeances(connection: Connection, contract: 'Contract') -> None:
+    """
+    Réécrit les échéances d'un contrat dans la table 03_echeances.
+    Exécuté dans la transaction du flush du contrat.
+    """
+    table = Echeance.__table__
+    connection.execute(table.delete().where(table.c.id_contrat == contract.id))
+    rows = [{'id_contrat': contract.id, 'type_echeance': type_echeance, 'date_echeance': date_echeance}
+            for type_echeance, date_echeance in ((TYPE_ECHEANCE_PREAVIS, _as_date(contract.date_fin_preavis)),
+                                                 (TYPE_ECHEANCE_FIN, _as_date(contract.date_fin)))
+            if date_echeance]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+@event.listens_for(Contract, 'after_insert')
+def _contract_after_insert(mapper: Mapper[Any], connection: Connection, contract: Contract) -> None:
+    """Création des échéances d'un nouveau contrat."""
+    _synchroniser_echeances(connection, contract)
+
+@event.listens_for(Contract, 'after_update')
+def _contract_after_update(mapper: Mapper[Any], connection: Connection, contract: Contract) -> None:
+    """Mise à jour des échéances lorsque les dates du contrat changent."""
+    state = inspect(contract)
+    if state.attrs.date_fin_preavis.history.has_changes() or state.attrs.date_fin.history.has_changes():
+        _synchroniser_echeances(connection, contract)
+
+@event.listens_for(Contract, 'before_delete')
+def _contract_before_delete(mapper: Mapper[Any], connection: Connection, contract: Contract) -> None:
+    """Suppression des échéances d'un contrat supprimé."""
+    table = Echeance.__table__
+    connection.execute(table.delete().where(table.c.id_contrat == contract.id))
+
+class Blob(Base):
+    """
+    Représente un fichier du magasin adressé par contenu (voir le module stockage.py).
+    Le fichier est stocké une seule fois sous son empreinte SHA-256, quel que soit le nombre
+    de documents, factures ou documents à signer qui le référencent (colonne `hash_fichier`).
+    Le compteur de références est tenu à jour par les évènements de mapper ci-dessous ;
+    les fichiers sans référence sont supprimés par une tâche planifiée.
+    Attributs :
+        hash (str): Empreinte SHA-256 du contenu (clé primaire, nom du fichier dans le magasin).
+        taille (int): Taille du fichier en octets.
+        nb_references (int): Nombre de lignes référençant le fichier.
+        created_at (datetime): Date et heure du premier dépôt.
+        used_at (datetime): Date et heure du dernier dépôt (délai de grâce avant suppression).
+    """
+    __tablename__ = '10_fichiers'
+    __table_args__ = (
+        Index('ix_10_fichiers_references_used', 'nb_references', 'used_at'),
+    )
+
+    # Données principales
+    hash = mapped_column(String(64), primary_key=True)
+    taille = mapped_column(BigInteger, nullable=False)
+    nb_references = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    created_at = mapped_column(DateTime, nullable=False, default=func.now())
+    used_at = mapped_column(DateTime, nullable=False, default=func.now())
+
+    def __repr__(self) -> str:
+        """
+        Représentation textuelle de l'objet Blob.
+        Exemple :
+            ```console
+            <Blob(hash='9f86d08...', taille=1024, nb_references=2)>
+            ```
+        """
+        return f"<Blob(hash='{self.hash[:7]}...', taille={self.taille}, nb_references={self.nb_references})>"
+
+class FichierStocke:
+    """
+    Fichier rattaché par nom (`str_lien`) et par empreinte (`hash_fichier`), partagé par
+    les documents et les factures des contrats.
+    Méthodes :
+        file_path() -> Optional[str]: Retourne le chemin du fichier sur le serveur.
+    """
+    str_lien: Any
+    hash_fichier: Any
+
+    def file_path(self) -> Optional[str]:
+        """
+        Retourne le chemin du fichier sur le serveur (magasin par empreinte, ou dossier
+        des documents pour un fichier stocké par nom avant migration).
+        Returns :
+            Optional[str]: Le chemin du fichier, ou None si aucun fichier n'est rattaché.
+        Exemple :
+            ```python
+            chemin = document.file_path()
+            ```
+        """
+        if not self.str_lien:
+            return None
+        from docs import stored_file_path
+        from stockage import chemin_stocke
+        return stored_file_path(self.str_lien, chemin_stocke(self.hash_fichier))
+
 class Contacts(Base):
     """
     Représente un contact associé à un contrat.
@@ -184,6 +378,9 @@ class Contacts(Base):
     
     """
     __tablename__ = '02_contacts'
+    __table_args__ = (
+        Index('ft_02_contacts', 'nom', 'mail', 'ville', mysql_prefix='FULLTEXT'),
+    )
 
     # Données principales
     id = mapped_column(Integer, primary_key=True)
@@ -218,7 +415,26 @@ class Contacts(Base):
             f"tel_portable='{self.tel_portable}', adresse='{self.adresse}', code_postal='{self.code_postal}', "
             f"ville='{self.ville}', pays='{self.pays}')>")
 
-class Document(Base):
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Retourne un dictionnaire représentant le contact.
+        Returns :
+            Dict[str, Any]: Dictionnaire des attributs du contact.
+        """
+        return {
+            "id": self.id,
+            "id_contrat": self.id_contrat,
+            "nom": self.nom,
+            "fonction": self.fonction,
+            "mail": self.mail,
+            "tel_fixe": self.tel_fixe,
+            "tel_portable": self.tel_portable,
+            "adresse": self.adresse,
+            "code_postal": self.code_postal,
+            "ville": self.ville
+        }
+
+class Document(FichierStocke, Base):
     """
     Représente un document associé à un contrat.
     Attributs :
@@ -230,6 +446,7 @@ class Document(Base):
         descriptif (str): Descriptif du document.
         str_lien (str): Chemin du fichier stocké.
         name (str): Nom du fichier stocké.
+        hash_fichier (str): SHA-256 du fichier : clé du magasin de fichiers (10_fichiers) et ETag.
     Relations :
         contrat (Contract): Contrat associé au document.
     Méthodes :
@@ -243,12 +460,15 @@ class Document(Base):
             Télécharge le fichier associé au document.
         rename_file() -> bool:
             Change le nom du fichier associé au document.
-        download() -> Optional[io.BytesIO]:
+        download() -> Optional[Response]:
             Télécharge le fichier associé au document.
         switch(file_to_switch: FileStorage, old_file_name: str) -> bool:
             Remplace le fichier du document par un nouveau fichier.
     """
     __tablename__ = '11_documents'
+    __table_args__ = (
+        Index('ft_11_documents', 'descriptif', mysql_prefix='FULLTEXT'),
+    )
 
     # Données principales
     id = mapped_column(Integer, primary_key=True)
@@ -261,6 +481,7 @@ class Document(Base):
     # Données du fichier binaire
     str_lien = mapped_column(String(255), nullable=True)
     name = mapped_column(String(30), nullable=True)
+    hash_fichier = mapped_column(String(64), nullable=True, active_history=True)  # clé du magasin 10_fichiers
 
     # Relations
     contrat = relationship("Contract", back_populates="documents")
@@ -279,6 +500,23 @@ class Document(Base):
         return (f"<Document(id={self.id}, name='{self.name}', date_document={self.date_document}, "
             f"id_contrat={self.id_contrat}, type_document='{self.type_document}', "
             f"sous_type_document='{self.sous_type_document}', descriptif='{self.descriptif}')>")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Retourne un dictionnaire représentant le document.
+        Returns :
+            Dict[str, Any]: Dictionnaire des attributs du document.
+        """
+        return {
+            "id": self.id,
+            "id_contrat": self.id_contrat,
+            "date_document": self.date_document.isoformat() if self.date_document else None,
+            "type_document": self.type_document,
+            "sous_type_document": self.sous_type_document,
+            "descriptif": self.descriptif,
+            "str_lien": self.str_lien,
+            "name": self.name
+        }
     
     def _get_extension(self, *, binary_file: Optional[FileStorage]=None) -> str:
         """
@@ -328,31 +566,36 @@ class Document(Base):
     def upload(self, *, file_to_upload: FileStorage) -> bool:
         """
         Fonction pour uploader le fichier du document.
-        Utilise la fonction upload_file du module docs.py.
+        Utilise la fonction stocker du module stockage.py (magasin adressé par contenu).
         Arguments :
             file (io.BytesIO): Fichier binaire à uploader
             extension (str): Extension du fichier (ex: .pdf, .docx)
         Returns :
             bool: True si l'upload a réussi, False sinon.
+        Raises :
+            UploadTooLargeError: Si le fichier dépasse la taille autorisée.
         Exemple d'utilisation :
             ```python
             document.upload(file_to_upload=binary_file)
             ```
         """
+        from docs import UploadTooLargeError
+        from stockage import stocker
         try:
-            from docs import upload_file
             if self.str_lien:
-                upload_file(file_to_upload, file_name=self.str_lien)
+                self.hash_fichier, _ = stocker(object_session(self) or g.db_session, file_to_upload, kind='document')
                 return True
             else:
                 return False
+        except UploadTooLargeError:
+            raise
         except Exception:
             return False
 
     def rename_file(self) -> bool:
         """
         Fonction pour changer le nom du fichier du document.
-        Utilise la fonction rename_file du module docs.py.
+        Le fichier du magasin n'est pas touché : seul le nom proposé au téléchargement change.
         Arguments :
             new_name (str): Nouveau nom sans extension
             extension (str): Extension du fichier (ex: .pdf, .docx)
@@ -365,10 +608,13 @@ class Document(Base):
         """
         try:
             if self.str_lien:
-                from docs import rename_file
+                from stockage import chemin_stocke
                 old_name = self.str_lien
                 self.create_name()
-                rename_file(old_file_name=old_name, new_file_name=self.str_lien)
+                # Fichier du magasin : seul le nom proposé au téléchargement change
+                if chemin_stocke(self.hash_fichier) is None:
+                    from docs import rename_file
+                    rename_file(old_file_name=old_name, new_file_name=self.str_lien)
                 return True
             else:
                 return False
@@ -382,7 +628,7 @@ class Document(Base):
         Arguments :
             None
         Returns :
-            io.BytesIO: Fichier binaire téléchargé, ou None si échec.
+            Response: Réponse Flask de téléchargement (fichier envoyé par blocs), ou None si échec.
         exemple :
             ```python
             file = document.download()
@@ -393,7 +639,9 @@ class Document(Base):
         try:
             if self.str_lien:
                 from docs import download_file
-                return download_file(self.str_lien)
+                from stockage import chemin_stocke
+                return download_file(self.str_lien, etag=self.hash_fichier,
+                                     file_path=chemin_stocke(self.hash_fichier))
         except Exception:
             return None
 
@@ -404,19 +652,28 @@ class Document(Base):
             file (FileStorage): Nouveau fichier binaire
         Returns :
             bool: True si le remplacement a réussi, False sinon.
+        Raises :
+            UploadTooLargeError: Si le fichier dépasse la taille autorisée.
         Exemple d'utilisation :
             ```python
             document.switch(file_to_switch=binary_file, old_file_name='ancien_nom.pdf')
             ```
         """
+        from docs import UploadTooLargeError, remove_file
+        from stockage import stocker, chemin_stocke
         try:
             if self.str_lien:
-                from docs import exchange_files
+                # Ancien fichier encore stocké par nom (avant migration) : supprimé après remplacement
+                ancien_par_nom = chemin_stocke(self.hash_fichier) is None
                 self.create_name(binary_file=file_to_switch)
-                return exchange_files(old_file_name=old_file_name, new_file=file_to_switch,
-                                      new_file_name=self.str_lien)
+                self.hash_fichier, _ = stocker(object_session(self) or g.db_session, file_to_switch, kind='document')
+                if ancien_par_nom:
+                    remove_file(old_file_name)
+                return True
             else:
                 return False
+        except UploadTooLargeError:
+            raise
         except Exception:
             return False
 
@@ -437,6 +694,9 @@ class Event(Base):
             Retourne une représentation textuelle de l'objet Event.
     """
     __tablename__ = '12_evenements'
+    __table_args__ = (
+        Index('ft_12_evenements', 'descriptif', mysql_prefix='FULLTEXT'),
+    )
 
     # Données principales
     id = mapped_column(Integer, primary_key=True)
@@ -462,8 +722,23 @@ class Event(Base):
         """
         return (f"<Event(id={self.id}, id_contrat={self.id_contrat}, date_evenement={self.date_evenement}, "
         f"type_evenement='{self.type_evenement}', sous_type_evenement='{self.sous_type_evenement}', descriptif='{self.descriptif}')>")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Retourne un dictionnaire représentant l'évènement.
+        Returns :
+            Dict[str, Any]: Dictionnaire des attributs de l'évènement.
+        """
+        return {
+            "id": self.id,
+            "id_contrat": self.id_contrat,
+            "type_evenement": self.type_evenement,
+            "sous_type_evenement": self.sous_type_evenement,
+            "date_evenement": self.date_evenement.isoformat() if self.date_evenement else None,
+            "descriptif": self.descriptif
+        }
     
-class Bill(Base):
+class Bill(FichierStocke, Base):
     """
     Représente une facture associée à un contrat.
     Attributs :
@@ -474,6 +749,7 @@ class Bill(Base):
         montant (Decimal): Montant de la facture.
         str_lien (str): Chemin du fichier de la facture.
         name (str): Nom du fichier de la facture.
+        hash_fichier (str): SHA-256 du fichier : clé du magasin de fichiers (10_fichiers) et ETag.
     Relations :
         contrat (Contract): Contrat associé à la facture.
     Méthodes :
@@ -487,23 +763,27 @@ class Bill(Base):
             Uploade le fichier de la facture.
         rename_file() -> bool:
             Change le nom du fichier de la facture.
-        download() -> Optional[io.BytesIO]:
+        download() -> Optional[Response]:
             Télécharge le fichier de la facture.
         switch(file_to_switch: FileStorage, old_file_name: str) -> bool:
             Remplace le fichier de la facture par un nouveau fichier.
     """
     __tablename__ = '13_factures'
+    __table_args__ = (
+        Index('ft_13_factures', 'titre_facture', mysql_prefix='FULLTEXT'),
+    )
 
     # Données principales
     id = mapped_column(Integer, primary_key=True, autoincrement=True)
-    id_contrat = mapped_column(Integer, ForeignKey(PK_CONTRACT), nullable=False)
-    date_facture = mapped_column(Date, nullable=False)
+    id_contrat = mapped_column(Integer, ForeignKey(PK_CONTRACT), nullable=False, active_history=True)
+    date_facture = mapped_column(Date, nullable=False, active_history=True)     # cumuls de 14_depenses
     titre_facture = mapped_column(String(255), nullable=False)
-    montant = mapped_column(Numeric(10, 2), nullable=False)
+    montant = mapped_column(Numeric(10, 2), nullable=False, active_history=True)
 
     # Données du fichier binaire
     str_lien = mapped_column(String(255), nullable=True)
     name = mapped_column(String(30), nullable=True)
+    hash_fichier = mapped_column(String(64), nullable=True, active_history=True)  # clé du magasin 10_fichiers
 
     # Relations
     contrat = relationship("Contract", back_populates="factures")
@@ -521,6 +801,22 @@ class Bill(Base):
         """
         return (f"<Bill(id={self.id}, id_contrat={self.id_contrat}, date_facture={self.date_facture}, "
             f"titre_facture='{self.titre_facture}', montant={self.montant}, lien='{self.str_lien}')>")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Retourne un dictionnaire représentant la facture.
+        Returns :
+            Dict[str, Any]: Dictionnaire des attributs de la facture.
+        """
+        return {
+            "id": self.id,
+            "id_contrat": self.id_contrat,
+            "date_facture": self.date_facture.isoformat() if self.date_facture else None,
+            "titre_facture": self.titre_facture,
+            "montant": float(self.montant) if self.montant is not None else None,
+            "str_lien": self.str_lien,
+            "name": self.name
+        }
     
     def _get_extension(self, *, binary_file: Optional[FileStorage]=None) -> str:
         """
@@ -570,31 +866,36 @@ class Bill(Base):
     def upload(self, *, file_to_upload: FileStorage) -> bool:
         """
         Fonction pour uploader le fichier de la facture.
-        Utilise la fonction upload_file du module docs.py.
+        Utilise la fonction stocker du module stockage.py (magasin adressé par contenu).
         Arguments :
             file : Fichier binaire à uploader (io.BytesIO)
             extension : Extension du fichier (ex: .pdf, .docx)
         Returns :
             bool: True si l'upload a réussi, False sinon.
+        Raises :
+            UploadTooLargeError: Si le fichier dépasse la taille autorisée.
         Exemple d'utilisation :
             ```python
             bill.upload(file_to_upload=binary_file)
             ```
         """
+        from docs import UploadTooLargeError
+        from stockage import stocker
         try:
-            from docs import upload_file
             if self.str_lien:
-                upload_file(file_to_upload, file_name=self.str_lien)
+                self.hash_fichier, _ = stocker(object_session(self) or g.db_session, file_to_upload, kind='facture')
                 return True
             else:
                 return False
+        except UploadTooLargeError:
+            raise
         except Exception:
             return False
 
     def rename_file(self) -> bool:
         """
         Fonction pour changer le nom du fichier du document.
-        Utilise la fonction rename_file du module docs.py.
+        Le fichier du magasin n'est pas touché : seul le nom proposé au téléchargement change.
         Arguments :
             new_name (str): Nouveau nom sans extension
             extension (str): Extension du fichier (ex: .pdf, .docx)
@@ -607,10 +908,13 @@ class Bill(Base):
         """
         try:
             if self.str_lien:
-                from docs import rename_file
+                from stockage import chemin_stocke
                 old_name = self.str_lien
                 self.create_name()
-                rename_file(old_file_name=old_name, new_file_name=self.str_lien)
+                # Fichier du magasin : seul le nom proposé au téléchargement change
+                if chemin_stocke(self.hash_fichier) is None:
+                    from docs import rename_file
+                    rename_file(old_file_name=old_name, new_file_name=self.str_lien)
                 return True
             else:
                 return False
@@ -623,7 +927,7 @@ class Bill(Base):
         Utilise la fonction download_file du module docs.py.
         Arguments : None
         Returns :
-            io.BytesIO: Fichier binaire téléchargé, ou None si échec.
+            Response: Réponse Flask de téléchargement (fichier envoyé par blocs), ou None si échec.
         Exemple :
             ```python
             file = bill.download()
@@ -634,10 +938,12 @@ class Bill(Base):
         try:
             if self.str_lien:
                 from docs import download_file
-                return download_file(self.str_lien)
+                from stockage import chemin_stocke
+                return download_file(self.str_lien, etag=self.hash_fichier,
+                                     file_path=chemin_stocke(self.hash_fichier))
         except Exception:
             return None
-        
+
     def switch(self, *, file_to_switch: FileStorage, old_file_name: str) -> bool:
         """
         Fonction pour remplacer le fichier de la facture par un nouveau fichier.
@@ -645,19 +951,28 @@ class Bill(Base):
             file : Nouveau fichier binaire (FileStorage)
         Returns :
             bool: True si le remplacement a réussi, False sinon.
+        Raises :
+            UploadTooLargeError: Si le fichier dépasse la taille autorisée.
         Exemple d'utilisation :
             ```python
             bill.switch(file_to_switch=new_file, old_file_name=old_file_name)
             ```
         """
+        from docs import UploadTooLargeError, remove_file
+        from stockage import stocker, chemin_stocke
         try:
             if self.str_lien:
-                from docs import exchange_files
+                # Ancien fichier encore stocké par nom (avant migration) : supprimé après remplacement
+                ancien_par_nom = chemin_stocke(self.hash_fichier) is None
                 self.create_name(binary_file=file_to_switch)
-                return exchange_files(old_file_name=old_file_name, new_file=file_to_switch,
-                                      new_file_name=self.str_lien)
+                self.hash_fichier, _ = stocker(object_session(self) or g.db_session, file_to_switch, kind='facture')
+                if ancien_par_nom:
+                    remove_file(old_file_name)
+                return True
             else:
                 return False
+        except UploadTooLargeError:
+            raise
         except Exception:
             return False
 
@@ -675,19 +990,28 @@ class DocToSigne(Base):
         description (str): Description du document.
         chemin_fichier (str): Chemin du fichier stocké.
         hash_fichier (str): Hash du fichier pour vérifier l'intégrité.
+        hash_signed_file (str): Hash du fichier signé final (sert aussi d'ETag au téléchargement).
+        nb_pages (int): Nombre de pages du PDF, relevé à l'analyse lors du téléversement.
         id_user (int): Identifiant de l'utilisateur créateur du document.
         cree_at (datetime): Date et heure de création du document.
         status (int): Statut du document (-2: annulé, -1: expiré, 0: en attente, 1: signé).
         limite_signature (datetime): Date limite pour la signature (calculée).
         complete_at (datetime): Date et heure de la complétion (signature finale).
+        id_campagne (int): Identifiant de la campagne d'origine (documents créés en masse, sinon None).
     Relations :
         user (User): Utilisateur créateur du document.
+        campagne (Campagne): Campagne de signature d'origine (si le document en fait partie).
         points (List[Points]): Liste des points de signature associés au document.
+        pages (List[Page]): Dimensions des pages du PDF (analyse au téléversement).
         signatures (List[Signatures]): Liste des signatures apposées sur le document.
     Méthodes :
         __repr__() -> str:
     """
     __tablename__ = '20_documents_a_signer'
+    __table_args__ = (
+        Index('ix_20_documents_status_limite', 'status', 'limite_signature'),
+        Index('ix_20_documents_campagne_status', 'id_campagne', 'status'),
+    )
     
     id = mapped_column(Integer, primary_key=True)
     doc_nom = mapped_column(String(255), nullable=False)            # nom_définitif du document
@@ -700,7 +1024,9 @@ class DocToSigne(Base):
     
     # Métadonnées techniques
     chemin_fichier = mapped_column(String(500), nullable=False)     # chemin du fichier
-    hash_fichier = mapped_column(String(64), nullable=False)        # hash du fichier pour intégrité
+    hash_fichier = mapped_column(String(64), nullable=False, active_history=True)  # hash du fichier (magasin)
+    hash_signed_file = mapped_column(String(64), nullable=True)     # hash du fichier signé final
+    nb_pages = mapped_column(Integer, nullable=True)                # nombre de pages (analyse au téléversement)
     id_user = mapped_column(Integer, ForeignKey(PK_USER), nullable=True) # identifiant créateur
     cree_at = mapped_column(DateTime, default=func.now())
     
@@ -708,11 +1034,14 @@ class DocToSigne(Base):
     status = mapped_column(Integer, nullable=False, default=0)      # -2: annulé, -1: expiré, 0: en attente, 1: signé
     limite_signature = mapped_column(DateTime, Computed("DATE_ADD(cree_at, INTERVAL echeance DAY)"), nullable=True)
     complete_at = mapped_column(DateTime, nullable=True)
+    id_campagne = mapped_column(Integer, ForeignKey('26_campagnes.id', ondelete='SET NULL'), nullable=True)
     
     # Relations
     user = relationship("User", back_populates="documents")
+    campagne = relationship("Campagne", back_populates="documents")
     points = relationship("Points", back_populates="document", cascade=CASCADE)
     invitation = relationship("Invitation", back_populates="document", cascade=CASCADE)
+    pages = relationship("Page", back_populates="document", cascade=CASCADE, order_by="Page.page_num")
 
     def __repr__(self) -> str:
         """
@@ -727,28 +1056,177 @@ class DocToSigne(Base):
         """
         return f"<DocToSigne(id={self.id}, doc_nom={self.doc_nom}, status={self.status})>"
     
-    def download(self) -> Optional[io.BytesIO]:
+    def download(self) -> Optional[Response]:
         """
         Fonction pour télécharger le fichier du document à signer.
-        Utilise la fonction download_file du module docs.py.
+        Utilise la fonction send_stored_file du module docs.py : le fichier est envoyé
+        par blocs depuis le disque (Range, ETag issu du hash stocké, 304 conditionnel).
         Arguments : None
         Returns :
-            io.BytesIO: Fichier binaire téléchargé, ou None si échec.
+            Response: Réponse Flask de téléchargement, ou None si échec.
         Exemple :
             ```python
-            file = doc.download()
-            # or
-            doc.download()
+            response = doc.download()
             ```
         """
         try:
             if self.chemin_fichier:
-                with open(self.chemin_fichier, 'rb') as f:
-                    file_data = f.read()
-                    return io.BytesIO(file_data)
+                from docs import send_stored_file
+                return send_stored_file(self.chemin_fichier, download_name=self.doc_nom,
+                                        etag=self.hash_signed_file or self.hash_fichier)
         except Exception:
             return None
 
+def _ajuster_references(connection: Connection, empreinte: Optional[str], delta: int) -> None:
+    """
+    Ajuste le compteur de références d'un fichier du magasin 10_fichiers.
+    Sans effet si l'empreinte est vide ou inconnue du magasin (fichier stocké par nom avant migration).
+    Exécuté dans la transaction du flush de la ligne référençante.
+    """
+    if not empreinte:
+        return
+    table = Blob.__table__
+    connection.execute(table.update().where(table.c.hash == empreinte)
+                       .values(nb_references=table.c.nb_references + delta))
+
+def _fichier_after_insert(mapper: Mapper[Any], connection: Connection, target: Any) -> None:
+    """Nouvelle référence au fichier d'un document, d'une facture ou d'un document à signer."""
+    _ajuster_references(connection, target.hash_fichier, 1)
+
+def _fichier_after_update(mapper: Mapper[Any], connection: Connection, target: Any) -> None:
+    """
+    Transfert de la référence lorsque le fichier est remplacé
+    (`active_history` : l'ancienne empreinte est chargée même si l'attribut était expiré).
+    """
+    history = inspect(target).attrs.hash_fichier.history
+    if history.has_changes():
+        for empreinte in history.deleted:
+            _ajuster_references(connection, empreinte, -1)
+        for empreinte in history.added:
+            _ajuster_references(connection, empreinte, 1)
+
+def _fichier_after_delete(mapper: Mapper[Any], connection: Connection, target: Any) -> None:
+    """Libération de la référence d'une ligne supprimée."""
+    _ajuster_references(connection, target.hash_fichier, -1)
+
+for _modele in (Document, Bill, DocToSigne):
+    event.listen(_modele, 'after_insert', _fichier_after_insert)
+    event.listen(_modele, 'after_update', _fichier_after_update)
+    event.listen(_modele, 'after_delete', _fichier_after_delete)
+
+class Depense(Base):
+    """
+    Représente le cumul mensuel des factures d'un contrat.
+    Table de cumuls maintenue à chaque création, modification ou suppression d'une facture
+    (voir les évènements de mapper ci-dessous) : les tableaux de dépenses agrègent ces
+    cumuls par contrat, entreprise, type ou sous-type sans parcourir 13_factures.
+    Attributs :
+        id_contrat (int): Identifiant du contrat.
+        annee (int): Année des factures.
+        mois (int): Mois des factures (1 à 12).
+        montant (Decimal): Somme des montants des factures du mois.
+        nb_factures (int): Nombre de factures du mois.
+    """
+    __tablename__ = '14_depenses'
+    __table_args__ = (
+        Index('ix_14_depenses_periode', 'annee', 'mois'),
+    )
+
+    # Données principales
+    id_contrat = mapped_column(Integer, ForeignKey(PK_CONTRACT, ondelete='CASCADE'), primary_key=True)
+    annee = mapped_column(SmallInteger, primary_key=True, autoincrement=False)
+    mois = mapped_column(SmallInteger, primary_key=True, autoincrement=False)
+    montant = mapped_column(Numeric(14, 2), nullable=False, default=0)
+    nb_factures = mapped_column(Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        """
+        Représentation textuelle de l'objet Depense.
+        Exemple :
+            ```console
+            <Depense(id_contrat=1, annee=2026, mois=3, montant=1500.00, nb_factures=2)>
+            ```
+        """
+        return (f"<Depense(id_contrat={self.id_contrat}, annee={self.annee}, mois={self.mois}, "
+            f"montant={self.montant}, nb_factures={self.nb_factures})>")
+
+def cumuler_depenses(connection: Connection, mouvements: Iterable[Tuple[Any, Any, Any, int]]) -> None:
+    """
+    Reporte des factures ajoutées (+1) ou retirées (-1) dans les cumuls de 14_depenses,
+    regroupées par (contrat, année, mois) puis écrites par une insertion multiple avec mise
+    à jour des cumuls existants (`ON DUPLICATE KEY UPDATE`). Les cumuls vidés sont supprimés.
+    Exécuté dans la transaction de l'écriture des factures.
+    Args:
+        connection (Connection): La connexion de la transaction en cours.
+        mouvements (Iterable[Tuple[Any, Any, Any, int]]): (id_contrat, date_facture, montant, +1 ou -1).
+    """
+    cumuls: Dict[Tuple[int, int, int], List[Any]] = {}
+    for id_contrat, date_facture, montant, sens in mouvements:
+        jour = _as_date(date_facture)
+        if id_contrat is None or jour is None or montant in (None, ''):
+            continue
+        cumul = cumuls.setdefault((int(id_contrat), jour.year, jour.month), [Decimal(0), 0])
+        cumul[0] += Decimal(str(montant)) * sens
+        cumul[1] += sens
+    lignes = [{'id_contrat': id_contrat, 'annee': annee, 'mois': mois, 'montant': montant, 'nb_factures': nombre}
+              for (id_contrat, annee, mois), (montant, nombre) in cumuls.items() if montant or nombre]
+    if not lignes:
+        return
+
+    table = Depense.__table__
+    if connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+        requete = insert_sqlite(table)
+        requete = requete.on_conflict_do_update(
+            index_elements=['id_contrat', 'annee', 'mois'],
+            set_={'montant': table.c.montant + requete.excluded.montant,
+                  'nb_factures': table.c.nb_factures + requete.excluded.nb_factures})
+    else:
+        from sqlalchemy.dialects.mysql import insert as insert_mysql
+        requete = insert_mysql(table)
+        requete = requete.on_duplicate_key_update(montant=table.c.montant + requete.inserted.montant,
+                                                  nb_factures=table.c.nb_factures + requete.inserted.nb_factures)
+    connection.execute(requete, lignes)
+
+    vides = [ligne for ligne in lignes if ligne['nb_factures'] < 0]
+    if vides:
+        connection.execute(table.delete().where(table.c.id_contrat == bindparam('b_contrat'),
+                                                table.c.annee == bindparam('b_annee'),
+                                                table.c.mois == bindparam('b_mois'),
+                                                table.c.nb_factures <= 0),
+                           [{'b_contrat': ligne['id_contrat'], 'b_annee': ligne['annee'], 'b_mois': ligne['mois']}
+                            for ligne in vides])
+
+def _valeurs_facture(bill: 'Bill', anciennes: bool = False) -> Tuple[Any, Any, Any]:
+    """
+    Retourne (id_contrat, date_facture, montant) d'une facture, ou leurs valeurs avant
+    modification (`active_history` : chargées même si les attributs étaient expirés).
+    """
+    if not anciennes:
+        return bill.id_contrat, bill.date_facture, bill.montant
+    state = inspect(bill)
+    return tuple(history.deleted[0] if history.deleted else (history.unchanged or [None])[0]
+                 for history in (state.attrs.id_contrat.history, state.attrs.date_facture.history,
+                                 state.attrs.montant.history))  # type: ignore[return-value]
+
+@event.listens_for(Bill, 'after_insert')
+def _bill_after_insert(mapper: Mapper[Any], connection: Connection, bill: Bill) -> None:
+    """Ajout d'une facture à son cumul mensuel."""
+    cumuler_depenses(connection, [(*_valeurs_facture(bill), 1)])
+
+@event.listens_for(Bill, 'after_update')
+def _bill_after_update(mapper: Mapper[Any], connection: Connection, bill: Bill) -> None:
+    """Transfert d'une facture modifiée (contrat, date ou montant) entre cumuls mensuels."""
+    state = inspect(bill)
+    if any(state.attrs[nom].history.has_changes() for nom in ('id_contrat', 'date_facture', 'montant')):
+        cumuler_depenses(connection, [(*_valeurs_facture(bill, anciennes=True), -1), (*_valeurs_facture(bill), 1)])
+
+@event.listens_for(Bill, 'before_delete')
+def _bill_before_delete(mapper: Mapper[Any], connection: Connection, bill: Bill) -> None:
+    """Retrait d'une facture supprimée de son cumul mensuel (attributs expirés rechargés avant la suppression)."""
+    _valeurs_facture(bill)
+    cumuler_depenses(connection, [(*_valeurs_facture(bill, anciennes=True), -1)])
+
 class Points(Base):
     """
     Représente un point de signature sur un document PDF.
@@ -769,6 +1247,10 @@ class Points(Base):
         __repr__() -> str: Représentation textuelle de l'objet Points.
     """
     __tablename__ = '21_points'
+    __table_args__ = (
+        Index('ix_21_points_user_status', 'id_user', 'status'),
+        Index('ix_21_points_document_status', 'id_document', 'status'),
+    )
     
     id = mapped_column(Integer, primary_key=True)
     id_document = mapped_column(Integer, ForeignKey(PK_DOC_TO_SIGNE), nullable=False)
@@ -926,6 +1408,7 @@ class Invitation(Base):
         signe_at (datetime): Date et heure de la signature (nullable).
         mail_envoye (bool): Indique si l'e-mail a été envoyé.
         mail_compte (int): Nombre de tentatives d'envoi d'e-mail.
+        status (int): Statut de l'invitation (-2: annulé, -1: expiré, 0: en attente, 1: signé).
     Relations :
         document (DocToSigne): Document associé à l'invitation.
         user (User): Utilisateur invité.
@@ -933,6 +1416,10 @@ class Invitation(Base):
         __repr__() -> str: Représentation textuelle de l'objet Invitation.
     """
     __tablename__ = '23_invitations'
+    __table_args__ = (
+        Index('ix_23_invitations_status_expire', 'status', 'expire_at'),
+        Index('ix_23_invitations_envoi', 'mail_envoye', 'status'),
+    )
     
     # Données principales
     id = mapped_column(Integer, primary_key=True)
@@ -947,6 +1434,7 @@ class Invitation(Base):
     expire_at = mapped_column(DateTime, nullable=False)
     accede_at = mapped_column(DateTime, nullable=True)          # première consultation
     signe_at = mapped_column(DateTime, nullable=True)
+    status = mapped_column(Integer, nullable=False, default=0, server_default='0')  # -2: annulé, -1: expiré, 0: en attente, 1: signé
     
     # Méta-données et OTP de validation
     mail_envoye = mapped_column(Boolean, default=False)
@@ -973,40 +1461,52 @@ class Invitation(Base):
 class AuditLog(Base):
     """
     Représentation de l'historique des actions sur les documents à signer.
+    La table est partitionnée par mois sous MariaDB (RANGE sur `timestamp`, clé primaire
+    (id, timestamp), sans clé étrangère) : les mois anciens sont archivés puis supprimés
+    par partition (module archivage_audit).
     Attributs :
         id (int): Identifiant unique de l'entrée de log.
-        id_document (int): Identifiant du document concerné.
+        id_document (int): Identifiant du document concerné (nullable : action sans document existant).
         id_user (int): Identifiant de l'utilisateur ayant effectué l'action (nullable).
         action (int): Type d'action effectuée (-2: annulé, -1: expiré, 0: créé, 1: consulté, 2: signé, 3: expédié).
-        details (str): Détails supplémentaires sur l'action (nullable).
+        code (int): Code de l'événement (libellés dans audit.LIBELLES_CODES, 0: succès).
+        details (str): Complément variable de l'événement (nullable).
         ip_addresse (str): Adresse IP de l'utilisateur au moment de l'action (nullable).
         user_agent (str): User-Agent du navigateur au moment de l'action (nullable).
-        timestamp (datetime): Date et heure de l'action.
+        timestamp (datetime): Date et heure de l'action (clé de partitionnement).
     Relations :
-        document (DocToSigne): Document concerné par l'action.
-        user (User): Utilisateur ayant effectué l'action (nullable).
+        document (DocToSigne): Document concerné par l'action (lecture seule).
+        user (User): Utilisateur ayant effectué l'action (lecture seule, nullable).
     Méthodes :
         __repr__() -> str: Représentation textuelle de l'objet AuditLog.
     """
     __tablename__ = '24_audit_logs'
-    
-    # Données principales
+    __table_args__ = (
+        Index('ix_24_audit_document_timestamp', 'id_document', 'timestamp'),
+        Index('ix_24_audit_user_timestamp', 'id_user', 'timestamp'),
+        Index('ix_24_audit_action_timestamp', 'action', 'timestamp'),
+        Index('ix_24_audit_timestamp', 'timestamp'),
+    )
+
+    # Données principales (pas de clé étrangère : non prises en charge sur une table partitionnée)
     id = mapped_column(Integer, primary_key=True)
-    id_document = mapped_column(Integer, ForeignKey(PK_DOC_TO_SIGNE), nullable=False)
-    id_user = mapped_column(Integer, ForeignKey(PK_USER), nullable=True)
+    id_document = mapped_column(Integer, nullable=True)
+    id_user = mapped_column(Integer, nullable=True)
 
     # Événement
-    action = mapped_column(Integer, nullable=False)  # -2: annuler, -1: expirer, 0: créer, 1: consulter, 2: signer, 3: expédier
+    action = mapped_column(SmallInteger, nullable=False)  # -2: annuler, -1: expirer, 0: créer, 1: consulter, 2: signer, 3: expédier
+    code = mapped_column(SmallInteger, nullable=False, default=0)
     details = mapped_column(String(255), nullable=True)
     
     # Contexte technique
     ip_addresse = mapped_column(String(45), nullable=True)
     user_agent = mapped_column(String(1024), nullable=True)
-    timestamp = mapped_column(DateTime, default=func.now())
+    timestamp = mapped_column(DateTime, nullable=False, default=func.now())
     
     # Relations
-    document = relationship("DocToSigne")
-    user = relationship("User")
+    document = relationship("DocToSigne", primaryjoin="foreign(AuditLog.id_document) == DocToSigne.id",
+                            viewonly=True)
+    user = relationship("User", primaryjoin="foreign(AuditLog.id_user) == User.id", viewonly=True)
 
     def __repr__(self) -> str:
         """
@@ -1029,6 +1529,187 @@ class AuditLog(Base):
         }.get(self.action, "inconnu")
         return f"<AuditLog(id={self.id}, {action} le {self.timestamp})>"
 
+class Page(Base):
+    """
+    Représente une page d'un document à signer, relevée à l'analyse du PDF lors du téléversement.
+    Les points de signature sont contrôlés sur ces dimensions au dépôt du document et la
+    génération du document signé les réutilise sans relire le PDF.
+    Attributs :
+        id (int): Identifiant unique de la page.
+        id_document (int): Identifiant du document associé.
+        page_num (int): Numéro de page (1-indexed).
+        largeur (Decimal): Largeur de la mediabox en points PDF (1/72 inch).
+        hauteur (Decimal): Hauteur de la mediabox en points PDF (1/72 inch).
+        rotation (int): Rotation d'affichage de la page (0, 90, 180 ou 270).
+    Relations :
+        document (DocToSigne): Document associé à la page.
+    Méthodes :
+        __repr__() -> str: Représentation textuelle de l'objet Page.
+        to_dict() -> Dict[str, Any]: Convertit l'objet Page en dictionnaire.
+    """
+    __tablename__ = '25_pages'
+    __table_args__ = (
+        UniqueConstraint('id_document', 'page_num', name='uq_25_pages_document_page'),
+    )
+
+    id = mapped_column(Integer, primary_key=True)
+    id_document = mapped_column(Integer, ForeignKey(PK_DOC_TO_SIGNE, ondelete='CASCADE'), nullable=False)
+    page_num = mapped_column(Integer, nullable=False)               # numéro de page (1-indexed)
+    largeur = mapped_column(Numeric(10, 2), nullable=False)         # largeur en points PDF
+    hauteur = mapped_column(Numeric(10, 2), nullable=False)         # hauteur en points PDF
+    rotation = mapped_column(Integer, nullable=False, default=0)    # 0, 90, 180 ou 270
+
+    # Relations
+    document = relationship("DocToSigne", back_populates="pages")
+
+    def __repr__(self) -> str:
+        """
+        Représentation textuelle de l'objet Page.
+        Exemple :
+            ```console
+            <Page(id_document=5, page_num=1, largeur=595.28, hauteur=841.89, rotation=0)>
+            ```
+        """
+        return (f"<Page(id_document={self.id_document}, page_num={self.page_num}, largeur={self.largeur}, "
+            f"hauteur={self.hauteur}, rotation={self.rotation})>")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convertit l'objet Page en dictionnaire (même format que le résultat de analyse_pdf.analyser_pdf).
+        Returns:
+            dict: Dictionnaire représentant la page.
+        """
+        return {
+            "page_num": self.page_num,
+            "largeur": float(self.largeur),
+            "hauteur": float(self.hauteur),
+            "rotation": self.rotation
+        }
+
+class Campagne(Base):
+    """
+    Représente une campagne de signature : un même PDF et une même disposition de points
+    envoyés à une liste de signataires (voir le module campagnes.py).
+    En mode individuel, chaque signataire reçoit son propre document ; en mode partagé,
+    tous signent le même document. Les documents, points et invitations sont créés par
+    insertions multiples et les invitations sont envoyées par lots en arrière-plan.
+    Attributs :
+        id (int): Identifiant unique de la campagne.
+        nom (str): Nom de la campagne (nom des documents créés).
+        mode (str): 'individuel' (un document par signataire) ou 'partage' (un document commun).
+        id_user (int): Identifiant de l'utilisateur créateur de la campagne.
+        url_racine (str): Racine des liens de signature envoyés par courriel.
+        nb_documents (int): Nombre de documents créés.
+        nb_signataires (int): Nombre de signataires invités.
+        cree_at (datetime): Date et heure de création de la campagne.
+    Relations :
+        user (User): Utilisateur créateur de la campagne.
+        documents (List[DocToSigne]): Documents à signer de la campagne.
+    """
+    __tablename__ = '26_campagnes'
+
+    id = mapped_column(Integer, primary_key=True)
+    nom = mapped_column(String(255), nullable=False)
+    mode = mapped_column(String(10), nullable=False)                # 'individuel' ou 'partage'
+    id_user = mapped_column(Integer, ForeignKey(PK_USER), nullable=True)
+    url_racine = mapped_column(String(255), nullable=False)         # racine des liens de signature
+    nb_documents = mapped_column(Integer, nullable=False, default=0)
+    nb_signataires = mapped_column(Integer, nullable=False, default=0)
+    cree_at = mapped_column(DateTime, default=func.now())
+
+    # Relations
+    user = relationship("User")
+    documents = relationship("DocToSigne", back_populates="campagne")
+
+    def __repr__(self) -> str:
+        """
+        Représentation textuelle de l'objet Campagne.
+        Exemple :
+            ```console
+            <Campagne(id=1, nom='Autorisation de sortie', mode='individuel', nb_documents=300)>
+            ```
+        """
+        return (f"<Campagne(id={self.id}, nom={self.nom}, mode={self.mode}, "
+            f"nb_documents={self.nb_documents})>")
+
+class PrintJob(Base):
+    """
+    Représente un travail d'impression de la file d'impression (voir le module impression.py).
+    Le travail est enregistré par la route d'impression puis envoyé à CUPS par un processus
+    léger de travail ; son état CUPS est ensuite suivi jusqu'à la fin de l'impression.
+    Attributs :
+        id (int): Identifiant unique du travail (référence retournée à l'utilisateur).
+        id_user (int): Identifiant de l'utilisateur demandeur.
+        titre (str): Titre du travail transmis à CUPS.
+        chemin_fichier (str): Chemin du fichier à imprimer (supprimé après envoi).
+        options (str): Options d'impression CUPS (JSON).
+        lot (str): Pour un lot, fichiers sources, plages de pages et imposition (JSON).
+        reference (str): Pour un fichier déjà stocké, sa référence ('document:<id>', 'facture:<id>',
+                         'signature:<id>') ; le fichier n'est alors ni copié ni supprimé.
+        status (int): Statut (-1: erreur, 0: en attente, 1: envoyé, 2: terminé, 3: en cours d'envoi).
+        cups_job_id (int): Identifiant du travail attribué par CUPS.
+        tentatives (int): Nombre de tentatives d'envoi.
+        reserve_at (datetime): Date et heure de la réservation du travail par un thread d'envoi (bail)
+                               ou de sa remise en attente après un échec.
+        erreur (str): Dernier message d'erreur.
+        created_at (datetime): Date et heure de la demande.
+        sent_at (datetime): Date et heure de l'envoi à CUPS.
+        completed_at (datetime): Date et heure de fin (impression terminée ou erreur).
+    Méthodes :
+        __repr__() -> str: Représentation textuelle de l'objet PrintJob.
+        to_dict() -> Dict[str, Any]: Convertit l'objet PrintJob en dictionnaire.
+    """
+    __tablename__ = '30_impressions'
+    __table_args__ = (
+        Index('ix_30_impressions_status_created', 'status', 'created_at'),
+    )
+
+    id = mapped_column(Integer, primary_key=True)
+    id_user = mapped_column(Integer, ForeignKey(PK_USER), nullable=True)
+    titre = mapped_column(String(255), nullable=False)
+    chemin_fichier = mapped_column(String(500), nullable=False)
+    options = mapped_column(Text, nullable=False, default='{}')
+    lot = mapped_column(Text, nullable=True)       # Lot fusionné : fichiers sources, plages et imposition (JSON)
+    reference = mapped_column(String(50), nullable=True)    # Fichier stocké imprimé par référence (ex. 'document:12')
+    status = mapped_column(Integer, nullable=False, default=0)      # -1: erreur, 0: en attente, 1: envoyé, 2: terminé, 3: en cours
+    cups_job_id = mapped_column(Integer, nullable=True)
+    tentatives = mapped_column(Integer, nullable=False, default=0)
+    reserve_at = mapped_column(DateTime, nullable=True)             # réservation (bail) ou remise en attente
+    erreur = mapped_column(Text, nullable=True)
+    created_at = mapped_column(DateTime, nullable=False, default=func.now())
+    sent_at = mapped_column(DateTime, nullable=True)
+    completed_at = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        """
+        Représentation textuelle de l'objet PrintJob.
+        Exemple :
+            ```console
+            <PrintJob(id=12, titre='Intranet-Jean Dupont', status=1, cups_job_id=345)>
+            ```
+        """
+        return (f"<PrintJob(id={self.id}, titre='{self.titre}', status={self.status}, "
+            f"cups_job_id={self.cups_job_id})>")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convertit l'objet PrintJob en dictionnaire.
+        Returns:
+            dict: Dictionnaire représentant le travail d'impression.
+        """
+        return {
+            "id": self.id,
+            "titre": self.titre,
+            "status": self.status,
+            "reference": self.reference,
+            "cups_job_id": self.cups_job_id,
+            "tentatives": self.tentatives,
+            "erreur": self.erreur,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "sent_at": self.sent_at.isoformat() if self.sent_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
+        }
+
 class ViewPoints:
     """
     Classe de vue 
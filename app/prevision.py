@@ -0,0 +1,299 @@
+"""
+=============================================================
+Prévision des dépenses de l'Intranet API'Raudière
+=============================================================
+Projection des dépenses des contrats jusqu'à leur date de fin, pour la préparation
+des budgets.
+
+L'historique est lu une seule fois par calcul, depuis la table de cumuls mensuels
+`14_depenses` (dérivée de `13_factures`, voir depenses.py), avec les dates des contrats.
+Le calcul est entièrement vectoriel (NumPy, une matrice contrats x mois) :
+- rythme mensuel de chaque contrat : dépense moyenne de ses mois actifs parmi les
+  RYTHME_MOIS derniers mois ;
+- saisonnalité : indice par mois calendaire calculé sur les HISTORIQUE_MOIS derniers
+  mois, propre au contrat et rapproché de celui de son type de contrat (moyenne pondérée
+  par le nombre d'années observées), ramené à une moyenne de 1 ;
+- projection : rythme x saisonnalité, du mois en cours jusqu'à la fin du contrat
+  (`date_fin`, sinon l'horizon de PREVISION_HORIZON_MOIS mois).
+
+Le résultat est associé à la version des données (empreinte de la table de cumuls,
+des dates des contrats et du mois de référence) : la tâche planifiée ne recalcule que
+lorsque cette version change, et enregistre le résultat dans un fichier JSON partagé
+par tous les processus du serveur, lu par la route de consultation.
+
+Exemple :
+    ```python
+    resultat = prevoir(session)
+    resultat['par_annee']  # {'2026': 18250.0, '2027': 21400.0}
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, TYPE_CHECKING, cast
+from sqlalchemy import extract, func, select
+from sqlalchemy.orm import Session
+from models import Contract, Depense
+from config import Config
+from logging import getLogger
+import hashlib
+import json
+import os
+import zlib
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = getLogger(__name__)
+
+# Fenêtres d'historique (en mois) : rythme mensuel et saisonnalité
+RYTHME_MOIS = 12
+HISTORIQUE_MOIS = 36
+
+# Poids de l'indice saisonnier du type de contrat (en années d'historique équivalentes)
+POIDS_SAISON_TYPE = 1.0
+
+# Nom du fichier de résultat
+FICHIER_PREVISION = 'prevision.json'
+
+
+def get_dossier_previsions() -> str:
+    """
+    Retourne le dossier du fichier de prévision (PREVISION_PATH, sinon sous-dossier 'previsions' des documents).
+    """
+    return Config.PREVISION_PATH or os.path.join(Config.UPLOAD_FOLDER or '/uploads', 'previsions')
+
+
+def _mois(jour: date) -> int:
+    """Retourne le numéro absolu d'un mois (année x 12 + mois - 1)."""
+    return jour.year * 12 + jour.month - 1
+
+
+def _somme_libelles(session: Session) -> Tuple[int, int]:
+    """
+    Empreinte des libellés des contrats (type et intitulé, qui regroupent la prévision) :
+    somme de `id * CRC32(libellé)` par colonne, agrégée par MariaDB, calculée à l'identique
+    (zlib) sur les autres bases qui n'ont pas de fonction CRC32.
+    """
+    colonnes = (Contract.type_contrat, Contract.intitule)
+    if session.get_bind().dialect.name in ('mysql', 'mariadb'):
+        sommes = session.execute(select(*[func.sum(Contract.id * func.crc32(colonne)) for colonne in colonnes])).one()
+        return cast(Tuple[int, int], tuple(int(somme or 0) for somme in sommes))
+    sommes = [0, 0]
+    for id_contrat, *libelles in session.execute(select(Contract.id, *colonnes)):
+        for rang, libelle in enumerate(libelles):
+            if libelle is not None:
+                sommes[rang] += id_contrat * zlib.crc32(libelle.encode('utf-8'))
+    return sommes[0], sommes[1]
+
+
+def version_donnees(session: Session, reference: date, horizon: int) -> str:
+    """
+    Retourne la version des données de la prévision : empreinte des agrégats de la table
+    de cumuls, des dates et des libellés des contrats (requêtes d'agrégat, sans lecture
+    de lignes sous MariaDB), du mois de référence et de l'horizon.
+    """
+    rang = Depense.annee * 12 + Depense.mois
+    cumuls = session.execute(select(func.count(), func.sum(Depense.nb_factures), func.sum(Depense.montant),
+                                    func.sum(Depense.montant * rang), func.sum(Depense.id_contrat * rang))).one()
+    jours = [extract('year', colonne) * 372 + extract('month', colonne) * 31 + extract('day', colonne)
+             for colonne in (Contract.date_debut, Contract.date_fin)]
+    contrats = session.execute(select(func.count(), func.max(Contract.id), func.sum(jours[0]), func.sum(jours[1]),
+                                      func.sum(Contract.id * jours[1]))).one()
+    empreinte = repr((tuple(cumuls), tuple(contrats), _somme_libelles(session), _mois(reference),
+                      horizon)).encode('utf-8')
+    return hashlib.sha256(empreinte).hexdigest()[:16]
+
+
+def charger(session: Session) -> Tuple['pd.DataFrame', 'pd.DataFrame']:
+    """
+    Lit les contrats et la table de cumuls, une requête chacune.
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: Les contrats (id, intitule, entreprise, type_contrat,
+            date_debut, date_fin) et les cumuls (id_contrat, annee, mois, montant).
+    """
+    import pandas as pd
+
+    contrats = pd.DataFrame(session.execute(select(Contract.id, Contract.intitule, Contract.entreprise,
+                                                   Contract.type_contrat, Contract.date_debut, Contract.date_fin)
+                                            ).all(),
+                            columns=['id', 'intitule', 'entreprise', 'type_contrat', 'date_debut', 'date_fin'])
+    depenses = pd.DataFrame(session.execute(select(Depense.id_contrat, Depense.annee, Depense.mois,
+                                                   Depense.montant)).all(),
+                            columns=['id_contrat', 'annee', 'mois', 'montant'])
+    return contrats, depenses
+
+
+def _rangs_mois(dates: 'pd.Series', defaut: int) -> Any:
+    """Convertit une colonne de dates en numéros absolus de mois (défaut pour les dates vides)."""
+    import numpy as np
+    import pandas as pd
+
+    horodatages = pd.to_datetime(dates, errors='coerce')
+    rangs = (horodatages.dt.year * 12 + horodatages.dt.month - 1).to_numpy(dtype='float64')
+    return np.where(np.isnan(rangs), defaut, rangs).astype(np.int64)
+
+
+def calculer(contrats: 'pd.DataFrame', depenses: 'pd.DataFrame', reference: date, horizon: int) -> Dict[str, Any]:
+    """
+    Calcule les rythmes mensuels, la saisonnalité et la projection de tous les contrats.
+    Args:
+        contrats (pd.DataFrame): Les contrats (voir charger).
+        depenses (pd.DataFrame): Les cumuls mensuels (voir charger).
+        reference (date): Le mois de référence (premier mois projeté).
+        horizon (int): Le nombre de mois projetés au plus.
+    Returns:
+        Dict[str, Any]: La projection par mois, par année, par type et année, et par contrat.
+    """
+    import numpy as np
+
+    nombre, debut_historique, ref = len(contrats), _mois(reference) - HISTORIQUE_MOIS, _mois(reference)
+    identifiants = contrats['id'].to_numpy(dtype=np.int64)
+    ordre = np.argsort(identifiants)
+    debut = _rangs_mois(contrats['date_debut'], 0)
+    fin = _rangs_mois(contrats['date_fin'], np.iinfo(np.int32).max)
+
+    # Matrice de l'historique : contrats x HISTORIQUE_MOIS derniers mois complets
+    historique = np.zeros((nombre, HISTORIQUE_MOIS))
+    if len(depenses) and nombre:
+        rang = depenses['annee'].to_numpy(dtype=np.int64) * 12 + depenses['mois'].to_numpy(dtype=np.int64) - 1
+        position = np.searchsorted(identifiants, depenses['id_contrat'].to_numpy(dtype=np.int64), sorter=ordre)
+        position = ordre[np.clip(position, 0, nombre - 1)]
+        garder = ((identifiants[position] == depenses['id_contrat'].to_numpy(dtype=np.int64))
+                  & (rang >= debut_historique) & (rang < ref))
+        np.add.at(historique, (position[garder], rang[garder] - debut_historique),
+                  depenses['montant'].to_numpy(dtype='float64')[garder])
+    mois_historique = np.arange(debut_historique, ref)
+    actif = (mois_historique[None, :] >= debut[:, None]) & (mois_historique[None, :] <= fin[:, None])
+
+    # Rythme mensuel : moyenne des mois actifs parmi les RYTHME_MOIS derniers
+    mois_actifs = actif[:, -RYTHME_MOIS:].sum(axis=1)
+    rythme = np.divide(historique[:, -RYTHME_MOIS:].sum(axis=1), mois_actifs,
+                       out=np.zeros(nombre), where=mois_actifs > 0)
+
+    # Saisonnalité : moyenne par mois calendaire rapportée à la moyenne mensuelle
+    calendrier = np.zeros((HISTORIQUE_MOIS, 12))
+    calendrier[np.arange(HISTORIQUE_MOIS), mois_historique % 12] = 1
+    sommes, annees = historique @ calendrier, actif.astype('float64') @ calendrier
+    moyenne = np.divide(historique.sum(axis=1), actif.sum(axis=1), out=np.zeros(nombre), where=actif.any(axis=1))
+    indice = np.divide(sommes, annees * moyenne[:, None], out=np.full((nombre, 12), np.nan),
+                       where=(annees > 0) & (moyenne[:, None] > 0))
+    types, code_type = np.unique(contrats['type_contrat'].astype(str).to_numpy(), return_inverse=True)
+    sommes_type, annees_type = np.zeros((len(types), 12)), np.zeros((len(types), 12))
+    moyenne_type = np.zeros((len(types), 12))
+    np.add.at(sommes_type, code_type, np.divide(sommes, moyenne[:, None], out=np.zeros((nombre, 12)),
+                                                where=moyenne[:, None] > 0))
+    np.add.at(annees_type, code_type, np.where(moyenne[:, None] > 0, annees, 0))
+    np.divide(sommes_type, annees_type, out=moyenne_type, where=annees_type > 0)
+    moyenne_type[annees_type == 0] = 1.0
+    poids = np.where(np.isnan(indice), 0, annees)
+    saison = ((np.nan_to_num(indice) * poids + moyenne_type[code_type] * POIDS_SAISON_TYPE)
+              / (poids + POIDS_SAISON_TYPE))
+    saison /= saison.mean(axis=1, keepdims=True)
+
+    # Projection : du mois de référence à la fin du contrat, dans la limite de l'horizon
+    mois_projetes = np.arange(ref, ref + horizon)
+    projete = ((mois_projetes[None, :] >= debut[:, None]) & (mois_projetes[None, :] <= fin[:, None]))
+    projection = rythme[:, None] * saison[:, mois_projetes % 12] * projete
+    annees_projetees = mois_projetes // 12
+    par_annee_contrat = {int(annee): projection[:, annees_projetees == annee].sum(axis=1)
+                         for annee in np.unique(annees_projetees)}
+
+    par_type: Dict[str, Dict[str, float]] = {}
+    for annee, montants in par_annee_contrat.items():
+        totaux_type = np.bincount(code_type, weights=montants, minlength=len(types))
+        for code, nom_type in enumerate(types):
+            par_type.setdefault(str(nom_type), {})[str(annee)] = round(float(totaux_type[code]), 2)
+    return {
+        'par_mois': {f'{rang // 12}-{rang % 12 + 1:02d}': round(float(montant), 2)
+                     for rang, montant in zip(mois_projetes, projection.sum(axis=0))},
+        'par_annee': {str(annee): round(float(montants.sum()), 2) for annee, montants in par_annee_contrat.items()},
+        'par_type': par_type,
+        'contrats': [{'id': int(identifiant), 'intitule': intitule, 'entreprise': entreprise,
+                      'type_contrat': type_contrat, 'rythme_mensuel': round(float(rythme_contrat), 2),
+                      'total': round(float(total), 2),
+                      'par_annee': {str(annee): round(float(montants[index]), 2)
+                                    for annee, montants in par_annee_contrat.items()}}
+                     for index, (identifiant, intitule, entreprise, type_contrat, rythme_contrat, total)
+                     in enumerate(zip(identifiants, contrats['intitule'], contrats['entreprise'],
+                                      contrats['type_contrat'], rythme, projection.sum(axis=1)))],
+    }
+
+
+def prevoir(session: Session, reference: Optional[date] = None, horizon: Optional[int] = None,
+            precedente: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Retourne la prévision des dépenses, recalculée seulement si la version des données a changé.
+    Args:
+        session (Session): La session de base de données.
+        reference (Optional[date]): Le mois de référence (défaut : le mois en cours).
+        horizon (Optional[int]): Le nombre de mois projetés (défaut : PREVISION_HORIZON_MOIS).
+        precedente (Optional[Dict[str, Any]]): La dernière prévision calculée (défaut : celle du fichier).
+    Returns:
+        Dict[str, Any]: La prévision (voir calculer), avec sa version, sa date de calcul,
+            son mois de référence et son horizon.
+    """
+    reference = (reference or date.today()).replace(day=1)
+    horizon = horizon or Config.PREVISION_HORIZON_MOIS
+    version = version_donnees(session, reference, horizon)
+    precedente = precedente if precedente is not None else derniere_prevision()
+    if precedente and precedente.get('version') == version:
+        return precedente
+
+    debut = datetime.now()
+    contrats, depenses = charger(session)
+    resultat = calculer(contrats, depenses, reference, horizon)
+    resultat.update({'version': version, 'calcule_le': datetime.now().isoformat(timespec='seconds'),
+                     'reference': reference.isoformat(), 'horizon': horizon})
+    logger.info(f"Prévision des dépenses : {len(contrats)} contrat(s) en "
+                f"{(datetime.now() - debut).total_seconds():.2f} s (version {version})")
+    return resultat
+
+
+def enregistrer(resultat: Dict[str, Any], dossier: Optional[str] = None) -> str:
+    """Enregistre une prévision dans le fichier partagé (écriture atomique). Retourne le chemin du fichier."""
+    dossier = dossier or get_dossier_previsions()
+    os.makedirs(dossier, exist_ok=True)
+    chemin = os.path.join(dossier, FICHIER_PREVISION)
+    temporaire = f'{chemin}.tmp'
+    with open(temporaire, 'w', encoding='utf-8') as fichier:
+        json.dump(resultat, fichier, ensure_ascii=False)
+    os.replace(temporaire, chemin)
+    return chemin
+
+
+def derniere_prevision(dossier: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Retourne la dernière prévision enregistrée (None s'il n'y en a pas), mise en cache
+    selon la date de modification du fichier.
+    """
+    chemin = os.path.join(dossier or get_dossier_previsions(), FICHIER_PREVISION)
+    try:
+        return _lire_prevision(chemin, os.path.getmtime(chemin))
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=2)
+def _lire_prevision(chemin: str, mtime: float) -> Dict[str, Any]:
+    """
+    Lecture effective du fichier de prévision, mise en cache par (chemin, date de modification).
+    """
+    with open(chemin, 'r', encoding='utf-8') as fichier:
+        return json.load(fichier)
+
+
+def tache_prevision(session: Session) -> Dict[str, Any]:
+    """
+    Tâche planifiée : recalcule la prévision si les données ont changé et l'enregistre.
+    Returns:
+        Dict[str, Any]: La version de la prévision et l'indicateur de recalcul.
+    """
+    precedente = derniere_prevision()
+    resultat = prevoir(session, precedente=precedente)
+    recalcul = resultat is not precedente
+    if recalcul:
+        enregistrer(resultat)
+    return {'version': resultat['version'], 'recalcul': recalcul}
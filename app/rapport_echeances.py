@@ -1,53 +1,169 @@
-from datetime import datetime, timedelta
-from sqlalchemy import and_
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from flask import g, render_template
-from config import Config
-from models import Contract
-from logging import getLogger
-
-logger = getLogger(__name__)
-
-def envoi_contrats_renego(mail: str):
-    # Connexion à la base de données
-    conn = g.db_session
-
-    # Calcul des dates limites
-    date_4_mois = (datetime.now() + timedelta(days=4*30)).strftime('%Y-%m-%d')
-    date_6_mois = (datetime.now() + timedelta(days=6*30)).strftime('%Y-%m-%d')
-
-    # Extraction des contrats
-    contracts = conn.query(Contract).filter(and_(Contract.date_fin_preavis >= date_4_mois, Contract.date_fin_preavis <= date_6_mois)).all()
-    logger.info(f"Nombre de contrats à renégocier trouvés : {len(contracts)}")
-    if contracts:
-        # Configuration de l'e-mail
-        email_expediteur: str = Config.EMAIL_USER
-        mot_de_passe: str = Config.EMAIL_PASSWORD
-
-        logger.info(f"Préparation de l'envoi de l'e-mail à {mail}")
-
-        msg = MIMEMultipart()
-        msg['From'] = email_expediteur
-        msg['To'] = mail
-        msg['Subject'] = 'IMPORTANT - Liste hebdomadaire des contrats à renégocier'
-
-        body = render_template('mail_echeance.html', date_4_mois=date_4_mois,
-                           date_6_mois=date_6_mois, contrats=contracts)
-        logger.info("Corps de l'e-mail généré avec succès.")
-        msg.attach(MIMEText(body, 'html'))
-
-        # Envoyer l'e-mail
-        try:
-            with smtplib.SMTP(Config.EMAIL_SMTP, Config.EMAIL_PORT) as server:
-                server.starttls()
-                server.login(email_expediteur, mot_de_passe)
-                server.send_message(msg)
-            logger.info(f"E-mail envoye avec succes a {mail}")
-        except Exception as e:
-            logger.error(f"Erreur lors de l envoi de l e-mail : {e}")
-        finally:
-            conn.close()
-    else:
-        conn.close()
\ No newline at end of file
+"""
+=============================================================
+Rapport des échéances de contrats de l'Intranet API'Raudière
+=============================================================
+Module d'extraction et d'envoi des contrats arrivant à échéance.
+
+Les échéances sont lues dans la table d'index `03_echeances` (maintenue à chaque
+modification d'un contrat) sur des fenêtres calendaires exactes exprimées en mois.
+Un même envoi peut porter sur plusieurs fenêtres et plusieurs destinataires :
+les contrats sont extraits en une seule requête et le courriel n'est généré qu'une fois.
+
+Auteur : Rémi Verschuur
+"""
+
+from datetime import date
+from calendar import monthrange
+from typing import List, Dict, Any, Iterable, Tuple, Optional, Union
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from flask import render_template
+from sqlalchemy.orm import Session
+from config import Config
+from models import Contract, Echeance, TYPE_ECHEANCE_PREAVIS
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Fenêtres par défaut (en mois à partir d'aujourd'hui) : fin de préavis entre m+4 et m+6
+FENETRES_PAR_DEFAUT: List[Tuple[int, int]] = [(4, 6)]
+
+
+def ajouter_mois(jour: date, mois: int) -> date:
+    """
+    Ajoute un nombre de mois calendaires à une date.
+    Le jour est ramené au dernier jour du mois si nécessaire (31/01 + 1 mois = 28/02 ou 29/02).
+    Args:
+        jour (date): La date de départ.
+        mois (int): Le nombre de mois à ajouter (peut être négatif).
+    Returns:
+        date: La date décalée.
+    """
+    index = jour.month - 1 + mois
+    annee, mois_cible = jour.year + index // 12, index % 12 + 1
+    return date(annee, mois_cible, min(jour.day, monthrange(annee, mois_cible)[1]))
+
+
+def parse_fenetre(valeur: str) -> Tuple[int, int]:
+    """
+    Convertit une fenêtre au format 'debut-fin' (en mois) en tuple.
+    Args:
+        valeur (str): La fenêtre, par exemple '4-6'.
+    Returns:
+        Tuple[int, int]: Les bornes (début, fin) en mois.
+    Raises:
+        ValueError: Si le format est invalide ou si le début est après la fin.
+    """
+    debut, fin = (int(borne) for borne in valeur.split('-', 1))
+    if debut > fin:
+        raise ValueError(f'Fenêtre invalide : {valeur}')
+    return debut, fin
+
+
+def echeances_entre(session: Session, debut: date, fin: date,
+                    type_echeance: str = TYPE_ECHEANCE_PREAVIS) -> List[Tuple[date, Contract]]:
+    """
+    Retourne les échéances d'un type donné comprises entre deux dates (bornes incluses).
+    La requête utilise l'index (type_echeance, date_echeance) de la table 03_echeances.
+    Args:
+        session (Session): La session de base de données.
+        debut (date): La date de début de la fenêtre.
+        fin (date): La date de fin de la fenêtre.
+        type_echeance (str): Le type d'échéance ('preavis' ou 'fin').
+    Returns:
+        List[Tuple[date, Contract]]: Les couples (date d'échéance, contrat) triés par date.
+    """
+    rows = (session.query(Echeance.date_echeance, Contract)
+            .join(Contract, Contract.id == Echeance.id_contrat)
+            .filter(Echeance.type_echeance == type_echeance,
+                    Echeance.date_echeance >= debut,
+                    Echeance.date_echeance <= fin)
+            .order_by(Echeance.date_echeance, Contract.id)
+            .all())
+    return [(row[0], row[1]) for row in rows]
+
+
+def contrats_par_fenetre(session: Session, fenetres: Iterable[Tuple[int, int]],
+                         aujourd_hui: Optional[date] = None,
+                         type_echeance: str = TYPE_ECHEANCE_PREAVIS) -> List[Dict[str, Any]]:
+    """
+    Répartit les contrats arrivant à échéance dans plusieurs fenêtres calendaires.
+    Une seule requête couvre l'ensemble des fenêtres, la répartition est faite en mémoire.
+    Args:
+        session (Session): La session de base de données.
+        fenetres (Iterable[Tuple[int, int]]): Les fenêtres (début, fin) en mois à partir d'aujourd'hui.
+        aujourd_hui (Optional[date]): La date de référence (défaut : date du jour).
+        type_echeance (str): Le type d'échéance ('preavis' ou 'fin').
+    Returns:
+        List[Dict[str, Any]]: Pour chaque fenêtre, ses bornes ('debut', 'fin') et ses 'contrats'.
+    """
+    aujourd_hui = aujourd_hui or date.today()
+    bornes = [(ajouter_mois(aujourd_hui, debut), ajouter_mois(aujourd_hui, fin)) for debut, fin in fenetres]
+    if not bornes:
+        return []
+
+    echeances = echeances_entre(session, min(b[0] for b in bornes), max(b[1] for b in bornes), type_echeance)
+    return [{'debut': debut,
+             'fin': fin,
+             'contrats': [contract for date_echeance, contract in echeances if debut <= date_echeance <= fin]}
+            for debut, fin in bornes]
+
+
+def envoi_contrats_renego(mails: Union[str, Iterable[str]], session: Session,
+                          fenetres: Optional[Iterable[Tuple[int, int]]] = None) -> int:
+    """
+    Envoie le rapport des contrats à renégocier à un ou plusieurs destinataires.
+    Les contrats sont extraits une seule fois, le courriel est généré une seule fois et
+    tous les envois passent par la même connexion SMTP.
+    La session n'est pas fermée : elle reste gérée par la requête appelante.
+    Args:
+        mails (Union[str, Iterable[str]]): Le ou les destinataires.
+        session (Session): La session de base de données.
+        fenetres (Optional[Iterable[Tuple[int, int]]]): Les fenêtres en mois (défaut : m+4 à m+6).
+    Returns:
+        int: Le nombre de courriels envoyés (0 si aucun contrat n'est à renégocier).
+    Raises:
+        RuntimeError: Si aucun courriel n'a pu être envoyé (connexion SMTP ou destinataires refusés).
+    """
+    destinataires = [mails] if isinstance(mails, str) else list(mails)
+    destinataires = [mail for mail in destinataires if mail]
+    periodes = contrats_par_fenetre(session, fenetres or FENETRES_PAR_DEFAUT)
+    nb_contrats = sum(len(periode['contrats']) for periode in periodes)
+    logger.info(f"Nombre de contrats à renégocier trouvés : {nb_contrats}")
+    if not nb_contrats or not destinataires:
+        return 0
+
+    # Génération unique du corps du courriel
+    body = render_template('mail_echeance.html', fenetres=periodes)
+    logger.info("Corps de l'e-mail généré avec succès.")
+
+    # Configuration de l'e-mail
+    email_expediteur: str = Config.EMAIL_USER
+    mot_de_passe: str = Config.EMAIL_PASSWORD
+    envoyes = 0
+
+    # Envoyer les e-mails sur une connexion SMTP unique
+    try:
+        with smtplib.SMTP(Config.EMAIL_SMTP, Config.EMAIL_PORT) as server:
+            server.starttls()
+            server.login(email_expediteur, mot_de_passe)
+            for mail in destinataires:
+                msg = MIMEMultipart()
+                msg['From'] = email_expediteur
+                msg['To'] = mail
+                msg['Subject'] = 'IMPORTANT - Liste hebdomadaire des contrats à renégocier'
+                msg.attach(MIMEText(body, 'html'))
+                try:
+                    server.send_message(msg)
+                    envoyes += 1
+                    logger.info(f"E-mail envoye avec succes a {mail}")
+                except smtplib.SMTPException as e:
+                    logger.error(f"Erreur lors de l envoi de l e-mail a {mail} : {e}")
+    except Exception as e:
+        logger.error(f"Erreur lors de l envoi de l e-mail : {e}")
+        if not envoyes:
+            raise RuntimeError(f"Connexion au serveur de courriel impossible : {e}") from e
+    if not envoyes:
+        raise RuntimeError("Aucun destinataire n'a accepté le courriel")
+    return envoyes
@@ -0,0 +1,115 @@
+"""
+=============================================================
+Recherche plein texte de l'Intranet API'Raudière
+=============================================================
+Module de recherche dans les contrats, contacts, évènements, documents et factures.
+
+La recherche s'appuie sur les index FULLTEXT de MariaDB (voir les `__table_args__`
+des modèles et la migration `d3f1a8b2c4e6`) : chaque table est interrogée en
+`MATCH ... AGAINST ... IN BOOLEAN MODE`, les résultats sont réunis par `UNION ALL`,
+triés par pertinence et paginés directement par la base.
+
+Auteur : Rémi Verschuur
+"""
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Dict, Any, List
+import re
+
+# Constantes de recherche
+MIN_TOKEN_SIZE = 3          # innodb_ft_min_token_size par défaut
+MAX_TERMS = 10
+MAX_PAR_PAGE = 100
+
+# Caractères réservés du mode booléen de MariaDB
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+
+# Requête unique : une branche par table, chaque MATCH reprend exactement les colonnes de l'index
+SEARCH_QUERY = text("""
+    SELECT 'contrat' AS type, id, id AS id_contrat,
+           CONCAT(entreprise, ' - ', intitule) AS libelle,
+           MATCH(intitule, entreprise, id_externe_contrat) AGAINST (:terme IN BOOLEAN MODE) AS score
+      FROM `01_contrats`
+     WHERE MATCH(intitule, entreprise, id_externe_contrat) AGAINST (:terme IN BOOLEAN MODE)
+    UNION ALL
+    SELECT 'contact', id, id_contrat, nom,
+           MATCH(nom, mail, ville) AGAINST (:terme IN BOOLEAN MODE)
+      FROM `02_contacts`
+     WHERE MATCH(nom, mail, ville) AGAINST (:terme IN BOOLEAN MODE)
+    UNION ALL
+    SELECT 'document', id, id_contrat, descriptif,
+           MATCH(descriptif) AGAINST (:terme IN BOOLEAN MODE)
+      FROM `11_documents`
+     WHERE MATCH(descriptif) AGAINST (:terme IN BOOLEAN MODE)
+    UNION ALL
+    SELECT 'evenement', id, id_contrat, descriptif,
+           MATCH(descriptif) AGAINST (:terme IN BOOLEAN MODE)
+      FROM `12_evenements`
+     WHERE MATCH(descriptif) AGAINST (:terme IN BOOLEAN MODE)
+    UNION ALL
+    SELECT 'facture', id, id_contrat, titre_facture,
+           MATCH(titre_facture) AGAINST (:terme IN BOOLEAN MODE)
+      FROM `13_factures`
+     WHERE MATCH(titre_facture) AGAINST (:terme IN BOOLEAN MODE)
+    ORDER BY score DESC, type, id
+    LIMIT :limite OFFSET :decalage
+""")
+
+
+def preparer_terme(saisie: str) -> str:
+    """
+    Transforme la saisie utilisateur en expression booléenne FULLTEXT.
+    Les opérateurs saisis sont neutralisés, les mots trop courts pour l'index sont ignorés
+    et chaque mot restant devient obligatoire avec recherche par préfixe.
+    Args:
+        saisie (str): La saisie brute de l'utilisateur.
+    Returns:
+        str: L'expression booléenne, ou une chaîne vide si aucun mot n'est exploitable.
+    Exemples:
+        ```python
+        preparer_terme('chauffage "Dupont"')   # '+chauffage* +Dupont*'
+        preparer_terme('a -b')                 # ''
+        ```
+    """
+    mots = _BOOLEAN_OPERATORS.sub(' ', saisie or '').split()
+    mots = [mot for mot in mots if len(mot) >= MIN_TOKEN_SIZE][:MAX_TERMS]
+    return ' '.join(f'+{mot}*' for mot in mots)
+
+
+def rechercher(session: Session, saisie: str, page: int = 1, par_page: int = 20) -> Dict[str, Any]:
+    """
+    Recherche classée et paginée dans les contrats et leurs éléments liés.
+    Une ligne supplémentaire est demandée pour savoir s'il existe une page suivante
+    sans requête de comptage.
+    Args:
+        session (Session): La session de base de données.
+        saisie (str): La saisie brute de l'utilisateur.
+        page (int): Le numéro de page (à partir de 1).
+        par_page (int): Le nombre de résultats par page (100 au maximum).
+    Returns:
+        Dict[str, Any]: Les résultats, la page, le nombre par page et la présence d'une page suivante.
+    Exemples:
+        ```python
+        resultats = rechercher(g.db_session, 'maintenance', page=2)
+        ```
+    """
+    page = max(page, 1)
+    par_page = min(max(par_page, 1), MAX_PAR_PAGE)
+    terme = preparer_terme(saisie)
+    resultats: List[Dict[str, Any]] = []
+
+    if terme:
+        rows = session.execute(SEARCH_QUERY, {'terme': terme,
+                                              'limite': par_page + 1,
+                                              'decalage': (page - 1) * par_page}).mappings().all()
+        resultats = [{'type': row['type'],
+                      'id': row['id'],
+                      'id_contrat': row['id_contrat'],
+                      'libelle': row['libelle'],
+                      'score': float(row['score'])} for row in rows]
+
+    return {'resultats': resultats[:par_page],
+            'page': page,
+            'par_page': par_page,
+            'suivant': len(resultats) > par_page}
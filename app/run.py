@@ -1,99 +1,101 @@
-import os
-import subprocess
-from sqlalchemy import create_engine, text
-from waitress import serve
-from application import peraudiere
-from datetime import datetime
-from typing import Any, List
+"""
+=============================================================
+Serveur de l'Intranet API'Raudière
+=============================================================
+Point d'entrée du serveur (entrypoint.sh : `python app/run.py`).
+
+Le démarrage enchaîne, en journalisant la durée de chaque phase :
+- l'import de l'application ;
+- l'attente de la base de données et la mise à jour de son schéma (migrations Alembic
+  dans le processus, seulement si la révision de la base diffère de head) ;
+- le démarrage des tâches de fond (planificateur, file d'impression, écrivain d'audit) ;
+- le lancement du serveur WSGI.
+
+Avec SERVEUR_WORKERS > 0, le serveur est multi-processus (voir serveur.py) : la base est
+préparée une seule fois par le superviseur, puis chaque worker démarre ses propres tâches
+de fond (le planificateur dans le seul worker n°0) après la création des workers.
+Remplacement progressif des workers : `docker compose kill -s HUP web`.
 
+Auteur : Rémi Verschuur
+"""
 
-DB_URL = os.environ.get('DB_URL')
-ALEMBIC_VERSION_TABLE = 'alembic_version'
-alembic_head = None
+from time import perf_counter
+
+DEBUT = perf_counter()
+
+from typing import Dict, cast
+from waitress import serve
+from application import peraudiere, Session, engine, initialize_database
+from demarrage import phase
+from serveur import Superviseur
+from taches import planificateur
+from impression import file_impression
+from audit import ecrivain_audit
+from logging import getLogger
 
-# Récupère la version head attendue depuis Alembic
-try:
-    result = subprocess.run(['alembic', 'heads'], capture_output=True, text=True)
-    alembic_head = result.stdout.split()[0] if result.returncode == 0 else None
-except Exception:
-    alembic_head = None
+logger = getLogger(__name__)
 
-def get_db_creation_date(conn: Any) -> Any | None:
+
+def demarrer_taches(numero: int = 0) -> None:
     """
-    Récupère la date de création de la base de données. (Pour MySQL/MariaDB)
-    Arguments:
-        conn: Connexion SQLAlchemy à la base de données.
-    Returns:
-        datetime | None: Date de création de la base, ou None si non trouvée ou erreur.
+    Démarre les tâches de fond d'un processus servant les requêtes.
+    Args:
+        numero (int): Le numéro du worker (le planificateur et la reprise des impressions
+            en attente ne tournent que dans le worker n°0).
     """
-    result = conn.execute(text(
-        "SELECT CREATE_TIME FROM information_schema.tables WHERE table_schema = DATABASE() ORDER BY CREATE_TIME ASC LIMIT 1"
-    ))
-    row = result.fetchone()
-    return row[0] if row and row[0] else None
+    if numero == 0:
+        planificateur.demarrer(Session)
+    file_impression.demarrer(Session, reprendre=numero == 0)
+    ecrivain_audit.demarrer(Session)
+
 
-def get_alembic_migrations_since(date_min: Any | None) -> list[str]:
+def demarrer_worker(numero: int) -> None:
     """
-    Récupère les migrations Alembic depuis une date donnée.
-    Arguments:
-        date_min (datetime | None): Date minimale pour filtrer les migrations. Si None, toutes les migrations sont retournées.
-    Returns:
-        List[str]: Liste des identifiants de migration (noms de fichiers sans extension) à appliquer.
+    Initialise un worker après sa création : connexions du superviseur abandonnées, tâches de fond démarrées.
+    Args:
+        numero (int): Le numéro du worker.
     """
-    # Récupération des fichiers de migration
-    versions_dir = os.path.join(os.path.dirname(__file__), '..', 'alembic', 'versions')
+    engine.dispose(close=False)
+    demarrer_taches(numero)
 
-    # Parcours des fichiers pour extraire les dates de création
-    migrations: List[str] = []
-    for fname in os.listdir(versions_dir):
-        if fname.endswith('.py'):
-            # Lecture du fichier pour extraire la date de création
-            fpath = os.path.join(versions_dir, fname)
 
-            mig_date = extract_migration_date(fpath)
-            if mig_date and (not date_min or mig_date >= date_min):
-                migrations.append(fname[:-3])
+def arreter_taches() -> None:
+    """Arrête les tâches de fond d'un worker (événements d'audit en attente écrits)."""
+    planificateur.arreter()
+    file_impression.arreter()
+    ecrivain_audit.arreter()
 
-    return migrations
 
-def extract_migration_date(filepath: str) -> datetime | None:
+def demarrer(taches: bool = True) -> Dict[str, float]:
     """
-    Extrait la date de création d'une migration à partir de son fichier.
-    Arguments:
-        filepath (str): Chemin du fichier de migration.
+    Prépare la base de données et démarre les tâches de fond.
+    Args:
+        taches (bool): Démarrer les tâches de fond dans ce processus (False : démarrées par les workers).
     Returns:
-        datetime | None: Date de création de la migration, ou None si non trouvée ou erreur.
+        Dict[str, float]: La durée de chaque phase du démarrage (secondes).
     """
-    try:
-        with open(filepath, encoding='utf-8') as f:
-            for line in f:
-                if line.startswith('Create Date:'):
-                    date_str = line.split('Create Date:')[1].strip()
-                    return datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S.%f')
-    except Exception:
-        return None
-
-# Vérifie la version actuelle de la base et applique les migrations récentes
-if DB_URL and alembic_head:
-    engine = create_engine(DB_URL)
-    with engine.connect() as conn:
-        db_creation_date = get_db_creation_date(conn)
-        try:
-            current_version = conn.execute(text(f"SELECT version_num FROM {ALEMBIC_VERSION_TABLE}")).scalar()
-        except Exception:
-            current_version = None
-
-        if db_creation_date:
-            print(f"Date de création de la base : {db_creation_date}")
-            migrations_to_apply = get_alembic_migrations_since(db_creation_date)
-            for mig in migrations_to_apply:
-                print(f"Application de la migration {mig}")
-                subprocess.run(['alembic', 'upgrade', mig])
-        elif current_version != alembic_head:
-            print(f"Migration nécessaire : {current_version} -> {alembic_head}")
-            subprocess.run(['alembic', 'upgrade', 'head'])
-        else:
-            print("La base est à jour.")
+    durees: Dict[str, float] = {'import': perf_counter() - DEBUT}
+    logger.info(f"Démarrage - import de l'application : {durees['import']:.3f} s")
+    initialize_database(durees=durees)
+    if taches:
+        with phase('tâches de fond', durees):
+            demarrer_taches()
+    logger.info(f"Démarrage terminé en {perf_counter() - DEBUT:.3f} s")
+    return durees
+
 
 if __name__ == '__main__':
-    serve(peraudiere, host="0.0.0.0", port=5000)
+    workers = cast(int, peraudiere.config['SERVEUR_WORKERS'])
+    threads = cast(int, peraudiere.config['SERVEUR_THREADS'])
+    if workers > 0:
+        demarrer(taches=False)
+        Superviseur(peraudiere, hote="0.0.0.0", port=5000, workers=workers, threads=threads,
+                    ecoute=cast(str, peraudiere.config['SERVEUR_ECOUTE']),
+                    max_requetes=cast(int, peraudiere.config['SERVEUR_MAX_REQUETES']),
+                    max_requetes_alea=cast(int, peraudiere.config['SERVEUR_MAX_REQUETES_ALEA']),
+                    delai_arret=cast(int, peraudiere.config['SERVEUR_DELAI_ARRET']),
+                    delai_battement=cast(int, peraudiere.config['SERVEUR_DELAI_BATTEMENT']),
+                    au_demarrage=demarrer_worker, a_l_arret=arreter_taches).executer()
+    else:
+        demarrer()
+        serve(peraudiere, host="0.0.0.0", port=5000, threads=threads)
@@ -0,0 +1,448 @@
+"""
+=============================================================
+Serveur multi-processus de l'Intranet API'Raudière
+=============================================================
+Superviseur de processus de travail (workers) waitress pré-forkés.
+
+Le processus principal (superviseur) ouvre les sockets d'écoute, puis crée les workers
+par `fork` : l'application, déjà importée, est partagée en copie sur écriture. Chaque
+worker sert les requêtes avec son propre pool de threads waitress, si bien qu'une
+finalisation de signature ou une conversion coûteuse n'occupe qu'un seul processus.
+
+Écoute :
+- 'partage' : tous les workers acceptent sur le même port (répartition par le noyau) ;
+- 'ports' : le worker n écoute sur le port `port + n` (entrées `upstream` de nginx).
+
+Cycle de vie :
+- SIGHUP : remplacement progressif des workers (chaque remplaçant est prêt avant l'arrêt
+  de l'ancien worker) ;
+- SIGTERM / SIGINT : arrêt des workers, qui terminent les requêtes en cours ;
+- nombre maximal de requêtes atteint : le worker demande son remplacement (recyclage,
+  pour borner la croissance de la mémoire) ;
+- worker arrêté anormalement ou sans battement de cœur : il est tué puis relancé.
+
+L'état de chaque worker (pid, requêtes servies et en cours, dernier battement de cœur)
+est tenu dans un tableau en mémoire partagée, lisible depuis n'importe quel worker
+(voir sante, route '/sante').
+
+Exemple :
+    ```python
+    Superviseur(peraudiere, port=5000, workers=4, threads=4, max_requetes=5000).executer()
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from ctypes import Structure, c_double, c_int, c_long
+from multiprocessing.sharedctypes import RawArray
+from threading import Event, Lock, Thread
+from time import monotonic, sleep, time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from waitress import wasyncore
+from waitress.server import create_server
+from werkzeug.wsgi import ClosingIterator
+from logging import getLogger
+import os
+import random
+import signal
+import socket
+
+logger = getLogger(__name__)
+
+# États d'un worker
+ETAT_LIBRE = 0
+ETAT_DEMARRAGE = 1
+ETAT_PRET = 2
+ETAT_RECYCLAGE = 3
+ETAT_ARRET = 4
+LIBELLES_ETATS = {ETAT_LIBRE: 'libre', ETAT_DEMARRAGE: 'démarrage', ETAT_PRET: 'prêt',
+                  ETAT_RECYCLAGE: 'recyclage', ETAT_ARRET: 'arrêt'}
+
+# Modes d'écoute
+ECOUTE_PARTAGEE = 'partage'
+ECOUTE_PORTS = 'ports'
+
+# Intervalles (secondes) : boucle du superviseur, battement de cœur, boucle d'un worker
+PAS_SUPERVISEUR = 0.5
+PAS_BATTEMENT = 2.0
+PAS_WORKER = 1.0
+
+# Emplacements du tableau partagé par worker
+EMPLACEMENTS_PAR_WORKER = 4
+
+# Durée de vie (secondes) en deçà de laquelle un worker arrêté est relancé après une pause
+DUREE_VIE_MIN = 5.0
+
+# Inactivité (secondes) au-delà de laquelle une connexion est fermée à l'arrêt d'un worker
+# (une connexion tout juste acceptée n'a pas encore reçu sa requête)
+DELAI_INACTIF = 1.0
+
+
+class EtatWorker(Structure):
+    """
+    Emplacement d'un worker dans le tableau partagé (écrit par le worker, lu par tous).
+    """
+    _fields_ = [('pid', c_int), ('numero', c_int), ('etat', c_int), ('port', c_int),
+                ('debut', c_double), ('battement', c_double), ('requetes', c_long), ('en_cours', c_int)]
+
+
+# Tableau des workers (hérité par fork ; None hors superviseur)
+_tableau: Optional[Any] = None
+
+
+def sante(delai_battement: float = 60.0) -> Dict[str, Any]:
+    """
+    Retourne l'état de santé du serveur : processus courant et, en mode multi-processus, chaque worker.
+    Args:
+        delai_battement (float): L'âge maximal (secondes) du dernier battement de cœur d'un worker prêt.
+    Returns:
+        Dict[str, Any]: Le statut ('ok' ou 'dégradé'), le mode, le pid courant et les workers.
+    Exemples:
+        ```python
+        sante()['workers'][0]  # {'pid': 12, 'numero': 0, 'etat': 'prêt', 'requetes': 154, ...}
+        ```
+    """
+    if _tableau is None:
+        return {'statut': 'ok', 'mode': 'processus unique', 'pid': os.getpid(), 'workers': []}
+    maintenant = time()
+    workers: List[Dict[str, Any]] = []
+    statut = 'ok'
+    for etat in _tableau:
+        if not etat.pid:
+            continue
+        silence = maintenant - etat.battement
+        if etat.etat == ETAT_PRET and silence > delai_battement:
+            statut = 'dégradé'
+        workers.append({'pid': etat.pid, 'numero': etat.numero, 'port': etat.port,
+                        'etat': LIBELLES_ETATS.get(etat.etat, 'inconnu'),
+                        'duree': round(maintenant - etat.debut, 1), 'battement': round(silence, 1),
+                        'requetes': etat.requetes, 'en_cours': etat.en_cours})
+    if not any(worker['etat'] == LIBELLES_ETATS[ETAT_PRET] for worker in workers):
+        statut = 'dégradé'
+    return {'statut': statut, 'mode': 'multi-processus', 'pid': os.getpid(),
+            'workers': sorted(workers, key=lambda worker: (worker['numero'], worker['duree']))}
+
+
+class CompteurRequetes:
+    """
+    Intergiciel WSGI d'un worker : compte les requêtes servies et en cours (fin de la réponse
+    comprise, pour les réponses produites en flux) et demande le recyclage à la limite.
+    """
+    def __init__(self, application: Callable[..., Iterable[bytes]], etat: EtatWorker, limite: int = 0) -> None:
+        self.application = application
+        self.etat = etat
+        self.limite = limite
+        self._verrou = Lock()
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable[..., Any]) -> Iterable[bytes]:
+        with self._verrou:
+            self.etat.requetes += 1
+            self.etat.en_cours += 1
+            if self.limite and self.etat.requetes >= self.limite and self.etat.etat == ETAT_PRET:
+                self.etat.etat = ETAT_RECYCLAGE
+                logger.info(f"Worker {os.getpid()} : {self.etat.requetes} requêtes servies, recyclage demandé")
+        try:
+            return ClosingIterator(self.application(environ, start_response), self._terminer)
+        except BaseException:
+            self._terminer()
+            raise
+
+    def _terminer(self) -> None:
+        with self._verrou:
+            self.etat.en_cours -= 1
+
+
+class Superviseur:
+    """
+    Superviseur des workers waitress pré-forkés.
+    Méthodes :
+        executer() -> None: Ouvre les sockets, démarre les workers et les surveille jusqu'à l'arrêt.
+    """
+    def __init__(self, application: Callable[..., Iterable[bytes]], *, hote: str = '0.0.0.0', port: int = 5000,
+                 workers: int = 2, threads: int = 4, ecoute: str = ECOUTE_PARTAGEE, max_requetes: int = 0,
+                 max_requetes_alea: int = 0, delai_arret: float = 30.0, delai_battement: float = 60.0,
+                 au_demarrage: Optional[Callable[[int], None]] = None,
+                 a_l_arret: Optional[Callable[[], None]] = None) -> None:
+        """
+        Args:
+            application (Callable): L'application WSGI (importée avant la création des workers).
+            hote (str): L'adresse d'écoute.
+            port (int): Le port d'écoute (premier port en écoute 'ports').
+            workers (int): Le nombre de workers.
+            threads (int): Le nombre de threads waitress par worker.
+            ecoute (str): 'partage' (même port pour tous) ou 'ports' (un port par worker).
+            max_requetes (int): Le nombre de requêtes après lequel un worker est recyclé (0 : sans limite).
+            max_requetes_alea (int): L'écart aléatoire ajouté à la limite (recyclages étalés).
+            delai_arret (float): Le délai (secondes) laissé aux requêtes en cours à l'arrêt d'un worker.
+            delai_battement (float): L'âge maximal (secondes) du battement de cœur d'un worker avant son remplacement.
+            au_demarrage (Optional[Callable[[int], None]]): Appelée dans chaque worker (numéro) avant de servir.
+            a_l_arret (Optional[Callable[[], None]]): Appelée dans chaque worker après la dernière requête.
+        Raises:
+            ValueError: Si le mode d'écoute ou le nombre de workers est invalide.
+        """
+        if ecoute not in (ECOUTE_PARTAGEE, ECOUTE_PORTS):
+            raise ValueError(f"Mode d'écoute inconnu : {ecoute}")
+        if workers < 1:
+            raise ValueError(f"Nombre de workers invalide : {workers}")
+        self.application = application
+        self.hote = hote
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.ecoute = ecoute
+        self.max_requetes = max_requetes
+        self.max_requetes_alea = max_requetes_alea
+        self.delai_arret = delai_arret
+        self.delai_battement = delai_battement
+        self.au_demarrage = au_demarrage
+        self.a_l_arret = a_l_arret
+        self._sockets: List[socket.socket] = []
+        self._pids: Dict[int, int] = {}        # pid -> emplacement
+        self._arrets: Dict[int, float] = {}    # pid -> instant de la demande d'arrêt
+        self._arret = False
+        self._rechargement = False
+
+    # --- Superviseur ---
+
+    def executer(self) -> None:
+        """
+        Ouvre les sockets, démarre les workers puis les surveille jusqu'à SIGTERM ou SIGINT.
+        """
+        global _tableau
+        self._sockets = self._ouvrir_sockets()
+        # Emplacements de réserve : les workers en arrêt et leurs remplaçants coexistent
+        _tableau = RawArray(EtatWorker, EMPLACEMENTS_PAR_WORKER * self.workers)
+        signal.signal(signal.SIGTERM, self._demander_arret)
+        signal.signal(signal.SIGINT, self._demander_arret)
+        signal.signal(signal.SIGHUP, self._demander_rechargement)
+        logger.info(f"Superviseur {os.getpid()} : {self.workers} worker(s) de {self.threads} thread(s), "
+                    f"écoute '{self.ecoute}' sur {self.hote}:{self._sockets[0].getsockname()[1]}")
+
+        for numero in range(self.workers):
+            self._lancer(numero)
+        try:
+            while not self._arret:
+                self._recolter()
+                if self._rechargement:
+                    self._rechargement = False
+                    self._recharger()
+                self._surveiller()
+                sleep(PAS_SUPERVISEUR)
+        finally:
+            self._arreter_workers()
+            for sock in self._sockets:
+                sock.close()
+        logger.info(f"Superviseur {os.getpid()} arrêté")
+
+    def _ouvrir_sockets(self) -> List[socket.socket]:
+        """Ouvre la socket partagée ou une socket par worker (conservées pour leurs remplaçants)."""
+        ports = [self.port] if self.ecoute == ECOUTE_PARTAGEE else \
+            [self.port + numero if self.port else 0 for numero in range(self.workers)]
+        return [socket.create_server((self.hote, port), backlog=1024) for port in ports]
+
+    def _demander_arret(self, _signum: int, _frame: Any) -> None:
+        self._arret = True
+
+    def _demander_rechargement(self, _signum: int, _frame: Any) -> None:
+        self._rechargement = True
+
+    def _lancer(self, numero: int) -> Optional[int]:
+        """
+        Crée un worker par fork dans un emplacement libre du tableau.
+        Returns:
+            Optional[int]: Le pid du worker, ou None si aucun emplacement n'est libre (trop de workers en arrêt).
+        """
+        assert _tableau is not None
+        emplacement = next((indice for indice, etat in enumerate(_tableau) if not etat.pid), None)
+        if emplacement is None:
+            logger.warning(f"Worker n°{numero} : aucun emplacement libre, démarrage reporté")
+            return None
+        etat = _tableau[emplacement]
+        etat.numero, etat.etat, etat.requetes, etat.en_cours = numero, ETAT_DEMARRAGE, 0, 0
+        etat.debut = etat.battement = time()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._servir(etat, numero)
+            except BaseException:
+                logger.exception(f"Worker {os.getpid()} (n°{numero}) arrêté sur erreur")
+                code = 1
+            finally:
+                os._exit(code)
+        etat.pid = pid
+        self._pids[pid] = emplacement
+        logger.info(f"Worker n°{numero} démarré (pid {pid})")
+        return pid
+
+    def _etat(self, pid: int) -> EtatWorker:
+        assert _tableau is not None
+        return _tableau[self._pids[pid]]
+
+    def _arreter(self, pid: int) -> None:
+        """Demande l'arrêt d'un worker (fin des requêtes en cours)."""
+        if pid in self._arrets:
+            return
+        self._etat(pid).etat = ETAT_ARRET
+        self._arrets[pid] = monotonic()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _recolter(self) -> None:
+        """Récupère les workers terminés (relancés par _surveiller)."""
+        while True:
+            try:
+                pid, statut = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid not in self._pids:
+                continue
+            etat = self._etat(pid)
+            numero, duree = etat.numero, time() - etat.debut
+            attendu = self._arrets.pop(pid, None) is not None
+            etat.pid = 0
+            etat.etat = ETAT_LIBRE
+            del self._pids[pid]
+            if attendu:
+                logger.info(f"Worker n°{numero} (pid {pid}) arrêté après {duree:.0f} s")
+            else:
+                logger.error(f"Worker n°{numero} (pid {pid}) arrêté anormalement "
+                             f"(statut {os.waitstatus_to_exitcode(statut)}) après {duree:.0f} s")
+            if not attendu and duree < DUREE_VIE_MIN and not self._arret:
+                # Arrêt dès le démarrage : pause avant la relance
+                sleep(1)
+
+    def _remplacer(self, pid: int) -> None:
+        """
+        Lance le remplaçant d'un worker et arrête ce dernier une fois le remplaçant prêt.
+        """
+        numero = self._etat(pid).numero
+        remplacant = self._lancer(numero)
+        if remplacant is None:
+            return
+        limite = monotonic() + self.delai_battement
+        while monotonic() < limite and not self._arret:
+            if remplacant not in self._pids or self._etat(remplacant).etat == ETAT_PRET:
+                break
+            sleep(0.1)
+        self._arreter(pid)
+
+    def _recharger(self) -> None:
+        """Remplace les workers un par un."""
+        logger.info("Superviseur : remplacement progressif des workers")
+        for pid in list(self._pids):
+            if pid in self._pids and pid not in self._arrets and not self._arret:
+                self._remplacer(pid)
+                self._recolter()
+
+    def _surveiller(self) -> None:
+        """
+        Traite les demandes de recyclage, les workers sans battement de cœur et les arrêts trop longs,
+        puis relance les numéros qui ne sont plus servis.
+        """
+        maintenant = time()
+        for pid in list(self._pids):
+            etat = self._etat(pid)
+            if pid in self._arrets:
+                if monotonic() - self._arrets[pid] > self.delai_arret + PAS_BATTEMENT:
+                    logger.warning(f"Worker n°{etat.numero} (pid {pid}) : arrêt trop long, processus tué")
+                    os.kill(pid, signal.SIGKILL)
+            elif etat.etat == ETAT_RECYCLAGE:
+                self._remplacer(pid)
+            elif maintenant - etat.battement > self.delai_battement:
+                logger.error(f"Worker n°{etat.numero} (pid {pid}) sans battement de cœur depuis "
+                             f"{maintenant - etat.battement:.0f} s, processus tué")
+                self._arrets[pid] = monotonic()
+                os.kill(pid, signal.SIGKILL)
+        servis = {self._etat(pid).numero for pid in self._pids if pid not in self._arrets}
+        for numero in range(self.workers):
+            if numero not in servis and not self._arret:
+                self._lancer(numero)
+
+    def _arreter_workers(self) -> None:
+        """Arrête tous les workers, puis tue ceux qui n'ont pas terminé dans le délai."""
+        self._arret = True
+        logger.info(f"Superviseur : arrêt de {len(self._pids)} worker(s)")
+        for pid in list(self._pids):
+            self._arreter(pid)
+        limite = monotonic() + self.delai_arret + PAS_BATTEMENT
+        while self._pids and monotonic() < limite:
+            self._recolter()
+            sleep(0.1)
+        for pid in list(self._pids):
+            logger.warning(f"Worker (pid {pid}) toujours actif, processus tué")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self._pids.pop(pid)
+
+    # --- Worker ---
+
+    def _servir(self, etat: EtatWorker, numero: int) -> None:
+        """
+        Boucle d'un worker : sert les requêtes jusqu'à SIGTERM puis termine les requêtes en cours.
+        """
+        arret = Event()
+        signal.signal(signal.SIGTERM, lambda *_: arret.set())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        random.seed()
+        etat.pid = os.getpid()
+        superviseur = os.getppid()
+
+        sock = self._sockets[numero if self.ecoute == ECOUTE_PORTS else 0]
+        for autre in self._sockets:
+            if autre is not sock:
+                autre.close()
+        etat.port = sock.getsockname()[1]
+        if self.au_demarrage is not None:
+            self.au_demarrage(numero)
+
+        limite = self.max_requetes + random.randint(0, self.max_requetes_alea) if self.max_requetes else 0
+        canaux: Dict[int, Any] = {}
+        serveur = create_server(CompteurRequetes(self.application, etat, limite), map=canaux, sockets=[sock],
+                                threads=self.threads)
+
+        def battre() -> None:
+            # Battement de cœur ; arrêt si le superviseur a disparu
+            while not arret.wait(PAS_BATTEMENT):
+                etat.battement = time()
+                if os.getppid() != superviseur:
+                    logger.error(f"Worker {os.getpid()} : superviseur disparu, arrêt")
+                    arret.set()
+
+        Thread(target=battre, name='battement', daemon=True).start()
+        etat.battement = time()
+        if etat.etat == ETAT_DEMARRAGE:
+            etat.etat = ETAT_PRET
+        try:
+            while not arret.is_set():
+                wasyncore.loop(timeout=PAS_WORKER, map=canaux, count=1)
+            self._vider(serveur, canaux, etat)
+        finally:
+            serveur.task_dispatcher.shutdown(timeout=PAS_BATTEMENT)
+            if self.a_l_arret is not None:
+                self.a_l_arret()
+
+    def _vider(self, serveur: Any, canaux: Dict[int, Any], etat: EtatWorker) -> None:
+        """
+        Arrêt progressif : plus aucune connexion acceptée, connexions inactives fermées,
+        requêtes en cours terminées (dans la limite de delai_arret).
+        """
+        etat.etat = ETAT_ARRET
+        serveur.accepting = False
+        limite = monotonic() + self.delai_arret
+        while monotonic() < limite:
+            ouverts = list(serveur.active_channels.values())
+            if not ouverts:
+                break
+            inactivite = time() - DELAI_INACTIF
+            for canal in ouverts:
+                if not canal.requests and canal.request is None and not canal.total_outbufs_len \
+                        and canal.last_activity < inactivite:
+                    canal.will_close = True
+            wasyncore.loop(timeout=0.1, map=canaux, count=1)
+        logger.info(f"Worker {os.getpid()} arrêté : {etat.requetes} requête(s) servie(s)")
@@ -108,4 +108,17 @@ function filterTable(event) {
             row.style.display = "none";
         }
     });
-}
\ No newline at end of file
+}
+function exportContracts(event, link) {
+    event.preventDefault();
+
+    // Exportation avec les filtres de la liste (type et sous-type)
+    let params = new URLSearchParams();
+    let typeFiltre = document.getElementById('TypeFiltre').value;
+    let subTypeFiltre = document.getElementById('STypeFiltre').value;
+    if (typeFiltre) params.set('TypeFiltre', typeFiltre);
+    if (subTypeFiltre) params.set('STypeFiltre', subTypeFiltre);
+    if (link.dataset.details) params.set('details', link.dataset.details);
+
+    window.location.href = link.dataset.exportUrl + (params.toString() ? '?' + params.toString() : '');
+}
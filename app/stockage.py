@@ -0,0 +1,385 @@
+"""
+=============================================================
+Magasin de fichiers adressé par contenu de l'Intranet API'Raudière
+=============================================================
+Module de stockage des fichiers des documents, factures et documents à signer.
+
+Chaque fichier est stocké une seule fois sous son empreinte SHA-256, dans une
+arborescence répartie sur les premiers caractères de l'empreinte :
+
+    <BLOB_PATH>/9f/86/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08
+
+Les lignes de `11_documents`, `13_factures` et `20_documents_a_signer` référencent le
+fichier par leur colonne `hash_fichier` ; la table `10_fichiers` compte ces références
+(évènements de mapper du module models.py). Un même PDF déposé plusieurs fois n'occupe
+donc qu'une place sur le disque, et renommer ou remplacer un fichier ne change que
+les métadonnées. Les fichiers sans référence sont supprimés par une tâche planifiée
+après un délai de grâce.
+
+Migration des fichiers existants (stockés par nom) :
+    ```console
+    python stockage.py --simulation
+    python stockage.py
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple, Any
+from sqlalchemy import update, delete, select, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+from models import Blob, Document, Bill, DocToSigne
+from docs import get_config, stream_to_temp, get_upload_limit, MODE_FICHIER
+from logging import getLogger
+import hashlib
+import os
+import shutil
+import tempfile
+
+logger = getLogger(__name__)
+
+# Délai avant suppression d'un fichier sans référence (dépôt en cours, annulation)
+DELAI_GRACE = timedelta(hours=1)
+
+# Nombre maximal de fichiers supprimés par passage de la tâche de nettoyage
+LOT_NETTOYAGE = 500
+
+
+def get_racine() -> str:
+    """
+    Retourne le dossier racine du magasin (BLOB_PATH, sinon sous-dossier 'blobs' des documents).
+    Le dossier doit être sur le même système de fichiers que ses fichiers temporaires (renommage atomique).
+    """
+    config = get_config()
+    return config.get('BLOB_PATH') or os.path.join(config.get('UPLOAD_FOLDER', '/uploads'), 'blobs')
+
+
+def chemin_blob(empreinte: str, racine: Optional[str] = None) -> str:
+    """
+    Retourne le chemin d'un fichier du magasin à partir de son empreinte.
+    Args:
+        empreinte (str): L'empreinte SHA-256 du fichier.
+        racine (Optional[str]): Le dossier racine du magasin (défaut : configuration).
+    Returns:
+        str: Le chemin du fichier, réparti sur deux niveaux de dossiers.
+    Exemples:
+        ```python
+        chemin_blob('9f86d081...')   # '<BLOB_PATH>/9f/86/9f86d081...'
+        ```
+    """
+    if len(empreinte) != 64 or any(c not in '0123456789abcdef' for c in empreinte):
+        raise ValueError(f'Empreinte invalide : {empreinte}')
+    return os.path.join(racine or get_racine(), empreinte[:2], empreinte[2:4], empreinte)
+
+
+def chemin_stocke(empreinte: Optional[str], racine: Optional[str] = None) -> Optional[str]:
+    """
+    Retourne le chemin du fichier du magasin s'il existe, sinon None
+    (fichier encore stocké par nom, avant migration).
+    """
+    if not empreinte or empreinte == 'temp':
+        return None
+    chemin = chemin_blob(empreinte, racine)
+    return chemin if os.path.isfile(chemin) else None
+
+
+def _get_engine(session: Session) -> Engine:
+    """Retourne le moteur de la session (la session peut être liée à une connexion)."""
+    return session.get_bind().engine
+
+
+def _enregistrer(session: Session, empreinte: str, taille: int) -> None:
+    """
+    Enregistre le fichier dans 10_fichiers dans une transaction séparée, validée immédiatement :
+    si la requête appelante échoue, le fichier reste connu (sans référence) et sera nettoyé.
+    Un fichier déjà connu voit seulement sa date de dernier dépôt rafraîchie. L'insertion et la
+    mise à jour forment une seule requête (insertion avec mise à jour) : une ligne supprimée par
+    le nettoyage entre deux requêtes laisserait le fichier redéposé sans ligne ni nettoyage.
+    """
+    maintenant = datetime.now()
+    table = Blob.__table__
+    valeurs = {'hash': empreinte, 'taille': taille, 'nb_references': 0, 'created_at': maintenant,
+               'used_at': maintenant}
+    with _get_engine(session).begin() as connexion:
+        if connexion.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+            requete = insert_sqlite(table).values(**valeurs)
+            requete = requete.on_conflict_do_update(index_elements=['hash'],
+                                                    set_={'used_at': requete.excluded.used_at})
+        else:
+            from sqlalchemy.dialects.mysql import insert as insert_mysql
+            requete = insert_mysql(table).values(**valeurs)
+            requete = requete.on_duplicate_key_update(used_at=requete.inserted.used_at)
+        connexion.execute(requete)
+
+
+def _copier(source: str, destination: str) -> None:
+    """
+    Copie un fichier vers sa destination via un fichier temporaire renommé atomiquement
+    (droits MODE_FICHIER : le fichier temporaire est créé en 0600).
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix='.import-', suffix='.part')
+    os.close(fd)
+    try:
+        shutil.copyfile(source, temp_path)
+        os.chmod(temp_path, MODE_FICHIER)
+        os.replace(temp_path, destination)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def stocker(session: Session, file_to_upload: FileStorage, *, kind: str = 'document',
+            racine: Optional[str] = None) -> Tuple[str, int]:
+    """
+    Enregistre un fichier téléversé dans le magasin.
+    Le fichier est écrit par blocs dans le dossier temporaire du magasin (SHA-256 calculé au fil
+    de l'écriture), puis renommé sous son empreinte ; s'il est déjà présent, la copie est abandonnée.
+    La référence est comptée lorsque l'empreinte est affectée à une ligne (hash_fichier).
+    Args:
+        session (Session): La session de base de données.
+        file_to_upload (FileStorage): Le fichier téléversé.
+        kind (str): Le type de fichier, pour la limite de taille ('document', 'facture' ou 'signature').
+        racine (Optional[str]): Le dossier racine du magasin (défaut : configuration).
+    Returns:
+        Tuple[str, int]: L'empreinte SHA-256 et la taille du fichier.
+    Raises:
+        UploadTooLargeError: Si le fichier dépasse la taille autorisée.
+    Exemples:
+        ```python
+        document.hash_fichier, taille = stocker(g.db_session, binary_file, kind='document')
+        ```
+    """
+    racine = racine or get_racine()
+    temp_path, empreinte, taille = stream_to_temp(file_to_upload, os.path.join(racine, 'tmp'),
+                                                  max_size=get_upload_limit(kind))
+    try:
+        _enregistrer(session, empreinte, taille)
+        destination = chemin_blob(empreinte, racine)
+        if os.path.exists(destination):
+            # Contenu déjà stocké : aucun espace disque supplémentaire
+            os.remove(temp_path)
+            logger.info(f"Fichier déjà présent dans le magasin : {empreinte}")
+        else:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(temp_path, destination)
+            logger.info(f"Fichier ajouté au magasin : {empreinte} ({taille} octets)")
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return empreinte, taille
+
+
+def importer_fichier(session: Session, chemin: str, *, empreinte: Optional[str] = None,
+                     conserver: bool = False, racine: Optional[str] = None) -> Tuple[str, int]:
+    """
+    Ajoute au magasin un fichier déjà présent sur le disque.
+    Le fichier est déplacé (ou lié / copié s'il doit être conservé) sous son empreinte.
+    Args:
+        session (Session): La session de base de données.
+        chemin (str): Le chemin du fichier à importer.
+        empreinte (Optional[str]): L'empreinte SHA-256 si elle est déjà connue (sinon calculée par blocs).
+        conserver (bool): Conserver le fichier source (True) ou le déplacer (False).
+        racine (Optional[str]): Le dossier racine du magasin (défaut : configuration).
+    Returns:
+        Tuple[str, int]: L'empreinte SHA-256 et la taille du fichier.
+    Exemples:
+        ```python
+        empreinte, taille = importer_fichier(g.db_session, '/tmp/signature/contrat.pdf', empreinte=sha256)
+        ```
+    """
+    if not empreinte:
+        with open(chemin, 'rb') as f:
+            empreinte = hashlib.file_digest(f, 'sha256').hexdigest()
+    taille = os.path.getsize(chemin)
+    _enregistrer(session, empreinte, taille)
+
+    destination = chemin_blob(empreinte, racine)
+    if os.path.exists(destination):
+        if not conserver:
+            os.remove(chemin)
+        return empreinte, taille
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if conserver:
+        try:
+            os.link(chemin, destination)
+        except FileExistsError:
+            pass
+        except OSError:
+            _copier(chemin, destination)
+    else:
+        try:
+            os.replace(chemin, destination)
+        except OSError:
+            # Systèmes de fichiers différents : copie atomique puis suppression de la source
+            _copier(chemin, destination)
+            os.remove(chemin)
+    # Fichier source éventuellement créé en 0600 (mkstemp) : lisible par nginx une fois stocké
+    os.chmod(destination, MODE_FICHIER)
+    return empreinte, taille
+
+
+def lier_copie_de_travail(empreinte: str, destination: str, racine: Optional[str] = None) -> str:
+    """
+    Crée la copie de travail d'un fichier du magasin (documents à signer).
+    Le processus de signature remplace le fichier de travail par renommage : un lien physique
+    suffit et n'occupe aucun espace disque. Une copie est faite si le lien est impossible
+    (magasin et dossier de travail sur des volumes différents).
+    Args:
+        empreinte (str): L'empreinte SHA-256 du fichier.
+        destination (str): Le chemin de la copie de travail.
+        racine (Optional[str]): Le dossier racine du magasin (défaut : configuration).
+    Returns:
+        str: Le chemin de la copie de travail.
+    """
+    source = chemin_blob(empreinte, racine)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        _copier(source, destination)
+    return destination
+
+
+def nettoyer_fichiers(session: Session, maintenant: Optional[datetime] = None,
+                      racine: Optional[str] = None) -> int:
+    """
+    Supprime les fichiers du magasin qui ne sont plus référencés depuis le délai de grâce.
+    Chaque ligne est supprimée sous condition (toujours sans référence, pas de dépôt récent)
+    avant son fichier : un dépôt concurrent du même contenu attend la fin de la transaction.
+    Le commit est laissé à l'appelant (tâche planifiée).
+    Args:
+        session (Session): La session de base de données.
+        maintenant (Optional[datetime]): La date de référence (défaut : maintenant).
+        racine (Optional[str]): Le dossier racine du magasin (défaut : configuration).
+    Returns:
+        int: Le nombre de fichiers supprimés.
+    """
+    limite = (maintenant or datetime.now()) - DELAI_GRACE
+    orphelin = (Blob.nb_references <= 0) & (Blob.used_at < limite)
+    empreintes = session.execute(select(Blob.hash).where(orphelin).limit(LOT_NETTOYAGE)).scalars().all()
+
+    supprimes = 0
+    for empreinte in empreintes:
+        resultat = session.execute(delete(Blob).where(Blob.hash == empreinte, orphelin),
+                                   execution_options={'synchronize_session': False})
+        if resultat.rowcount:
+            try:
+                os.remove(chemin_blob(empreinte, racine))
+            except FileNotFoundError:
+                pass
+            supprimes += 1
+
+    if supprimes:
+        logger.info(f"Nettoyage du magasin de fichiers : {supprimes} fichier(s) supprimé(s)")
+    return supprimes
+
+
+def recompter_references(session: Session) -> None:
+    """
+    Recalcule les compteurs de références de tous les fichiers du magasin.
+    Utilisé après la migration et pour réparer un compteur faussé (suppression hors ORM).
+    """
+    def _compte(modele: Any) -> Any:
+        return select(func.count()).where(modele.hash_fichier == Blob.hash).scalar_subquery()
+
+    references = _compte(Document) + _compte(Bill) + _compte(DocToSigne)
+    session.execute(update(Blob).values(nb_references=references),
+                    execution_options={'synchronize_session': False})
+
+
+def migrer_fichiers_existants(session: Session, *, simulation: bool = False, taille_lot: int = 200,
+                              racine: Optional[str] = None) -> Dict[str, int]:
+    """
+    Migre vers le magasin les fichiers stockés par nom (documents, factures) ou par dossier
+    de signature (documents à signer). La migration est reprenable : les lignes dont le
+    fichier est déjà dans le magasin sont ignorées. Les lignes sont parcourues par lots
+    (pagination par identifiant), validés au fur et à mesure.
+    Les copies de travail des documents à signer sont conservées.
+    Args:
+        session (Session): La session de base de données.
+        simulation (bool): Compter sans rien modifier.
+        taille_lot (int): Le nombre de lignes par lot.
+        racine (Optional[str]): Le dossier racine du magasin (défaut : configuration).
+    Returns:
+        Dict[str, int]: Les compteurs 'migres', 'deja_migres', 'manquants' et 'divergents'.
+    """
+    compteurs = {'migres': 0, 'deja_migres': 0, 'manquants': 0, 'divergents': 0}
+    dossier_documents = get_config().get('UPLOAD_FOLDER', '/uploads')
+
+    def _candidats(ligne: Any) -> Tuple[str, ...]:
+        if isinstance(ligne, DocToSigne):
+            # Document signé : l'original (hash_fichier) a été renommé 'original_<nom>'
+            dossier, nom = os.path.split(ligne.chemin_fichier)
+            return (os.path.join(dossier, f'original_{nom}'), ligne.chemin_fichier)
+        return (os.path.join(dossier_documents, secure_filename(ligne.str_lien)),)
+
+    for modele, colonne in ((Document, Document.str_lien), (Bill, Bill.str_lien),
+                            (DocToSigne, DocToSigne.chemin_fichier)):
+        dernier_id = 0
+        while True:
+            lignes = (session.query(modele)
+                      .filter(modele.id > dernier_id, colonne.isnot(None))
+                      .order_by(modele.id).limit(taille_lot).all())
+            if not lignes:
+                break
+            dernier_id = lignes[-1].id
+
+            for ligne in lignes:
+                if chemin_stocke(ligne.hash_fichier, racine):
+                    compteurs['deja_migres'] += 1
+                    continue
+                candidats = [chemin for chemin in _candidats(ligne) if os.path.isfile(chemin)]
+                if not candidats:
+                    compteurs['manquants'] += 1
+                    continue
+
+                # Document à signer : seul un fichier conforme au hash enregistré est importé
+                conserver = isinstance(ligne, DocToSigne)
+                chemin, empreinte = candidats[0], None
+                if conserver:
+                    for candidat in candidats:
+                        with open(candidat, 'rb') as f:
+                            if hashlib.file_digest(f, 'sha256').hexdigest() == ligne.hash_fichier:
+                                chemin, empreinte = candidat, ligne.hash_fichier
+                                break
+                    if empreinte is None:
+                        compteurs['divergents'] += 1
+                        continue
+
+                if not simulation:
+                    ligne.hash_fichier, _ = importer_fichier(session, chemin, empreinte=empreinte,
+                                                             conserver=conserver, racine=racine)
+                compteurs['migres'] += 1
+
+            if not simulation:
+                session.commit()
+
+    if not simulation:
+        recompter_references(session)
+        session.commit()
+    logger.info(f"Migration du magasin de fichiers : {compteurs}")
+    return compteurs
+
+
+if __name__ == '__main__':
+    import argparse
+    from application import peraudiere, Session as SessionFactory
+
+    parser = argparse.ArgumentParser(description="Migration des fichiers existants vers le magasin adressé par contenu.")
+    parser.add_argument('--simulation', action='store_true', help="Compter les fichiers à migrer sans rien modifier.")
+    parser.add_argument('--lot', type=int, default=200, help="Nombre de lignes traitées par lot.")
+    arguments = parser.parse_args()
+
+    with peraudiere.app_context(), SessionFactory() as db_session:
+        resultat_migration = migrer_fichiers_existants(db_session, simulation=arguments.simulation,
+                                                       taille_lot=arguments.lot)
+    print(resultat_migration)
@@ -0,0 +1,159 @@
+"""
+=============================================================
+Tâches planifiées de l'Intranet API'Raudière
+=============================================================
+Planificateur minimal exécuté dans le processus applicatif (thread démon).
+
+Chaque tâche reçoit sa propre session de base de données, committée en cas de succès
+et annulée en cas d'erreur. Un verrou nommé MariaDB (`GET_LOCK`) garantit qu'une tâche
+n'est exécutée que par un seul processus à la fois lorsque plusieurs serveurs tournent.
+
+Exemple :
+    ```python
+    planificateur.ajouter('expiration_signatures', expirer_signatures, intervalle=300)
+    planificateur.demarrer(Session)
+    ```
+
+Auteur : Rémi Verschuur
+"""
+
+from dataclasses import dataclass, field
+from threading import Thread, Event, Lock
+from time import monotonic
+from typing import Callable, Any, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session, sessionmaker
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class Tache:
+    """
+    Tâche planifiée.
+    Attributs :
+        nom (str): Nom unique de la tâche (sert aussi de nom de verrou).
+        fonction (Callable[[Session], Any]): Fonction exécutée avec une session dédiée.
+        intervalle (float): Intervalle entre deux exécutions, en secondes.
+        prochaine (float): Instant (monotone) de la prochaine exécution.
+    """
+    nom: str
+    fonction: Callable[[Session], Any]
+    intervalle: float
+    prochaine: float = field(default=0.0)
+
+
+class Planificateur:
+    """
+    Planificateur de tâches périodiques en thread démon.
+    Méthodes :
+        ajouter(nom, fonction, intervalle) -> None: Enregistre une tâche.
+        demarrer(session_factory) -> None: Démarre le thread de planification.
+        arreter() -> None: Arrête le thread de planification.
+        executer(nom) -> Any: Exécute immédiatement une tâche (hors planification).
+    """
+    def __init__(self, pas: float = 5.0) -> None:
+        self.pas = pas
+        self._taches: List[Tache] = []
+        self._session_factory: Optional[sessionmaker[Session]] = None
+        self._arret = Event()
+        self._verrou = Lock()
+        self._thread: Optional[Thread] = None
+
+    def ajouter(self, nom: str, fonction: Callable[[Session], Any], intervalle: float) -> None:
+        """
+        Enregistre une tâche périodique (remplace une tâche de même nom).
+        Args:
+            nom (str): Nom unique de la tâche.
+            fonction (Callable[[Session], Any]): Fonction à exécuter avec une session dédiée.
+            intervalle (float): Intervalle entre deux exécutions, en secondes.
+        """
+        with self._verrou:
+            self._taches = [tache for tache in self._taches if tache.nom != nom]
+            self._taches.append(Tache(nom=nom, fonction=fonction, intervalle=intervalle))
+
+    def demarrer(self, session_factory: 'sessionmaker[Session]') -> None:
+        """
+        Démarre le thread de planification (sans effet s'il tourne déjà).
+        Args:
+            session_factory (sessionmaker[Session]): La fabrique de sessions de l'application.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._session_factory = session_factory
+        self._arret.clear()
+        self._thread = Thread(target=self._boucle, name='planificateur', daemon=True)
+        self._thread.start()
+        logger.info(f"Planificateur démarré : {[tache.nom for tache in self._taches]}")
+
+    def arreter(self) -> None:
+        """
+        Arrête le thread de planification et attend la fin de la tâche en cours.
+        """
+        self._arret.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def executer(self, nom: str) -> Any:
+        """
+        Exécute immédiatement une tâche enregistrée.
+        Args:
+            nom (str): Le nom de la tâche.
+        Returns:
+            Any: Le résultat de la tâche, ou None si elle n'a pas pu être exécutée.
+        """
+        tache = next((tache for tache in self._taches if tache.nom == nom), None)
+        if tache is None:
+            raise KeyError(f"Tâche inconnue : {nom}")
+        return self._executer(tache)
+
+    def _boucle(self) -> None:
+        """
+        Boucle du thread : exécute les tâches dont l'échéance est atteinte.
+        """
+        while not self._arret.is_set():
+            maintenant = monotonic()
+            with self._verrou:
+                a_executer = [tache for tache in self._taches if tache.prochaine <= maintenant]
+            for tache in a_executer:
+                tache.prochaine = maintenant + tache.intervalle
+                self._executer(tache)
+            self._arret.wait(self.pas)
+
+    def _executer(self, tache: Tache) -> Any:
+        """
+        Exécute une tâche dans sa propre session, sous verrou nommé de base de données.
+        Le verrou MariaDB étant attaché à la connexion, la session est liée à une connexion
+        dédiée qui prend et libère le verrou.
+        """
+        if self._session_factory is None:
+            raise RuntimeError("Planificateur non démarré : aucune fabrique de session.")
+        verrou = f'intranet_{tache.nom}'
+        try:
+            with self._session_factory.kw['bind'].connect() as connexion:
+                # Un seul processus exécute la tâche à un instant donné
+                if not connexion.execute(text("SELECT GET_LOCK(:nom, 0)"), {'nom': verrou}).scalar():
+                    logger.info(f"Tâche {tache.nom} déjà en cours dans un autre processus")
+                    return None
+                connexion.commit()
+                try:
+                    with self._session_factory(bind=connexion) as session:
+                        try:
+                            resultat = tache.fonction(session)
+                            session.commit()
+                            return resultat
+                        except Exception:
+                            session.rollback()
+                            raise
+                finally:
+                    connexion.execute(text("SELECT RELEASE_LOCK(:nom)"), {'nom': verrou})
+                    connexion.commit()
+        except Exception as e:
+            logger.error(f"Erreur lors de l'exécution de la tâche {tache.nom} : {e}")
+            return None
+
+
+# Planificateur unique de l'application
+planificateur = Planificateur()
@@ -1,5 +1,6 @@
 from typing import List, Dict, Any, Optional, overload, Literal, Union
-from os.path import dirname, join as join_os
+from os.path import dirname, getmtime, join as join_os
+from functools import lru_cache
 import json
 
 # Création des variables et constantes
@@ -31,12 +32,32 @@ def get_jsoned_datas(file: str, level_one: str, level_two: Optional[str] = None,
     Returns:
         str ou Dict[str, Any] ou List[Any]: Les menus au format JSON ou en tant que structure de données Python.
     """
-    with open(join_os(dirname(__file__), 'json', file), 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        if level_two is None:
-            menus_json = data[1][level_one]
-        else:
-            menus_json = data[1][level_one][0][level_two]
+    data = _load_json(file)
+    if level_two is None:
+        menus_json = data[1][level_one]
+    else:
+        menus_json = data[1][level_one][0][level_two]
     if dumped:
         return json.dumps(menus_json, ensure_ascii=False)
     return menus_json
+
+def _load_json(file: str) -> Any:
+    """
+    Retourne le contenu d'un fichier JSON du dossier 'json', mis en cache.
+    Le cache est indexé sur la date de modification du fichier : une modification
+    du fichier sur le disque est donc prise en compte sans redémarrage.
+    Args:
+        file (str): Le nom du fichier JSON.
+    Returns:
+        Any: Le contenu désérialisé du fichier (à ne pas modifier en place).
+    """
+    path = join_os(dirname(__file__), 'json', file)
+    return _read_json(path, getmtime(path))
+
+@lru_cache(maxsize=16)
+def _read_json(path: str, mtime: float) -> Any:
+    """
+    Lecture effective d'un fichier JSON, mise en cache par (chemin, date de modification).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -268,6 +268,42 @@ def app() -> Flask:
         return app      # type: ignore
 
 
+@pytest.fixture
+def sqlite_session():
+    """
+    Fixture fournissant une vraie session SQLAlchemy sur une base SQLite en mémoire.
+
+    Seules les tables des contrats sont créées (les tables de signature utilisent
+    des colonnes calculées propres à MariaDB). Le nombre de requêtes exécutées est
+    disponible dans l'attribut `statements` de la session.
+    """
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    app_path = os.path.join(os.path.dirname(__file__), '..', 'app')
+    if app_path not in sys.path:
+        sys.path.insert(0, app_path)
+    import models   # type: ignore
+
+    engine = create_engine('sqlite://')
+    tables = [models.Base.metadata.tables[name] for name in
+              ('01_contrats', '02_contacts', '03_echeances', '10_fichiers', '11_documents', '12_evenements',
+               '13_factures', '14_depenses')]
+    models.Base.metadata.create_all(engine, tables=tables)
+
+    statements: List[str] = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _count_statements(conn, cursor, statement, parameters, context, executemany):   # type: ignore
+        statements.append(statement)
+
+    session = sessionmaker(bind=engine)()
+    session.statements = statements     # type: ignore
+    yield session
+    session.close()
+    engine.dispose()
+
+
 @pytest.fixture
 def client(app: Flask) -> FlaskClient:
     """
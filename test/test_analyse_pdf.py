@@ -0,0 +1,55 @@
+"""
+Tests de l'analyse des PDF à signer au téléversement (module analyse_pdf).
+
+Ces tests vérifient que les dimensions des pages sont relevées dans un processus de travail,
+que les fichiers malformés sont rejetés et que les points de signature sont contrôlés.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from pypdf import PdfWriter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from analyse_pdf import analyser_pdf, verifier_points, PdfInvalideError   # type: ignore    # noqa: E402
+
+
+def _create_pdf(path: Path) -> Path:
+    """Crée un PDF de deux pages : A4 portrait puis paysage tourné de 90°."""
+    writer = PdfWriter()
+    writer.add_blank_page(width=595.28, height=841.89)
+    writer.add_blank_page(width=841.89, height=595.28).rotate(90)
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return path
+
+
+def test_analyse_pages(tmp_path: Path):
+    """Le nombre de pages, leurs dimensions et leur rotation sont relevés."""
+    pages = analyser_pdf(str(_create_pdf(tmp_path / 'contrat.pdf')))
+
+    assert pages == [{'largeur': 595.28, 'hauteur': 841.89, 'rotation': 0},
+                     {'largeur': 841.89, 'hauteur': 595.28, 'rotation': 90}]
+
+
+@pytest.mark.parametrize('contenu', [b'pas un pdf', b'%PDF-1.7\n%%EOF tronque'])
+def test_malformed_pdf_rejected(tmp_path: Path, contenu: bytes):
+    """Un fichier qui n'est pas un PDF lisible est rejeté dès l'analyse."""
+    chemin = tmp_path / 'faux.pdf'
+    chemin.write_bytes(contenu)
+
+    with pytest.raises(PdfInvalideError):
+        analyser_pdf(str(chemin))
+
+
+def test_points_checked_against_pages():
+    """Les points sont contrôlés sur les pages existantes et leurs dimensions affichées (pixels à l'échelle 1,5)."""
+    pages = [{'largeur': 595.28, 'hauteur': 841.89, 'rotation': 0},
+             {'largeur': 595.28, 'hauteur': 841.89, 'rotation': 90}]
+
+    verifier_points([{'x': 800, 'y': 1200, 'page_num': 1}, {'x': 1200, 'y': 800, 'page_num': 2}], pages)
+    with pytest.raises(ValueError, match="page 3 n'existe pas"):
+        verifier_points([{'x': 10, 'y': 10, 'page_num': 3}], pages)
+    with pytest.raises(ValueError, match='hors de la page 2'):
+        verifier_points([{'x': 800, 'y': 1200, 'page_num': 2}], pages)
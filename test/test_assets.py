@@ -0,0 +1,55 @@
+"""
+Tests des fichiers statiques à empreinte (assets.py) : construction, variantes précompressées
+et adresses produites par url_for.
+"""
+import gzip
+import os
+import sys
+from functools import partial
+from pathlib import Path
+
+from flask import Flask, url_for
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+import assets   # type: ignore    # noqa: E402
+
+
+def _static(dossier: Path) -> Path:
+    (dossier / 'css').mkdir(parents=True)
+    (dossier / 'img').mkdir()
+    (dossier / 'css' / 'style.css').write_text('body { margin: 0; }\n' * 50, encoding='utf-8')
+    (dossier / 'img' / 'logo.png').write_bytes(b'\x89PNG' + bytes(64))
+    return dossier
+
+
+def test_build_fingerprints_and_precompresses(tmp_path: Path):
+    """Chaque fichier est copié sous son empreinte ; seuls les fichiers texte ont une variante gzip."""
+    source = _static(tmp_path / 'static')
+    manifeste = assets.construire(str(source))
+
+    css = manifeste['css/style.css']
+    assert css.startswith('dist/css/style.') and css.endswith('.css') and len(css) == len('dist/css/style..css') + 12
+    assert gzip.decompress((source / (css + '.gz')).read_bytes()) == (source / 'css' / 'style.css').read_bytes()
+    assert (source / manifeste['img/logo.png']).exists()
+    assert not (source / (manifeste['img/logo.png'] + '.gz')).exists()
+    assert assets.charger_manifeste(str(source)) == manifeste
+
+    # Contenu modifié : nouvelle empreinte, dist reconstruit sans l'ancien fichier
+    (source / 'css' / 'style.css').write_text('body { margin: 1px; }\n', encoding='utf-8')
+    nouveau = assets.construire(str(source))['css/style.css']
+    assert nouveau != css and not (source / css).exists()
+
+
+def test_url_for_emits_fingerprinted_url(tmp_path: Path):
+    """url_for('static') produit l'adresse à empreinte ; sans manifeste, le nom d'origine."""
+    source = _static(tmp_path / 'static')
+    application = Flask(__name__, static_folder=str(source))
+    application.url_defaults(partial(assets.empreinte_static, source=str(source)))
+
+    with application.test_request_context():
+        assert url_for('static', filename='css/style.css') == '/static/css/style.css'
+        manifeste = assets.construire(str(source))
+        assert url_for('static', filename='css/style.css') == f"/static/{manifeste['css/style.css']}"
+        assert url_for('static', filename='js/absent.js') == '/static/js/absent.js'
+    assert assets.est_empreinte(manifeste['css/style.css'])
+    assert not assets.est_empreinte('dist/manifest.json')
@@ -0,0 +1,115 @@
+"""
+Tests du journal d'audit (module audit).
+
+Ces tests vérifient que les événements liés à une modification sont écrits avec son commit
+(et abandonnés avec son annulation), que l'écrivain différé insère les événements par lots
+que la consultation est paginée par clé et l'exportation produite par lots (module historique_audit)
+et que l'archivage mensuel exporte les événements avec leurs libellés (module archivage_audit).
+"""
+import gzip
+import json
+import os
+import sys
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+import models   # type: ignore    # noqa: E402
+import audit    # type: ignore    # noqa: E402
+import historique_audit    # type: ignore    # noqa: E402
+import archivage_audit    # type: ignore    # noqa: E402
+
+
+@pytest.fixture
+def fabrique(tmp_path: Path) -> Iterator[sessionmaker[Session]]:
+    """Fabrique de sessions SQLite sur fichier (l'écrivain différé utilise ses propres connexions)."""
+    engine = create_engine(f'sqlite:///{tmp_path / "audit.db"}')
+    tables = [models.Base.metadata.tables[name] for name in ('99_users', '24_audit_logs')]
+    models.Base.metadata.create_all(engine, tables=tables)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _nombre(fabrique: sessionmaker[Session]) -> int:
+    with fabrique() as session:
+        return session.execute(select(func.count()).select_from(models.AuditLog)).scalar_one()
+
+
+def test_events_follow_business_transaction(fabrique: sessionmaker[Session]):
+    """Un événement est écrit par le commit métier et abandonné par son annulation."""
+    with fabrique() as session:
+        audit.auditer(session, audit.ACTION_SIGNER, audit.CODE_OTP_ENVOYE, id_user=1)
+        session.rollback()
+        assert _nombre(fabrique) == 0
+
+        audit.auditer(session, audit.ACTION_SIGNER, id_user=1)
+        audit.auditer(session, audit.ACTION_EXPEDIER, audit.CODE_DOCUMENT_FINALISE, id_user=1)
+        assert _nombre(fabrique) == 0
+        session.commit()
+    assert _nombre(fabrique) == 2
+
+
+def test_buffered_writer_inserts_batches(fabrique: sessionmaker[Session]):
+    """L'écrivain différé écrit les événements sans document, par lots."""
+    ecrivain = audit.EcrivainAudit(taille_lot=2)
+    ecrivain._engine = fabrique.kw['bind']
+    for numero in range(5):
+        ecrivain.ajouter(audit.evenement(audit.ACTION_CONSULTER, audit.CODE_DOCUMENT_INTROUVABLE,
+                                         details=f'document {numero}'))
+
+    assert ecrivain.vider() == 5
+    with fabrique() as session:
+        lignes = session.execute(select(models.AuditLog)).scalars().all()
+    assert len(lignes) == 5 and all(ligne.id_document is None for ligne in lignes)
+
+
+def test_month_export_and_archive_purge(fabrique: sessionmaker[Session], tmp_path: Path):
+    """Un mois est exporté (codes et libellés) dans une archive compressée ; les archives anciennes sont purgées."""
+    evenements = [audit.evenement(audit.ACTION_CONSULTER, audit.CODE_DOCUMENT_INTROUVABLE, details='document 7'),
+                  audit.evenement(audit.ACTION_SIGNER), audit.evenement(audit.ACTION_SIGNER)]
+    jours = (datetime(2025, 9, 3), datetime(2025, 9, 30, 23, 59), datetime(2025, 10, 1))
+    for evenement, jour in zip(evenements, jours):
+        evenement['timestamp'] = jour
+    with fabrique() as session:
+        session.execute(models.AuditLog.__table__.insert(), evenements)
+        session.commit()
+        chemin, nombre = archivage_audit.exporter_mois(session, date(2025, 9, 1), str(tmp_path))
+
+    assert nombre == 2 and os.path.basename(chemin) == 'audit_202509.jsonl.gz'
+    with gzip.open(chemin, 'rt', encoding='utf-8') as archive:
+        lignes = [json.loads(ligne) for ligne in archive]
+    assert lignes[0]['code'] == audit.CODE_DOCUMENT_INTROUVABLE
+    assert lignes[0]['libelle'] == 'Tentative de téléchargement de document non trouvé (document 7)'
+    assert lignes[1]['action_libelle'] == 'signature'
+
+    (tmp_path / 'audit_202410.jsonl.gz').write_bytes(b'')
+    assert archivage_audit.purger_archives(datetime(2026, 8, 15), retention=12, dossier=str(tmp_path)) == 1
+    assert sorted(os.listdir(tmp_path)) == ['audit.db', 'audit_202509.jsonl.gz']
+    assert archivage_audit.nom_partition(archivage_audit.decaler_mois(date(2026, 11, 1), 3)) == 'p202702'
+
+
+def test_keyset_pages_and_batched_export(fabrique: sessionmaker[Session]):
+    """Les pages se suivent sans doublon (même horodatage) et l'export parcourt tous les lots."""
+    evenements = [audit.evenement(audit.ACTION_CONSULTER if numero % 2 else audit.ACTION_SIGNER, id_document=numero % 3)
+                  for numero in range(7)]
+    for numero, evenement in enumerate(evenements):
+        evenement['timestamp'] = datetime(2026, 3, 1 + numero // 2)
+    with fabrique() as session:
+        session.execute(models.AuditLog.__table__.insert(), evenements)
+        session.commit()
+
+        filtres = historique_audit.lire_filtres({'action': '2', 'fin': '2026-03-03'})
+        premiere = historique_audit.page_audit(session, filtres, par_page=2)
+        seconde = historique_audit.page_audit(session, filtres, apres=premiere['suivant'], par_page=2)
+        assert [e['id'] for e in premiere['evenements']] == [5, 3] and seconde['suivant'] is None
+        assert [e['id'] for e in seconde['evenements']] == [1]
+
+        lignes = historique_audit.parcourir(session.connection(), {}, lot=3)
+        export = ''.join(historique_audit.exporter_csv(lignes, lot=3)).splitlines()
+    assert export[0].startswith('id,timestamp,action') and len(export) == 8
+    assert [ligne.split(',')[0] for ligne in export[1:]] == [str(numero) for numero in range(1, 8)]
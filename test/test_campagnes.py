@@ -0,0 +1,231 @@
+"""
+Tests des campagnes de signature (campagnes.py) : choix des signataires, répartition
+des points selon le mode, création par insertions multiples, envoi des invitations par
+lots sur une connexion SMTP et avancement.
+"""
+import os
+import sys
+import smtplib
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Iterator, List
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+from sqlalchemy import MetaData, create_engine, update
+from sqlalchemy.orm import Session, sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+import models       # type: ignore    # noqa: E402
+import campagnes    # type: ignore    # noqa: E402
+import stockage     # type: ignore    # noqa: E402
+
+TABLES_SIGNATURE = ('99_users', '26_campagnes', '20_documents_a_signer', '21_points', '22_signatures',
+                    '23_invitations', '25_pages', '24_audit_logs')
+APP_TEMPLATES = os.path.join(os.path.dirname(__file__), '..', 'app', 'templates')
+
+
+@pytest.fixture
+def campagne_session(sqlite_session: Session, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Session]:
+    """
+    Session SQLite des tests de contrats complétée des tables de signature (la colonne calculée
+    `limite_signature`, propre à MariaDB, est créée comme une colonne simple sur une copie des tables),
+    avec un magasin de fichiers et 5 utilisateurs de test.
+    """
+    copie = MetaData()
+    for nom in TABLES_SIGNATURE:
+        models.Base.metadata.tables[nom].to_metadata(copie)
+    limite = copie.tables['20_documents_a_signer'].c.limite_signature
+    limite.computed, limite.server_default = None, None
+    copie.create_all(sqlite_session.get_bind())
+
+    monkeypatch.setattr(stockage, 'get_racine', lambda: str(tmp_path / 'blobs'))
+    for numero in range(5):
+        sqlite_session.add(models.User(prenom='Jean', nom=f'Signataire{numero}', mail=f'{numero}@test.fr',
+                                       sha_mdp='x', habilitation=4))
+    sqlite_session.commit()
+    with Flask(__name__, template_folder=APP_TEMPLATES).test_request_context():
+        yield sqlite_session
+
+
+def _creer(session: Session, tmp_path: Path, mode: str, signataires: List[int], **options: Any) -> Any:
+    """Crée une campagne sur un PDF de test (une page, un point par signataire en mode partagé)."""
+    modele = tmp_path / 'modele.pdf'
+    modele.write_bytes(b'%PDF-1.7 autorisation')
+    points = ([{'x': 50.0, 'y': 80.0, 'page_num': 1}] if mode == campagnes.MODE_INDIVIDUEL else
+              [{'x': 50.0, 'y': 20.0 * rang, 'page_num': 1, 'user_id': signataire}
+               for rang, signataire in enumerate(signataires, start=1)])
+    campagne = campagnes.creer_campagne(
+        session, nom='Autorisation.pdf', mode=mode, chemin_modele=str(modele), empreinte=None,
+        pages=[{'largeur': 595.0, 'hauteur': 842.0}], points=points, signataires=signataires,
+        metadonnees={'doc_type': 'Autorisation', 'echeance': 7}, id_user=signataires[0],
+        url_racine='https://intranet.test/', dossier=str(tmp_path / 'signatures'), **options)
+    session.commit()
+    return campagne
+
+
+def test_signers_chosen_by_id_or_habilitation():
+    """Les signataires actifs sont choisis par identifiant ou par habilitation, triés par nom."""
+    engine = create_engine('sqlite://')
+    models.Base.metadata.create_all(engine, tables=[models.Base.metadata.tables['99_users']])
+    with sessionmaker(bind=engine)() as session:
+        for nom, habilitation, locked, fin in (('Martin', 34, False, None), ('Bernard', 4, None, None),
+                                               ('Durand', 1, False, None), ('Petit', 4, True, None),
+                                               ('Roux', 45, False, date.today() - timedelta(days=1))):
+            session.add(models.User(prenom='A', nom=nom, mail=f'{nom}@test.fr', sha_mdp='x',
+                                    habilitation=habilitation, locked=locked, fin=fin))
+        session.commit()
+        ids = {user.nom: user.id for user in session.query(models.User)}
+
+        assert campagnes.choisir_signataires(session, habilitations=['4']) == [ids['Bernard'], ids['Martin']]
+        assert campagnes.choisir_signataires(session, ids=[ids['Durand']], habilitations=['3']) == [
+            ids['Durand'], ids['Martin']]
+        assert campagnes.choisir_signataires(session) == []
+    engine.dispose()
+
+
+def test_points_fanned_out_per_mode():
+    """Mode individuel : un document par signataire avec toute la disposition ; partagé : un document."""
+    disposition = [{'x': 50.0, 'y': 80.0, 'page_num': 1, 'user_id': 1}, {'x': 50.0, 'y': 80.0, 'page_num': 2}]
+
+    documents = campagnes.repartir(campagnes.MODE_INDIVIDUEL, disposition, list(range(1, 301)) + [7])
+    assert len(documents) == 300 and documents[6][0] == 7
+    assert [point['user_id'] for point in documents[6][1]] == [7, 7]
+
+    partage = [{'x': 50.0, 'y': 80.0 * i, 'page_num': 1, 'user_id': i} for i in (1, 2)]
+    assert campagnes.repartir(campagnes.MODE_PARTAGE, partage, [1, 2]) == [(None, partage)]
+    with pytest.raises(ValueError, match='sans point'):
+        campagnes.repartir(campagnes.MODE_PARTAGE, partage, [1, 2, 3])
+    # Utilisateur verrouillé, expiré ou non choisi : écarté par choisir_signataires, refusé ici
+    with pytest.raises(ValueError, match='non retenus.*2'):
+        campagnes.repartir(campagnes.MODE_PARTAGE, partage, [1])
+    for mode in campagnes.MODES:
+        with pytest.raises(ValueError, match='aucun signataire'):
+            campagnes.repartir(mode, partage, [])
+    with pytest.raises(ValueError, match='inconnu'):
+        campagnes.repartir('massif', partage, [1])
+
+
+def test_invitations_sent_over_one_smtp_connection():
+    """Un lot passe par une seule connexion ; un refus n'empêche pas les envois suivants."""
+    def envoyer(msg: Any) -> None:
+        if msg['To'] == 'refus@test.fr':
+            raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b'inconnu')})
+
+    with patch('campagnes.smtplib.SMTP') as smtp:
+        serveur = smtp.return_value.__enter__.return_value
+        serveur.send_message.side_effect = envoyer
+        envoyes, echecs = campagnes.expedier([(i, 'refus@test.fr' if i == 2 else f'{i}@test.fr', '<p>Signer</p>')
+                                              for i in range(1, 201)])
+
+    assert smtp.call_count == 1 and serveur.login.call_count == 1
+    assert len(envoyes) == 199 and echecs == [2]
+
+    with patch('campagnes.smtplib.SMTP', side_effect=OSError('injoignable')):
+        assert campagnes.expedier([(1, 'a@test.fr', '')]) == ([], [])
+
+
+def test_campaign_created_with_batched_inserts(campagne_session: Session, tmp_path: Path):
+    """Mode individuel : insertions par lots, un seul fichier stocké et une invitation par signataire."""
+    signataires = campagnes.choisir_signataires(campagne_session, habilitations=['4'])
+    campagne_session.statements.clear()     # type: ignore[attr-defined]
+    campagne = _creer(campagne_session, tmp_path, campagnes.MODE_INDIVIDUEL, signataires, taille_lot=2)
+
+    # 5 documents par lots de 2 : 3 insertions multiples, idem pour les points et les invitations
+    insertions = [requete for requete in campagne_session.statements      # type: ignore[attr-defined]
+                  if requete.startswith('INSERT INTO "20_documents_a_signer"')]
+    assert len(insertions) == 3
+    documents = campagne_session.query(models.DocToSigne).filter_by(id_campagne=campagne.id).all()
+    assert (campagne.nb_documents, campagne.nb_signataires, len(documents)) == (5, 5, 5)
+    assert campagne_session.query(models.Points).count() == 5
+    assert campagne_session.query(models.Page).count() == 5
+    assert campagne_session.query(models.AuditLog).count() == 5
+
+    # Une invitation en file par signataire, sur son propre document
+    invitations = campagne_session.query(models.Invitation).all()
+    assert sorted(invitation.id_user for invitation in invitations) == sorted(signataires)
+    assert all(not invitation.mail_envoye and invitation.envoye_at is None for invitation in invitations)
+    assert {(document.id, document.chemin_fichier.split(os.sep)[-2]) for document in documents} == {
+        (invitation.id_document, str(invitation.id_user)) for invitation in invitations}
+
+    # Un fichier stocké référencé par chaque document, copies de travail en liens physiques
+    blob = campagne_session.query(models.Blob).one()
+    assert blob.nb_references == 5 and {document.hash_fichier for document in documents} == {blob.hash}
+    stocke = os.stat(stockage.chemin_blob(blob.hash))
+    assert stocke.st_nlink == 6
+    assert all(os.stat(document.chemin_fichier).st_ino == stocke.st_ino for document in documents)
+
+
+def test_shared_campaign_single_document(campagne_session: Session, tmp_path: Path):
+    """Mode partagé : un document, ses points tels qu'attribués et une invitation par signataire."""
+    signataires = campagnes.choisir_signataires(campagne_session, habilitations=['4'])[:3]
+    campagne = _creer(campagne_session, tmp_path, campagnes.MODE_PARTAGE, signataires)
+
+    document = campagne_session.query(models.DocToSigne).filter_by(id_campagne=campagne.id).one()
+    assert (campagne.nb_documents, campagne.nb_signataires) == (1, 3)
+    assert document.chemin_fichier.split(os.sep)[-2] == 'commun'
+    assert sorted(point.id_user for point in campagne_session.query(models.Points)) == sorted(signataires)
+    assert sorted(invitation.id_user for invitation in campagne_session.query(models.Invitation)) == sorted(signataires)
+    assert campagne_session.query(models.Blob).one().nb_references == 1
+
+
+def test_invitations_sent_from_queue(campagne_session: Session, tmp_path: Path):
+    """Les invitations en file sont envoyées par lots ; un échec est retenté jusqu'à TENTATIVES_MAIL."""
+    signataires = campagnes.choisir_signataires(campagne_session, habilitations=['4'])
+    campagne = _creer(campagne_session, tmp_path, campagnes.MODE_INDIVIDUEL, signataires)
+    refus = campagne_session.get(models.User, signataires[0]).mail
+    # Invitation hors file : déjà signée
+    campagne_session.execute(update(models.Invitation).where(models.Invitation.id_user == signataires[1])
+                             .values(status=1))
+
+    def envoyer(msg: Any) -> None:
+        if msg['To'] == refus:
+            raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b'inconnu')})
+
+    with patch('campagnes.smtplib.SMTP') as smtp:
+        serveur = smtp.return_value.__enter__.return_value
+        serveur.send_message.side_effect = envoyer
+        assert campagnes.envoyer_invitations(campagne_session, lot=2) == {'envoyes': 1, 'echecs': 1}
+        campagne_session.commit()
+        corps = serveur.send_message.call_args[0][0].get_payload()[0].get_payload(decode=True).decode()
+        assert 'https://intranet.test/signature/signer/' in corps
+        # Lots suivants : l'invitation refusée est retentée jusqu'à TENTATIVES_MAIL, puis abandonnée
+        for _ in range(campagnes.TENTATIVES_MAIL):
+            campagnes.envoyer_invitations(campagne_session)
+            campagne_session.commit()
+        assert campagnes.envoyer_invitations(campagne_session) == {'envoyes': 0, 'echecs': 0}
+        assert smtp.call_count == 1 + campagnes.TENTATIVES_MAIL - 1
+
+    invitations = {invitation.id_user: invitation for invitation in campagne_session.query(models.Invitation)}
+    assert invitations[signataires[0]].mail_compte == campagnes.TENTATIVES_MAIL
+    assert not invitations[signataires[0]].mail_envoye
+    assert not invitations[signataires[1]].mail_envoye and invitations[signataires[1]].mail_compte == 0
+    envoyees = [invitations[signataire] for signataire in signataires[2:]]
+    assert all(invitation.mail_envoye and invitation.mail_compte == 1 and invitation.envoye_at
+               for invitation in envoyees)
+
+    etat = campagnes.avancement(campagne_session, [campagne])[0]
+    assert etat['invitations'] == {'en_file': 1, 'envoyees': 3, 'abandonnees': 1, 'signees': 1, 'expirees': 0}
+    assert etat['documents'] == {'en_attente': 5, 'signes': 0, 'expires': 0, 'annules': 0}
+    assert etat['progression'] == 20.0
+
+
+def test_progress_of_several_campaigns(campagne_session: Session, tmp_path: Path):
+    """L'avancement est agrégé par campagne (documents par statut, invitations, progression)."""
+    signataires = campagnes.choisir_signataires(campagne_session, habilitations=['4'])
+    individuelle = _creer(campagne_session, tmp_path, campagnes.MODE_INDIVIDUEL, signataires[:2])
+    partagee = _creer(campagne_session, tmp_path, campagnes.MODE_PARTAGE, signataires)
+    document = campagne_session.query(models.DocToSigne).filter_by(id_campagne=individuelle.id).first()
+    document.status = 1
+    campagne_session.execute(update(models.Invitation).where(models.Invitation.id_document == document.id)
+                             .values(status=1))
+    campagne_session.commit()
+
+    etats = {etat['id']: etat for etat in campagnes.avancement(campagne_session, [individuelle, partagee])}
+    assert etats[individuelle.id]['documents'] == {'en_attente': 1, 'signes': 1, 'expires': 0, 'annules': 0}
+    assert etats[individuelle.id]['invitations']['signees'] == 1 and etats[individuelle.id]['progression'] == 50.0
+    assert etats[partagee.id]['invitations'] == {'en_file': 5, 'envoyees': 0, 'abandonnees': 0,
+                                                 'signees': 0, 'expirees': 0}
+    assert etats[partagee.id]['mode'] == campagnes.MODE_PARTAGE and etats[partagee.id]['progression'] == 0.0
+    assert campagnes.avancement(campagne_session, []) == []
@@ -0,0 +1,158 @@
+"""
+Tests du chargement des contrats sur une base SQLite en mémoire.
+
+Ces tests vérifient que le détail d'un contrat est construit avec un nombre
+de requêtes constant, quel que soit le nombre d'éléments liés.
+"""
+import pytest
+from datetime import date, timedelta
+from typing import Any
+
+
+def _create_contract(session: Any, nb_elements: int) -> int:
+    """Crée un contrat avec `nb_elements` contacts, évènements, documents et factures."""
+    import models   # type: ignore
+
+    contract = models.Contract(type_contrat='Maintenance', sous_type_contrat='Informatique',
+                               entreprise='TechCorp', id_externe_contrat='TC001',
+                               intitule='Maintenance des serveurs', date_debut=date.today(),
+                               date_fin_preavis=date.today() + timedelta(days=365))
+    for i in range(nb_elements):
+        contract.contacts.append(models.Contacts(nom=f'Contact {i}', mail=f'contact{i}@test.com'))
+        contract.evenements.append(models.Event(type_evenement='Renouvellement', sous_type_evenement='Annuel',
+                                                date_evenement=date.today(), descriptif=f'Évènement {i}'))
+        contract.documents.append(models.Document(date_document=date.today(), type_document='Contrat',
+                                                  descriptif=f'Document {i}'))
+        contract.factures.append(models.Bill(date_facture=date.today(), titre_facture=f'Facture {i}',
+                                             montant=100 + i))
+    session.add(contract)
+    session.commit()
+    id_contrat = contract.id
+    session.expunge_all()
+    return id_contrat
+
+
+@pytest.mark.parametrize('nb_elements', [0, 1, 25])
+def test_contract_details_constant_queries(sqlite_session: Any, nb_elements: int):
+    """Le détail d'un contrat est chargé en 5 requêtes (contrat + 4 relations)."""
+    from bp_contracts import get_contract_details     # type: ignore
+
+    id_contrat = _create_contract(sqlite_session, nb_elements)
+    sqlite_session.statements.clear()
+
+    contract = get_contract_details(sqlite_session, id_contrat)
+    payload = contract.to_dict(with_details=True)
+
+    assert len(sqlite_session.statements) == 5
+    assert len(payload['contacts']) == nb_elements
+    assert len(payload['evenements']) == nb_elements
+    assert len(payload['documents']) == nb_elements
+    assert len(payload['factures']) == nb_elements
+
+
+def test_contract_details_unknown(sqlite_session: Any):
+    """Un contrat inexistant retourne None sans charger les relations."""
+    from bp_contracts import get_contract_details     # type: ignore
+
+    assert get_contract_details(sqlite_session, 999) is None
+    assert len(sqlite_session.statements) == 1
+
+
+@pytest.mark.parametrize('saisie, attendu', [
+    ('maintenance', '+maintenance*'),
+    ('chauffage "Dupont"', '+chauffage* +Dupont*'),
+    ('+a -bc (x) ~y', ''),
+    ('C12345 <serveurs>', '+C12345* +serveurs*'),
+    ('', ''),
+])
+def test_preparer_terme(saisie: str, attendu: str):
+    """La saisie est convertie en expression booléenne sans opérateur injecté."""
+    from recherche import preparer_terme     # type: ignore
+
+    assert preparer_terme(saisie) == attendu
+
+
+def test_rechercher_sans_terme_exploitable():
+    """Une saisie vide ne déclenche aucune requête."""
+    from unittest.mock import MagicMock
+    from recherche import rechercher     # type: ignore
+
+    session = MagicMock()
+    resultat = rechercher(session, 'a b', page=0, par_page=500)
+
+    session.execute.assert_not_called()
+    assert resultat == {'resultats': [], 'page': 1, 'par_page': 100, 'suivant': False}
+
+
+@pytest.mark.parametrize('jour, mois, attendu', [
+    (date(2025, 1, 31), 1, date(2025, 2, 28)),
+    (date(2024, 1, 31), 1, date(2024, 2, 29)),
+    (date(2025, 11, 15), 4, date(2026, 3, 15)),
+    (date(2025, 3, 31), -1, date(2025, 2, 28)),
+])
+def test_ajouter_mois(jour: date, mois: int, attendu: date):
+    """Les fenêtres du rapport sont calculées en mois calendaires exacts."""
+    from rapport_echeances import ajouter_mois     # type: ignore
+
+    assert ajouter_mois(jour, mois) == attendu
+
+
+def test_echeances_maintenues_et_fenetres(sqlite_session: Any):
+    """La table des échéances suit les contrats et alimente plusieurs fenêtres en une requête."""
+    import models   # type: ignore
+    from rapport_echeances import contrats_par_fenetre     # type: ignore
+
+    reference = date(2025, 1, 15)
+    for i, preavis in enumerate([date(2025, 3, 1), date(2025, 5, 20), date(2025, 7, 10)]):
+        sqlite_session.add(models.Contract(type_contrat='Services', sous_type_contrat='Nettoyage',
+                                           entreprise=f'Entreprise {i}', id_externe_contrat=f'E{i}',
+                                           intitule=f'Contrat {i}', date_debut=date(2024, 1, 1),
+                                           date_fin_preavis=preavis))
+    sqlite_session.commit()
+    assert sqlite_session.query(models.Echeance).count() == 3
+
+    # Modification des dates d'un contrat et suppression d'un autre
+    contract = sqlite_session.query(models.Contract).filter_by(intitule='Contrat 0').one()
+    contract.date_fin_preavis = date(2025, 6, 30)
+    contract.date_fin = date(2025, 12, 31)
+    sqlite_session.delete(sqlite_session.query(models.Contract).filter_by(intitule='Contrat 2').one())
+    sqlite_session.commit()
+    assert sqlite_session.query(models.Echeance).count() == 3
+
+    sqlite_session.statements.clear()
+    periodes = contrats_par_fenetre(sqlite_session, [(4, 6), (0, 2)], aujourd_hui=reference)
+
+    assert len(sqlite_session.statements) == 1
+    assert periodes[0]['debut'] == date(2025, 5, 15) and periodes[0]['fin'] == date(2025, 7, 15)
+    assert [c.intitule for c in periodes[0]['contrats']] == ['Contrat 1', 'Contrat 0']
+    assert periodes[1]['contrats'] == []
+
+
+def test_rapport_renego_en_echec_sans_aucun_envoi(sqlite_session: Any):
+    """Le rapport signale une erreur si aucun courriel n'a pu être envoyé, et rien à envoyer sans contrat."""
+    import os
+    import smtplib
+    from unittest.mock import patch
+    from flask import Flask
+    import models   # type: ignore
+    from rapport_echeances import envoi_contrats_renego, ajouter_mois     # type: ignore
+
+    app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), '..', 'app', 'templates'))
+    with app.app_context(), patch('rapport_echeances.smtplib.SMTP') as smtp:
+        assert envoi_contrats_renego(['a@test.fr'], sqlite_session) == 0
+        assert smtp.call_count == 0
+
+        sqlite_session.add(models.Contract(type_contrat='Services', sous_type_contrat='Nettoyage', entreprise='E',
+                                           id_externe_contrat='E1', intitule='Contrat', date_debut=date(2024, 1, 1),
+                                           date_fin_preavis=ajouter_mois(date.today(), 5)))
+        sqlite_session.commit()
+        serveur = smtp.return_value.__enter__.return_value
+        serveur.send_message.side_effect = [smtplib.SMTPRecipientsRefused({}), {}]
+        assert envoi_contrats_renego(['refus@test.fr', 'b@test.fr'], sqlite_session) == 1
+
+        serveur.send_message.side_effect = smtplib.SMTPRecipientsRefused({})
+        with pytest.raises(RuntimeError, match='Aucun destinataire'):
+            envoi_contrats_renego(['refus@test.fr'], sqlite_session)
+        smtp.side_effect = OSError('injoignable')
+        with pytest.raises(RuntimeError, match='Connexion'):
+            envoi_contrats_renego(['a@test.fr'], sqlite_session)
@@ -0,0 +1,34 @@
+"""
+Tests du démarrage (module demarrage).
+
+Ces tests vérifient que les scripts de migration forment une seule branche et qu'une base
+déjà à la révision head n'est ni migrée ni recréée au démarrage.
+"""
+import os
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+import demarrage    # type: ignore    # noqa: E402
+
+
+def test_migrations_have_a_single_head():
+    """Une seule révision head : le démarrage compare une révision unique."""
+    assert len(demarrage.revisions_cibles(demarrage.get_config_alembic())) == 1
+
+
+def test_current_schema_is_left_untouched(tmp_path: Path):
+    """Base à la révision head : aucune création de table ni migration."""
+    head = next(iter(demarrage.revisions_cibles(demarrage.get_config_alembic())))
+    engine = create_engine(f'sqlite:///{tmp_path / "demarrage.db"}')
+    with engine.begin() as connexion:
+        connexion.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        connexion.execute(text("INSERT INTO alembic_version VALUES (:head)"), {'head': head})
+
+    durees = {}
+    with demarrage.phase('schéma', durees):
+        assert demarrage.preparer_schema(engine) == demarrage.SCHEMA_A_JOUR
+    assert inspect(engine).get_table_names() == ['alembic_version'] and durees['schéma'] >= 0
+    engine.dispose()
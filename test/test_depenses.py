@@ -0,0 +1,50 @@
+"""
+Tests des cumuls mensuels des factures (table 14_depenses) sur une base SQLite en mémoire :
+maintenance à chaque écriture d'une facture et tableau des dépenses (depenses.py).
+"""
+from datetime import date
+from typing import Any, List, Tuple
+
+
+def _cumuls(session: Any) -> List[Tuple[int, int, int, float, int]]:
+    import models   # type: ignore
+
+    return sorted((depense.id_contrat, depense.annee, depense.mois, float(depense.montant), depense.nb_factures)
+                  for depense in session.query(models.Depense))
+
+
+def test_rollup_follows_bill_insert_update_delete(sqlite_session: Any):
+    """Les cumuls suivent les créations, modifications (montant, date) et suppressions de factures."""
+    import models   # type: ignore
+    import depenses     # type: ignore
+
+    contrats = [models.Contract(type_contrat=type_contrat, sous_type_contrat='Autre', entreprise=entreprise,
+                                id_externe_contrat=entreprise, intitule=entreprise, date_debut=date(2025, 1, 1),
+                                date_fin_preavis=date(2026, 1, 1))
+                for type_contrat, entreprise in (('RH', 'A'), ('Services', 'B'))]
+    sqlite_session.add_all(contrats)
+    sqlite_session.flush()
+    factures = [models.Bill(id_contrat=contrats[0].id, date_facture=date(2025, 3, 5), titre_facture='f1', montant=100),
+                models.Bill(id_contrat=contrats[0].id, date_facture=date(2025, 3, 20), titre_facture='f2', montant=50),
+                models.Bill(id_contrat=contrats[1].id, date_facture=date(2026, 1, 2), titre_facture='f3', montant=10)]
+    sqlite_session.add_all(factures)
+    sqlite_session.commit()
+    assert _cumuls(sqlite_session) == [(1, 2025, 3, 150.0, 2), (2, 2026, 1, 10.0, 1)]
+
+    # Formulaire de modification : montant en texte, attributs expirés après le commit
+    factures[1].montant = '75.50'
+    factures[1].date_facture = date(2025, 4, 1)
+    sqlite_session.commit()
+    sqlite_session.delete(factures[2])
+    sqlite_session.commit()
+    assert _cumuls(sqlite_session) == [(1, 2025, 3, 100.0, 1), (1, 2025, 4, 75.5, 1)]
+
+    analyse = depenses.analyser(sqlite_session, axe='type', periode=depenses.PERIODE_ANNEE)
+    assert analyse['periodes'] == ['2025'] and analyse['total'] == 175.5
+    assert analyse['lignes'] == [{'libelle': 'RH', 'montants': {'2025': 175.5}, 'nb_factures': 2, 'total': 175.5}]
+    mensuel = depenses.analyser(sqlite_session, **depenses.lire_parametres({'axe': 'entreprise', 'debut': '2025-04'}))
+    assert mensuel['periodes'] == ['2025-04'] and mensuel['lignes'][0]['libelle'] == 'A'
+
+    cumuls = _cumuls(sqlite_session)
+    assert depenses.reconstruire_depenses(sqlite_session) == 2
+    assert _cumuls(sqlite_session) == cumuls
@@ -0,0 +1,160 @@
+"""
+Tests de l'envoi des fichiers stockés (module docs).
+
+Ces tests vérifient que les fichiers sont envoyés par blocs depuis le disque,
+avec la prise en charge des requêtes partielles (Range) et conditionnelles (ETag),
+et que les fichiers téléversés sont enregistrés par blocs avec calcul du SHA-256.
+"""
+import hashlib
+import io
+import os
+import stat
+import sys
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import pytest
+from flask import Flask
+from werkzeug.datastructures import FileStorage
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from docs import send_stored_file, store_upload, UploadTooLargeError   # type: ignore    # noqa: E402
+
+TAILLE_FICHIER = 100 * 1024 * 1024   # 100 Mo
+ETAG = 'a' * 64
+
+
+@pytest.fixture
+def files_app(tmp_path: Path) -> Flask:
+    """Application minimale servant les fichiers du dossier temporaire."""
+    app = Flask(__name__)
+
+    @app.route('/fichier/<name>')
+    def fichier(name: str) -> Any:
+        return send_stored_file(str(tmp_path / name), download_name=name, etag=ETAG)
+
+    return app
+
+
+def _create_file(path: Path, size: int) -> Path:
+    """Crée un fichier creux de la taille demandée (pas d'écriture réelle sur le disque)."""
+    with open(path, 'wb') as f:
+        f.truncate(size)
+    return path
+
+
+def test_range_request(files_app: Flask, tmp_path: Path):
+    """Une requête Range reçoit une réponse 206 avec le seul extrait demandé."""
+    (tmp_path / 'doc.pdf').write_bytes(bytes(range(256)) * 4)
+    client = files_app.test_client()
+
+    response = client.get('/fichier/doc.pdf', headers={'Range': 'bytes=10-19'})
+
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == 'bytes 10-19/1024'
+    assert response.data == bytes(range(10, 20))
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+
+def test_etag_and_not_modified(files_app: Flask, tmp_path: Path):
+    """L'ETag est le hash stocké et If-None-Match renvoie 304 sans contenu."""
+    (tmp_path / 'doc.pdf').write_bytes(b'%PDF-1.7 contenu')
+    client = files_app.test_client()
+
+    response = client.get('/fichier/doc.pdf')
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{ETAG}"'
+
+    response = client.get('/fichier/doc.pdf', headers={'If-None-Match': f'"{ETAG}"'})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_missing_file(files_app: Flask):
+    """Un fichier absent lève FileNotFoundError (converti en 404 par les appelants)."""
+    with pytest.raises(FileNotFoundError):
+        with files_app.test_request_context('/'):
+            send_stored_file('/chemin/inexistant.pdf', download_name='inexistant.pdf')
+
+
+def test_concurrent_downloads_memory(files_app: Flask, tmp_path: Path):
+    """Plusieurs téléchargements simultanés de 100 Mo restent à mémoire constante."""
+    nb_fichiers = 4
+    for i in range(nb_fichiers):
+        _create_file(tmp_path / f'gros_{i}.pdf', TAILLE_FICHIER)
+
+    def download(i: int) -> int:
+        client = files_app.test_client()
+        response = client.get(f'/fichier/gros_{i}.pdf', buffered=False)
+        total = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return total
+
+    tracemalloc.start()
+    try:
+        with ThreadPoolExecutor(max_workers=nb_fichiers) as executor:
+            totaux = list(executor.map(download, range(nb_fichiers)))
+        _, pic = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert totaux == [TAILLE_FICHIER] * nb_fichiers
+    # 400 Mo transférés pour un pic de quelques Mo au plus
+    assert pic < 16 * 1024 * 1024
+
+
+def test_accel_redirect(files_app: Flask, tmp_path: Path):
+    """En mode nginx, seule la redirection interne est renvoyée, vers le dossier le plus spécifique."""
+    signatures = tmp_path / 'signatures' / '12'
+    signatures.mkdir(parents=True)
+    (signatures / 'doc signé.pdf').write_bytes(b'%PDF-1.7')
+    (tmp_path / 'facture.pdf').write_bytes(b'%PDF-1.7')
+    files_app.config.update(FILE_DELIVERY_MODE='nginx', UPLOAD_FOLDER=str(tmp_path),
+                            SIGNATURE_PATH=str(tmp_path / 'signatures'))
+
+    with files_app.test_request_context('/'):
+        response = send_stored_file(str(signatures / 'doc signé.pdf'), download_name='doc.pdf')
+        assert response.headers['X-Accel-Redirect'] == '/_fichiers/signatures/12/doc%20sign%C3%A9.pdf'
+        assert response.headers['Content-Type'] == 'application/pdf'
+        assert response.get_data() == b''
+
+        response = send_stored_file(str(tmp_path / 'facture.pdf'), download_name='facture.pdf')
+        assert response.headers['X-Accel-Redirect'] == '/_fichiers/documents/facture.pdf'
+
+        # Hors des dossiers publiés : envoi par l'application
+        response = send_stored_file(str(tmp_path / '..' / tmp_path.name / 'facture.pdf'), download_name='f.pdf')
+        assert response.headers['X-Accel-Redirect'] == '/_fichiers/documents/facture.pdf'
+        files_app.config['UPLOAD_FOLDER'] = str(tmp_path / 'autre')
+        response = send_stored_file(str(tmp_path / 'facture.pdf'), download_name='facture.pdf')
+        assert 'X-Accel-Redirect' not in response.headers
+        response.close()
+
+
+def test_store_upload_hash_and_size(tmp_path: Path):
+    """Le fichier est écrit par blocs, le SHA-256 et la taille sont calculés au fil de l'eau."""
+    contenu = os.urandom(3 * 1024 * 1024 + 17)
+    destination = tmp_path / 'depot' / 'doc.pdf'
+
+    sha256, taille = store_upload(FileStorage(io.BytesIO(contenu), filename='doc.pdf'), str(destination))
+
+    assert sha256 == hashlib.sha256(contenu).hexdigest()
+    assert taille == len(contenu)
+    assert destination.read_bytes() == contenu
+    assert os.listdir(destination.parent) == ['doc.pdf']
+    # Lisible par les workers nginx (X-Accel-Redirect), comme un fichier ouvert en écriture
+    assert stat.S_IMODE(destination.stat().st_mode) == 0o644
+
+
+def test_store_upload_too_large_keeps_previous_file(tmp_path: Path):
+    """Un fichier trop volumineux est rejeté sans fichier partiel ni écrasement du fichier existant."""
+    destination = tmp_path / 'doc.pdf'
+    destination.write_bytes(b'ancien contenu')
+    trop_gros = FileStorage(io.BytesIO(b'x' * (2 * 1024 * 1024)), filename='doc.pdf')
+
+    with pytest.raises(UploadTooLargeError):
+        store_upload(trop_gros, str(destination), max_size=1024 * 1024)
+
+    assert destination.read_bytes() == b'ancien contenu'
+    assert os.listdir(tmp_path) == ['doc.pdf']
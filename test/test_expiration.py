@@ -0,0 +1,129 @@
+"""
+Tests de l'expiration des signatures (expiration.py) sur une base SQLite en mémoire.
+
+Ces tests vérifient les compteurs et les statuts après un passage, l'écriture d'une
+seule ligne d'audit par document ou invitation expiré, et l'idempotence d'un second passage.
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Iterator
+
+import pytest
+from sqlalchemy import Column, Computed, DateTime, MetaData
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+import models       # type: ignore    # noqa: E402
+import expiration   # type: ignore    # noqa: E402
+from audit import ACTION_EXPIRER, CODE_DOCUMENT_EXPIRE, CODE_INVITATION_EXPIREE   # type: ignore    # noqa: E402
+
+TABLES_SIGNATURE = ('99_users', '26_campagnes', '20_documents_a_signer', '21_points', '22_signatures',
+                    '23_invitations', '25_pages', '24_audit_logs')
+
+MAINTENANT = datetime(2026, 10, 19, 12, 0)
+
+
+@pytest.fixture
+def signature_session(sqlite_session: Session) -> Iterator[Session]:
+    """
+    Session SQLite des tests de contrats complétée des tables de signature. La colonne calculée
+    `limite_signature` (DATE_ADD, propre à MariaDB) est recréée en colonne générée SQLite équivalente.
+    """
+    copie = MetaData()
+    for nom in TABLES_SIGNATURE:
+        models.Base.metadata.tables[nom].to_metadata(copie)
+    copie.tables['20_documents_a_signer'].append_column(
+        Column('limite_signature', DateTime, Computed("datetime(cree_at, '+' || echeance || ' days')")),
+        replace_existing=True)
+    copie.create_all(sqlite_session.get_bind())
+    yield sqlite_session
+
+
+def _document(session: Session, id_user: int, cree_at: datetime, echeance: int, status: int = 0,
+              signataires: Any = ()) -> Any:
+    """Crée un document à signer, un point et une invitation par signataire (échéance de l'invitation incluse)."""
+    document = models.DocToSigne(doc_nom='Autorisation.pdf', doc_type='Autorisation', echeance=echeance,
+                                 chemin_fichier=f'/tmp/{cree_at.isoformat()}.pdf', hash_fichier='0' * 64,
+                                 id_user=id_user, cree_at=cree_at, status=status)
+    session.add(document)
+    session.flush()
+    for signataire, expire_at in signataires:
+        session.add(models.Points(id_document=document.id, id_user=signataire, page_num=1, x=50.0, y=80.0, status=0))
+        session.add(models.Invitation(id_document=document.id, id_user=signataire, token=f'{document.id}-{signataire}',
+                                      expire_at=expire_at, status=0, mail_envoye=True, mail_compte=1))
+    session.commit()
+    return document
+
+
+def test_expired_documents_points_and_invitations(signature_session: Session):
+    """
+    Un passage expire documents, points et invitations échus, avec une ligne d'audit pour chaque
+    document et invitation ; un second passage ne change rien.
+    """
+    session = signature_session
+    users = [models.User(prenom='Jean', nom=f'Signataire{numero}', mail=f'{numero}@test.fr', sha_mdp='x',
+                         habilitation=4) for numero in range(3)]
+    session.add_all(users)
+    session.commit()
+    createur, premier, second = (user.id for user in users)
+    plus_tard = MAINTENANT + timedelta(days=5)
+
+    # Document échu (limite : cree_at + 3 jours dépassée) : ses deux points et invitations expirent
+    echu = _document(session, createur, MAINTENANT - timedelta(days=4), 3,
+                     signataires=[(premier, plus_tard), (second, plus_tard)])
+    # Document en cours dont une seule invitation est échue
+    en_cours = _document(session, createur, MAINTENANT - timedelta(days=1), 7,
+                         signataires=[(premier, MAINTENANT - timedelta(hours=1)), (second, plus_tard)])
+    # Document déjà signé, même échu : inchangé
+    signe = _document(session, createur, MAINTENANT - timedelta(days=10), 3, status=1)
+
+    # Point déjà signé du document échu : conservé
+    point_signe = session.query(models.Points).filter_by(id_document=echu.id, id_user=second).one()
+    point_signe.status = 1
+    session.commit()
+
+    compteurs = expiration.expirer_signatures(session, maintenant=MAINTENANT)
+    session.commit()
+    assert compteurs == {'documents': 1, 'points': 1, 'invitations': 3}
+
+    session.expire_all()
+    statuts = {document.id: document.status for document in session.query(models.DocToSigne)}
+    assert statuts == {echu.id: -1, en_cours.id: 0, signe.id: 1}
+    assert {(point.id_document, point.id_user): point.status for point in session.query(models.Points)} == {
+        (echu.id, premier): -1, (echu.id, second): 1, (en_cours.id, premier): 0, (en_cours.id, second): 0}
+    assert {(invitation.id_document, invitation.id_user): invitation.status
+            for invitation in session.query(models.Invitation)} == {
+        (echu.id, premier): -1, (echu.id, second): -1, (en_cours.id, premier): -1, (en_cours.id, second): 0}
+
+    # Une ligne d'audit par document et par invitation expirés
+    audit = sorted((ligne.action, ligne.code, ligne.id_document, ligne.id_user, ligne.timestamp)
+                   for ligne in session.query(models.AuditLog))
+    assert audit == sorted([
+        (ACTION_EXPIRER, CODE_DOCUMENT_EXPIRE, echu.id, createur, MAINTENANT),
+        (ACTION_EXPIRER, CODE_INVITATION_EXPIREE, echu.id, premier, MAINTENANT),
+        (ACTION_EXPIRER, CODE_INVITATION_EXPIREE, echu.id, second, MAINTENANT),
+        (ACTION_EXPIRER, CODE_INVITATION_EXPIREE, en_cours.id, premier, MAINTENANT)])
+
+    # Second passage : rien à expirer, aucune ligne d'audit supplémentaire
+    assert expiration.expirer_signatures(session, maintenant=MAINTENANT) == {'documents': 0, 'points': 0,
+                                                                             'invitations': 0}
+    session.commit()
+    assert session.query(models.AuditLog).count() == 4
+
+
+def test_nothing_expired_before_deadline(signature_session: Session):
+    """Avant l'échéance, aucun statut ne change et aucune ligne d'audit n'est écrite."""
+    session = signature_session
+    user = models.User(prenom='Jean', nom='Dupont', mail='jd@test.fr', sha_mdp='x', habilitation=4)
+    session.add(user)
+    session.commit()
+    _document(session, user.id, MAINTENANT - timedelta(days=2), 3,
+              signataires=[(user.id, MAINTENANT + timedelta(days=1))])
+
+    session.statements.clear()      # type: ignore[attr-defined]
+    assert expiration.expirer_signatures(session, maintenant=MAINTENANT) == {'documents': 0, 'points': 0,
+                                                                             'invitations': 0}
+    # Traitement ensembliste : deux insertions d'audit et trois mises à jour, sans lecture de lignes
+    assert len(session.statements) == 5     # type: ignore[attr-defined]
+    assert session.query(models.AuditLog).count() == 0
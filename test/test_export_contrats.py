@@ -0,0 +1,80 @@
+"""
+Tests de l'exportation des contrats (export_contrats.py) sur une base SQLite en mémoire :
+lecture par lots sur la clé primaire, filtres de la liste et formats produits.
+"""
+import csv
+import io
+import json
+from datetime import date
+from typing import Any
+
+import pytest
+
+
+def _contrats(session: Any, nombre: int) -> None:
+    import models   # type: ignore
+
+    for i in range(nombre):
+        contrat = models.Contract(type_contrat='Services' if i % 2 else 'RH', sous_type_contrat='Autre',
+                                  entreprise=f'Ent {i}', id_externe_contrat=f'C{i}', intitule=f'Contrat {i}',
+                                  date_debut=date(2025, 1, 1), date_fin_preavis=date(2025, 6, 30))
+        contrat.factures.append(models.Bill(date_facture=date(2025, 2, 1), titre_facture=f'Facture {i}', montant=10 + i))
+        session.add(contrat)
+    session.commit()
+
+
+def test_jsonl_export_reads_batches_with_filters(sqlite_session: Any):
+    """Les contrats filtrés sont lus par lots de `lot`, avec une requête par nature liée et par lot."""
+    import export_contrats  # type: ignore
+
+    _contrats(sqlite_session, 10)
+    sqlite_session.statements.clear()
+    filtres = export_contrats.lire_filtres({'TypeFiltre': 'Services', 'STypeFiltre': ''})
+    texte = ''.join(export_contrats.exporter(sqlite_session.get_bind(), 'jsonl', filtres, ('factures',), lot=2))
+
+    objets = [json.loads(ligne) for ligne in texte.splitlines()]
+    assert [objet['id_externe_contrat'] for objet in objets] == ['C1', 'C3', 'C5', 'C7', 'C9']
+    assert objets[0]['factures'][0]['montant'] == 11.0 and objets[0]['date_fin_preavis'] == '2025-06-30'
+    selects = [statement for statement in sqlite_session.statements if statement.startswith('SELECT')]
+    assert len(selects) == 3 * 2     # 3 lots de contrats (2, 2 puis 1) et leurs factures
+
+
+def test_csv_export_joins_one_detail():
+    """
+    Un export CSV avec un détail produit une ligne par élément lié, et une ligne aux colonnes
+    du détail vides pour un contrat sans élément ; plusieurs détails sont refusés.
+    """
+    import export_contrats  # type: ignore
+
+    contrat = {'id': 1, 'type_contrat': 'RH', 'sous_type_contrat': 'Autre', 'entreprise': 'Ent',
+               'id_externe_contrat': 'C1', 'intitule': 'Contrat', 'date_debut': date(2025, 1, 1),
+               'date_fin_preavis': date(2025, 6, 30), 'date_fin': None}
+    contacts = [{'id': 7, 'id_contrat': 1, 'nom': 'Nom', 'mail': 'a@b.fr'}]
+    lignes = list(csv.reader(io.StringIO(''.join(export_contrats.exporter_csv(iter([(contrat, {'contacts': contacts})]),
+                                                                           ('contacts',)))), delimiter=';'))
+    assert lignes[0][:2] == ['id_contrat', 'type_contrat'] and 'mail' in lignes[0]
+    assert len(lignes) == 2 and lignes[1][0] == '1' and lignes[1][lignes[0].index('mail')] == 'a@b.fr'
+
+    # Contrat sans contact : conservé, colonnes du détail vides
+    sans_contact = {**contrat, 'id': 2, 'id_externe_contrat': 'C2'}
+    lignes = list(csv.reader(io.StringIO(''.join(export_contrats.exporter_csv(
+        iter([(contrat, {'contacts': contacts}), (sans_contact, {'contacts': []})]), ('contacts',)))), delimiter=';'))
+    assert [ligne[0] for ligne in lignes[1:]] == ['1', '2']
+    assert len(lignes[2]) == len(lignes[0]) and lignes[2][lignes[0].index('mail')] == ''
+
+    with pytest.raises(ValueError):
+        export_contrats.lire_details('contacts,factures', 'csv')
+
+
+def test_xlsx_export_can_be_imported(sqlite_session: Any):
+    """Le classeur XLSX exporté se relit avec l'import en masse (mêmes feuilles et colonnes)."""
+    pytest.importorskip('openpyxl')
+    import export_contrats  # type: ignore
+    import import_contrats  # type: ignore
+
+    _contrats(sqlite_session, 3)
+    contenu = b''.join(export_contrats.exporter(sqlite_session.get_bind(), 'xlsx', {}, ('factures',)))
+    donnees = import_contrats.lire_fichier(io.BytesIO(contenu), 'export.xlsx')
+    assert len(donnees['contrats']) == 3 and len(donnees['factures']) == 3
+    assert [erreur['message'] for erreur in import_contrats.importer(sqlite_session, donnees, simulation=True)
+            ['erreurs']] == ['Contrat déjà existant'] * 3
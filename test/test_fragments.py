@@ -0,0 +1,72 @@
+"""
+Tests du cache de fragments des gabarits (fragments.py).
+"""
+import os
+import sys
+from pathlib import Path
+from typing import List
+
+from jinja2 import Environment, FileSystemLoader
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+import fragments   # type: ignore    # noqa: E402
+
+GABARIT = ("<p>{{ message }}</p>"
+           "{% cache 'modules', version_json('modules.json'), niveaux %}"
+           "{% for niveau in niveaux %}<a>{{ rendre(niveau) }}</a>{% endfor %}"
+           "{% endcache %}")
+
+
+def _environnement(dossier: Path, rendus: List[int]) -> Environment:
+    environnement = Environment(loader=FileSystemLoader(str(dossier)), autoescape=True, auto_reload=True,
+                                extensions=[fragments.CacheFragments])
+    environnement.globals['version_json'] = fragments.version_json
+
+    def rendre(niveau: int) -> str:
+        rendus.append(niveau)
+        return f'<module {niveau}>'
+
+    environnement.globals['rendre'] = rendre
+    return environnement
+
+
+def _modifier(chemin: Path, contenu: str, decalage: float) -> None:
+    chemin.write_text(contenu, encoding='utf-8')
+    instant = os.path.getmtime(chemin) + decalage
+    os.utime(chemin, (instant, instant))
+
+
+def test_fragment_rendered_once_per_key_and_messages_stay_dynamic(tmp_path: Path, monkeypatch):
+    """Un fragment est rendu une fois par ensemble d'habilitations ; le message reste rendu à chaque requête."""
+    monkeypatch.setattr(fragments, 'DOSSIER_JSON', str(tmp_path))
+    (tmp_path / 'modules.json').write_text('[]', encoding='utf-8')
+    (tmp_path / 'page.html').write_text(GABARIT, encoding='utf-8')
+    rendus: List[int] = []
+    page = _environnement(tmp_path, rendus).get_template('page.html')
+
+    assert page.render(message='<b>', niveaux=[1, 2]) == \
+        '<p>&lt;b&gt;</p><a>&lt;module 1&gt;</a><a>&lt;module 2&gt;</a>'
+    assert page.render(message='ok', niveaux=[1, 2]).startswith('<p>ok</p><a>&lt;module 1&gt;')
+    assert rendus == [1, 2]
+
+    page.render(message='', niveaux=[6])
+    assert rendus == [1, 2, 6]
+
+
+def test_fragment_invalidated_when_template_or_json_changes(tmp_path: Path, monkeypatch):
+    """Une modification du gabarit ou du fichier JSON invalide le fragment."""
+    monkeypatch.setattr(fragments, 'DOSSIER_JSON', str(tmp_path))
+    _modifier(tmp_path / 'modules.json', '[]', 0)
+    _modifier(tmp_path / 'page.html', GABARIT, 0)
+    rendus: List[int] = []
+    environnement = _environnement(tmp_path, rendus)
+
+    environnement.get_template('page.html').render(message='', niveaux=[1])
+    _modifier(tmp_path / 'modules.json', '[{}]', 10)
+    environnement.get_template('page.html').render(message='', niveaux=[1])
+    assert rendus == [1, 1]
+
+    _modifier(tmp_path / 'page.html', GABARIT.replace('<a>', '<li>').replace('</a>', '</li>'), 20)
+    assert environnement.get_template('page.html').render(message='', niveaux=[1]) == \
+        '<p></p><li>&lt;module 1&gt;</li>'
+    assert rendus == [1, 1, 1]
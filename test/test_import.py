@@ -0,0 +1,80 @@
+"""
+Mesure du coût d'import de l'application (démarrage d'un processus du serveur).
+
+L'import de `application` est mesuré dans un processus neuf avec `python -X importtime` :
+durée cumulée, mémoire résidente maximale (RSS) et modules chargés. Le test vérifie que la
+pile PDF et cryptographie de la signature (pypdf, reportlab, Pillow, cairosvg, cryptography)
+et pandas ne sont pas chargés à l'import ; un budget de durée peut être imposé en CI avec
+la variable IMPORT_BUDGET_MS.
+
+Rapport détaillé (modules les plus coûteux) :
+    ```console
+    python test/test_import.py
+    ```
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+# Modules lourds chargés à la première utilisation seulement
+MODULES_DIFFERES = ['pypdf', 'reportlab.pdfgen', 'PIL', 'cairosvg', 'cryptography', 'pandas', 'signature_pdf']
+
+SCRIPT = (
+    "import sys, resource; sys.path.insert(0, {app!r}); import application; "
+    "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+)
+
+
+def mesurer_import(dossier: str) -> Tuple[int, int, Dict[str, int]]:
+    """
+    Importe l'application dans un processus neuf (dossier de travail `dossier`, pour le journal).
+    Returns:
+        Tuple[int, int, Dict[str, int]]: La durée cumulée (µs), la RSS maximale (Kio) et la durée
+                                         cumulée de chaque module importé (µs).
+    """
+    resultat = subprocess.run([sys.executable, '-X', 'importtime', '-c', SCRIPT.format(app=APP_DIR)],
+                              cwd=dossier, capture_output=True, text=True, timeout=120)
+    if resultat.returncode != 0:
+        raise RuntimeError(resultat.stderr[-2000:])
+    modules: Dict[str, int] = {}
+    for ligne in resultat.stderr.splitlines():
+        if not ligne.startswith('import time:') or 'cumulative' in ligne:
+            continue
+        _, cumul, nom = ligne[len('import time:'):].split('|')
+        modules[nom.strip()] = int(cumul)
+    return modules['application'], int(resultat.stdout.split()[-1]), modules
+
+
+def rapport(duree: int, rss: int, modules: Dict[str, int], nombre: int = 15) -> List[str]:
+    """Lignes du rapport : totaux puis modules les plus coûteux (durée cumulée)."""
+    lignes = [f"Import de l'application : {duree / 1000:.0f} ms, RSS maximale : {rss / 1024:.1f} Mio, "
+              f"{len(modules)} modules"]
+    for nom, cumul in sorted(modules.items(), key=lambda item: item[1], reverse=True)[1:nombre + 1]:
+        lignes.append(f"  {cumul / 1000:8.1f} ms  {nom}")
+    return lignes
+
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="L'application cible Python 3.12 (f-strings PEP 701)")
+def test_application_import_defers_heavy_modules(tmp_path: Path):
+    """L'import de l'application ne charge ni la pile PDF/cryptographie ni pandas."""
+    duree, rss, modules = mesurer_import(str(tmp_path))
+    print('\n'.join(rapport(duree, rss, modules)))
+
+    charges = [nom for nom in MODULES_DIFFERES if any(module == nom or module.startswith(nom + '.')
+                                                      for module in modules)]
+    assert charges == []
+    budget = os.getenv('IMPORT_BUDGET_MS')
+    if budget:
+        assert duree / 1000 <= float(budget)
+
+
+if __name__ == '__main__':
+    import tempfile
+    with tempfile.TemporaryDirectory() as dossier:
+        print('\n'.join(rapport(*mesurer_import(dossier))))
@@ -0,0 +1,67 @@
+"""
+Tests de l'import en masse des contrats (import_contrats.py) sur une base SQLite en mémoire :
+validation par colonne, rapport d'erreurs par ligne et insertions par lots.
+"""
+import io
+from typing import Any
+
+CONTRATS = ("Type contrat;Sous-type contrat;Entreprise;Id externe contrat;Intitulé;Date début;Date fin préavis;Date fin\n"
+            + "".join(f"Services;Prestations régulières;Ent {i};C{i:05d};Contrat {i};2025-01-01;31/12/2025;\n"
+                      for i in range(2500)))
+
+
+def _lire(contenu: str, nom: str, nature: str) -> Any:
+    import import_contrats  # type: ignore
+
+    return import_contrats.lire_fichier(io.BytesIO(contenu.encode('utf-8')), nom, nature)
+
+
+def test_import_inserts_batches_with_echeances(sqlite_session: Any):
+    """2 500 contrats et leurs factures sont insérés par lots, avec les échéances des contrats."""
+    import models   # type: ignore
+    import import_contrats  # type: ignore
+
+    donnees = _lire(CONTRATS, 'contrats.csv', 'contrats')
+    donnees.update(_lire("id_externe_contrat,date_facture,titre_facture,montant\n"
+                         + "".join(f"C{i:05d},2025-03-01,Facture {i},\"1 234,5\"\n" for i in range(0, 2500, 5)),
+                         'factures.csv', 'factures'))
+    sqlite_session.statements.clear()
+    rapport = import_contrats.importer(sqlite_session, donnees)
+
+    assert rapport['erreurs'] == [] and rapport['importe']
+    assert rapport['importees'] == {'contrats': 2500, 'factures': 500}
+    inserts = [statement for statement in sqlite_session.statements if statement.startswith('INSERT')]
+    assert len(inserts) == 3 + 3 + 1 + 1     # contrats, échéances (préavis seulement), factures et leurs cumuls
+    assert sqlite_session.query(models.Echeance).count() == 2500
+    assert sqlite_session.query(models.Depense).count() == 500
+    contrat = sqlite_session.query(models.Contract).filter_by(id_externe_contrat='C00005').one()
+    assert str(contrat.date_fin_preavis) == '2025-12-31' and contrat.date_fin is None
+    assert [float(facture.montant) for facture in contrat.factures] == [1234.5]
+
+
+def test_import_reports_errors_per_row_and_writes_nothing(sqlite_session: Any):
+    """Les erreurs sont rapportées par ligne ; l'import strict n'écrit rien, le partiel les lignes valides."""
+    import models   # type: ignore
+    import import_contrats  # type: ignore
+
+    contenu = ("type_contrat;sous_type_contrat;entreprise;id_externe_contrat;intitule;date_debut;date_fin_preavis\n"
+               "Services;Autre;Ent;A1;Valide;2025-01-01;2025-06-30\n"
+               "Services;Banque;Ent;A2;Mauvais sous-type;2025-01-01;2025-06-30\n"
+               "Finance;Banque;Ent;A1;Doublon;01/13/2025;\n")
+    evenements = ("id_externe_contrat;type_evenement;sous_type_evenement;date_evenement;descriptif\n"
+                  "A1;Contact;Appel;2025-02-01;Appel\n"
+                  "Z9;Contact;Appel;2025-02-01;Contrat inconnu\n")
+
+    donnees = {**_lire(contenu, 'c.csv', 'contrats'), **_lire(evenements, 'e.csv', 'evenements')}
+    rapport = import_contrats.importer(sqlite_session, donnees)
+    assert not rapport['importe'] and sqlite_session.query(models.Contract).count() == 0
+    assert {(erreur['nature'], erreur['ligne'], erreur['colonne']) for erreur in rapport['erreurs']} == {
+        ('contrats', 3, 'sous_type_contrat'), ('contrats', 4, 'date_debut'), ('contrats', 4, 'date_fin_preavis'),
+        ('contrats', 2, 'id_externe_contrat'), ('contrats', 4, 'id_externe_contrat'),
+        ('evenements', 2, 'id_externe_contrat'), ('evenements', 3, 'id_externe_contrat')}
+
+    contenu = contenu.replace('Doublon', 'Autre').replace(';A1;Autre', ';A3;Autre')
+    donnees = {**_lire(contenu, 'c.csv', 'contrats'), **_lire(evenements, 'e.csv', 'evenements')}
+    rapport = import_contrats.importer(sqlite_session, donnees, partiel=True)
+    assert rapport['importe'] and rapport['importees'] == {'contrats': 1, 'evenements': 1}
+    assert [contrat.intitule for contrat in sqlite_session.query(models.Contract)] == ['Valide']
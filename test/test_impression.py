@@ -0,0 +1,194 @@
+"""
+Tests de la file d'impression (module impression).
+
+Ces tests vérifient qu'un travail est enregistré avant son envoi, que l'identifiant CUPS
+est conservé et que le fichier est supprimé après envoi ou après échec définitif.
+"""
+import io
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from werkzeug.datastructures import FileStorage
+from pypdf import PdfReader, PdfWriter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+import models   # type: ignore    # noqa: E402
+import impression   # type: ignore    # noqa: E402
+import imposition   # type: ignore    # noqa: E402
+
+
+@pytest.fixture
+def fabrique(tmp_path: Path) -> Iterator[sessionmaker[Session]]:
+    """Fabrique de sessions SQLite sur fichier (les threads de travail ont leur propre session)."""
+    engine = create_engine(f'sqlite:///{tmp_path / "impressions.db"}')
+    tables = [models.Base.metadata.tables[name] for name in ('99_users', '30_impressions')]
+    models.Base.metadata.create_all(engine, tables=tables)
+    app = Flask(__name__)
+    with app.app_context():
+        yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _soumettre(file: 'impression.FileImpression', fabrique: sessionmaker[Session]) -> Any:
+    with fabrique() as session:
+        travail = file.soumettre(session, FileStorage(io.BytesIO(b'%PDF-1.7 cours'), filename='cours.pdf'),
+                                 'cours.pdf', id_user=None, titre='Intranet-Jean Dupont-Intranet',
+                                 options=impression.construire_options(copies='2', orientation='4'))
+        return travail.id, travail.chemin_fichier
+
+
+def test_job_sent_with_cups_id(fabrique: sessionmaker[Session], tmp_path: Path):
+    """Le travail est en attente jusqu'à son envoi, puis conserve l'identifiant CUPS."""
+    envois: List[Tuple[str, str, Dict[str, str]]] = []
+
+    def envoyeur(chemin: str, titre: str, options: Dict[str, str]) -> int:
+        envois.append((Path(chemin).read_bytes().decode(), titre, options))
+        return 345
+
+    file = impression.FileImpression(envoyeur=envoyeur, nb_workers=1, dossier=str(tmp_path / 'print'))
+    file._session_factory = fabrique
+    id_job, chemin = _soumettre(file, fabrique)
+
+    with fabrique() as session:
+        assert session.get(models.PrintJob, id_job).status == impression.STATUS_EN_ATTENTE
+    assert chemin.endswith('.pdf') and os.path.exists(chemin)
+
+    file.traiter(id_job)
+    with fabrique() as session:
+        travail = session.get(models.PrintJob, id_job)
+        assert (travail.status, travail.cups_job_id, travail.tentatives) == (impression.STATUS_ENVOYE, 345, 1)
+    assert envois[0][0] == '%PDF-1.7 cours'
+    assert envois[0][2]['copies'] == '2' and envois[0][2]['orientation-requested'] == '4'
+    assert not os.path.exists(chemin)
+
+    # Un travail déjà envoyé n'est pas renvoyé
+    file.traiter(id_job)
+    assert len(envois) == 1
+
+
+def test_job_in_error_after_last_attempt(fabrique: sessionmaker[Session], tmp_path: Path,
+                                         monkeypatch: pytest.MonkeyPatch):
+    """Après la dernière tentative en échec, le travail passe en erreur et le fichier est supprimé."""
+    def envoyeur(chemin: str, titre: str, options: Dict[str, str]) -> int:
+        raise RuntimeError('client-error-not-found')
+
+    monkeypatch.setattr(impression.Config, 'PRINT_TENTATIVES', 1)
+    file = impression.FileImpression(envoyeur=envoyeur, nb_workers=1, dossier=str(tmp_path / 'print'))
+    file._session_factory = fabrique
+    id_job, chemin = _soumettre(file, fabrique)
+
+    file.traiter(id_job)
+    with fabrique() as session:
+        travail = session.get(models.PrintJob, id_job)
+        assert travail.status == impression.STATUS_ERREUR
+        assert 'client-error-not-found' in travail.erreur
+    assert not os.path.exists(chemin)
+
+
+def test_job_reserved_with_lease(fabrique: sessionmaker[Session], tmp_path: Path):
+    """Un travail en cours n'est repris qu'après expiration de son bail, et par le seul worker n°0."""
+    envois: List[str] = []
+    file = impression.FileImpression(envoyeur=lambda chemin, titre, options: envois.append(chemin) or 7,
+                                     nb_workers=1, dossier=str(tmp_path / 'print'))
+    file._session_factory = fabrique
+    id_job, _ = _soumettre(file, fabrique)
+
+    # Travail réservé par un autre processus : ni renvoyé, ni remis en file
+    with fabrique() as session:
+        travail = session.get(models.PrintJob, id_job)
+        travail.status, travail.reserve_at, travail.tentatives = impression.STATUS_EN_COURS, datetime.now(), 1
+        session.commit()
+        assert file.reprendre(session) == 0
+    file.traiter(id_job)
+    assert envois == []
+
+    # Bail expiré (processus arrêté) : le travail est repris puis envoyé une seule fois
+    with fabrique() as session:
+        travail = session.get(models.PrintJob, id_job)
+        travail.reserve_at = datetime.now() - timedelta(seconds=impression.DUREE_BAIL + 1)
+        session.commit()
+        assert file.reprendre(session) == 1
+    file.traiter(id_job)
+    file.traiter(id_job)
+    assert len(envois) == 1
+    with fabrique() as session:
+        travail = session.get(models.PrintJob, id_job)
+        assert (travail.status, travail.tentatives) == (impression.STATUS_ENVOYE, 2)
+
+
+def test_pending_jobs_requeued_by_first_worker_only(fabrique: sessionmaker[Session], tmp_path: Path):
+    """Au démarrage, seul le worker n°0 remet en file les travaux en attente."""
+    file = impression.FileImpression(envoyeur=lambda chemin, titre, options: 1, nb_workers=1,
+                                     dossier=str(tmp_path / 'print'))
+    _soumettre(file, fabrique)
+    autre = impression.FileImpression(envoyeur=lambda chemin, titre, options: 1, nb_workers=1,
+                                      dossier=str(tmp_path / 'print'))
+    autre._boucle = lambda: None    # type: ignore[method-assign]    # la file n'est pas consommée
+    autre.demarrer(fabrique, reprendre=False)
+    assert autre._file.empty()
+    autre.demarrer(fabrique)
+    assert autre._file.qsize() == 1
+
+
+def test_stored_file_printed_in_place(fabrique: sessionmaker[Session], tmp_path: Path):
+    """Un fichier stocké est envoyé depuis son emplacement et n'est pas supprimé après envoi."""
+    envois: List[str] = []
+    stocke = tmp_path / 'uploads' / 'contrat.pdf'
+    stocke.parent.mkdir()
+    stocke.write_bytes(b'%PDF-1.7 contrat')
+
+    file = impression.FileImpression(envoyeur=lambda chemin, titre, options: envois.append(chemin) or 12,
+                                     nb_workers=1, dossier=str(tmp_path / 'print'))
+    file._session_factory = fabrique
+    with fabrique() as session:
+        id_job = file.soumettre_reference(session, str(stocke), reference='document:3', id_user=None,
+                                          titre='Intranet-Jean Dupont-contrat.pdf', options={}).id
+
+    file.traiter(id_job)
+    assert envois == [str(stocke)] and stocke.exists()
+    assert not (tmp_path / 'print').exists()
+    with fabrique() as session:
+        assert session.get(models.PrintJob, id_job).status == impression.STATUS_ENVOYE
+
+
+def _pdf(chemin: Path, nb_pages: int) -> None:
+    writer = PdfWriter()
+    for _ in range(nb_pages):
+        writer.add_blank_page(width=595, height=842)
+    with open(chemin, 'wb') as f:
+        writer.write(f)
+
+
+def test_batch_merged_with_ranges_and_nup(tmp_path: Path):
+    """Un lot PDF + image est fusionné avec ses plages de pages puis imposé 2 pages par feuille."""
+    from PIL import Image
+
+    _pdf(tmp_path / 'cours.pdf', 5)
+    Image.new('RGB', (40, 20), 'white').save(tmp_path / 'schema.png')
+    destination = str(tmp_path / 'lot.pdf')
+
+    assert imposition.fusionner([(str(tmp_path / 'cours.pdf'), '1-2,5'), (str(tmp_path / 'schema.png'), None)],
+                                destination) == 4
+    assert imposition.fusionner([(str(tmp_path / 'cours.pdf'), '1-2,5'), (str(tmp_path / 'schema.png'), None)],
+                                destination, pages_par_feuille=2) == 2
+    # 2 pages par feuille : côte à côte sur une feuille paysage (réduction d'environ 71 %)
+    feuille = PdfReader(destination).pages[0].mediabox
+    assert (round(float(feuille.width)), round(float(feuille.height))) == (842, 595)
+    # Portrait demandé explicitement : pages empilées
+    imposition.fusionner([(str(tmp_path / 'cours.pdf'), '1-2')], destination, pages_par_feuille=2, orientation='3')
+    feuille = PdfReader(destination).pages[0].mediabox
+    assert (round(float(feuille.width)), round(float(feuille.height))) == (595, 842)
+    # 4 pages par feuille : feuille portrait par défaut
+    imposition.fusionner([(str(tmp_path / 'cours.pdf'), None)], destination, pages_par_feuille=4)
+    feuille = PdfReader(destination).pages[0].mediabox
+    assert (round(float(feuille.width)), round(float(feuille.height))) == (595, 842)
+
+    with pytest.raises(ValueError):
+        imposition.fusionner([(str(tmp_path / 'cours.pdf'), '4-9')], destination)
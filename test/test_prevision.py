@@ -0,0 +1,92 @@
+"""
+Tests de la prévision des dépenses (prevision.py) : projection jusqu'à la fin des contrats,
+saisonnalité, durée du calcul vectoriel et recalcul selon la version des données.
+"""
+import os
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+import prevision    # type: ignore    # noqa: E402
+
+
+def _historique(contrats: pd.DataFrame, mois: int, montant: Any) -> pd.DataFrame:
+    """Cumuls mensuels de chaque contrat sur les `mois` mois précédant janvier 2026."""
+    rangs = np.arange(2026 * 12 - mois, 2026 * 12)
+    identifiants = np.repeat(contrats['id'].to_numpy(), mois)
+    rang = np.tile(rangs, len(contrats))
+    return pd.DataFrame({'id_contrat': identifiants, 'annee': rang // 12, 'mois': rang % 12 + 1,
+                         'montant': montant(identifiants, rang % 12 + 1)})
+
+
+def test_projection_until_end_date_with_seasonality():
+    """Un contrat régulier est projeté jusqu'à sa fin ; un contrat saisonnier garde son profil."""
+
+    contrats = pd.DataFrame({'id': [1, 2], 'intitule': ['Loyer', 'Chauffage'], 'entreprise': ['A', 'B'],
+                             'type_contrat': ['Matériel', 'Services'],
+                             'date_debut': [date(2022, 1, 1), date(2022, 1, 1)],
+                             'date_fin': [date(2026, 6, 30), None]})
+    depenses = _historique(contrats, 36, lambda ids, mois: np.where(
+        ids == 1, 100.0, np.where(np.isin(mois, [1, 2, 12]), 400.0, 0.0)))
+    resultat = prevision.calculer(contrats, depenses, date(2026, 1, 1), 24)
+
+    loyer, chauffage = resultat['contrats']
+    assert loyer['rythme_mensuel'] == 100.0 and loyer['total'] == 600.0
+    assert loyer['par_annee'] == {'2026': 600.0, '2027': 0.0}
+    assert chauffage['rythme_mensuel'] == 100.0 and chauffage['par_annee']['2026'] == 1200.0
+    assert resultat['par_mois']['2026-01'] == 500.0 and resultat['par_mois']['2026-07'] == 0.0
+    assert resultat['par_type'] == {'Matériel': {'2026': 600.0, '2027': 0.0},
+                                    'Services': {'2026': 1200.0, '2027': 1200.0}}
+
+
+def test_thousands_of_contracts_in_under_a_second():
+    """5 000 contrats et 3 ans d'historique sont projetés en moins d'une seconde."""
+
+    nombre = 5000
+    generateur = np.random.default_rng(0)
+    contrats = pd.DataFrame({'id': np.arange(1, nombre + 1), 'intitule': 'Contrat', 'entreprise': 'Ent',
+                             'type_contrat': generateur.choice(['RH', 'Services', 'Matériel'], nombre),
+                             'date_debut': date(2023, 1, 1),
+                             'date_fin': [date(2027, 12, 31) if i % 3 else None for i in range(nombre)]})
+    depenses = _historique(contrats, 36, lambda ids, mois: generateur.gamma(2.0, 50.0, len(ids)))
+
+    debut = time.perf_counter()
+    resultat = prevision.calculer(contrats, depenses, date(2026, 1, 1), 24)
+    assert time.perf_counter() - debut < 1.0
+    assert len(resultat['contrats']) == nombre and resultat['par_annee']['2027'] > 0
+
+
+def test_recomputed_only_when_data_version_changes(sqlite_session: Any, tmp_path: Path):
+    """La prévision enregistrée est réutilisée tant que les factures et les contrats sont inchangés."""
+    import models       # type: ignore
+
+    contrat = models.Contract(type_contrat='RH', sous_type_contrat='Autre', entreprise='A', id_externe_contrat='A',
+                              intitule='A', date_debut=date(2025, 1, 1), date_fin_preavis=date(2026, 1, 1))
+    contrat.factures.append(models.Bill(date_facture=date(2025, 11, 3), titre_facture='f', montant=120))
+    sqlite_session.add(contrat)
+    sqlite_session.commit()
+
+    premiere = prevision.prevoir(sqlite_session, reference=date(2026, 1, 1), horizon=12, precedente={})
+    prevision.enregistrer(premiere, str(tmp_path))
+    stockee = prevision.derniere_prevision(str(tmp_path))
+    assert stockee == premiere and stockee['par_annee'] == {'2026': 120.0}
+    assert prevision.prevoir(sqlite_session, reference=date(2026, 1, 1), horizon=12, precedente=stockee) is stockee
+
+    contrat.factures[0].montant = 240
+    sqlite_session.commit()
+    seconde = prevision.prevoir(sqlite_session, reference=date(2026, 1, 1), horizon=12, precedente=stockee)
+    assert seconde['version'] != stockee['version'] and seconde['par_annee'] == {'2026': 240.0}
+
+    # Type et intitulé regroupent la prévision : les modifier change la version
+    versions = {seconde['version']}
+    for attribut, valeur in (('type_contrat', 'Maintenance'), ('intitule', 'Ascenseurs')):
+        setattr(contrat, attribut, valeur)
+        sqlite_session.commit()
+        versions.add(prevision.version_donnees(sqlite_session, date(2026, 1, 1), 12))
+    assert len(versions) == 3
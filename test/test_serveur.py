@@ -0,0 +1,77 @@
+"""
+Tests du serveur multi-processus (serveur.py) : superviseur lancé dans un processus dédié,
+sur un port libre, avec une application WSGI minimale qui retourne l'état de santé.
+"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Dict
+
+import pytest
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+SCRIPT = """
+import json, logging, sys
+sys.path.insert(0, {app!r})
+logging.basicConfig(level=logging.INFO)
+import serveur
+
+def application(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    return [json.dumps(serveur.sante()).encode()]
+
+serveur.Superviseur(application, hote='127.0.0.1', port={port}, workers=2, threads=2,
+                    max_requetes=3, delai_arret=5).executer()
+"""
+
+
+def _port_libre() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _sante(port: int) -> Dict[str, Any]:
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as reponse:
+        return json.loads(reponse.read())
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="Workers créés par fork (Linux)")
+def test_supervisor_recycles_workers_without_failed_requests():
+    """Les workers sont recyclés après 3 requêtes sans requête perdue, puis arrêtés proprement par SIGTERM."""
+    port = _port_libre()
+    processus = subprocess.Popen([sys.executable, '-c', SCRIPT.format(app=APP_DIR, port=port)],
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        limite = time.monotonic() + 20
+        while True:
+            try:
+                etat = _sante(port)
+                break
+            except OSError:
+                assert time.monotonic() < limite and processus.poll() is None, processus.stderr
+                time.sleep(0.1)
+
+        assert etat['mode'] == 'multi-processus'
+        initiaux = {worker['pid'] for worker in etat['workers']}
+        for _ in range(10):
+            etat = _sante(port)
+            assert etat['pid'] in [worker['pid'] for worker in etat['workers']]
+        # Plus de 3 requêtes par worker : chacun est remplacé, sans requête perdue entre-temps
+        limite = time.monotonic() + 20
+        while initiaux & {worker['pid'] for worker in etat['workers']}:
+            assert time.monotonic() < limite
+            time.sleep(0.2)
+            etat = _sante(port)
+        assert {worker['numero'] for worker in etat['workers']} == {0, 1}
+    finally:
+        processus.send_signal(signal.SIGTERM)
+        _, erreurs = processus.communicate(timeout=20)
+    assert processus.returncode == 0, erreurs
+    assert 'anormalement' not in erreurs
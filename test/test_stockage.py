@@ -0,0 +1,161 @@
+"""
+Tests du magasin de fichiers adressé par contenu (module stockage).
+
+Ces tests vérifient qu'un même contenu n'est stocké qu'une fois, que les références
+des documents et factures sont comptées et que les fichiers orphelins sont nettoyés.
+"""
+import io
+import os
+import stat
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterator, List, Tuple
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from werkzeug.datastructures import FileStorage
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+import models   # type: ignore    # noqa: E402
+import stockage    # type: ignore    # noqa: E402
+from stockage import stocker, chemin_blob, nettoyer_fichiers   # type: ignore    # noqa: E402
+
+
+@pytest.fixture
+def magasin(tmp_path: Path) -> Iterator[Tuple[Session, str]]:
+    """Session SQLite sur fichier (le magasin enregistre ses fichiers dans sa propre transaction)."""
+    engine = create_engine(f'sqlite:///{tmp_path / "magasin.db"}')
+    tables = [models.Base.metadata.tables[name] for name in
+              ('01_contrats', '10_fichiers', '11_documents', '13_factures', '14_depenses')]
+    models.Base.metadata.create_all(engine, tables=tables)
+
+    app = Flask(__name__)
+    app.config['UPLOAD_LIMITS'] = {'document': 1024 * 1024, 'facture': 1024 * 1024}
+    with app.app_context():
+        session = sessionmaker(bind=engine)()
+        yield session, str(tmp_path / 'blobs')
+        session.close()
+    engine.dispose()
+
+
+def _fichiers(racine: str) -> List[str]:
+    """Liste les fichiers du magasin (hors dossier temporaire)."""
+    return [nom for dossier, _, noms in os.walk(racine) if not dossier.endswith('tmp') for nom in noms]
+
+
+def _references(session: Session, empreinte: str) -> Any:
+    session.expire_all()
+    blob = session.get(models.Blob, empreinte)
+    return blob.nb_references if blob else None
+
+
+def test_deduplication_and_references(magasin: Tuple[Session, str]):
+    """Deux dépôts identiques partagent un seul fichier, compté deux fois puis libéré."""
+    session, racine = magasin
+    contenu = b'%PDF-1.7 facture identique'
+
+    empreinte, taille = stocker(session, FileStorage(io.BytesIO(contenu), filename='a.pdf'), racine=racine)
+    document = models.Document(id_contrat=1, date_document=date(2026, 1, 1), type_document='Contrat',
+                               descriptif='Contrat', str_lien='a.pdf', hash_fichier=empreinte)
+    doublon, _ = stocker(session, FileStorage(io.BytesIO(contenu), filename='b.pdf'), kind='facture', racine=racine)
+    bill = models.Bill(id_contrat=1, date_facture=date(2026, 1, 2), titre_facture='Facture', montant=10,
+                       str_lien='b.pdf', hash_fichier=doublon)
+    session.add_all([document, bill])
+    session.commit()
+
+    assert doublon == empreinte and taille == len(contenu)
+    assert _fichiers(racine) == [empreinte]
+    assert Path(chemin_blob(empreinte, racine)).read_bytes() == contenu
+    assert _references(session, empreinte) == 2
+
+    # Renommage : simple mise à jour des métadonnées, la référence est inchangée
+    document.descriptif = 'Contrat renommé'
+    session.commit()
+    assert _references(session, empreinte) == 2
+
+    session.delete(document)
+    session.delete(bill)
+    session.commit()
+    assert _references(session, empreinte) == 0
+
+    # Le fichier orphelin n'est supprimé qu'après le délai de grâce
+    assert nettoyer_fichiers(session, racine=racine) == 0
+    assert nettoyer_fichiers(session, maintenant=datetime.now() + timedelta(hours=2), racine=racine) == 1
+    session.commit()
+    assert _fichiers(racine) == []
+    assert _references(session, empreinte) is None
+
+
+def test_replacement_moves_reference(magasin: Tuple[Session, str]):
+    """Le remplacement du fichier d'un document transfère la référence vers le nouveau contenu."""
+    session, racine = magasin
+    ancien, _ = stocker(session, FileStorage(io.BytesIO(b'version 1'), filename='v1.pdf'), racine=racine)
+    document = models.Document(id_contrat=1, date_document=date(2026, 1, 1), type_document='Contrat',
+                               descriptif='Contrat', str_lien='v1.pdf', hash_fichier=ancien)
+    session.add(document)
+    session.commit()
+
+    nouveau, _ = stocker(session, FileStorage(io.BytesIO(b'version 2'), filename='v2.pdf'), racine=racine)
+    document.hash_fichier = nouveau
+    session.commit()
+
+    assert _references(session, ancien) == 0
+    assert _references(session, nouveau) == 1
+
+
+def test_stored_files_readable_by_nginx(magasin: Tuple[Session, str], tmp_path: Path,
+                                        monkeypatch: pytest.MonkeyPatch):
+    """Les fichiers du magasin sont en 0644 (servis par nginx), qu'ils soient déposés, déplacés ou copiés."""
+    session, racine = magasin
+    depose, _ = stocker(session, FileStorage(io.BytesIO(b'%PDF-1.7 depot'), filename='a.pdf'), racine=racine)
+
+    # Fichier de travail créé en 0600 (mkstemp) déplacé dans le magasin
+    fd, travail = tempfile.mkstemp(dir=tmp_path)
+    os.write(fd, b'%PDF-1.7 signe')
+    os.close(fd)
+    deplace, _ = stockage.importer_fichier(session, travail, racine=racine)
+
+    # Volumes différents : copie via un fichier temporaire
+    fd, source = tempfile.mkstemp(dir=tmp_path)
+    os.write(fd, b'%PDF-1.7 copie')
+    os.close(fd)
+    monkeypatch.setattr(stockage.os, 'replace', _replace_sans_lien(os.replace, source))
+    copie, _ = stockage.importer_fichier(session, source, racine=racine)
+
+    for empreinte in (depose, deplace, copie):
+        assert stat.S_IMODE(os.stat(chemin_blob(empreinte, racine)).st_mode) == 0o644
+    assert not os.path.exists(source)
+
+
+def _replace_sans_lien(replace: Any, source: str) -> Any:
+    """os.replace refusé pour `source` (magasin sur un autre système de fichiers)."""
+    def remplacer(depuis: str, vers: str) -> None:
+        if depuis == source:
+            raise OSError(18, 'Invalid cross-device link')
+        replace(depuis, vers)
+    return remplacer
+
+
+def test_blob_row_recreated_after_cleanup(magasin: Tuple[Session, str]):
+    """Un fichier redéposé après le nettoyage de sa ligne retrouve sa ligne (insertion avec mise à jour)."""
+    session, racine = magasin
+    contenu = b'%PDF-1.7 nettoye puis redepose'
+    empreinte, _ = stocker(session, FileStorage(io.BytesIO(contenu), filename='a.pdf'), racine=racine)
+    premier_depot = session.get(models.Blob, empreinte).used_at
+
+    # Nouveau dépôt : date de dernier dépôt rafraîchie, sans doublon
+    stocker(session, FileStorage(io.BytesIO(contenu), filename='b.pdf'), racine=racine)
+    session.expire_all()
+    assert session.get(models.Blob, empreinte).used_at >= premier_depot
+    assert session.query(models.Blob).count() == 1
+
+    # Ligne et fichier nettoyés entre deux dépôts : ligne recréée avec le fichier
+    assert nettoyer_fichiers(session, maintenant=datetime.now() + timedelta(hours=2), racine=racine) == 1
+    session.commit()
+    stocker(session, FileStorage(io.BytesIO(contenu), filename='c.pdf'), racine=racine)
+    assert _references(session, empreinte) == 0
+    assert Path(chemin_blob(empreinte, racine)).read_bytes() == contenu
@@ -0,0 +1,120 @@
+"""
+Tests du planificateur de tâches (taches.py) sur une base SQLite sur fichier.
+
+Le verrou nommé MariaDB (`GET_LOCK` / `RELEASE_LOCK`) est reproduit par des fonctions SQLite
+partagées entre les connexions : ces tests vérifient qu'une tâche verrouillée par un autre
+processus n'est pas exécutée, que la session est validée ou annulée selon l'issue de la tâche
+et que le verrou est toujours libéré.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from taches import Planificateur   # type: ignore    # noqa: E402
+
+
+@pytest.fixture
+def verrous() -> Dict[str, int]:
+    """Verrous nommés pris (nom → nombre de prises), partagés par toutes les connexions."""
+    return {}
+
+
+@pytest.fixture
+def fabrique(tmp_path: Path, verrous: Dict[str, int]) -> Iterator[sessionmaker[Session]]:
+    """Fabrique de sessions SQLite avec GET_LOCK / RELEASE_LOCK et une table de résultats."""
+    engine = create_engine(f'sqlite:///{tmp_path / "taches.db"}')
+
+    def get_lock(nom: str, delai: int) -> int:
+        if verrous.get(nom):
+            return 0
+        verrous[nom] = 1
+        return 1
+
+    def release_lock(nom: str) -> int:
+        return 1 if verrous.pop(nom, None) else 0
+
+    @event.listens_for(engine, 'connect')
+    def _verrous(connexion: Any, _: Any) -> None:     # type: ignore
+        connexion.create_function('GET_LOCK', 2, get_lock)
+        connexion.create_function('RELEASE_LOCK', 1, release_lock)
+
+    with engine.begin() as connexion:
+        connexion.execute(text('CREATE TABLE resultats (tache VARCHAR(50))'))
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _enregistrer(nom: str) -> Any:
+    """Tâche qui écrit une ligne dans sa session."""
+    def tache(session: Session) -> str:
+        session.execute(text('INSERT INTO resultats VALUES (:nom)'), {'nom': nom})
+        return nom
+    return tache
+
+
+def _resultats(fabrique: sessionmaker[Session]) -> List[str]:
+    with fabrique() as session:
+        return list(session.execute(text('SELECT tache FROM resultats')).scalars())
+
+
+def test_task_committed_and_lock_released(fabrique: sessionmaker[Session], verrous: Dict[str, int]):
+    """Une tâche réussie est validée et libère son verrou ; une tâche en erreur est annulée."""
+    planificateur = Planificateur()
+    planificateur._session_factory = fabrique
+    planificateur.ajouter('ecriture', _enregistrer('ecriture'), intervalle=60)
+
+    def echec(session: Session) -> None:
+        _enregistrer('echec')(session)
+        raise RuntimeError('tâche en erreur')
+    planificateur.ajouter('echec', echec, intervalle=60)
+
+    assert planificateur.executer('ecriture') == 'ecriture'
+    assert planificateur.executer('echec') is None
+    assert _resultats(fabrique) == ['ecriture']
+    assert verrous == {}
+
+    with pytest.raises(KeyError):
+        planificateur.executer('inconnue')
+
+
+def test_task_skipped_when_locked_elsewhere(fabrique: sessionmaker[Session], verrous: Dict[str, int]):
+    """Une tâche dont le verrou est tenu par un autre processus n'est pas exécutée (une tâche par verrou)."""
+    planificateur = Planificateur()
+    planificateur._session_factory = fabrique
+    planificateur.ajouter('expiration', _enregistrer('expiration'), intervalle=60)
+    planificateur.ajouter('nettoyage', _enregistrer('nettoyage'), intervalle=60)
+
+    verrous['intranet_expiration'] = 1
+    assert planificateur.executer('expiration') is None
+    assert planificateur.executer('nettoyage') == 'nettoyage'
+    assert _resultats(fabrique) == ['nettoyage']
+    # Le verrou de l'autre processus n'est pas libéré par celui-ci
+    assert verrous == {'intranet_expiration': 1}
+
+
+def test_loop_runs_due_tasks_once_per_interval(fabrique: sessionmaker[Session], verrous: Dict[str, int]):
+    """
+    Le thread exécute chaque tâche au démarrage puis à son intervalle ; une tâche remplacée
+    (même nom) n'est plus exécutée.
+    """
+    planificateur = Planificateur(pas=0.01)
+    planificateur.ajouter('frequente', _enregistrer('ancienne'), intervalle=0.05)
+    planificateur.ajouter('frequente', _enregistrer('frequente'), intervalle=0.05)
+    planificateur.ajouter('rare', _enregistrer('rare'), intervalle=3600)
+
+    planificateur.demarrer(fabrique)
+    planificateur.demarrer(fabrique)    # sans effet : un seul thread
+    time.sleep(0.3)
+    planificateur.arreter()
+
+    resultats = _resultats(fabrique)
+    assert resultats.count('rare') == 1 and 'ancienne' not in resultats
+    assert resultats.count('frequente') >= 2
+    assert verrous == {}